@@ -0,0 +1,42 @@
+"""
+Append daily transaction batches to the columnar store.
+
+    python -m backend.append_data data/2024-06-01.csv data/2024-06-02.parquet
+
+Run while the API server is stopped (the server holds the store open);
+against a running server use POST /api/admin/append instead (batches must be
+placed under APPEND_BATCH_DIR).
+"""
+import sys
+import argparse
+
+try:
+    from backend.core.database import db
+except ImportError:
+    from core.database import db
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Append CSV/Parquet transaction batches to the columnar store.")
+    parser.add_argument("paths", nargs="+", help="batch files, appended in the given order")
+    args = parser.parse_args(argv)
+
+    db.ensure_initialized()
+    if not db._initialized:
+        print("Database failed to initialize — check CSV_PATH and DATA_STORE_DIR.", file=sys.stderr)
+        return 1
+    for path in args.paths:
+        try:
+            result = db.append_batch(path)
+        except Exception as e:
+            print(f"{path}: FAILED — {e}", file=sys.stderr)
+            return 1
+        print(
+            f"{path}: +{result['appended_rows']} rows, {result['row_count']} total, "
+            f"data_version={result['data_version']} ({result['execution_time_ms']:.0f} ms)"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Before/after benchmark of ENUM-encoded categorical columns on the current query mix.
+
+    python -m backend.benchmark_storage [--csv path] [--repeat 20]
+
+Builds two throwaway stores from the CSV (plain VARCHAR vs ENUM), then reports
+store file size, in-memory table size and the median latency of every few-shot
+SQL from the SQL-generation prompt plus a few wider GROUP BY / IN shapes.
+Queries run against the base table the way DatabaseManager runs them (ENUM
+literals typed) but with no result cache and no cube routing.
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+import duckdb
+
+try:
+    from backend.core.ingest import IngestManager, load_enum_columns, COLUMN_NAMES
+    from backend.core.sql_rewrite import type_enum_literals
+except ImportError:
+    from core.ingest import IngestManager, load_enum_columns, COLUMN_NAMES
+    from core.sql_rewrite import type_enum_literals
+
+PROMPT_BUILDER_PATH = os.path.join(os.path.dirname(__file__), "core", "prompt_builder.py")
+
+EXTRA_QUERIES = [
+    "SELECT sender_state, sender_bank, COUNT(*) AS n FROM transactions GROUP BY sender_state, sender_bank ORDER BY n DESC LIMIT 20",
+    "SELECT device_type, network_type, ROUND(AVG(amount_inr), 2) AS avg_amount FROM transactions WHERE transaction_type IN ('P2P', 'P2M') GROUP BY device_type, network_type",
+    "SELECT day_of_week, COUNT(*) AS n FROM transactions WHERE sender_age_group IN ('18-25', '26-35') AND network_type = '5G' GROUP BY day_of_week ORDER BY n DESC",
+]
+
+
+def query_mix():
+    """Few-shot SQL examples from the prompt (deduplicated, in order) plus EXTRA_QUERIES."""
+    with open(PROMPT_BUILDER_PATH, "r", encoding="utf-8") as f:
+        source = f.read()
+    queries = []
+    for sql in re.findall(r'"sql": "(SELECT .+?)"', source):
+        if "..." not in sql and sql not in queries:
+            queries.append(sql)
+    return queries + EXTRA_QUERIES
+
+
+def build_store(csv_path: str, store_dir: str, enum_encoding: bool) -> str:
+    manager = IngestManager(store_dir, storage_format="duckdb", enum_encoding=enum_encoding)
+    manager.ensure_store(csv_path)
+    return manager.store_path
+
+
+def measure(store_path: str, queries, repeat: int):
+    conn = duckdb.connect()
+    conn.execute(f"ATTACH '{store_path}' AS store (READ_ONLY)")
+    conn.execute(f"CREATE VIEW transactions AS SELECT {', '.join(COLUMN_NAMES)} FROM store.transactions")
+
+    # In-memory footprint: the same table materialized in the in-memory database
+    conn.execute("CREATE TABLE resident AS SELECT * FROM store.transactions")
+    memory_usage = conn.execute("SELECT memory_usage FROM pragma_database_size() WHERE database_name = 'memory'").fetchone()[0]
+    conn.execute("DROP TABLE resident")
+
+    enum_columns = load_enum_columns(conn)
+    timings = []
+    for sql in queries:
+        sql = type_enum_literals(sql, enum_columns)
+        conn.execute(sql).fetch_arrow_table()  # warm-up
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(sql).fetch_arrow_table()
+            samples.append((time.perf_counter() - start) * 1000)
+        timings.append(statistics.median(samples))
+    conn.close()
+    return os.path.getsize(store_path), memory_usage, timings
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark VARCHAR vs ENUM categorical storage.")
+    parser.add_argument("--csv", default=os.getenv("CSV_PATH", os.path.join(os.path.dirname(__file__), "data", "upi_transactions_2024.csv")))
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.csv):
+        print(f"CSV not found at {args.csv}", file=sys.stderr)
+        return 1
+
+    queries = query_mix()
+    workdir = tempfile.mkdtemp(prefix="insightx_bench_")
+    try:
+        before = measure(build_store(args.csv, os.path.join(workdir, "varchar"), False), queries, args.repeat)
+        after = measure(build_store(args.csv, os.path.join(workdir, "enum"), True), queries, args.repeat)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n{'':>4} {'VARCHAR':>12} {'ENUM':>12} {'speedup':>8}")
+    print(f"{'file':>4} {before[0] / 1e6:>10.1f}MB {after[0] / 1e6:>10.1f}MB {before[0] / after[0]:>7.2f}x")
+    print(f"{'mem':>4} {before[1]:>12} {after[1]:>12}")
+    for i, (sql, b, a) in enumerate(zip(queries, before[2], after[2])):
+        print(f"Q{i + 1:<3} {b:>10.2f}ms {a:>10.2f}ms {b / a:>7.2f}x  {sql[:70]}")
+    total_before, total_after = sum(before[2]), sum(after[2])
+    print(f"{'all':>4} {total_before:>10.2f}ms {total_after:>10.2f}ms {total_before / total_after:>7.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+# Core modules read their settings from the environment at import time, so .env
+# is loaded here, before any of them is imported
+from dotenv import load_dotenv
+
+load_dotenv()
@@ -0,0 +1,221 @@
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+import pyarrow as pa
+
+try:
+    from backend.core.ingest import ingest_manager, TRANSACTION_COLUMNS, ENUM_COLUMNS, ENUM_MAX_VALUES
+except ImportError:
+    from core.ingest import ingest_manager, TRANSACTION_COLUMNS, ENUM_COLUMNS, ENUM_MAX_VALUES
+
+logger = logging.getLogger(__name__)
+
+CATALOG_TABLE = "transactions_catalog"
+
+# Columns whose distinct values are recorded (dropped when there are more than ENUM_MAX_VALUES)
+VALUE_COLUMNS = ENUM_COLUMNS + ["fraud_flag", "hour_of_day", "is_weekend"]
+
+_COLUMN_TYPES = {alias: col_type for _, alias, col_type in TRANSACTION_COLUMNS}
+
+
+def _typed(value: Optional[str], col_type: str):
+    if value is None:
+        return None
+    return int(value) if col_type == "INTEGER" else value
+
+
+def _sorted_values(values: List[str], col_type: str) -> List[str]:
+    return sorted(values, key=lambda v: _typed(v, col_type))
+
+
+def compute_column_stats(conn, source: str) -> Dict[str, Dict[str, Any]]:
+    """Row count, NULL count, min/max and (for VALUE_COLUMNS) distinct values of
+    every transaction column, in a single scan of source. Values are kept as text."""
+    aggregates = ["COUNT(*)"]
+    for column, col_type in _COLUMN_TYPES.items():
+        # Text columns compare as text, whatever their storage type (ENUM or VARCHAR)
+        expr = f"CAST({column} AS VARCHAR)" if col_type == "VARCHAR" else column
+        aggregates += [f"COUNT({column})", f"CAST(MIN({expr}) AS VARCHAR)", f"CAST(MAX({expr}) AS VARCHAR)"]
+        if column in VALUE_COLUMNS:
+            aggregates.append(f"array_agg(DISTINCT CAST({column} AS VARCHAR)) FILTER (WHERE {column} IS NOT NULL)")
+    row = conn.execute(f"SELECT {', '.join(aggregates)} FROM {source}").fetchone()
+
+    row_count = int(row[0])
+    stats: Dict[str, Dict[str, Any]] = {}
+    position = 1
+    for column, col_type in _COLUMN_TYPES.items():
+        non_null, minimum, maximum = row[position:position + 3]
+        position += 3
+        values = None
+        if column in VALUE_COLUMNS:
+            distinct = row[position] or []
+            position += 1
+            if len(distinct) <= ENUM_MAX_VALUES:
+                values = _sorted_values(distinct, col_type)
+        stats[column] = {
+            "data_type": col_type,
+            "row_count": row_count,
+            "null_count": row_count - int(non_null),
+            "min_value": minimum,
+            "max_value": maximum,
+            "distinct_values": values,
+        }
+    return stats
+
+
+def merge_column_stats(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """Statistics of one column over the union of the rows behind a and b."""
+    col_type = a["data_type"]
+
+    def _pick(x, y, fn):
+        present = [v for v in (x, y) if v is not None]
+        return fn(present, key=lambda v: _typed(v, col_type)) if present else None
+
+    values = None
+    if a["distinct_values"] is not None and b["distinct_values"] is not None:
+        union = set(a["distinct_values"]) | set(b["distinct_values"])
+        values = _sorted_values(list(union), col_type) if len(union) <= ENUM_MAX_VALUES else None
+    return {
+        "data_type": col_type,
+        "row_count": a["row_count"] + b["row_count"],
+        "null_count": a["null_count"] + b["null_count"],
+        "min_value": _pick(a["min_value"], b["min_value"], min),
+        "max_value": _pick(a["max_value"], b["max_value"], max),
+        "distinct_values": values,
+    }
+
+
+def _write_catalog(conn, stats: Dict[str, Dict[str, Any]]) -> None:
+    columns = list(stats)
+    conn.register("catalog_rows", pa.table({
+        "column_name": pa.array(columns, pa.string()),
+        "data_type": pa.array([stats[c]["data_type"] for c in columns], pa.string()),
+        "row_count": pa.array([stats[c]["row_count"] for c in columns], pa.int64()),
+        "null_count": pa.array([stats[c]["null_count"] for c in columns], pa.int64()),
+        "min_value": pa.array([stats[c]["min_value"] for c in columns], pa.string()),
+        "max_value": pa.array([stats[c]["max_value"] for c in columns], pa.string()),
+        "distinct_values": pa.array([stats[c]["distinct_values"] for c in columns], pa.list_(pa.string())),
+    }))
+    try:
+        conn.execute(f"INSERT INTO {CATALOG_TABLE} SELECT * FROM catalog_rows")
+    finally:
+        conn.unregister("catalog_rows")
+
+
+def read_column_stats(conn, relation: str) -> Dict[str, Dict[str, Any]]:
+    rows = conn.execute(
+        f"SELECT column_name, data_type, row_count, null_count, min_value, max_value, distinct_values FROM {relation}"
+    ).fetchall()
+    return {
+        name: {
+            "data_type": data_type,
+            "row_count": int(row_count),
+            "null_count": int(null_count),
+            "min_value": minimum,
+            "max_value": maximum,
+            "distinct_values": values,
+        }
+        for name, data_type, row_count, null_count, minimum, maximum, values in rows
+    }
+
+
+def build_catalog_table(conn, source: str) -> None:
+    conn.execute(
+        f"CREATE OR REPLACE TABLE {CATALOG_TABLE} (column_name VARCHAR, data_type VARCHAR, row_count BIGINT, "
+        "null_count BIGINT, min_value VARCHAR, max_value VARCHAR, distinct_values VARCHAR[])"
+    )
+    _write_catalog(conn, compute_column_stats(conn, source))
+
+
+def merge_catalog_table(conn, delta_source: str) -> None:
+    current = read_column_stats(conn, CATALOG_TABLE)
+    delta = compute_column_stats(conn, delta_source)
+    merged = {c: merge_column_stats(current[c], delta[c]) if c in current else delta[c] for c in delta}
+    conn.execute(f"DELETE FROM {CATALOG_TABLE}")
+    _write_catalog(conn, merged)
+
+
+class ColumnCatalog:
+    """
+    Per-column statistics of the transactions table: type, row count, NULL
+    fraction, min/max and the distinct values of low-cardinality columns.
+    Built in one scan at ingest and merged on append, it is loaded into
+    memory once per data version, so schema descriptions, prompt value lists
+    and validators never query the table for metadata.
+    """
+
+    def __init__(self, catalog_relation: str = f"store.{CATALOG_TABLE}"):
+        self.catalog_relation = catalog_relation
+        self.data_version: Optional[str] = None
+        self._columns: Dict[str, Dict[str, Any]] = {}
+        self._lookup: Dict[str, Dict[str, str]] = {}
+
+    def load(self, connection, data_version: Optional[str]) -> None:
+        if data_version is not None and data_version == self.data_version and self._columns:
+            return
+        start = time.time()
+        try:
+            columns = read_column_stats(connection, self.catalog_relation)
+        except Exception as e:
+            logger.warning(f"Column catalog unavailable: {e}")
+            columns = {}
+        # Case-insensitive lookup of known values, for literal checks
+        lookup = {
+            name: {v.lower(): v for v in info["distinct_values"]}
+            for name, info in columns.items() if info["distinct_values"] is not None
+        }
+        self._columns, self._lookup, self.data_version = columns, lookup, data_version
+        logger.info(f"Loaded column catalog ({len(columns)} columns) in {(time.time() - start) * 1000:.1f}ms")
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._columns)
+
+    @property
+    def row_count(self) -> int:
+        return next(iter(self._columns.values()))["row_count"] if self._columns else 0
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._columns)
+
+    def column(self, name: str) -> Optional[Dict[str, Any]]:
+        info = self._columns.get(name.lower())
+        if info is None:
+            return None
+        return {
+            **info,
+            "null_fraction": info["null_count"] / info["row_count"] if info["row_count"] else 0.0,
+            "min_value": _typed(info["min_value"], info["data_type"]),
+            "max_value": _typed(info["max_value"], info["data_type"]),
+            "distinct_values": self.distinct_values(name),
+        }
+
+    def distinct_values(self, name: str) -> Optional[List[Any]]:
+        """Known values of a low-cardinality column (typed), or None if not recorded."""
+        info = self._columns.get(name.lower())
+        if info is None or info["distinct_values"] is None:
+            return None
+        return [_typed(v, info["data_type"]) for v in info["distinct_values"]]
+
+    def canonical_value(self, name: str, literal: str) -> Optional[str]:
+        """The recorded spelling of literal in a low-cardinality text column, matched
+        case-insensitively; None when the column has no such value."""
+        return self._lookup.get(name.lower(), {}).get(literal.lower())
+
+    def has_values(self, name: str) -> bool:
+        return name.lower() in self._lookup
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "data_version": self.data_version,
+            "row_count": self.row_count,
+            "columns": {name: self.column(name) for name in self._columns},
+        }
+
+
+# Built in the same ingest pass as the other derived tables; appends merge the batch's statistics
+ingest_manager.register_derived_builder(CATALOG_TABLE, build_catalog_table, merge_catalog_table)
+
+catalog = ColumnCatalog()
@@ -0,0 +1,274 @@
+import os
+import logging
+from itertools import combinations
+from typing import List, Optional, Tuple
+
+try:
+    from backend.core.sql_rewrite import tokenize
+    from backend.core.ingest import ingest_manager, COLUMN_NAMES
+except ImportError:
+    from core.sql_rewrite import tokenize
+    from core.ingest import ingest_manager, COLUMN_NAMES
+
+logger = logging.getLogger(__name__)
+
+CUBE_TABLE = "transactions_cube"
+
+# Low-cardinality dimensions the few-shot examples group and filter by
+CUBE_DIMENSIONS = [
+    "sender_state",
+    "sender_bank",
+    "transaction_type",
+    "device_type",
+    "network_type",
+    "sender_age_group",
+    "hour_of_day",
+    "day_of_week",
+    "merchant_category",
+]
+
+# Widest grouping set materialized; every subset of up to this many dimensions gets a cuboid
+CUBE_MAX_DIMS = int(os.getenv("CUBE_MAX_DIMS", "3"))
+
+# Additive measures — each can be re-aggregated with SUM over any cuboid
+CUBE_MEASURES = {
+    "cnt": "COUNT(*)",
+    "fraud_sum": "SUM(fraud_flag)",
+    "failed_cnt": "SUM(CASE WHEN transaction_status = 'FAILED' THEN 1 ELSE 0 END)",
+    "success_cnt": "SUM(CASE WHEN transaction_status = 'SUCCESS' THEN 1 ELSE 0 END)",
+    "amount_sum": "SUM(amount_inr)",
+    "amount_cnt": "COUNT(amount_inr)",
+}
+
+_AGGREGATES = {
+    "count", "sum", "avg", "mean", "min", "max", "median", "mode", "stddev", "stddev_pop",
+    "stddev_samp", "variance", "var_pop", "var_samp", "quantile", "quantile_cont",
+    "quantile_disc", "approx_count_distinct", "approx_quantile", "first", "last", "list",
+    "string_agg", "group_concat", "arg_min", "arg_max", "bool_and", "bool_or", "product",
+    "any_value", "histogram", "entropy", "kurtosis", "skewness", "corr", "covar_pop",
+}
+_REJECT_KEYWORDS = {"join", "distinct", "union", "intersect", "except", "with", "using", "qualify", "sample", "tablesample", "filter"}
+_NON_DIMENSION_COLUMNS = {c for c in COLUMN_NAMES if c not in CUBE_DIMENSIONS}
+
+
+def grouping_id(dims) -> int:
+    """GROUPING() bitmask of the cuboid grouped by exactly `dims` (1 = rolled up, first dim is MSB)."""
+    n = len(CUBE_DIMENSIONS)
+    return sum(1 << (n - 1 - i) for i, d in enumerate(CUBE_DIMENSIONS) if d not in dims)
+
+
+def build_cube_sql(source: str) -> str:
+    dims = ", ".join(CUBE_DIMENSIONS)
+    grouping_sets = []
+    for size in range(CUBE_MAX_DIMS + 1):
+        for combo in combinations(CUBE_DIMENSIONS, size):
+            grouping_sets.append("(" + ", ".join(combo) + ")")
+    measures = ",\n            ".join(f"{expr} AS {name}" for name, expr in CUBE_MEASURES.items())
+    return f"""
+        SELECT
+            GROUPING({dims}) AS gid,
+            {dims},
+            {measures}
+        FROM {source}
+        GROUP BY GROUPING SETS ({", ".join(grouping_sets)})
+        ORDER BY gid
+    """
+
+
+def _pattern(sql: str) -> List[Tuple[str, str]]:
+    return [(k, t.lower() if k == "id" else t) for k, t in tokenize(sql)]
+
+
+def _failed_variants(status: str) -> List[List[Tuple[str, str]]]:
+    variants = []
+    for one in ("1", "1.0"):
+        for zero in ("0", "0.0"):
+            variants.append(_pattern(
+                f"SUM(CASE WHEN transaction_status = '{status}' THEN {one} ELSE {zero} END)"
+            ))
+    return variants
+
+
+# (token pattern, replacement over cube measures). Replacements keep the result
+# types of the original expressions, and COUNT(*) over no matching rows stays 0
+# rather than the NULL of an empty SUM; column names are kept by _alias_measures.
+_MEASURE_REWRITES: List[Tuple[List[Tuple[str, str]], str]] = (
+    [(_pattern("COUNT(*)"), "CAST(COALESCE(SUM(cnt), 0) AS BIGINT)")]
+    + [(_pattern("SUM(fraud_flag)"), "SUM(fraud_sum)")]
+    + [(p, "SUM(failed_cnt)" if p[8][1] == "1" else "CAST(SUM(failed_cnt) AS DECIMAL(38,1))") for p in _failed_variants("FAILED")]
+    + [(p, "SUM(success_cnt)" if p[8][1] == "1" else "CAST(SUM(success_cnt) AS DECIMAL(38,1))") for p in _failed_variants("SUCCESS")]
+    + [(_pattern("SUM(amount_inr)"), "SUM(amount_sum)")]
+    + [(_pattern("AVG(amount_inr)"), "(SUM(amount_sum) / SUM(amount_cnt))")]
+)
+
+
+# Column name DuckDB gives each unaliased measure, so a routed answer keeps it.
+# Measures missing here (the CASE variants) are not routed when unaliased.
+_MEASURE_COLUMN_NAMES = {
+    "CAST(COALESCE(SUM(cnt), 0) AS BIGINT)": "count_star()",
+    "SUM(fraud_sum)": "sum(fraud_flag)",
+    "SUM(amount_sum)": "sum(amount_inr)",
+    "(SUM(amount_sum) / SUM(amount_cnt))": "avg(amount_inr)",
+}
+
+
+def _alias_measures(tokens: List[Tuple[str, str]]) -> Optional[List[Tuple[str, str]]]:
+    """tokens with AS "<original column name>" after each unaliased SELECT item that is
+    a lone measure; None if an unaliased item computes something else from a measure
+    (its column name would change)."""
+    lowered = [t.lower() if k == "id" else t for k, t in tokens]
+    if "select" not in lowered:
+        return tokens
+    start = lowered.index("select") + 1
+    depth = 0
+    items, item = [], []
+    for j in range(start, len(tokens)):
+        kind, text = tokens[j]
+        if kind == "op" and text == "(":
+            depth += 1
+        elif kind == "op" and text == ")":
+            depth -= 1
+        if depth == 0 and ((kind == "op" and text == ",") or (kind == "id" and lowered[j] == "from")):
+            items.append(item)
+            item = []
+            if lowered[j] == "from":
+                break
+            continue
+        item.append(j)
+    else:
+        items.append(item)
+
+    aliases = {}
+    for item in items:
+        if not any(tokens[j][0] == "measure" for j in item):
+            continue
+        last = tokens[item[-1]]
+        before = tokens[item[-2]] if len(item) > 1 else None
+        if before is not None and last[0] in ("id", "qid") and (
+                (before[0] == "id" and before[1].lower() == "as") or before[0] == "measure" or before == ("op", ")")):
+            continue
+        name = _MEASURE_COLUMN_NAMES.get(last[1]) if len(item) == 1 and last[0] == "measure" else None
+        if name is None:
+            return None
+        aliases[item[-1]] = name
+    out = []
+    for j, token in enumerate(tokens):
+        out.append(token)
+        if j in aliases:
+            out.extend([("id", "AS"), ("qid", '"' + aliases[j] + '"')])
+    return out
+
+
+class CubeRouter:
+    """
+    Answers compatible queries from the pre-aggregated cube.
+    A query is compatible when it reads `transactions` exactly once, without
+    joins, DISTINCT or table aliases, every aggregate is one of the known
+    additive measures, and the dimensions it references (in SELECT, WHERE,
+    GROUP BY, ORDER BY) fit in one materialized cuboid. Anything else
+    returns None and runs against the base table unchanged.
+    """
+
+    def __init__(self, cube_relation: str = f"store.{CUBE_TABLE}"):
+        self.cube_relation = cube_relation
+        self.enabled = os.getenv("CUBE_ROUTING", "true").lower() in ("1", "true", "yes")
+
+    def rewrite(self, sql: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        tokens = tokenize(sql)
+        lowered = [(k, t.lower() if k == "id" else t) for k, t in tokens]
+
+        # Structural checks — single unaliased scan of transactions, no joins/distinct
+        table_refs = [i for i, tok in enumerate(lowered) if tok == ("id", "transactions")]
+        if len(table_refs) != 1:
+            return None
+        ref = table_refs[0]
+        if ref == 0 or lowered[ref - 1] != ("id", "from"):
+            return None
+        following = lowered[ref + 1] if ref + 1 < len(lowered) else None
+        if following is not None and following not in (
+            ("id", "where"), ("id", "group"), ("id", "order"), ("id", "limit"), ("id", "having"), ("op", ")")
+        ):
+            return None
+        if any(k == "id" and t in _REJECT_KEYWORDS for k, t in lowered) or ("op", ".") in lowered:
+            return None
+
+        # Replace known measure expressions with opaque cube-measure tokens
+        rewritten: List[Tuple[str, str]] = []
+        measures_used = 0
+        i = 0
+        while i < len(lowered):
+            for pattern, replacement in _MEASURE_REWRITES:
+                if lowered[i:i + len(pattern)] == pattern:
+                    rewritten.append(("measure", replacement))
+                    measures_used += 1
+                    i += len(pattern)
+                    break
+            else:
+                rewritten.append(tokens[i])
+                i += 1
+
+        if not self._only_cube_safe_aggregates(rewritten):
+            return None
+        rewritten = _alias_measures(rewritten)
+        if rewritten is None:
+            return None
+
+        has_group_by = any(
+            rewritten[j][1].lower() == "group" and rewritten[j + 1][1].lower() == "by"
+            for j in range(len(rewritten) - 1) if rewritten[j][0] == "id"
+        )
+        if not has_group_by and measures_used == 0:
+            return None  # row-level query — the cube cannot reproduce individual rows
+
+        dims = {t.lower() for k, t in rewritten if k == "id" and t.lower() in CUBE_DIMENSIONS}
+        if len(dims) > CUBE_MAX_DIMS:
+            return None
+
+        projection = ", ".join([d for d in CUBE_DIMENSIONS if d in dims] + list(CUBE_MEASURES))
+        cuboid = (
+            f"(SELECT {projection} FROM {self.cube_relation} "
+            f"WHERE gid = {grouping_id(dims)}) AS transactions"
+        )
+        out = []
+        for kind, text in rewritten:
+            if kind == "id" and text.lower() == "transactions":
+                out.append(cuboid)
+            else:
+                out.append(text)
+        return " ".join(out)
+
+    @staticmethod
+    def _only_cube_safe_aggregates(tokens: List[Tuple[str, str]]) -> bool:
+        for j, (kind, text) in enumerate(tokens):
+            if kind == "measure":
+                # COUNT(*) OVER () etc. would count cube rows, not transactions
+                if j + 1 < len(tokens) and tokens[j + 1][1].lower() == "over":
+                    return False
+                continue
+            if kind == "qid":
+                return False  # quoted identifiers could name any raw column
+            if kind != "id":
+                continue
+            name = text.lower()
+            if name in _NON_DIMENSION_COLUMNS:
+                return False
+            if name in _AGGREGATES and j + 1 < len(tokens) and tokens[j + 1] == ("op", "("):
+                arg = tokens[j + 2:j + 4]
+                # SUM(<measure>) OVER () — window total over already-aggregated groups
+                if len(arg) == 2 and arg[0][0] == "measure" and arg[1] == ("op", ")") \
+                        and j + 4 < len(tokens) and tokens[j + 4][1].lower() == "over":
+                    continue
+                # MIN/MAX of a dimension is the same over cuboid rows as over base rows
+                if name in ("min", "max") and len(arg) == 2 and arg[0][0] == "id" \
+                        and arg[0][1].lower() in CUBE_DIMENSIONS and arg[1] == ("op", ")"):
+                    continue
+                return False
+        return True
+
+
+# Built inside the columnar store at ingest time; appends merge per (gid, dimensions) group
+ingest_manager.register_derived_table(CUBE_TABLE, build_cube_sql, merge_keys=["gid"] + CUBE_DIMENSIONS)
+
+cube_router = CubeRouter()
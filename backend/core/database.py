@@ -1,17 +1,139 @@
 import os
 import duckdb
+import asyncio
 import logging
 import time
-from typing import Dict, List, Any, Optional
-from dotenv import load_dotenv
+import functools
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Any, Optional, Tuple
+try:
+    from backend.core.ingest import ingest_manager, load_enum_columns, COLUMN_NAMES
+    from backend.core.profiler import profile_engine
+    from backend.core.result_set import ResultSet
+    from backend.core.result_cache import result_cache
+    from backend.core.cube import cube_router
+    from backend.core.sampling import sample_estimator
+    from backend.core.sketches import sketch_index
+    from backend.core.catalog import catalog
+    from backend.core.process_executor import (
+        ProcessQueryExecutor, QueryTimeout, QueryCancelled, WorkerCrashed, QUERY_EXECUTOR, QUERY_TIMEOUT_SECONDS
+    )
+    from backend.core.query_context import current_query
+    from backend.core.query_profiler import query_profiler
+    from backend.core.sql_rewrite import type_enum_literals
+except ImportError:
+    from core.ingest import ingest_manager, load_enum_columns, COLUMN_NAMES
+    from core.profiler import profile_engine
+    from core.result_set import ResultSet
+    from core.result_cache import result_cache
+    from core.cube import cube_router
+    from core.sampling import sample_estimator
+    from core.sketches import sketch_index
+    from core.catalog import catalog
+    from core.process_executor import (
+        ProcessQueryExecutor, QueryTimeout, QueryCancelled, WorkerCrashed, QUERY_EXECUTOR, QUERY_TIMEOUT_SECONDS
+    )
+    from core.query_context import current_query
+    from core.query_profiler import query_profiler
+    from core.sql_rewrite import type_enum_literals
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class CursorPool:
+    """
+    Per-thread DuckDB cursors over one shared database instance.
+    A DuckDB connection object must not be used from two threads at once;
+    each worker thread gets its own cursor (which shares the catalog, views
+    and attached store), and a semaphore caps how many queries run together.
+    """
+
+    def __init__(self, connection: duckdb.DuckDBPyConnection, max_concurrency: int):
+        self._connection = connection
+        self.max_concurrency = max_concurrency
+        self._local = threading.local()
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._stats_lock = threading.Lock()
+        self._exclusive_lock = threading.Lock()
+        self._in_flight = 0
+        self._acquired = 0
+        self._waited = 0
+        self._total_wait_ms = 0.0
+        self._max_wait_ms = 0.0
+
+    def _thread_cursor(self) -> duckdb.DuckDBPyConnection:
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._connection.cursor()
+            self._local.cursor = cursor
+        return cursor
+
+    @contextmanager
+    def cursor(self):
+        wait_start = time.perf_counter()
+        self._semaphore.acquire()
+        wait_ms = (time.perf_counter() - wait_start) * 1000
+        with self._stats_lock:
+            self._acquired += 1
+            self._in_flight += 1
+            self._total_wait_ms += wait_ms
+            self._max_wait_ms = max(self._max_wait_ms, wait_ms)
+            if wait_ms >= 1.0:
+                self._waited += 1
+        try:
+            yield self._thread_cursor()
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+            self._semaphore.release()
+
+    @contextmanager
+    def exclusive(self):
+        """Hold every permit: waits for in-flight queries to drain and blocks new
+        ones until the block exits (used while the store is detached)."""
+        with self._exclusive_lock:
+            for _ in range(self.max_concurrency):
+                self._semaphore.acquire()
+            try:
+                yield
+            finally:
+                for _ in range(self.max_concurrency):
+                    self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "acquired": self._acquired,
+                "waited": self._waited,
+                "total_wait_ms": round(self._total_wait_ms, 3),
+                "avg_wait_ms": round(self._total_wait_ms / self._acquired, 3) if self._acquired else 0.0,
+                "max_wait_ms": round(self._max_wait_ms, 3),
+            }
+
+
+# What the numbers cannot say about a column; values, ranges and NULLs come from the catalog
+_COLUMN_NOTES = {
+    "transaction_id": "unique identifier",
+    "timestamp": "transaction date and time",
+    "merchant_category": "NULL for P2P transactions",
+    "amount_inr": "transaction amount in Indian Rupees",
+    "receiver_age_group": "NULL for non-P2P transactions",
+    "sender_state": "Indian state name",
+    "fraud_flag": "0 = not flagged, 1 = flagged for review (NOT confirmed fraud)",
+    "hour_of_day": "derived from timestamp",
+    "is_weekend": "0 = weekday, 1 = weekend",
+}
+_PROMPT_TYPES = {"VARCHAR": "STRING", "TIMESTAMP": "DATE"}
+
+
 class DatabaseManager:
     def __init__(self):
-        load_dotenv()
         self.csv_path = os.getenv(
             "CSV_PATH",
             os.path.join(
@@ -22,16 +144,62 @@ class DatabaseManager:
             )
         )
         self.connection = duckdb.connect(database=':memory:')
+        # Deadline for each query's execution, enforced with DuckDB's interrupt (0 disables)
+        self.query_timeout_s = QUERY_TIMEOUT_SECONDS
+        # Resource caps for in-process queries; DuckDB applies them to the whole
+        # instance, i.e. shared by the (at most DB_MAX_CONCURRENCY) running queries
+        memory_limit = os.getenv("QUERY_MEMORY_LIMIT")
+        if memory_limit:
+            self.connection.execute(f"SET memory_limit = '{memory_limit}'")
+        query_threads = int(os.getenv("QUERY_THREADS", "0"))
+        if query_threads > 0:
+            self.connection.execute(f"SET threads = {query_threads}")
+        self.pool = CursorPool(self.connection, int(os.getenv("DB_MAX_CONCURRENCY", "8")))
+        # Optional isolation: query SQL runs in worker processes over the read-only store
+        self.query_executor = ProcessQueryExecutor() if QUERY_EXECUTOR == "process" else None
+        # Threads that run DuckDB work awaited by async request handlers
+        self._query_threads = ThreadPoolExecutor(
+            max_workers=self.pool.max_concurrency, thread_name_prefix="query"
+        )
+        # Exact re-runs of approximate answers
+        self._refiner = ThreadPoolExecutor(
+            max_workers=int(os.getenv("APPROX_REFINE_WORKERS", "2")), thread_name_prefix="refine"
+        )
         self.data_profile = {}
+        self.store_meta = {}
+        self.data_version = None
+        self.enum_columns = {}
+        self._store_attached = False
         self._initialized = False
+        self._init_lock = threading.RLock()
+        self.init_error: Optional[str] = None
 
     def initialize(self) -> None:
-        """Load CSV data into DuckDB and compute data profile.
+        """Ingest CSV data into the columnar store and compute data profile.
         Safe to call from notebooks without a running FastAPI server.
         Idempotent — calling twice re-initializes cleanly.
         """
-        self._load_data()
-        self._initialized = True
+        with self._init_lock:
+            try:
+                self._load_data()
+            except Exception as e:
+                self.init_error = str(e)
+                raise
+            self.init_error = None
+            self._initialized = True
+
+    def ensure_initialized(self) -> None:
+        """Load the data on first use (scripts, notebooks). The API server loads it
+        in its background warm-up instead; a failed load is not retried here."""
+        if self._initialized or self.init_error is not None:
+            return
+        with self._init_lock:  # waits for a load already in progress
+            if self._initialized or self.init_error is not None:
+                return
+            try:
+                self.initialize()
+            except Exception as e:
+                logger.warning(f"DB init failed: {e}")
         
     def _load_data(self):
         # Handle path resolution if running from root or backend
@@ -49,35 +217,17 @@ class DatabaseManager:
                 raise FileNotFoundError(error_msg)
                 
         try:
-            # Create view with exact column mapping
-            query = f"""
-                CREATE OR REPLACE VIEW transactions AS 
-                SELECT 
-                    "transaction id" AS transaction_id,
-                    "timestamp" AS timestamp,
-                    "transaction type" AS transaction_type,
-                    "merchant_category" AS merchant_category,
-                    "amount (INR)" AS amount_inr,
-                    "transaction_status" AS transaction_status,
-                    "sender_age_group" AS sender_age_group,
-                    "receiver_age_group" AS receiver_age_group,
-                    "sender_state" AS sender_state,
-                    "sender_bank" AS sender_bank,
-                    "receiver_bank" AS receiver_bank,
-                    "device_type" AS device_type,
-                    "network_type" AS network_type,
-                    "fraud_flag" AS fraud_flag,
-                    "hour_of_day" AS hour_of_day,
-                    "day_of_week" AS day_of_week,
-                    "is_weekend" AS is_weekend
-                FROM read_csv_auto('{self.csv_path}');
-            """
-            self.connection.execute(query)
+            # Materialize the CSV once into the columnar store (reused across restarts)
+            self._detach_store()
+            result_cache.clear()
+            self.store_meta = ingest_manager.ensure_store(self.csv_path)
+            self.data_version = self.store_meta.get("data_version")
+            self._attach_store()
             
-            # Log row count
-            count_result = self.connection.execute("SELECT COUNT(*) FROM transactions").fetchone()
-            row_count = count_result[0] if count_result else 0
-            logger.info(f"Loaded {row_count} rows from {self.csv_path} into 'transactions' view.")
+            # Column statistics and sketches are read once per data version
+            catalog.load(self.connection, self.data_version)
+            sketch_index.load(self.connection, self.data_version)
+            logger.info(f"Loaded {catalog.row_count} rows from {self.csv_path} into 'transactions' view.")
             
             # Compute profile
             self._compute_data_profile()
@@ -86,8 +236,81 @@ class DatabaseManager:
             logger.error(f"Failed to load data: {e}")
             raise e
 
-    def execute_query(self, sql: str) -> Dict[str, Any]:
+    def _attach_store(self) -> None:
+        self.connection.execute(f"ATTACH '{ingest_manager.store_path}' AS store (READ_ONLY)")
+        self._store_attached = True
+        # Stable view — generated SQL keeps querying 'transactions' with aliased names
+        columns = ", ".join(COLUMN_NAMES)
+        relation = ingest_manager.transactions_relation()
+        view_sql = f"CREATE OR REPLACE VIEW transactions AS SELECT {columns} FROM {relation}"
+        self.connection.execute(view_sql)
+        self.enum_columns = load_enum_columns(self.connection)
+        if self.query_executor is not None:
+            self.query_executor.start(ingest_manager.store_path, [view_sql])
+
+    def _detach_store(self) -> None:
+        # Workers hold the store file open too; they are respawned on the next attach
+        if self.query_executor is not None:
+            self.query_executor.stop()
+        if self._store_attached:
+            self.connection.execute("DETACH store")
+            self._store_attached = False
+
+    def append_batch(self, batch_path: str) -> Dict[str, Any]:
+        """Append a CSV or Parquet batch of transactions to the store.
+        Existing rows are never rewritten; the data profile and the rollup cube
+        are updated from the batch alone. Queries wait while the store is detached."""
+        start_time = time.time()
+        self.ensure_initialized()
+        if not os.path.exists(batch_path):
+            raise FileNotFoundError(f"Batch file not found at {batch_path}")
+        previous_version = self.data_version
+        previous_rows = int(self.store_meta.get("row_count", "0"))
+        delta = {}
+
+        def _profile_delta(conn, table):
+            delta["partials"] = profile_engine.compute_partials(conn, table)
+
+        with self.pool.exclusive():
+            self._detach_store()
+            try:
+                meta = ingest_manager.append(batch_path, on_delta=_profile_delta)
+            finally:
+                self._attach_store()
+            if meta.get("data_version") != previous_version:
+                self.store_meta = meta
+                self.data_version = meta.get("data_version")
+                result_cache.clear()
+                catalog.load(self.connection, self.data_version)
+                sketch_index.load(self.connection, self.data_version)
+                try:
+                    self.data_profile = profile_engine.apply_delta(
+                        self.connection, previous_version, self.data_version, delta["partials"]
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to update data profile after append: {e}")
+                    self._compute_data_profile()
+
+        row_count = int(self.store_meta.get("row_count", "0"))
+        return {
+            "appended_rows": row_count - previous_rows,
+            "row_count": row_count,
+            "data_version": self.data_version,
+            "execution_time_ms": (time.time() - start_time) * 1000
+        }
+
+    def execute_query(self, sql: str, columnar: bool = False, approximate: bool = False) -> Dict[str, Any]:
+        """Run a read query. With columnar=True, "data" is a ResultSet backed by
+        Arrow; otherwise it is a list of row dicts. With approximate=True, queries
+        that would scan the base table are answered from the sketch index
+        (percentiles, distinct counts) or estimated from the uniform sample when
+        their shape allows it; the result then carries "approximate": True and
+        "estimates" with 95% confidence intervals per row.
+        Execution is interrupted after QUERY_TIMEOUT_SECONDS, or when the current
+        query context is cancelled; failures carry "error_type" ("timeout",
+        "cancelled" or "error")."""
         start_time = time.time()
+        self.ensure_initialized()
         sql = sql.strip().rstrip(';')
         
         # Enforce LIMIT 500 if not present
@@ -96,65 +319,198 @@ class DatabaseManager:
             sql += f" LIMIT {limit_val}"
             
         try:
-            # Execute and fetch as DF then dict
-            result = self.connection.execute(sql).fetchdf()
-            # Convert timestamp to string for JSON serialization compatibility if needed, 
-            # though pandas to_dict usually handles it. 
-            # Force conversion of timestamp/date columns if necessary? 
-            # Usually pydantic handles it, but let's see.
-            
-            data = result.to_dict(orient='records')
-            row_count = len(data)
+            # Serve repeated (canonically equal) queries from the result cache
+            cache_key, aliases = result_cache.key_for(sql, self.data_version)
+            result = result_cache.get(cache_key, aliases) if result_cache.enabled else None
+            cache_hit = result is not None
+
+            cube_routed = False
+            estimates = None
+            if not cache_hit and approximate:
+                approx = self._run_approximate(sql)
+                if approx is not None:
+                    result, estimates = approx
+            if result is None:
+                result, cube_routed = self._run(sql)
+                result_cache.put(cache_key, aliases, result)
+
+            data = result if columnar else result.to_records()
+            row_count = len(result)
             execution_time = (time.time() - start_time) * 1000
             
-            return {
+            response = {
                 "success": True,
                 "data": data,
                 "row_count": row_count,
                 "error": None,
-                "execution_time_ms": execution_time
+                "execution_time_ms": execution_time,
+                "cache_hit": cache_hit,
+                "cube_routed": cube_routed,
+                "approximate": estimates is not None
             }
+            if estimates is not None:
+                response["estimates"] = estimates
+            return response
         except Exception as e:
             execution_time = (time.time() - start_time) * 1000
             error_msg = str(e)
-            logger.error(f"Query failed: {sql} | Error: {error_msg}")
+            if isinstance(e, QueryTimeout):
+                error_type = "timeout"
+            elif isinstance(e, QueryCancelled):
+                error_type = "cancelled"
+            else:
+                error_type = "error"
+            if error_type == "cancelled":
+                logger.info(f"Query cancelled: {sql}")
+            else:
+                logger.error(f"Query failed: {sql} | Error: {error_msg}")
             return {
                 "success": False,
                 "data": [],
                 "row_count": 0,
                 "error": error_msg,
+                "error_type": error_type,
                 "execution_time_ms": execution_time
             }
 
-    def get_schema_description(self) -> str:
-        # Get actual count for the prompt
+    async def execute_query_async(self, sql: str, columnar: bool = False, approximate: bool = False) -> Dict[str, Any]:
+        """execute_query on the query threads, awaitable from the event loop. The
+        caller's context variables (query cancellation, question) go with it."""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._query_threads, functools.partial(context.run, self.execute_query, sql, columnar, approximate)
+        )
+
+    def _run_approximate(self, sql: str) -> Optional[Tuple[ResultSet, Dict[str, Any]]]:
+        """Estimate from the sketches or the sample, or None when the exact answer
+        should be computed instead: unsupported query shape, the cube answers it
+        exactly anyway, the sample would not be smaller than the table, or a
+        LIMIT ranks groups the sample cannot tell apart."""
+        if cube_router.rewrite(sql) is not None:
+            return None
+        population_rows = catalog.row_count
+        sketched = sketch_index.answer(sql, population_rows)
+        if sketched is not None:
+            return sketched
+        sql = type_enum_literals(sql, self.enum_columns)
+        plan = sample_estimator.plan(sql)
+        if plan is None:
+            return None
         try:
-            count_result = self.connection.execute("SELECT COUNT(*) FROM transactions").fetchone()
-            actual_count = count_result[0] if count_result else 0
-        except:
-            actual_count = 0
-        
+            with self.pool.cursor() as cursor:
+                sample_rows = sum(sample_estimator.batch_sizes(cursor, self.data_version).values())
+                if not 0 < sample_rows < population_rows:
+                    return None
+                return sample_estimator.estimate(cursor, sql, plan, population_rows, self.data_version)
+        except Exception as e:
+            logger.warning(f"Approximate execution failed, running exact query: {e}")
+            return None
+
+    def refine_in_background(self, sql: str) -> Future:
+        """Compute the exact answer off the request path; it also lands in the
+        result cache, so asking again returns exact numbers immediately."""
+        return self._refiner.submit(self.execute_query, sql)
+
+    def _run(self, sql: str) -> Tuple[ResultSet, bool]:
+        """Execute on this thread's cursor (or a worker process), answering from the
+        rollup cube when the query is compatible. Returns (result, answered_from_cube)."""
+        with self.pool.cursor() as cursor:
+            routed_sql = cube_router.rewrite(sql)
+            if routed_sql is not None:
+                try:
+                    routed_sql = type_enum_literals(routed_sql, self.enum_columns)
+                    return self._fetch(cursor, routed_sql), True
+                except (QueryTimeout, QueryCancelled, WorkerCrashed):
+                    raise
+                except Exception as e:
+                    logger.warning(f"Cube routing failed, falling back to base table: {e}")
+            # ENUM-typed literals keep categorical filters inside the scan
+            sql = type_enum_literals(sql, self.enum_columns)
+            return self._fetch(cursor, sql), False
+
+    def _fetch(self, cursor, sql: str) -> ResultSet:
+        # Fetch columnar — no per-cell boxing; workers ship the same Arrow table over IPC
+        context = current_query()
+        if context is not None:
+            context.check()
+        on_cancel = context.on_cancel if context is not None else None
+        profiling = query_profiler.enabled
+        profile = {}
+        question = context.question if context is not None else None
+        start = time.perf_counter()
+        try:
+            if self.query_executor is not None and self.query_executor.running:
+                result = ResultSet(self.query_executor.execute(
+                    sql, timeout=self.query_timeout_s, on_cancel=on_cancel,
+                    profile_threshold_ms=query_profiler.threshold_ms if profiling else None,
+                    on_profile=lambda text: profile.update(json=text),
+                ))
+            else:
+                profile_path = query_profiler.prepare(cursor) if profiling else None
+                result = self._fetch_local(cursor, sql, context)
+                if profile_path is not None and query_profiler.is_slow((time.perf_counter() - start) * 1000):
+                    profile["json"] = query_profiler.read_profile(profile_path)
+        except QueryTimeout:
+            # The slowest queries of all: logged without a plan (DuckDB writes none when interrupted)
+            if profiling:
+                query_profiler.record(sql, (time.perf_counter() - start) * 1000, None, None, question=question)
+            raise
+        if profiling:
+            query_profiler.record(sql, (time.perf_counter() - start) * 1000, len(result), profile.get("json"),
+                                  question=question)
+        return result
+
+    def _fetch_local(self, cursor, sql: str, context) -> ResultSet:
+        """Run on the cursor, interrupting it at the deadline or when context is cancelled."""
+        timed_out = threading.Event()
+
+        def _timeout():
+            timed_out.set()
+            cursor.interrupt()
+
+        timer = threading.Timer(self.query_timeout_s, _timeout) if self.query_timeout_s > 0 else None
+        if timer is not None:
+            timer.daemon = True
+            timer.start()
+        try:
+            with context.on_cancel(cursor.interrupt) if context is not None else nullcontext():
+                return ResultSet(cursor.execute(sql).fetch_arrow_table())
+        except duckdb.InterruptException:
+            if timed_out.is_set():
+                raise QueryTimeout(f"Query timeout: exceeded {self.query_timeout_s:g}s and was cancelled")
+            if context is not None and context.cancelled:
+                raise QueryCancelled(f"Query cancelled: {context.reason}")
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+    def get_schema_description(self) -> str:
+        """Schema block for the SQL prompt: types, NULLs, value lists and ranges come
+        from the column catalog, so they always match the loaded data."""
+        self.ensure_initialized()
+        lines = []
+        for name in COLUMN_NAMES:
+            info = catalog.column(name)
+            if info is None:
+                continue
+            facts = []
+            if _COLUMN_NOTES.get(name):
+                facts.append(_COLUMN_NOTES[name])
+            if info["data_type"] == "VARCHAR" and info["distinct_values"] is not None:
+                facts.append("values: " + ", ".join(info["distinct_values"]))
+            elif info["data_type"] != "VARCHAR" and info["min_value"] is not None:
+                facts.append(f"range: {info['min_value']} to {info['max_value']}")
+            nullable = f" (NULLABLE, {info['null_fraction'] * 100:.0f}% NULL)" if info["null_count"] else ""
+            detail = ". ".join(f[0].upper() + f[1:] if k else f for k, f in enumerate(facts))
+            lines.append(f"- {name}: {_PROMPT_TYPES.get(info['data_type'], info['data_type'])}{nullable} — {detail}")
+
         return f"""Table name: transactions
-Total rows: {actual_count}
+Total rows: {catalog.row_count}
 
 Columns:
-- transaction_id: STRING — unique identifier
-- timestamp: DATE — transaction date and time
-- transaction_type: STRING — values: P2P, P2M, Bill Payment, Recharge
-- merchant_category: STRING (NULLABLE) — NULL for P2P transactions. Values: Food, Grocery, Fuel, Entertainment, Shopping, Healthcare, Education, Transport, Utilities, Other
-- amount_inr: INTEGER — transaction amount in Indian Rupees
-- transaction_status: STRING — values: SUCCESS, FAILED
-- sender_age_group: STRING — values: 18-25, 26-35, 36-45, 46-55, 56+
-- receiver_age_group: STRING (NULLABLE) — NULL for non-P2P transactions
-- sender_state: STRING — Indian state name
-- sender_bank: STRING — values: SBI, HDFC, ICICI, Axis, PNB, Kotak, IndusInd, Yes Bank
-- receiver_bank: STRING — same values as sender_bank
-- device_type: STRING — values: Android, iOS, Web
-- network_type: STRING — values: 4G, 5G, WiFi, 3G
-- fraud_flag: INTEGER — 0 = not flagged, 1 = flagged for review (NOT confirmed fraud)
-- hour_of_day: INTEGER — 0 to 23, derived from timestamp
-- day_of_week: STRING — Monday through Sunday
-- is_weekend: INTEGER — 0 = weekday, 1 = weekend
+{chr(10).join(lines)}
 
 Important query rules:
 - Always filter merchant_category IS NOT NULL when querying P2M-specific metrics
@@ -164,73 +520,39 @@ Important query rules:
 
     def _compute_data_profile(self) -> None:
         try:
-            # Total rows
-            total_rows = self.connection.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
-            
-            # Date range
-            min_date = self.connection.execute("SELECT MIN(timestamp) FROM transactions").fetchone()[0]
-            max_date = self.connection.execute("SELECT MAX(timestamp) FROM transactions").fetchone()[0]
-            
-            # Success rate - ensure proper division
-            success_count = self.connection.execute("SELECT COUNT(*) FROM transactions WHERE transaction_status = 'SUCCESS'").fetchone()[0]
-            success_rate = (success_count / total_rows * 100) if total_rows > 0 else 0.0
-            
-            # Fraud flag rate
-            fraud_count = self.connection.execute("SELECT COUNT(*) FROM transactions WHERE fraud_flag = 1").fetchone()[0]
-            fraud_flag_rate = (fraud_count / total_rows * 100) if total_rows > 0 else 0.0
-            
-            # Avg/Max/Min amount
-            stats = self.connection.execute("SELECT AVG(amount_inr), MAX(amount_inr), MIN(amount_inr) FROM transactions").fetchone()
-            avg_amount = stats[0] if stats[0] is not None else 0.0
-            max_amount = stats[1] if stats[1] is not None else 0
-            min_amount = stats[2] if stats[2] is not None else 0
-            
-            # Transaction type distribution
-            type_dist = self.connection.execute("SELECT transaction_type, COUNT(*) FROM transactions GROUP BY transaction_type").fetchall()
-            type_dist_dict = {row[0]: row[1] for row in type_dist}
-            
-            # Top 5 states - ensure list of dicts
-            top_states = self.connection.execute("SELECT sender_state, COUNT(*) as cnt FROM transactions GROUP BY sender_state ORDER BY cnt DESC LIMIT 5").fetchall()
-            top_5_states = [{"state": row[0], "count": row[1]} for row in top_states]
-            
-            # Peak hour
-            peak_hour_res = self.connection.execute("SELECT hour_of_day, COUNT(*) as cnt FROM transactions GROUP BY hour_of_day ORDER BY cnt DESC LIMIT 1").fetchone()
-            peak_hour = peak_hour_res[0] if peak_hour_res else 0
-            
-            # Device distribution
-            device_dist = self.connection.execute("SELECT device_type, COUNT(*) FROM transactions GROUP BY device_type").fetchall()
-            device_dist_dict = {row[0]: row[1] for row in device_dist}
-            
-            # Network distribution
-            network_dist = self.connection.execute("SELECT network_type, COUNT(*) FROM transactions GROUP BY network_type").fetchall()
-            network_dist_dict = {row[0]: row[1] for row in network_dist}
-            
-            self.data_profile = {
-                "total_rows": int(total_rows),
-                "date_range": {"min": str(min_date), "max": str(max_date)},
-                "success_rate": float(success_rate),
-                "fraud_flag_rate": float(fraud_flag_rate),
-                "avg_amount_inr": float(avg_amount),
-                "max_amount_inr": int(max_amount),
-                "min_amount_inr": int(min_amount),
-                "transaction_type_distribution": type_dist_dict,
-                "top_5_states": top_5_states,
-                "peak_hour": int(peak_hour),
-                "device_distribution": device_dist_dict,
-                "network_distribution": network_dist_dict
-            }
-            
+            # Single scan, cached on disk per data version
+            self.data_profile = profile_engine.load_or_compute(self.connection, self.data_version)
         except Exception as e:
             logger.error(f"Failed to compute data profile: {e}")
             self.data_profile = {}
 
     def get_data_profile(self) -> dict:
+        self.ensure_initialized()
         return self.data_profile
 
-# Singleton — auto-initializes at import time
+    def get_pool_stats(self) -> dict:
+        stats = self.pool.stats()
+        if self.query_executor is not None:
+            stats["query_workers"] = self.query_executor.stats()
+        return stats
+
+    def get_cache_stats(self) -> dict:
+        return result_cache.stats()
+
+    def get_sketch_stats(self) -> dict:
+        return sketch_index.stats()
+
+    def get_slow_queries(self, limit: Optional[int] = None) -> dict:
+        return {**query_profiler.stats(), "queries": query_profiler.slow_queries(limit)}
+
+    def get_catalog(self) -> dict:
+        self.ensure_initialized()
+        return catalog.stats()
+
+    def get_column_values(self, column: str) -> Optional[List[Any]]:
+        """Distinct values of a low-cardinality column, from the column catalog."""
+        self.ensure_initialized()
+        return catalog.distinct_values(column)
+
+# Singleton — data is loaded by the API's background warm-up, or on first use
 db = DatabaseManager()
-try:
-    db.initialize()
-except Exception as e:
-    import logging as _logging
-    _logging.getLogger(__name__).warning(f"DB auto-init failed: {e}")
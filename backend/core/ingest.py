@@ -0,0 +1,538 @@
+import os
+import time
+import shutil
+import hashlib
+import logging
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+import duckdb
+
+logger = logging.getLogger(__name__)
+
+# Columnar store location — one DuckDB file holding the materialized transactions table
+STORE_DIR = os.getenv(
+    "DATA_STORE_DIR",
+    os.path.join(
+        os.path.dirname(__file__),
+        "..",
+        "data",
+        "store"
+    )
+)
+STORE_FILENAME = "transactions.duckdb"
+
+# Where the transaction rows live: "duckdb" (native table inside the store file) or
+# "parquet" (hive-partitioned files under <store>/parquet; metadata and derived tables
+# stay in the store file). Partitions are month (from timestamp), optionally then sender_state.
+STORAGE_FORMAT = os.getenv("STORAGE_FORMAT", "duckdb").lower()
+PARQUET_DIRNAME = "parquet"
+PARQUET_PARTITION_BY = [p.strip() for p in os.getenv("PARQUET_PARTITION_BY", "month").split(",") if p.strip()]
+PARQUET_ROW_GROUP_SIZE = int(os.getenv("PARQUET_ROW_GROUP_SIZE", "122880"))
+_PARTITION_EXPRESSIONS = {"month": "strftime(timestamp, '%Y-%m')", "sender_state": "sender_state"}
+
+# Low-cardinality text columns stored as DuckDB ENUMs in duckdb mode (1-byte codes
+# instead of strings; the view still yields the same string values). Parquet mode
+# relies on Parquet's own dictionary encoding instead.
+ENUM_ENCODING = os.getenv("ENUM_ENCODING", "true").lower() in ("1", "true", "yes")
+ENUM_COLUMNS = [
+    "transaction_type",
+    "merchant_category",
+    "transaction_status",
+    "sender_age_group",
+    "receiver_age_group",
+    "sender_state",
+    "sender_bank",
+    "receiver_bank",
+    "device_type",
+    "network_type",
+    "day_of_week",
+]
+# Columns with more distinct values than this stay VARCHAR
+ENUM_MAX_VALUES = int(os.getenv("ENUM_MAX_VALUES", "255"))
+
+# (raw CSV header, aliased column name, pinned DuckDB type)
+# Types are pinned so ingest never depends on CSV sniffing.
+TRANSACTION_COLUMNS: List[Tuple[str, str, str]] = [
+    ("transaction id", "transaction_id", "VARCHAR"),
+    ("timestamp", "timestamp", "TIMESTAMP"),
+    ("transaction type", "transaction_type", "VARCHAR"),
+    ("merchant_category", "merchant_category", "VARCHAR"),
+    ("amount (INR)", "amount_inr", "INTEGER"),
+    ("transaction_status", "transaction_status", "VARCHAR"),
+    ("sender_age_group", "sender_age_group", "VARCHAR"),
+    ("receiver_age_group", "receiver_age_group", "VARCHAR"),
+    ("sender_state", "sender_state", "VARCHAR"),
+    ("sender_bank", "sender_bank", "VARCHAR"),
+    ("receiver_bank", "receiver_bank", "VARCHAR"),
+    ("device_type", "device_type", "VARCHAR"),
+    ("network_type", "network_type", "VARCHAR"),
+    ("fraud_flag", "fraud_flag", "INTEGER"),
+    ("hour_of_day", "hour_of_day", "INTEGER"),
+    ("day_of_week", "day_of_week", "VARCHAR"),
+    ("is_weekend", "is_weekend", "INTEGER"),
+]
+
+COLUMN_NAMES = [alias for _, alias, _ in TRANSACTION_COLUMNS]
+
+
+def file_fingerprint(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of the file contents, streamed in 1 MiB chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _sql_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def csv_select_sql(csv_path: str) -> str:
+    """SELECT that reads the raw CSV as text and casts every column to its pinned type."""
+    projections = ",\n        ".join(
+        f'CAST("{raw}" AS {col_type}) AS {alias}' for raw, alias, col_type in TRANSACTION_COLUMNS
+    )
+    return f"""SELECT
+        {projections}
+    FROM read_csv({_sql_literal(csv_path)}, header = true, all_varchar = true)"""
+
+
+def batch_select_sql(conn: duckdb.DuckDBPyConnection, path: str) -> str:
+    """SELECT over an appended CSV or Parquet batch, cast to the pinned schema.
+    Parquet batches may carry either the raw CSV headers or the aliased names."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return csv_select_sql(path)
+    if extension != ".parquet":
+        raise ValueError(f"Unsupported batch format '{extension}' — expected .csv or .parquet")
+
+    reader = f"read_parquet({_sql_literal(path)})"
+    available = {row[0] for row in conn.execute(f"DESCRIBE SELECT * FROM {reader}").fetchall()}
+    projections = []
+    for raw, alias, col_type in TRANSACTION_COLUMNS:
+        source = alias if alias in available else raw
+        if source not in available:
+            raise ValueError(f"Batch {path} is missing column '{alias}'")
+        projections.append(f'CAST("{source}" AS {col_type}) AS {alias}')
+    return "SELECT\n        " + ",\n        ".join(projections) + f"\n    FROM {reader}"
+
+
+def enum_type_sql(values: List[str]) -> str:
+    return "ENUM(" + ", ".join(_sql_literal(v) for v in values) + ")"
+
+
+def load_enum_columns(conn: duckdb.DuckDBPyConnection, database: str = "store") -> Dict[str, Tuple[str, frozenset]]:
+    """ENUM-encoded transaction columns of an attached store: name -> (type SQL, values)."""
+    rows = conn.execute(
+        "SELECT column_name, data_type FROM duckdb_columns() "
+        "WHERE database_name = ? AND table_name = 'transactions' AND data_type LIKE 'ENUM(%'",
+        [database],
+    ).fetchall()
+    return {
+        name: (type_sql, frozenset(conn.execute(f"SELECT enum_range(NULL::{type_sql})").fetchone()[0]))
+        for name, type_sql in rows
+    }
+
+
+def distinct_values(conn: duckdb.DuckDBPyConnection, source: str, columns: List[str]) -> Dict[str, List[str]]:
+    """Sorted non-NULL distinct values of each column, in one scan of source."""
+    if not columns:
+        return {}
+    aggregates = ", ".join(
+        f"array_agg(DISTINCT {c} ORDER BY {c}) FILTER (WHERE {c} IS NOT NULL)" for c in columns
+    )
+    row = conn.execute(f"SELECT {aggregates} FROM {source}").fetchone()
+    return {c: list(values or []) for c, values in zip(columns, row)}
+
+
+class IngestManager:
+    """
+    Materializes the source CSV into a native DuckDB table exactly once.
+    The store file records the fingerprint of the CSV it was built from;
+    a restart with an unchanged CSV reuses the existing columnar copy.
+    New batches are appended in place; each append derives a new data
+    version from the previous one and the batch fingerprint.
+    In parquet mode the rows are written as hive-partitioned Parquet sorted
+    by timestamp, so partition filters skip whole files and date ranges skip
+    row groups by their min/max statistics.
+    """
+
+    def __init__(self, store_dir: str = STORE_DIR, storage_format: str = STORAGE_FORMAT,
+                 partition_by: List[str] = PARQUET_PARTITION_BY, enum_encoding: bool = ENUM_ENCODING):
+        self.store_dir = store_dir
+        self.store_path = os.path.join(store_dir, STORE_FILENAME)
+        self.parquet_dir = os.path.join(store_dir, PARQUET_DIRNAME)
+        if storage_format not in ("duckdb", "parquet"):
+            logger.warning(f"Unknown STORAGE_FORMAT '{storage_format}', using duckdb")
+            storage_format = "duckdb"
+        if partition_by not in (["month"], ["month", "sender_state"]):
+            logger.warning(f"Unsupported PARQUET_PARTITION_BY {partition_by}, using month")
+            partition_by = ["month"]
+        self.storage_format = storage_format
+        self.partition_by = list(partition_by)
+        self.enum_encoding = enum_encoding and storage_format == "duckdb"
+        # name -> builder(source_table) returning the SELECT that materializes it
+        self._derived_tables: Dict[str, Callable[[str], str]] = {}
+        # name -> key columns, for derived tables whose other columns are summable
+        self._merge_keys: Dict[str, List[str]] = {}
+        # derived tables whose rows each depend on one transaction row only
+        self._appendable: set = set()
+        # name -> (build(conn, source), merge(conn, delta_source)) for tables maintained in Python
+        self._builders: Dict[str, Tuple[Callable[[duckdb.DuckDBPyConnection, str], None],
+                                        Callable[[duckdb.DuckDBPyConnection, str], None]]] = {}
+
+    def register_derived_table(self, name: str, build_sql: Callable[[str], str],
+                               merge_keys: Optional[List[str]] = None, appendable: bool = False) -> None:
+        """Declare a table derived from transactions that is materialized alongside it.
+        With merge_keys, every other column must be additive: appends then fold
+        the batch's own aggregate into the table instead of rebuilding it.
+        With appendable, each output row depends on a single input row (a filter
+        or projection), so appends simply insert the builder's rows for the batch."""
+        self._derived_tables[name] = build_sql
+        if merge_keys:
+            self._merge_keys[name] = list(merge_keys)
+        if appendable:
+            self._appendable.add(name)
+
+    def register_derived_builder(self, name: str,
+                                 build: Callable[[duckdb.DuckDBPyConnection, str], None],
+                                 merge: Callable[[duckdb.DuckDBPyConnection, str], None]) -> None:
+        """Declare a derived table maintained by Python code instead of one SELECT, for
+        states SQL cannot fold (e.g. sketches). build(conn, source) (re)creates the
+        table from the rows of source; merge(conn, delta_source) folds an appended
+        batch into it inside the append transaction."""
+        self._builders[name] = (build, merge)
+
+    @property
+    def derived_table_names(self) -> List[str]:
+        return list(self._derived_tables) + list(self._builders)
+
+    @property
+    def storage_layout(self) -> str:
+        if self.storage_format == "parquet":
+            return "parquet:" + ",".join(self.partition_by)
+        return "duckdb+enum" if self.enum_encoding else "duckdb"
+
+    def transactions_relation(self) -> str:
+        """FROM-clause relation holding the transaction rows, as seen from a
+        connection that has the store attached as `store`."""
+        if self.storage_format == "parquet":
+            files = os.path.join(self.parquet_dir, "**", "*.parquet")
+            hive_types = ", ".join(f"'{p}': VARCHAR" for p in self.partition_by)
+            return f"read_parquet({_sql_literal(files)}, hive_partitioning = true, hive_types = {{{hive_types}}})"
+        return "store.transactions"
+
+    def ensure_store(self, csv_path: str) -> Dict[str, Any]:
+        """Return store metadata, (re)building the store only if the CSV or the storage layout changed."""
+        os.makedirs(self.store_dir, exist_ok=True)
+        stat = os.stat(csv_path)
+        meta = self.read_meta()
+        layout_changed = bool(meta) and meta.get("storage_layout", "duckdb") != self.storage_layout
+
+        if layout_changed:
+            logger.info(f"Storage layout changed ({meta.get('storage_layout', 'duckdb')} -> {self.storage_layout}), rebuilding store")
+            fingerprint = file_fingerprint(csv_path)
+        elif meta:
+            # Cheap check first: unchanged size + mtime means unchanged content
+            if meta.get("source_size") == str(stat.st_size) and meta.get("source_mtime_ns") == str(stat.st_mtime_ns):
+                logger.info(f"Reusing columnar store {self.store_path} (data_version={meta.get('data_version')})")
+                return self._ensure_derived_tables(meta)
+            fingerprint = file_fingerprint(csv_path)
+            if meta.get("source_sha256") == fingerprint:
+                self._write_meta({"source_size": str(stat.st_size), "source_mtime_ns": str(stat.st_mtime_ns)})
+                logger.info(f"Reusing columnar store {self.store_path} (content unchanged)")
+                return self._ensure_derived_tables(self.read_meta())
+        else:
+            fingerprint = file_fingerprint(csv_path)
+
+        if meta and int(meta.get("appended_batches", "0")):
+            logger.warning(
+                f"Rebuilding the store drops {meta['appended_batches']} appended batch(es); "
+                f"re-append them if they are not part of the new CSV"
+            )
+        return self._build_store(csv_path, fingerprint, stat)
+
+    def read_meta(self) -> Optional[Dict[str, str]]:
+        if not os.path.exists(self.store_path):
+            return None
+        try:
+            conn = duckdb.connect(self.store_path, read_only=True)
+            rows = conn.execute("SELECT key, value FROM ingest_meta").fetchall()
+            conn.close()
+            return {k: v for k, v in rows}
+        except Exception as e:
+            logger.warning(f"Columnar store at {self.store_path} is unreadable, rebuilding: {e}")
+            return None
+
+    def _write_meta(self, values: Dict[str, str]) -> None:
+        conn = duckdb.connect(self.store_path)
+        try:
+            self._upsert_meta(conn, values)
+        finally:
+            conn.close()
+
+    def _ensure_derived_tables(self, meta: Dict[str, str]) -> Dict[str, str]:
+        """Materialize derived tables registered after this store was built."""
+        built = set(filter(None, meta.get("derived_tables", "").split(",")))
+        missing = [name for name in self.derived_table_names if name not in built]
+        if not missing:
+            return meta
+        conn = self._connect_writer()
+        try:
+            self._build_derived_tables(conn, missing)
+            self._upsert_meta(conn, {"derived_tables": ",".join(sorted(built | set(missing)))})
+            conn.execute("CHECKPOINT")
+        finally:
+            conn.close()
+        return self.read_meta()
+
+    def _build_derived_tables(self, conn: duckdb.DuckDBPyConnection, names: List[str]) -> None:
+        for name in names:
+            start = time.time()
+            if name in self._builders:
+                self._builders[name][0](conn, "transactions")
+            else:
+                conn.execute(f"CREATE OR REPLACE TABLE {name} AS {self._derived_tables[name]('transactions')}")
+            logger.info(f"Materialized derived table '{name}' in {time.time() - start:.1f}s")
+
+    def append(self, batch_path: str,
+               on_delta: Optional[Callable[[duckdb.DuckDBPyConnection, str], None]] = None) -> Dict[str, str]:
+        """
+        Append a CSV or Parquet batch to the store without rewriting existing rows.
+        Derived tables with merge keys absorb the batch's own aggregate, builder
+        tables merge it in Python; others are rebuilt. on_delta(conn, table) is called with the staged batch before
+        commit so callers can compute their own partial aggregates from the delta.
+        A batch that was already appended (same fingerprint) is a no-op.
+        Requires exclusive access to the store file.
+        """
+        meta = self.read_meta()
+        if not meta:
+            raise RuntimeError(f"No columnar store at {self.store_path} — ingest the base CSV first")
+        fingerprint = file_fingerprint(batch_path)
+        start = time.time()
+
+        conn = self._connect_writer()
+        published: List[str] = []
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ingest_batches "
+                "(sha256 VARCHAR PRIMARY KEY, source_path VARCHAR, row_count BIGINT, appended_at TIMESTAMP)"
+            )
+            if conn.execute("SELECT 1 FROM ingest_batches WHERE sha256 = ?", [fingerprint]).fetchone():
+                logger.info(f"Batch {batch_path} was already appended, skipping")
+                return meta
+
+            conn.execute(f"CREATE TEMP TABLE batch AS {batch_select_sql(conn, batch_path)}")
+            batch_rows = conn.execute("SELECT COUNT(*) FROM batch").fetchone()[0]
+            if batch_rows == 0:
+                logger.info(f"Batch {batch_path} has no rows, skipping")
+                return meta
+
+            built = [n for n in meta.get("derived_tables", "").split(",") if n in self.derived_table_names]
+            conn.execute("BEGIN TRANSACTION")
+            try:
+                if self.storage_format == "parquet":
+                    # New files only — existing partitions are never rewritten
+                    staging = os.path.join(self.store_dir, f"staging_{fingerprint[:12]}")
+                    self._write_parquet(conn, "batch", staging, f"b{fingerprint[:12]}_{{i}}")
+                    published = self._publish_files(staging, self.parquet_dir)
+                else:
+                    self._widen_enums(conn, "batch")
+                    columns = ", ".join(COLUMN_NAMES)
+                    conn.execute(f"INSERT INTO transactions ({columns}) SELECT {columns} FROM batch")
+                for name in built:
+                    if name in self._merge_keys:
+                        self._merge_derived_table(conn, name, "batch")
+                    elif name in self._appendable:
+                        conn.execute(f"INSERT INTO {name} {self._derived_tables[name]('batch')}")
+                    elif name in self._builders:
+                        self._builders[name][1](conn, "batch")
+                    else:
+                        self._build_derived_tables(conn, [name])
+                if on_delta is not None:
+                    on_delta(conn, "batch")
+                data_version = hashlib.sha256(f"{meta['data_version']}:{fingerprint}".encode()).hexdigest()[:16]
+                self._upsert_meta(conn, {
+                    "data_version": data_version,
+                    "row_count": str(int(meta.get("row_count", "0")) + batch_rows),
+                    "appended_batches": str(int(meta.get("appended_batches", "0")) + 1),
+                })
+                conn.execute(
+                    "INSERT INTO ingest_batches VALUES (?, ?, ?, now())",
+                    [fingerprint, os.path.abspath(batch_path), batch_rows],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                for path in published:
+                    os.remove(path)
+                raise
+            conn.execute("CHECKPOINT")
+        finally:
+            conn.close()
+
+        logger.info(
+            f"Appended {batch_rows} rows from {batch_path} in {time.time() - start:.1f}s "
+            f"(data_version={data_version})"
+        )
+        return self.read_meta()
+
+    def _connect_writer(self) -> duckdb.DuckDBPyConnection:
+        """Read-write connection to the store in which `transactions` names the rows
+        in either layout (a temp view over the Parquet files in parquet mode)."""
+        conn = duckdb.connect(self.store_path)
+        if self.storage_format == "parquet":
+            columns = ", ".join(COLUMN_NAMES)
+            relation = self.transactions_relation()
+            conn.execute(f"CREATE TEMP VIEW transactions AS SELECT {columns} FROM {relation}")
+        return conn
+
+    def _enum_encoded_select(self, conn: duckdb.DuckDBPyConnection, source: str) -> str:
+        """SELECT over source with each low-cardinality column cast to an ENUM of its
+        sorted values, so ORDER BY on the ENUM matches string order."""
+        values = distinct_values(conn, source, ENUM_COLUMNS)
+        projections = []
+        for col in COLUMN_NAMES:
+            if 0 < len(values.get(col, [])) <= ENUM_MAX_VALUES:
+                projections.append(f"CAST({col} AS {enum_type_sql(values[col])}) AS {col}")
+            else:
+                projections.append(col)
+        return f"SELECT {', '.join(projections)} FROM {source}"
+
+    def _widen_enums(self, conn: duckdb.DuckDBPyConnection, source: str) -> None:
+        """Extend ENUM columns with values first seen in source. DuckDB cannot add
+        values to an ENUM in place, so every table column of the old type is
+        altered to the widened one (derived tables share the dimension types)."""
+        enum_columns = dict(conn.execute(
+            "SELECT column_name, data_type FROM duckdb_columns() "
+            "WHERE table_name = 'transactions' AND NOT internal AND data_type LIKE 'ENUM(%'"
+        ).fetchall())
+        if not enum_columns:
+            return
+        incoming = distinct_values(conn, source, list(enum_columns))
+        for col, old_type in enum_columns.items():
+            existing = conn.execute(f"SELECT enum_range(NULL::{old_type})").fetchone()[0]
+            added = set(incoming[col]) - set(existing)
+            if not added:
+                continue
+            widened = sorted(set(existing) | added)
+            new_type = enum_type_sql(widened) if len(widened) <= ENUM_MAX_VALUES else "VARCHAR"
+            targets = conn.execute(
+                "SELECT table_name FROM duckdb_columns() WHERE column_name = ? AND data_type = ? "
+                "AND NOT internal AND schema_name = 'main'", [col, old_type]
+            ).fetchall()
+            for (table,) in targets:
+                conn.execute(f"ALTER TABLE {table} ALTER {col} TYPE {new_type}")
+            logger.info(f"Widened {col} with {len(added)} new value(s) ({len(widened)} total)")
+
+    def _write_parquet(self, conn: duckdb.DuckDBPyConnection, source: str, target_dir: str, filename_pattern: str) -> None:
+        """Write source as hive-partitioned Parquet under target_dir, sorted by timestamp
+        so each row group covers a narrow time range (tight zone maps)."""
+        shutil.rmtree(target_dir, ignore_errors=True)
+        projections = ", ".join(
+            COLUMN_NAMES + [f"{_PARTITION_EXPRESSIONS[p]} AS {p}" for p in self.partition_by if p not in COLUMN_NAMES]
+        )
+        conn.execute(f"""
+            COPY (SELECT {projections} FROM {source} ORDER BY timestamp)
+            TO {_sql_literal(target_dir)} (
+                FORMAT PARQUET,
+                PARTITION_BY ({", ".join(self.partition_by)}),
+                FILENAME_PATTERN '{filename_pattern}',
+                ROW_GROUP_SIZE {PARQUET_ROW_GROUP_SIZE}
+            )
+        """)
+
+    @staticmethod
+    def _publish_files(staging_dir: str, target_dir: str) -> List[str]:
+        """Move staged partition files into the dataset; returns the published paths."""
+        published = []
+        for root, _, files in os.walk(staging_dir):
+            destination = os.path.join(target_dir, os.path.relpath(root, staging_dir))
+            for name in files:
+                os.makedirs(destination, exist_ok=True)
+                os.replace(os.path.join(root, name), os.path.join(destination, name))
+                published.append(os.path.join(destination, name))
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        return published
+
+    def _merge_derived_table(self, conn: duckdb.DuckDBPyConnection, name: str, delta_source: str) -> None:
+        """Fold the aggregate of delta_source into an additive derived table:
+        matching key groups are summed, new groups inserted."""
+        start = time.time()
+        keys = self._merge_keys[name]
+        delta = f"{name}_delta"
+        conn.execute(f"CREATE OR REPLACE TEMP TABLE {delta} AS {self._derived_tables[name](delta_source)}")
+        measures = [col[0] for col in conn.execute(f"SELECT * FROM {name} LIMIT 0").description if col[0] not in keys]
+        match = " AND ".join(f"t.{k} IS NOT DISTINCT FROM d.{k}" for k in keys)
+        # SUM over an all-NULL group is NULL, so NULL + x keeps x rather than propagating
+        assignments = ", ".join(
+            f"{m} = CASE WHEN t.{m} IS NULL THEN d.{m} WHEN d.{m} IS NULL THEN t.{m} ELSE t.{m} + d.{m} END"
+            for m in measures
+        )
+        conn.execute(f"UPDATE {name} AS t SET {assignments} FROM {delta} AS d WHERE {match}")
+        conn.execute(
+            f"INSERT INTO {name} SELECT * FROM {delta} AS d "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {name} AS t WHERE {match})"
+        )
+        conn.execute(f"DROP TABLE {delta}")
+        logger.info(f"Merged batch aggregate into derived table '{name}' in {time.time() - start:.2f}s")
+
+    @staticmethod
+    def _upsert_meta(conn: duckdb.DuckDBPyConnection, values: Dict[str, str]) -> None:
+        # INSERT OR REPLACE — DuckDB rejects DELETE + INSERT of one key inside a transaction
+        for key, value in values.items():
+            conn.execute("INSERT OR REPLACE INTO ingest_meta VALUES (?, ?)", [key, str(value)])
+
+    def _build_store(self, csv_path: str, fingerprint: str, stat: os.stat_result) -> Dict[str, Any]:
+        start = time.time()
+        tmp_path = self.store_path + ".tmp"
+        for stale in (tmp_path, tmp_path + ".wal"):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+        parquet_tmp = self.parquet_dir + ".tmp"
+        conn = duckdb.connect(tmp_path)
+        try:
+            if self.storage_format == "parquet":
+                # Rows go to Parquet; the temp copy only feeds the derived tables
+                conn.execute(f"CREATE TEMP TABLE transactions AS {csv_select_sql(csv_path)}")
+                self._write_parquet(conn, "transactions", parquet_tmp, "part_{i}")
+            elif self.enum_encoding:
+                conn.execute(f"CREATE TEMP TABLE staging AS {csv_select_sql(csv_path)}")
+                conn.execute(f"CREATE TABLE transactions AS {self._enum_encoded_select(conn, 'staging')}")
+                conn.execute("DROP TABLE staging")
+            else:
+                conn.execute(f"CREATE TABLE transactions AS {csv_select_sql(csv_path)}")
+            row_count = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+            self._build_derived_tables(conn, self.derived_table_names)
+            conn.execute("CREATE TABLE ingest_meta (key VARCHAR PRIMARY KEY, value VARCHAR)")
+            self._upsert_meta(conn, {
+                "source_path": os.path.abspath(csv_path),
+                "source_sha256": fingerprint,
+                "source_size": str(stat.st_size),
+                "source_mtime_ns": str(stat.st_mtime_ns),
+                "data_version": fingerprint[:16],
+                "row_count": str(row_count),
+                "derived_tables": ",".join(sorted(self.derived_table_names)),
+                "storage_layout": self.storage_layout,
+            })
+            conn.execute("CHECKPOINT")
+        finally:
+            conn.close()
+
+        # Atomic swap so a crash mid-ingest never leaves a half-written store behind
+        if os.path.exists(self.store_path + ".wal"):
+            os.remove(self.store_path + ".wal")
+        shutil.rmtree(self.parquet_dir, ignore_errors=True)
+        if self.storage_format == "parquet":
+            os.replace(parquet_tmp, self.parquet_dir)
+        os.replace(tmp_path, self.store_path)
+        logger.info(
+            f"Ingested {row_count} rows from {csv_path} into {self.store_path} ({self.storage_layout}) "
+            f"in {time.time() - start:.1f}s"
+        )
+        return self.read_meta()
+
+
+ingest_manager = IngestManager()
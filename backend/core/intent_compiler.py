@@ -0,0 +1,270 @@
+import os
+import re
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from backend.core.catalog import catalog
+    from backend.core.sql_cache import STOPWORDS
+except ImportError:
+    from core.catalog import catalog
+    from core.sql_cache import STOPWORDS
+
+logger = logging.getLogger(__name__)
+
+INTENT_COMPILER_ENABLED = os.getenv("INTENT_COMPILER_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# metric → (SELECT expression, alias, description); expressions follow the SQL rules of the generation prompt
+METRICS = {
+    "failure_rate": ("ROUND(SUM(CASE WHEN transaction_status = 'FAILED' THEN 1.0 ELSE 0 END) * 100.0 / COUNT(*), 2)",
+                     "failure_rate", "failure rate (%)"),
+    "fraud_flag_rate": ("ROUND(SUM(fraud_flag) * 100.0 / COUNT(*), 2)", "fraud_flag_rate", "fraud flag rate (%)"),
+    "volume": ("COUNT(*)", "transaction_count", "transaction volume"),
+    "avg_amount_inr": ("ROUND(AVG(amount_inr), 2)", "avg_amount_inr", "average transaction amount"),
+    "total_amount_inr": ("ROUND(SUM(amount_inr), 2)", "total_amount_inr", "total transaction amount"),
+}
+
+METRIC_PHRASES = {
+    "failure rate": "failure_rate", "failure rates": "failure_rate", "failure percentage": "failure_rate",
+    "fail rate": "failure_rate",
+    "fraud rate": "fraud_flag_rate", "fraud rates": "fraud_flag_rate", "fraud flag rate": "fraud_flag_rate",
+    "fraud flag rates": "fraud_flag_rate", "flag rate": "fraud_flag_rate", "flagged rate": "fraud_flag_rate",
+    "fraud flagged rate": "fraud_flag_rate",
+    "volume": "volume", "volumes": "volume", "count": "volume", "counts": "volume", "how many": "volume",
+    "number of": "volume",
+    "average amount": "avg_amount_inr", "avg amount": "avg_amount_inr", "mean amount": "avg_amount_inr",
+    "average value": "avg_amount_inr", "average transaction amount": "avg_amount_inr",
+    "average transaction value": "avg_amount_inr", "average ticket size": "avg_amount_inr",
+    "total amount": "total_amount_inr", "total value": "total_amount_inr",
+    "total transaction amount": "total_amount_inr", "total transaction value": "total_amount_inr",
+}
+
+# Group-by columns; filter values come from the catalog instead
+DIMENSIONS = {
+    "sender_bank": "sender bank", "sender_state": "state", "device_type": "device type",
+    "network_type": "network type", "transaction_type": "transaction type",
+    "merchant_category": "merchant category", "sender_age_group": "age group",
+    "hour_of_day": "hour of day", "day_of_week": "day of week",
+}
+
+DIMENSION_PHRASES = {
+    "bank": "sender_bank", "banks": "sender_bank", "sender bank": "sender_bank", "sender banks": "sender_bank",
+    "state": "sender_state", "states": "sender_state", "sender state": "sender_state",
+    "device": "device_type", "devices": "device_type", "device type": "device_type", "device types": "device_type",
+    "network": "network_type", "networks": "network_type", "network type": "network_type",
+    "network types": "network_type",
+    "type": "transaction_type", "types": "transaction_type", "transaction type": "transaction_type",
+    "transaction types": "transaction_type", "payment type": "transaction_type", "payment types": "transaction_type",
+    "category": "merchant_category", "categories": "merchant_category", "merchant category": "merchant_category",
+    "merchant categories": "merchant_category",
+    "age group": "sender_age_group", "age groups": "sender_age_group", "age": "sender_age_group",
+    "hour": "hour_of_day", "hours": "hour_of_day", "hour of day": "hour_of_day", "hour of the day": "hour_of_day",
+    "time of day": "hour_of_day",
+    "day": "day_of_week", "days": "day_of_week", "day of week": "day_of_week", "day of the week": "day_of_week",
+    "weekday": "day_of_week", "weekdays": "day_of_week",
+}
+
+# Dimensions whose rows are a time series: chronological order, line chart — unless ranked
+TIME_DIMENSIONS = {"hour_of_day"}
+
+DESCENDING = {"highest", "most", "top", "max", "maximum", "largest", "biggest", "higher", "more"}
+ASCENDING = {"lowest", "least", "fewest", "min", "minimum", "smallest", "bottom", "lower", "less"}
+
+# Words that carry no part of the query once metric, dimension and filters are known
+FILLER = STOPWORDS | {
+    "how", "has", "have", "had", "by", "per", "each", "every", "across", "between", "and", "or", "vs", "versus",
+    "compare", "comparing", "comparison", "breakdown", "broken", "down", "split", "wise", "all", "overall",
+    "total", "transactions", "transaction", "payments", "payment", "users", "user", "sender", "senders",
+}
+
+# Dataset values that double as everyday words; a question using them goes to the model
+AMBIGUOUS_VALUES = {"other"}
+
+# Columns a mentioned value may filter on; sender_* wins over receiver_* for values in both
+FILTER_COLUMNS = [
+    "transaction_type", "merchant_category", "transaction_status", "sender_age_group", "sender_state",
+    "sender_bank", "device_type", "network_type", "day_of_week",
+]
+
+# entities_extracted lists the filters are reported under (the generation prompt's format)
+ENTITY_KEYS = {"transaction_type": "transaction_types", "sender_state": "states", "sender_age_group": "age_groups"}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _longest_match(words: List[str], i: int, phrases: Dict[str, Any], max_words: int) -> Tuple[Any, int]:
+    for n in range(min(max_words, len(words) - i), 0, -1):
+        span = words[i:i + n]
+        value = phrases.get(" ".join(span))
+        if value is None:
+            value = phrases.get("".join(span))
+        if value is not None:
+            return value, n
+    return None, 0
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+class IntentCompiler:
+    """
+    Local NL→SQL for the common "metric by dimension, optionally filtered"
+    questions (failure rate, fraud flag rate, volume, average or total amount,
+    by bank, state, device, ...). Every word of the question must be accounted
+    for — a metric, at most one dimension, dataset values, ranking words or
+    filler — or compile() returns None and the question goes to the model.
+    Output has the same shape as the model's SQL-generation response.
+    """
+
+    def __init__(self, enabled: bool = INTENT_COMPILER_ENABLED):
+        self.enabled = enabled
+        self._data_version: Optional[str] = None
+        self._values: Dict[str, Tuple[str, str]] = {}
+        self._max_value_words = 1
+        self.compiled = 0
+        self.fallbacks = 0
+
+    def _value_phrases(self) -> Dict[str, Tuple[str, str]]:
+        """Phrase (spaced and run together) → (column, value) for the filterable columns."""
+        if self._data_version == catalog.data_version and self._values:
+            return self._values
+        values: Dict[str, Tuple[str, str]] = {}
+        ambiguous = set()
+        for column in FILTER_COLUMNS:
+            for value in catalog.distinct_values(column) or []:
+                words = _WORD_RE.findall(str(value).lower())
+                if not words or " ".join(words) in AMBIGUOUS_VALUES:
+                    continue
+                for phrase in (" ".join(words), "".join(words)):
+                    if phrase in values and values[phrase][0] != column:
+                        ambiguous.add(phrase)
+                    values.setdefault(phrase, (column, value))
+        for phrase in ambiguous:
+            del values[phrase]
+        self._values = values
+        self._max_value_words = max((len(p.split()) for p in values), default=1)
+        self._data_version = catalog.data_version
+        return values
+
+    def compile(self, question: str, entity_context: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """The SQL-generation response for question, or None when it is not a
+        confident match (or context from earlier turns has to be applied)."""
+        if not self.enabled or entity_context or not catalog.loaded:
+            return None
+        parsed = self._parse(question)
+        if parsed is None:
+            self.fallbacks += 1
+            return None
+        self.compiled += 1
+        response = self._build(*parsed)
+        logger.info(f"Intent compiled locally: {response['sql']}")
+        return response
+
+    def _parse(self, question: str):
+        values = self._value_phrases()
+        words = _WORD_RE.findall(question.lower())
+        metrics, dimensions, filters = set(), set(), {}
+        descending, limit = None, None
+        i = 0
+        while i < len(words):
+            word = words[i]
+            match, n = _longest_match(words, i, values, self._max_value_words)
+            if match is not None:
+                column, value = match
+                if value not in filters.setdefault(column, []):
+                    filters[column].append(value)
+                i += n
+                continue
+            match, n = _longest_match(words, i, METRIC_PHRASES, 4)
+            if match is not None:
+                metrics.add(match)
+                i += n
+                continue
+            match, n = _longest_match(words, i, DIMENSION_PHRASES, 4)
+            if match is not None:
+                dimensions.add(match)
+                i += n
+                continue
+            if word in DESCENDING or word in ASCENDING:
+                descending = word in DESCENDING
+                if word in ("top", "bottom") and i + 1 < len(words) and words[i + 1].isdigit():
+                    limit = int(words[i + 1])
+                    i += 1
+            elif word not in FILLER:
+                return None
+            i += 1
+
+        if len(metrics) != 1 or len(dimensions) > 1 or limit == 0:
+            return None
+        dimension = next(iter(dimensions), None)
+        if dimension is None:
+            # "Compare SBI and HDFC": several values of one column are the breakdown
+            listed = [column for column, vals in filters.items() if len(vals) > 1]
+            if len(listed) > 1:
+                return None
+            dimension = listed[0] if listed else None
+        elif any(len(vals) > 1 for column, vals in filters.items() if column != dimension):
+            return None
+        return next(iter(metrics)), dimension, filters, descending, limit
+
+    def _build(self, metric: str, dimension: Optional[str], filters: Dict[str, List[str]],
+               descending: Optional[bool], limit: Optional[int]) -> Dict[str, Any]:
+        expression, alias, description = METRICS[metric]
+        conditions = []
+        for column, vals in filters.items():
+            if len(vals) == 1:
+                conditions.append(f"{column} = {_quote(vals[0])}")
+            else:
+                conditions.append(f"{column} IN ({', '.join(_quote(v) for v in vals)})")
+        if dimension == "merchant_category" and "merchant_category" not in filters:
+            conditions.append("merchant_category IS NOT NULL")
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        filter_text = "; ".join(f"{column} = {', '.join(vals)}" for column, vals in filters.items())
+        if dimension is None:
+            sql = f"SELECT {expression} AS {alias} FROM transactions{where}"
+            query_intent = f"Compute {description}" + (f" for {filter_text}" if filter_text else " across all transactions")
+            chart = "none"
+        else:
+            select = f"{dimension}, {expression} AS {alias}"
+            if metric == "volume":
+                select += ", ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER(), 1) AS pct_of_total"
+            # A time dimension is a trend (chronological, line chart) unless the question ranks it
+            timeline = dimension in TIME_DIMENSIONS and descending is None and limit is None
+            if timeline:
+                order = f"{dimension} ASC"
+                chart = "line"
+            else:
+                order = f"{alias} {'ASC' if descending is False else 'DESC'}"
+                chart = "bar"
+            sql = f"SELECT {select} FROM transactions{where} GROUP BY {dimension} ORDER BY {order}"
+            if limit is not None or (dimension not in filters and not timeline):
+                sql += f" LIMIT {min(limit or 20, 20)}"
+            query_intent = f"Compute {description} by {DIMENSIONS[dimension]}" + (
+                f" for {filter_text}" if filter_text else "")
+            if not timeline:
+                query_intent += f" and rank {'ascending' if descending is False else 'descending'}"
+
+        entities = {"transaction_types": [], "states": [], "age_groups": [], "time_filters": {}, "metric": metric}
+        for column, key in ENTITY_KEYS.items():
+            entities[key] = list(filters.get(column, []))
+        return {
+            "sql": sql,
+            "query_intent": query_intent,
+            "entities_extracted": entities,
+            "requires_chart": dimension is not None,
+            "suggested_chart_type": chart,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        attempts = self.compiled + self.fallbacks
+        return {
+            "enabled": self.enabled,
+            "compiled": self.compiled,
+            "fallbacks": self.fallbacks,
+            "compile_rate": round(self.compiled / attempts, 4) if attempts else 0.0,
+        }
+
+
+intent_compiler = IntentCompiler()
@@ -0,0 +1,500 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, FIRST_COMPLETED, wait
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "15"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "120"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+LLM_HEDGING = os.getenv("LLM_HEDGING", "true").lower() in ("1", "true", "yes")
+LLM_HEDGE_DEFAULT_SECONDS = float(os.getenv("LLM_HEDGE_DEFAULT_SECONDS", "6"))
+LLM_HEDGE_MIN_SECONDS = float(os.getenv("LLM_HEDGE_MIN_SECONDS", "1"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# Tokens a completion is assumed to use before the response reports its usage
+COMPLETION_TOKEN_ESTIMATE = 400
+# Latencies kept per model for the p95
+LATENCY_WINDOW = 200
+
+
+class LLMError(Exception):
+    """A model call that got no usable answer (HTTP error, bad payload, circuit open).
+    status is the HTTP status of an error response."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+def is_model_failure(error: BaseException) -> bool:
+    """Whether error says the model is unhealthy: a 5xx or 429 answer, or no answer
+    at all (connection, timeout). Other 4xx are the request's fault and a bad
+    payload is the caller's problem; neither moves the circuit breaker."""
+    if isinstance(error, LLMError):
+        return error.status is not None and (error.status >= 500 or error.status == 429)
+    return isinstance(error, httpx.TransportError)
+
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Rough prompt + completion size (about four characters per token)."""
+    chars = sum(len(str(m.get("content") or "")) for m in messages)
+    return chars // 4 + COMPLETION_TOKEN_ESTIMATE
+
+
+class TokenBucket:
+    """
+    Refills per_minute units a minute, up to a minute's worth. reserve() takes
+    units right away — the level may go negative — and returns how long the
+    caller has to wait for them, so sync and async callers share one bucket.
+    per_minute <= 0 disables the limit.
+    """
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self._level = per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.per_minute, self._level + (now - self._updated) * self.per_minute / 60.0)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        if self.per_minute <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self._level -= amount
+            return 0.0 if self._level >= 0 else -self._level * 60.0 / self.per_minute
+
+    def adjust(self, amount: float) -> None:
+        """Correct an earlier reservation by amount (positive: more was used)."""
+        if self.per_minute <= 0 or not amount:
+            return
+        with self._lock:
+            self._refill()
+            self._level -= amount
+
+    def level(self) -> Optional[float]:
+        if self.per_minute <= 0:
+            return None
+        with self._lock:
+            self._refill()
+            return round(self._level, 1)
+
+
+class ModelHealth:
+    """
+    Latency window and circuit breaker of one model. LLM_BREAKER_FAILURES
+    failures in a row open the circuit: the model is skipped for
+    LLM_BREAKER_COOLDOWN_SECONDS, then half-open — a single probe call is let
+    through (others still skip the model) — a success closes the circuit, a
+    failure re-opens it. Calls admitted with admit() end in record_success(),
+    record_failure() or release().
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self.calls = 0
+        self.failures = 0
+        self.circuit_opens = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < LLM_BREAKER_COOLDOWN_SECONDS:
+            return "open"
+        return "half_open"
+
+    def available(self) -> bool:
+        """Whether a call could be admitted now (without taking the probe)."""
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self._probing)
+
+    def admit(self) -> bool:
+        """Admit one call; while half-open only the probe, until it ends."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "open" or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def release(self) -> None:
+        """End an admitted call that says nothing about the model (cancelled, client error)."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self, latency_s: Optional[float]) -> None:
+        with self._lock:
+            self.calls += 1
+            self.consecutive_failures = 0
+            if self.opened_at is not None:
+                logger.info(f"LLM circuit closed for {self.model}")
+            self.opened_at = None
+            self._probing = False
+            if latency_s is not None:
+                self._latencies.append(latency_s)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.calls += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            reopen = self.opened_at is not None and self.state == "half_open"
+            if reopen or (self.opened_at is None and self.consecutive_failures >= LLM_BREAKER_FAILURES):
+                self.opened_at = time.monotonic()
+                self.circuit_opens += 1
+                logger.warning(f"LLM circuit opened for {self.model} after {self.consecutive_failures} failures")
+            self._probing = False
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < LLM_HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.p95()
+        return {
+            "state": self.state,
+            "calls": self.calls,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "circuit_opens": self.circuit_opens,
+            "latency_samples": len(self._latencies),
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class LLMGateway:
+    """
+    Chat-completions calls over shared keep-alive connection pools (one sync
+    httpx client, one async), rate limited by request and token buckets.
+    A call goes to the primary model; if it has not answered by the primary's
+    observed p95 (LLM_HEDGE_DEFAULT_SECONDS until enough samples), the
+    fallback is sent too and the first answer wins. A primary error sends the
+    fallback at once; models with an open circuit are skipped.
+    """
+
+    def __init__(self, base_url: str = OPENAI_BASE_URL, api_key: Optional[str] = None,
+                 timeout_s: float = OPENAI_TIMEOUT_SECONDS):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout_s = timeout_s
+        self.hedging = LLM_HEDGING
+        self.requests = TokenBucket(LLM_REQUESTS_PER_MINUTE)
+        self.tokens = TokenBucket(LLM_TOKENS_PER_MINUTE)
+        self._health: Dict[str, ModelHealth] = {}
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._client_lock = threading.Lock()
+        # Hedged sync calls wait on both requests from here; a losing request finishes in the background
+        self._hedge_pool = ThreadPoolExecutor(max_workers=LLM_MAX_CONNECTIONS, thread_name_prefix="llm-hedge")
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.throttled_ms = 0.0
+
+    def _client_kwargs(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "headers": {"Authorization": f"Bearer {self.api_key or os.getenv('OPENAI_API_KEY', '')}"},
+            "timeout": self.timeout_s,
+            "limits": httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                   max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                                   keepalive_expiry=LLM_KEEPALIVE_SECONDS),
+        }
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = httpx.Client(**self._client_kwargs())
+        return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        # Connections belong to the event loop that opened them: use from the server's loop only
+        if self._async_client is None:
+            with self._client_lock:
+                if self._async_client is None:
+                    self._async_client = httpx.AsyncClient(**self._client_kwargs())
+        return self._async_client
+
+    def warm(self) -> None:
+        """Open a pooled connection (DNS, TCP, TLS) ahead of the first question."""
+        try:
+            self.client.get("/models")
+        except Exception as e:
+            logger.warning(f"LLM connection warm-up failed: {e}")
+
+    async def awarm(self) -> None:
+        try:
+            await self.async_client.get("/models")
+        except Exception as e:
+            logger.warning(f"LLM connection warm-up failed: {e}")
+
+    async def aclose(self) -> None:
+        """Close both connection pools (server shutdown); later calls open new ones."""
+        with self._client_lock:
+            client, async_client = self._client, self._async_client
+            self._client = self._async_client = None
+        if async_client is not None:
+            await async_client.aclose()
+        if client is not None:
+            client.close()
+
+    def health(self, model: str) -> ModelHealth:
+        if model not in self._health:
+            with self._client_lock:
+                self._health.setdefault(model, ModelHealth(model))
+        return self._health[model]
+
+    def _candidates(self, primary: str, fallback: Optional[str]) -> List[str]:
+        models = [m for m in (primary, fallback) if m]
+        models = list(dict.fromkeys(models))
+        usable = [m for m in models if self.health(m).available()]
+        if not usable:
+            raise LLMError(f"All models unavailable (circuit open): {', '.join(models)}")
+        skipped = [m for m in models if m not in usable]
+        if skipped:
+            logger.info(f"Skipping degraded model(s) {', '.join(skipped)}")
+        return usable
+
+    def hedge_delay(self, model: str) -> float:
+        p95 = self.health(model).p95()
+        return max(LLM_HEDGE_MIN_SECONDS, p95 if p95 is not None else LLM_HEDGE_DEFAULT_SECONDS)
+
+    def _reserve(self, estimate: int) -> float:
+        delay = max(self.requests.reserve(1), self.tokens.reserve(estimate))
+        if delay > 0:
+            self.throttled_ms += delay * 1000
+            logger.info(f"LLM rate limit: waiting {delay:.2f}s")
+        return delay
+
+    def _payload(self, model: str, messages: list, temperature: float, stream: bool = False) -> Dict[str, Any]:
+        payload = {"model": model, "messages": messages, "temperature": temperature}
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    def _admit(self, model: str) -> ModelHealth:
+        health = self.health(model)
+        if not health.admit():
+            # Another call is probing the half-open circuit
+            raise LLMError(f"{model}: circuit open")
+        return health
+
+    def _settle(self, health: ModelHealth, error: BaseException) -> None:
+        if is_model_failure(error):
+            health.record_failure()
+        else:
+            health.release()
+
+    def _answer(self, model: str, response: httpx.Response, estimate: int, started: float) -> str:
+        if response.status_code >= 400:
+            raise LLMError(f"{model}: HTTP {response.status_code} {response.text[:200]}", response.status_code)
+        try:
+            body = response.json()
+            content = body["choices"][0]["message"]["content"]
+        except Exception as e:
+            raise LLMError(f"{model}: malformed response ({e})")
+        used = (body.get("usage") or {}).get("total_tokens")
+        if used:
+            self.tokens.adjust(used - estimate)
+        self.health(model).record_success(time.perf_counter() - started)
+        return content
+
+    def _request(self, model: str, messages: list, temperature: float) -> str:
+        estimate = estimate_tokens(messages)
+        delay = self._reserve(estimate)
+        if delay > 0:
+            time.sleep(delay)
+        health = self._admit(model)
+        started = time.perf_counter()
+        try:
+            response = self.client.post("/chat/completions", json=self._payload(model, messages, temperature))
+            return self._answer(model, response, estimate, started)
+        except BaseException as e:
+            self._settle(health, e)
+            raise
+
+    async def _arequest(self, model: str, messages: list, temperature: float) -> str:
+        estimate = estimate_tokens(messages)
+        delay = self._reserve(estimate)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        health = self._admit(model)
+        started = time.perf_counter()
+        try:
+            response = await self.async_client.post("/chat/completions",
+                                                     json=self._payload(model, messages, temperature))
+            return self._answer(model, response, estimate, started)
+        except BaseException as e:
+            # A cancelled request (the hedge partner answered first) is not a failure of this model
+            self._settle(health, e)
+            raise
+
+    def complete(self, messages: list, temperature: float, primary: str, fallback: Optional[str] = None) -> str:
+        """The first answer of primary (hedged with fallback) as text."""
+        models = self._candidates(primary, fallback)
+        if len(models) == 1:
+            return self._request(models[0], messages, temperature)
+        first = self._hedge_pool.submit(self._request, models[0], messages, temperature)
+        try:
+            return first.result(timeout=self.hedge_delay(models[0]) if self.hedging else None)
+        except FutureTimeout:
+            pass
+        except Exception as e:
+            logger.warning(f"Model {models[0]} failed: {e}. Trying {models[1]}.")
+            return self._request(models[1], messages, temperature)
+
+        self.hedges += 1
+        logger.info(f"Model {models[0]} slower than {self.hedge_delay(models[0]):.2f}s; hedging with {models[1]}")
+        second = self._hedge_pool.submit(self._request, models[1], messages, temperature)
+        pending = {first, second}
+        error: Optional[Exception] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    answer = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if future is second:
+                    self.hedge_wins += 1
+                return answer
+        raise error
+
+    async def acomplete(self, messages: list, temperature: float, primary: str,
+                        fallback: Optional[str] = None) -> str:
+        """complete() on the async client; the losing request of a hedge is cancelled."""
+        models = self._candidates(primary, fallback)
+        if len(models) == 1:
+            return await self._arequest(models[0], messages, temperature)
+        first = asyncio.ensure_future(self._arequest(models[0], messages, temperature))
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self.hedge_delay(models[0]) if self.hedging else None)
+        except asyncio.CancelledError:
+            first.cancel()
+            raise
+        if first in done:
+            try:
+                return first.result()
+            except Exception as e:
+                logger.warning(f"Model {models[0]} failed: {e}. Trying {models[1]}.")
+                return await self._arequest(models[1], messages, temperature)
+
+        self.hedges += 1
+        logger.info(f"Model {models[0]} slower than {self.hedge_delay(models[0]):.2f}s; hedging with {models[1]}")
+        second = asyncio.ensure_future(self._arequest(models[1], messages, temperature))
+        pending = {first, second}
+        error: Optional[Exception] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    if task is second:
+                        self.hedge_wins += 1
+                    return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise error
+
+    async def astream(self, messages: list, temperature: float, primary: str,
+                      fallback: Optional[str] = None) -> AsyncIterator[str]:
+        """Completion fragments as they arrive. Not hedged: the fallback is used
+        only when the primary is skipped or fails before its first fragment."""
+        models = self._candidates(primary, fallback)
+        for i, model in enumerate(models):
+            started = False
+            estimate = estimate_tokens(messages)
+            delay = self._reserve(estimate)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                health = self._admit(model)
+            except LLMError as e:
+                if i == len(models) - 1:
+                    raise
+                logger.warning(f"Model {model} skipped: {e}. Trying {models[i + 1]}.")
+                continue
+            try:
+                async with self.async_client.stream(
+                        "POST", "/chat/completions",
+                        json=self._payload(model, messages, temperature, stream=True)) as response:
+                    if response.status_code >= 400:
+                        await response.aread()
+                        raise LLMError(f"{model}: HTTP {response.status_code} {response.text[:200]}",
+                                       response.status_code)
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        choices = json.loads(data).get("choices") or []
+                        content = (choices[0].get("delta") or {}).get("content") if choices else None
+                        if content:
+                            started = True
+                            yield content
+                # Streamed latency depends on answer length; only the breaker learns from it
+                health.record_success(None)
+                logger.info(f"Successfully streamed model: {model}")
+                return
+            except (asyncio.CancelledError, GeneratorExit):
+                health.release()
+                raise
+            except Exception as e:
+                self._settle(health, e)
+                if started or i == len(models) - 1:
+                    logger.error(f"Model {model} stream failed: {e}")
+                    raise
+                logger.warning(f"Model {model} failed: {e}. Trying {models[i + 1]}.")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "hedging": self.hedging,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "throttled_ms": round(self.throttled_ms, 1),
+            "requests_per_minute": self.requests.per_minute or None,
+            "requests_available": self.requests.level(),
+            "tokens_per_minute": self.tokens.per_minute or None,
+            "tokens_available": self.tokens.level(),
+            "models": {model: health.stats() for model, health in list(self._health.items())},
+        }
+
+
+llm_gateway = LLMGateway()
@@ -0,0 +1,98 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from backend.core.result_set import to_records
+except ImportError:
+    from core.result_set import to_records
+
+logger = logging.getLogger(__name__)
+
+
+def result_fingerprint(db_result: dict, statistical_enrichment: dict) -> str:
+    """Hash of the rows (and whether they are estimates) plus the enrichment the narrator sees."""
+    payload = json.dumps({
+        "rows": to_records(db_result.get("data", [])),
+        "estimates": db_result.get("estimates"),
+        "enrichment": statistical_enrichment,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class NarrationCache:
+    """
+    Pass 2 answers keyed by (question, cleaned SQL, result fingerprint), so the
+    same question over the same rows — in any session — reuses its narration
+    instead of another model round trip. Entries expire after ttl_seconds;
+    past max_entries the least recently used go first.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def key_for(self, question: str, cleaned_sql: str, db_result: dict, statistical_enrichment: dict) -> str:
+        parts = [" ".join(question.lower().split()), cleaned_sql, result_fingerprint(db_result, statistical_enrichment)]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, answer_text: str) -> None:
+        if not self.enabled or not answer_text:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, answer_text)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+narration_cache = NarrationCache(int(os.getenv("NARRATION_CACHE_MAX_ENTRIES", "500")),
+                                 float(os.getenv("NARRATION_CACHE_TTL_SECONDS", "600")))
@@ -0,0 +1,377 @@
+"""
+Out-of-process query execution.
+
+Each worker is a separate Python process (this file run as a script) holding
+its own DuckDB connection with the columnar store attached READ_ONLY. The API
+process sends SQL over the worker's stdin and reads the result back as an
+Arrow IPC stream from its stdout, so a runaway query only ever burns the
+worker's CPU and memory. A worker that exceeds the timeout is killed; one that
+dies (timeout, out-of-memory kill, crash) is replaced before the next query.
+
+Frames: request = 4-byte little-endian length + JSON; response = 1 status
+byte (R ready, O ok, E error, P profile) + 8-byte little-endian length +
+payload. A request with "profile_threshold_ms" is answered by O followed by P
+(DuckDB's JSON profile when the query took at least that long, else empty).
+The script half imports nothing from the backend package.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import threading
+import tempfile
+import subprocess
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# "thread" runs queries on the API process's DuckDB cursors; "process" uses worker processes
+QUERY_EXECUTOR = os.getenv("QUERY_EXECUTOR", "thread").lower()
+QUERY_WORKERS = int(os.getenv("QUERY_WORKERS", "2"))
+QUERY_TIMEOUT_SECONDS = float(os.getenv("QUERY_TIMEOUT_SECONDS", "30"))
+# DuckDB memory_limit inside each worker (queries over it fail or spill instead of growing)
+QUERY_WORKER_MEMORY_LIMIT = os.getenv("QUERY_WORKER_MEMORY_LIMIT", "1GB")
+QUERY_WORKER_THREADS = int(os.getenv("QUERY_WORKER_THREADS", "2"))
+# Optional hard cap on each worker's address space (RLIMIT_AS, Linux/macOS); 0 disables
+QUERY_WORKER_ADDRESS_SPACE_MB = int(os.getenv("QUERY_WORKER_ADDRESS_SPACE_MB", "0"))
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+class QueryCancelled(Exception):
+    pass
+
+
+class WorkerCrashed(RuntimeError):
+    pass
+
+
+def _write_frame(stream, status: bytes, payload) -> None:
+    stream.write(status + len(payload).to_bytes(8, "little"))
+    stream.write(payload)
+    stream.flush()
+
+
+def _read_frame(stream):
+    header = stream.read(9)
+    if len(header) < 9:
+        raise EOFError("worker closed its output")
+    length = int.from_bytes(header[1:], "little")
+    payload = stream.read(length)
+    if len(payload) < length:
+        raise EOFError("worker output truncated")
+    return header[:1], payload
+
+
+class _Worker:
+    def __init__(self, config: Dict[str, Any]):
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), json.dumps(config)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        self.ready = False
+        self.queries = 0
+        self.started_at = time.time()
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def run(self, sql: str, timeout: Optional[float], on_cancel=None,
+            profile_threshold_ms: Optional[float] = None) -> Tuple[bytes, Optional[str]]:
+        """Arrow IPC stream bytes of the query result, and its JSON profile when
+        profiling was asked for and the query was slow. Raises QueryTimeout or
+        QueryCancelled (worker killed), WorkerCrashed (worker gone) or RuntimeError
+        (query error). on_cancel(callback) is a context manager that calls callback
+        if the caller cancels while the query runs."""
+        timed_out = threading.Event()
+        cancelled = threading.Event()
+
+        def _kill():
+            timed_out.set()
+            self.kill()
+
+        def _cancel():
+            cancelled.set()
+            self.kill()
+
+        timer = threading.Timer(timeout, _kill) if timeout else None
+        if timer is not None:
+            timer.daemon = True
+            timer.start()
+        try:
+            with on_cancel(_cancel) if on_cancel is not None else nullcontext():
+                if not self.ready:
+                    self._expect_ready()
+                request = json.dumps({"sql": sql, "profile_threshold_ms": profile_threshold_ms}).encode("utf-8")
+                self.process.stdin.write(len(request).to_bytes(4, "little") + request)
+                self.process.stdin.flush()
+                status, payload = _read_frame(self.process.stdout)
+                profile = None
+                if status == b"O" and profile_threshold_ms is not None:
+                    profile = _read_frame(self.process.stdout)[1].decode("utf-8") or None
+        except (EOFError, OSError, ValueError) as e:
+            if timed_out.is_set():
+                raise QueryTimeout(f"Query timeout: exceeded {timeout:g}s and was cancelled")
+            if cancelled.is_set():
+                raise QueryCancelled("Query cancelled by the caller")
+            code = self.process.poll()
+            raise WorkerCrashed(f"Query worker {self.pid} died (exit code {code}): {e}")
+        finally:
+            if timer is not None:
+                timer.cancel()
+        self.queries += 1
+        if status == b"E":
+            raise RuntimeError(payload.decode("utf-8", "replace"))
+        return payload, profile
+
+    def _expect_ready(self) -> None:
+        status, payload = _read_frame(self.process.stdout)
+        if status != b"R":
+            raise EOFError(payload.decode("utf-8", "replace") or "worker failed to start")
+        self.ready = True
+
+    def kill(self) -> None:
+        if self.alive():
+            self.process.kill()
+
+    def close(self) -> None:
+        """Ask the worker to exit (EOF on stdin), killing it if it does not."""
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=2)
+        except Exception:
+            self.kill()
+            try:
+                self.process.wait(timeout=2)
+            except Exception:
+                pass
+        for stream in (self.process.stdout,):
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+
+# Put on a stopped pool's idle queue to wake callers still waiting for a worker
+_STOPPED = object()
+
+
+class ProcessQueryExecutor:
+    """
+    Fixed-size pool of query worker processes over the read-only store.
+    execute() borrows an idle worker, so at most `workers` queries run out of
+    process at once; callers beyond that wait. start() (re)spawns the pool for
+    an attached store, stop() ends it (the store file must not be held open
+    while it is rebuilt or appended to).
+    """
+
+    def __init__(self, workers: int = QUERY_WORKERS, timeout_s: float = QUERY_TIMEOUT_SECONDS,
+                 memory_limit: str = QUERY_WORKER_MEMORY_LIMIT, threads: int = QUERY_WORKER_THREADS,
+                 address_space_mb: int = QUERY_WORKER_ADDRESS_SPACE_MB):
+        self.workers = max(1, workers)
+        self.timeout_s = timeout_s
+        self.memory_limit = memory_limit
+        self.threads = threads
+        self.address_space_mb = address_space_mb
+        self._config: Optional[Dict[str, Any]] = None
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._all: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.executed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.crashes = 0
+        self.respawns = 0
+
+    @property
+    def running(self) -> bool:
+        return self._config is not None
+
+    def start(self, store_path: str, setup_sql: List[str]) -> None:
+        """Spawn the workers; each attaches store_path READ_ONLY as `store` and runs setup_sql."""
+        self.stop()
+        with self._lock:
+            self._config = {
+                "store_path": os.path.abspath(store_path),
+                "setup_sql": setup_sql,
+                "memory_limit": self.memory_limit,
+                "threads": self.threads,
+                "address_space_mb": self.address_space_mb,
+            }
+            self._generation += 1
+            for _ in range(self.workers):
+                self._add_worker()
+        logger.info(f"Started {self.workers} query worker process(es) (memory_limit={self.memory_limit})")
+
+    def stop(self) -> None:
+        with self._lock:
+            workers, self._all = self._all, []
+            self._config = None
+            self._generation += 1
+            retired, self._idle = self._idle, queue.Queue()
+        # Callers blocked on the retired queue would never be handed a worker: the
+        # sentinel wakes one, which passes it on to the next before retrying
+        retired.put(_STOPPED)
+        for worker in workers:
+            worker.close()
+
+    def _add_worker(self) -> None:
+        worker = _Worker(self._config)
+        self._all.append(worker)
+        self._idle.put(worker)
+
+    def _release(self, worker: _Worker, generation: int, healthy: bool) -> None:
+        with self._lock:
+            current = generation == self._generation and self._config is not None
+            if healthy and current:
+                self._idle.put(worker)
+                return
+            if worker in self._all:
+                self._all.remove(worker)
+            if current:
+                self._add_worker()
+                self.respawns += 1
+        worker.close()
+
+    def execute(self, sql: str, timeout: Optional[float] = None, on_cancel=None,
+                profile_threshold_ms: Optional[float] = None, on_profile=None):
+        """Run sql in a worker and return its result as a pyarrow Table; on_cancel
+        is passed to _Worker.run. With profile_threshold_ms, on_profile(json) is
+        called with the query's profile if it ran at least that long."""
+        import pyarrow as pa
+
+        while True:
+            with self._lock:
+                if self._config is None:
+                    raise RuntimeError("Query workers are not running")
+                generation, idle = self._generation, self._idle
+            worker = idle.get()
+            if worker is not _STOPPED:
+                break
+            idle.put(_STOPPED)  # the pool was stopped (and maybe restarted) while waiting
+        healthy = False
+        try:
+            payload, profile = worker.run(
+                sql, self.timeout_s if timeout is None else timeout, on_cancel, profile_threshold_ms
+            )
+            healthy = True
+        except QueryTimeout:
+            self.timeouts += 1
+            logger.warning(f"Killed query worker {worker.pid} after timeout: {sql[:200]}")
+            raise
+        except QueryCancelled:
+            self.cancelled += 1
+            logger.info(f"Killed query worker {worker.pid} on cancellation: {sql[:200]}")
+            raise
+        except WorkerCrashed as e:
+            self.crashes += 1
+            logger.error(str(e))
+            raise
+        except RuntimeError:
+            healthy = worker.alive()
+            self.failed += 1
+            raise
+        finally:
+            self._release(worker, generation, healthy)
+        self.executed += 1
+        if profile is not None and on_profile is not None:
+            on_profile(profile)
+        return pa.ipc.open_stream(payload).read_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "running": self.running,
+                "workers": len(self._all),
+                "idle": self._idle.qsize(),
+                "pids": [w.pid for w in self._all],
+                "memory_limit": self.memory_limit,
+                "timeout_s": self.timeout_s,
+                "executed": self.executed,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+                "cancelled": self.cancelled,
+                "crashes": self.crashes,
+                "respawns": self.respawns,
+            }
+
+
+def _serve(config: Dict[str, Any]) -> None:
+    """Worker loop: one DuckDB connection, one query at a time, until stdin closes."""
+    out = sys.stdout.buffer
+    sys.stdout = sys.stderr  # nothing but frames may reach the parent's pipe
+    if config.get("address_space_mb"):
+        try:
+            import resource
+            limit = config["address_space_mb"] * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError) as e:
+            print(f"query worker: address space limit not applied: {e}", file=sys.stderr)
+
+    try:
+        import duckdb
+        import pyarrow as pa
+
+        conn = duckdb.connect()
+        conn.execute(f"SET memory_limit = '{config['memory_limit']}'")
+        conn.execute(f"SET threads = {int(config['threads'])}")
+        store_path = config["store_path"].replace("'", "''")
+        conn.execute(f"ATTACH '{store_path}' AS store (READ_ONLY)")
+        for statement in config["setup_sql"]:
+            conn.execute(statement)
+    except Exception as e:
+        _write_frame(out, b"E", f"{e}".encode("utf-8"))
+        return
+    try:
+        _write_frame(out, b"R", b"")
+    except BrokenPipeError:
+        return  # parent went away while this worker started
+
+    inp = sys.stdin.buffer
+    profile_path = None
+    while True:
+        header = inp.read(4)
+        if len(header) < 4:
+            return
+        request = json.loads(inp.read(int.from_bytes(header, "little")))
+        threshold_ms = request.get("profile_threshold_ms")
+        try:
+            if threshold_ms is not None and profile_path is None:
+                profile_path = os.path.join(tempfile.gettempdir(), f"insightx_worker_{os.getpid()}.json")
+                conn.execute("PRAGMA enable_profiling = 'json'")
+                conn.execute(f"PRAGMA profiling_output = '{profile_path}'")
+            start = time.perf_counter()
+            table = conn.execute(request["sql"]).fetch_arrow_table()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            _write_frame(out, b"O", sink.getvalue())
+        except Exception as e:
+            _write_frame(out, b"E", str(e).encode("utf-8"))
+            continue
+        if threshold_ms is not None:
+            profile = b""
+            if elapsed_ms >= threshold_ms:
+                try:
+                    with open(profile_path, "rb") as f:
+                        profile = f.read()
+                except OSError:
+                    pass
+            _write_frame(out, b"P", profile)
+
+
+if __name__ == "__main__":
+    _serve(json.loads(sys.argv[1]))
@@ -0,0 +1,193 @@
+import os
+import json
+import logging
+from typing import Dict, List, Any, Optional
+
+try:
+    from backend.core.ingest import STORE_DIR
+except ImportError:
+    from core.ingest import STORE_DIR
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FILENAME = "profile.json"
+PROFILE_FORMAT = 1
+
+# Dimensions whose value counts feed the dashboard distributions
+PROFILE_DIMENSIONS = ["transaction_type", "sender_state", "hour_of_day", "device_type", "network_type"]
+
+
+def _single_pass_sql(source: str) -> str:
+    dims = ", ".join(PROFILE_DIMENSIONS)
+    grouping_sets = ", ".join(["()"] + [f"({d})" for d in PROFILE_DIMENSIONS])
+    return f"""
+        SELECT
+            GROUPING({dims}) AS gid,
+            {dims},
+            COUNT(*) AS cnt,
+            MIN(timestamp) AS min_ts,
+            MAX(timestamp) AS max_ts,
+            SUM(CASE WHEN transaction_status = 'SUCCESS' THEN 1 ELSE 0 END) AS success_cnt,
+            SUM(CASE WHEN fraud_flag = 1 THEN 1 ELSE 0 END) AS fraud_cnt,
+            SUM(amount_inr) AS amount_sum,
+            COUNT(amount_inr) AS amount_cnt,
+            MIN(amount_inr) AS amount_min,
+            MAX(amount_inr) AS amount_max
+        FROM {source}
+        GROUP BY GROUPING SETS ({grouping_sets})
+    """
+
+
+class ProfileEngine:
+    """
+    Computes the dataset profile in a single scan and caches it on disk.
+    The cache stores mergeable partial aggregates (counts, sums, min/max,
+    per-dimension value counts) so the dashboard profile is derived without
+    touching the table again while the data version is unchanged.
+    """
+
+    def __init__(self, store_dir: str = STORE_DIR):
+        self.cache_path = os.path.join(store_dir, PROFILE_FILENAME)
+
+    def load_or_compute(self, connection, data_version: Optional[str], source: str = "transactions") -> Dict[str, Any]:
+        partials = self._load_cached(data_version)
+        if partials is None:
+            partials = self.compute_partials(connection, source)
+            self._save(data_version, partials)
+        else:
+            logger.info(f"Loaded cached data profile for data_version={data_version}")
+        return self.finalize(partials)
+
+    def apply_delta(self, connection, old_version: Optional[str], new_version: Optional[str],
+                    delta_partials: Dict[str, Any], source: str = "transactions") -> Dict[str, Any]:
+        """Profile after an append: cached partials of the previous version merged
+        with the partials of the appended rows. Falls back to one full scan when
+        the previous version has no cached partials."""
+        base = self._load_cached(old_version)
+        if base is None:
+            logger.info(f"No cached profile for data_version={old_version}, recomputing from {source}")
+            partials = self.compute_partials(connection, source)
+        else:
+            partials = self.merge(base, delta_partials)
+        self._save(new_version, partials)
+        return self.finalize(partials)
+
+    def compute_partials(self, connection, source: str = "transactions") -> Dict[str, Any]:
+        rows = connection.execute(_single_pass_sql(source)).fetchall()
+        all_rolled_up = (1 << len(PROFILE_DIMENSIONS)) - 1
+        partials: Dict[str, Any] = {
+            "total_rows": 0,
+            "min_ts": None,
+            "max_ts": None,
+            "success_count": 0,
+            "fraud_count": 0,
+            "amount_sum": 0,
+            "amount_count": 0,
+            "amount_min": None,
+            "amount_max": None,
+            "distributions": {d: [] for d in PROFILE_DIMENSIONS},
+        }
+        for row in rows:
+            gid = row[0]
+            measures = row[1 + len(PROFILE_DIMENSIONS):]
+            if gid == all_rolled_up:
+                cnt, min_ts, max_ts, success_cnt, fraud_cnt, amount_sum, amount_cnt, amount_min, amount_max = measures
+                partials.update({
+                    "total_rows": int(cnt),
+                    "min_ts": str(min_ts) if min_ts is not None else None,
+                    "max_ts": str(max_ts) if max_ts is not None else None,
+                    "success_count": int(success_cnt or 0),
+                    "fraud_count": int(fraud_cnt or 0),
+                    "amount_sum": int(amount_sum or 0),
+                    "amount_count": int(amount_cnt or 0),
+                    "amount_min": int(amount_min) if amount_min is not None else None,
+                    "amount_max": int(amount_max) if amount_max is not None else None,
+                })
+                continue
+            # Exactly one dimension is grouped in every other grouping set
+            for i, dim in enumerate(PROFILE_DIMENSIONS):
+                if not gid & (1 << (len(PROFILE_DIMENSIONS) - 1 - i)):
+                    partials["distributions"][dim].append([row[1 + i], int(measures[0])])
+                    break
+        return partials
+
+    @staticmethod
+    def merge(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+        """Combine two partials as if computed over the union of their rows."""
+        def _pick(x, y, fn):
+            values = [v for v in (x, y) if v is not None]
+            return fn(values) if values else None
+
+        merged = {
+            "total_rows": a["total_rows"] + b["total_rows"],
+            "min_ts": _pick(a["min_ts"], b["min_ts"], min),
+            "max_ts": _pick(a["max_ts"], b["max_ts"], max),
+            "success_count": a["success_count"] + b["success_count"],
+            "fraud_count": a["fraud_count"] + b["fraud_count"],
+            "amount_sum": a["amount_sum"] + b["amount_sum"],
+            "amount_count": a["amount_count"] + b["amount_count"],
+            "amount_min": _pick(a["amount_min"], b["amount_min"], min),
+            "amount_max": _pick(a["amount_max"], b["amount_max"], max),
+            "distributions": {},
+        }
+        for dim in PROFILE_DIMENSIONS:
+            counts: Dict[Any, int] = {}
+            for value, cnt in a["distributions"].get(dim, []) + b["distributions"].get(dim, []):
+                counts[value] = counts.get(value, 0) + cnt
+            merged["distributions"][dim] = [[v, c] for v, c in counts.items()]
+        return merged
+
+    @staticmethod
+    def finalize(partials: Dict[str, Any]) -> Dict[str, Any]:
+        """Derive the public data_profile from partial aggregates."""
+        total_rows = partials["total_rows"]
+        dists = partials["distributions"]
+
+        def _ranked(dim: str) -> List[List[Any]]:
+            return sorted(dists.get(dim, []), key=lambda vc: vc[1], reverse=True)
+
+        hours = _ranked("hour_of_day")
+        success_rate = (partials["success_count"] / total_rows * 100) if total_rows > 0 else 0.0
+        fraud_flag_rate = (partials["fraud_count"] / total_rows * 100) if total_rows > 0 else 0.0
+        avg_amount = (partials["amount_sum"] / partials["amount_count"]) if partials["amount_count"] else 0.0
+
+        return {
+            "total_rows": int(total_rows),
+            "date_range": {"min": str(partials["min_ts"]), "max": str(partials["max_ts"])},
+            "success_rate": float(success_rate),
+            "fraud_flag_rate": float(fraud_flag_rate),
+            "avg_amount_inr": float(avg_amount),
+            "max_amount_inr": int(partials["amount_max"] or 0),
+            "min_amount_inr": int(partials["amount_min"] or 0),
+            "transaction_type_distribution": {v: c for v, c in dists.get("transaction_type", [])},
+            "top_5_states": [{"state": v, "count": c} for v, c in _ranked("sender_state")[:5]],
+            "peak_hour": int(hours[0][0]) if hours else 0,
+            "device_distribution": {v: c for v, c in dists.get("device_type", [])},
+            "network_distribution": {v: c for v, c in dists.get("network_type", [])},
+        }
+
+    def _load_cached(self, data_version: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not data_version or not os.path.exists(self.cache_path):
+            return None
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("format") == PROFILE_FORMAT and cached.get("data_version") == data_version:
+                return cached["partials"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable profile cache {self.cache_path}: {e}")
+        return None
+
+    def _save(self, data_version: Optional[str], partials: Dict[str, Any]) -> None:
+        if not data_version:
+            return
+        try:
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"format": PROFILE_FORMAT, "data_version": data_version, "partials": partials}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Could not persist profile cache: {e}")
+
+
+profile_engine = ProfileEngine()
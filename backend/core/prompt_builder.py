@@ -1,46 +1,64 @@
 import sys
 import os
+import re
 import json
-from typing import List, Dict, Any
+import math
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Tuple
 
 # Add parent directory to path to allow imports from core
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 try:
     from core.database import db
+    from core.result_set import to_records
+    from core.sql_cache import STOPWORDS
 except ImportError:
     from backend.core.database import db
-
-VALID_ENUM_REFERENCE = """VALID ENUM VALUES (use these EXACTLY — do not paraphrase):
-- transaction_type: 'P2P', 'P2M', 'Bill Payment', 'Recharge'
-- transaction_status: 'SUCCESS', 'FAILED'
-- sender_age_group: '18-25', '26-35', '36-45', '46-55', '56+'
-- device_type: 'Android', 'iOS', 'Web'
-- network_type: '4G', '5G', 'WiFi', '3G'
-- sender_bank: 'SBI', 'HDFC', 'ICICI', 'Axis', 'PNB', 'Kotak', 'IndusInd', 'Yes Bank'
-- day_of_week: 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'
-- fraud_flag: 0, 1
-- is_weekend: 0, 1"""
-
-
-class PromptBuilder:
-    def __init__(self):
-        self.schema = db.get_schema_description() if db else "Schema not available"
-
-    def build_sql_generation_prompt(self, user_query: str, conversation_history: List[Dict], entity_context: Dict) -> List[Dict]:
-        """
-        Constructs the prompt for GPT-4 to generate DuckDB SQL from natural language.
-        """
-        enum_block = ""
-        if "VALID ENUM VALUES" not in (self.schema or ""):
-            enum_block = f"\n\n{VALID_ENUM_REFERENCE}\n"
-
-        system_content = f"""You are an expert data analyst for a UPI digital payments platform in India.
-Your job is to convert natural language questions into precise DuckDB SQL queries.
-
-{self.schema}
-{enum_block}
-
-CRITICAL SQL RULES — follow these exactly:
+    from backend.core.result_set import to_records
+    from backend.core.sql_cache import STOPWORDS
+
+logger = logging.getLogger(__name__)
+
+# Token budget of the SQL-generation prompt (approximate tokens, 0 = send every
+# example and the full schema). Fixed sections always go in; the rest of the
+# budget holds the most relevant schema detail and few-shot examples.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2500"))
+PROMPT_MAX_EXAMPLES = int(os.getenv("PROMPT_MAX_EXAMPLES", "4"))
+# Longer history messages (usually narrated answers) are cut to this many tokens
+PROMPT_HISTORY_MESSAGE_TOKENS = int(os.getenv("PROMPT_HISTORY_MESSAGE_TOKENS", "200"))
+
+# Columns listed in the VALID ENUM VALUES block; their values come from the column catalog
+ENUM_REFERENCE_COLUMNS = [
+    "transaction_type", "transaction_status", "sender_age_group", "device_type", "network_type",
+    "sender_bank", "day_of_week", "fraud_flag", "is_weekend",
+]
+
+# Words that point at a column besides its own name and values
+COLUMN_KEYWORDS = {
+    "transaction_id": "id identifier unique",
+    "timestamp": "date time month trend daily monthly when",
+    "transaction_type": "type p2p p2m recharge bill",
+    "merchant_category": "merchant category shop",
+    "amount_inr": "amount value rupee inr spend spent ticket",
+    "transaction_status": "status fail failed failure success successful decline",
+    "sender_age_group": "age group young old",
+    "receiver_age_group": "receiver age group",
+    "sender_state": "state location region where",
+    "sender_bank": "bank",
+    "receiver_bank": "receiver bank",
+    "device_type": "device android ios web phone",
+    "network_type": "network 3g 4g 5g wifi",
+    "fraud_flag": "fraud flag flagged review risk suspicious",
+    "hour_of_day": "hour time peak night morning evening",
+    "day_of_week": "day week weekday",
+    "is_weekend": "weekend weekday",
+}
+
+SQL_INSTRUCTIONS = """You are an expert data analyst for a UPI digital payments platform in India.
+Your job is to convert natural language questions into precise DuckDB SQL queries."""
+
+SQL_RULES = """CRITICAL SQL RULES — follow these exactly:
 1. Only write SELECT statements. Never write INSERT, UPDATE, DELETE, DROP, or any mutating SQL.
 2. Always use the aliased column names (amount_inr, transaction_type, etc.) — never the raw CSV names.
 3. When calculating failure rate: SUM(CASE WHEN transaction_status = 'FAILED' THEN 1.0 ELSE 0 END) / COUNT(*) * 100
@@ -55,216 +73,184 @@ CRITICAL SQL RULES — follow these exactly:
 12. If a query asks to "compare" any two or more groups — always use GROUP BY on the grouping column and compute the metric for each group. A comparison query ALWAYS produces multiple rows, one per group.
 13. When computing fraud flag rate for a FILTERED subset (e.g., high-value transactions), always use: SUM(fraud_flag) * 100.0 / COUNT(*) where COUNT(*) is the count of rows IN THAT FILTERED SUBSET, not the total table. Never divide by a hardcoded number or a subquery count of the full table.
 14. When asked for top N states/banks/categories by volume or count, use ORDER BY count DESC LIMIT N. Never use HAVING or WHERE to filter by count unless the user explicitly asks for a threshold. The LIMIT clause alone is sufficient.
-15. In compound or follow-up queries about a specific entity (state, bank, category), ALL metrics including fraud_flag rate must be computed within a WHERE clause filtering to that entity. Never compute a rate using the full table denominator when the question is about a specific subset.
+15. In compound or follow-up queries about a specific entity (state, bank, category), ALL metrics including fraud_flag rate must be computed within a WHERE clause filtering to that entity. Never compute a rate using the full table denominator when the question is about a specific subset."""
 
-FEW-SHOT EXAMPLES (follow this style exactly):
-Example 1 — Percentage calculation (failure rate per bank)
+FEW_SHOT_EXAMPLES = [
+    ("1", """Example 1 — Percentage calculation (failure rate per bank)
 Question: "Which bank has the highest failure rate?"
 Expected JSON:
-{{
+{
   "sql": "SELECT sender_bank, ROUND(SUM(CASE WHEN transaction_status = 'FAILED' THEN 1.0 ELSE 0 END) * 100.0 / COUNT(*), 2) AS failure_rate FROM transactions GROUP BY sender_bank ORDER BY failure_rate DESC LIMIT 20",
   "query_intent": "Compute failure rate (%) by sender bank and rank descending",
-  "entities_extracted": {{
+  "entities_extracted": {
     "transaction_types": [],
     "states": [],
     "age_groups": [],
-    "time_filters": {{}},
+    "time_filters": {},
     "metric": "failure_rate"
-  }},
+  },
   "requires_chart": true,
   "suggested_chart_type": "bar"
-}}
-
-Example 2 — Follow-up with context (use context entities; do not broaden)
-Context: {{ "states": ["Maharashtra"] }}
+}"""),
+    ("2", """Example 2 — Follow-up with context (use context entities; do not broaden)
+Context: { "states": ["Maharashtra"] }
 Question: "What is the fraud flag rate there?"
 Expected JSON:
-{{
+{
   "sql": "SELECT ROUND(SUM(fraud_flag) * 100.0 / COUNT(*), 2) AS fraud_flag_rate FROM transactions WHERE sender_state IN ('Maharashtra')",
   "query_intent": "Compute fraud flag rate (%) for Maharashtra",
-  "entities_extracted": {{
+  "entities_extracted": {
     "transaction_types": [],
     "states": ["Maharashtra"],
     "age_groups": [],
-    "time_filters": {{}},
+    "time_filters": {},
     "metric": "fraud_flag_rate"
-  }},
+  },
   "requires_chart": false,
   "suggested_chart_type": "none"
-}}
-
-Example 3 — NULL-aware query (merchant category)
+}"""),
+    ("3", """Example 3 — NULL-aware query (merchant category)
 Question: "What is the average amount per merchant category?"
 Expected JSON:
-{{
+{
   "sql": "SELECT merchant_category, ROUND(AVG(amount_inr), 2) AS avg_amount_inr FROM transactions WHERE merchant_category IS NOT NULL GROUP BY merchant_category ORDER BY avg_amount_inr DESC LIMIT 20",
   "query_intent": "Compute average transaction amount by merchant category (excluding NULL categories)",
-  "entities_extracted": {{
+  "entities_extracted": {
     "transaction_types": [],
     "states": [],
     "age_groups": [],
-    "time_filters": {{}},
+    "time_filters": {},
     "metric": "avg_amount_inr"
-  }},
+  },
   "requires_chart": true,
   "suggested_chart_type": "bar"
-}}
-
-Example A — General comparison query (NO transaction_type filter when question is general):
+}"""),
+    ("A", """Example A — General comparison query (NO transaction_type filter when question is general):
 Question: "Compare failure rates between Android and iOS users"
 Expected JSON:
-{{
+{
   "sql": "SELECT device_type, ROUND(SUM(CASE WHEN transaction_status = 'FAILED' THEN 1.0 ELSE 0 END) * 100.0 / COUNT(*), 2) AS failure_rate FROM transactions WHERE device_type IN ('Android', 'iOS') GROUP BY device_type ORDER BY failure_rate DESC",
   "query_intent": "Compare failure rate between Android and iOS — no transaction_type filter since question is general",
-  "entities_extracted": {{"transaction_types": [], "states": [], "age_groups": [], "time_filters": {{}}, "metric": "failure_rate"}},
+  "entities_extracted": {"transaction_types": [], "states": [], "age_groups": [], "time_filters": {}, "metric": "failure_rate"},
   "requires_chart": true,
   "suggested_chart_type": "bar"
-}}
-
-Example B — General bank query (NO transaction_type filter):
+}"""),
+    ("B", """Example B — General bank query (NO transaction_type filter):
 Question: "Which bank has the highest failure rate?"
 Expected JSON:
-{{
+{
   "sql": "SELECT sender_bank, ROUND(SUM(CASE WHEN transaction_status = 'FAILED' THEN 1.0 ELSE 0 END) * 100.0 / COUNT(*), 2) AS failure_rate FROM transactions GROUP BY sender_bank ORDER BY failure_rate DESC LIMIT 20",
   "query_intent": "Rank all banks by failure rate — no filter applied since question is about all banks",
-  "entities_extracted": {{"transaction_types": [], "states": [], "age_groups": [], "time_filters": {{}}, "metric": "failure_rate"}},
+  "entities_extracted": {"transaction_types": [], "states": [], "age_groups": [], "time_filters": {}, "metric": "failure_rate"},
   "requires_chart": true,
   "suggested_chart_type": "bar"
-}}
-
-Example C — All transaction types volume (no filter — show all 4 types):
+}"""),
+    ("C", """Example C — All transaction types volume (no filter — show all 4 types):
 Question: "What is the total transaction volume for each transaction type?"
 Expected JSON:
-{{
+{
   "sql": "SELECT transaction_type, COUNT(*) AS transaction_count, ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER(), 1) AS pct_of_total FROM transactions GROUP BY transaction_type ORDER BY transaction_count DESC",
   "query_intent": "Transaction volume and percentage share by type — all types, no filter",
-  "entities_extracted": {{"transaction_types": [], "states": [], "age_groups": [], "time_filters": {{}}, "metric": "volume"}},
+  "entities_extracted": {"transaction_types": [], "states": [], "age_groups": [], "time_filters": {}, "metric": "volume"},
   "requires_chart": true,
   "suggested_chart_type": "bar"
-}}
-
-Example D — State fraud rate with national average in single query:
+}"""),
+    ("D", """Example D — State fraud rate with national average in single query:
 Question: "Which state has the highest fraud flag rate and how does it compare to the national average?"
 Expected JSON:
-{{
+{
   "sql": "SELECT sender_state, ROUND(SUM(fraud_flag) * 100.0 / COUNT(*), 4) AS fraud_flag_rate, ROUND((SELECT SUM(fraud_flag) * 100.0 / COUNT(*) FROM transactions), 4) AS national_avg FROM transactions GROUP BY sender_state ORDER BY fraud_flag_rate DESC LIMIT 15",
   "query_intent": "State fraud flag rates ranked with national average for comparison",
-  "entities_extracted": {{"transaction_types": [], "states": [], "age_groups": [], "time_filters": {{}}, "metric": "fraud_flag_rate"}},
+  "entities_extracted": {"transaction_types": [], "states": [], "age_groups": [], "time_filters": {}, "metric": "fraud_flag_rate"},
   "requires_chart": true,
   "suggested_chart_type": "bar"
-}}
-
-Example E — Multi-turn follow-up: what percentage does that represent (after a bank question):
-Context: {{"states": [], "transaction_types": [], "metric": "failed_transactions", "last_category": "SBI"}}
+}"""),
+    ("E", """Example E — Multi-turn follow-up: what percentage does that represent (after a bank question):
+Context: {"states": [], "transaction_types": [], "metric": "failed_transactions", "last_category": "SBI"}
 Question: "What percentage of their total transactions does that represent?"
 Expected JSON:
-{{
+{
   "sql": "SELECT ROUND(SUM(CASE WHEN transaction_status = 'FAILED' THEN 1.0 ELSE 0 END) * 100.0 / COUNT(*), 2) AS failure_rate FROM transactions WHERE sender_bank = 'SBI'",
   "query_intent": "SBI failure rate as percentage of their total — resolved from context",
-  "entities_extracted": {{"transaction_types": [], "states": [], "age_groups": [], "time_filters": {{}}, "metric": "failure_rate"}},
+  "entities_extracted": {"transaction_types": [], "states": [], "age_groups": [], "time_filters": {}, "metric": "failure_rate"},
   "requires_chart": false,
   "suggested_chart_type": "none"
-}}
-
-Example F — High value transaction fraud rate (filtered subset — denominator is subset not full table):
+}"""),
+    ("F", """Example F — High value transaction fraud rate (filtered subset — denominator is subset not full table):
 Question: "What percentage of high value transactions above 10000 rupees are flagged for review?"
 Expected JSON:
-{{
+{
   "sql": "SELECT ROUND(SUM(fraud_flag) * 100.0 / COUNT(*), 4) AS fraud_flag_rate, COUNT(*) AS total_high_value FROM transactions WHERE amount_inr > 10000",
   "query_intent": "Fraud flag rate for high-value transactions only — denominator is filtered subset",
-  "entities_extracted": {{"transaction_types": [], "states": [], "age_groups": [], "time_filters": {{"amount_min": 10000}}, "metric": "fraud_flag_rate"}},
+  "entities_extracted": {"transaction_types": [], "states": [], "age_groups": [], "time_filters": {"amount_min": 10000}, "metric": "fraud_flag_rate"},
   "requires_chart": false,
   "suggested_chart_type": "none"
-}}
-
-Example G — Peak hours time series for a specific metric:
+}"""),
+    ("G", """Example G — Peak hours time series for a specific metric:
 Question: "What are the peak hours for fraud flagged transactions?"
 Expected JSON:
-{{
+{
   "sql": "SELECT hour_of_day, COUNT(*) AS flagged_count FROM transactions WHERE fraud_flag = 1 GROUP BY hour_of_day ORDER BY hour_of_day ASC",
   "query_intent": "Count of fraud-flagged transactions by hour — ordered chronologically for time series",
-  "entities_extracted": {{"transaction_types": [], "states": [], "age_groups": [], "time_filters": {{}}, "metric": "fraud_flag_count"}},
+  "entities_extracted": {"transaction_types": [], "states": [], "age_groups": [], "time_filters": {}, "metric": "fraud_flag_count"},
   "requires_chart": true,
   "suggested_chart_type": "line"
-}}
-Critical notes for Example G: ORDER BY hour_of_day ASC not flagged_count DESC — time series charts must be chronological. The chart type is line not bar for time-based data.
-
-Example H — Never decompose a simple comparison into multiple queries:
+}
+Critical notes for Example G: ORDER BY hour_of_day ASC not flagged_count DESC — time series charts must be chronological. The chart type is line not bar for time-based data."""),
+    ("H", """Example H — Never decompose a simple comparison into multiple queries:
 Question: "Compare failure rates between SBI and HDFC"
 Expected JSON:
-{{
+{
   "sql": "SELECT sender_bank, COUNT(*) AS total_transactions, SUM(CASE WHEN transaction_status = 'FAILED' THEN 1 ELSE 0 END) AS failed_transactions, ROUND(SUM(CASE WHEN transaction_status = 'FAILED' THEN 1.0 ELSE 0 END) * 100.0 / COUNT(*), 2) AS failure_rate FROM transactions WHERE sender_bank IN ('SBI', 'HDFC') GROUP BY sender_bank ORDER BY failure_rate DESC",
   "query_intent": "Compare SBI vs HDFC failure rate — single GROUP BY query, never decompose into separate counts",
-  "entities_extracted": {{"transaction_types": [], "states": [], "age_groups": [], "time_filters": {{}}, "metric": "failure_rate"}},
+  "entities_extracted": {"transaction_types": [], "states": [], "age_groups": [], "time_filters": {}, "metric": "failure_rate"},
   "requires_chart": true,
   "suggested_chart_type": "bar"
-}}
-CRITICAL: NEVER run separate COUNT queries to compare two entities. ALWAYS use a single SELECT with GROUP BY and WHERE column IN ('A', 'B'). Separate queries produce wrong percentages because they use different denominators.
-
-Example I — Simple location/show query (must never fail JSON parsing):
+}
+CRITICAL: NEVER run separate COUNT queries to compare two entities. ALWAYS use a single SELECT with GROUP BY and WHERE column IN ('A', 'B'). Separate queries produce wrong percentages because they use different denominators."""),
+    ("I", """Example I — Simple location/show query (must never fail JSON parsing):
 Question: "Show me transactions from Maharashtra"
 Expected JSON:
-{{
+{
   "sql": "SELECT COUNT(*) AS total_transactions, ROUND(AVG(amount_inr), 2) AS avg_amount, ROUND(SUM(CASE WHEN transaction_status = 'FAILED' THEN 1.0 ELSE 0 END) * 100.0 / COUNT(*), 2) AS failure_rate FROM transactions WHERE sender_state = 'Maharashtra'",
   "query_intent": "Summary statistics for Maharashtra — count, average amount, failure rate in single query",
-  "entities_extracted": {{"transaction_types": [], "states": ["Maharashtra"], "age_groups": [], "time_filters": {{}}, "metric": "volume"}},
+  "entities_extracted": {"transaction_types": [], "states": ["Maharashtra"], "age_groups": [], "time_filters": {}, "metric": "volume"},
   "requires_chart": false,
   "suggested_chart_type": "none"
-}}
-Apply this same pattern for ANY "show me [entity]" or "list [entity]" or "give me [entity]" query — always respond with a single summary SELECT with COUNT, AVG amount, and failure rate. Never decompose. Never return null SQL.
-
-Example J — Bank comparison with correct failure RATE (not raw count):
+}
+Apply this same pattern for ANY "show me [entity]" or "list [entity]" or "give me [entity]" query — always respond with a single summary SELECT with COUNT, AVG amount, and failure rate. Never decompose. Never return null SQL."""),
+    ("J", """Example J — Bank comparison with correct failure RATE (not raw count):
 Question: "Which bank has the most failed transactions? What percentage is that? Compare with HDFC"
 Expected JSON:
-{{
+{
   "sql": "SELECT sender_bank, COUNT(*) AS total_transactions, SUM(CASE WHEN transaction_status = 'FAILED' THEN 1 ELSE 0 END) AS failed_transactions, ROUND(SUM(CASE WHEN transaction_status = 'FAILED' THEN 1.0 ELSE 0 END) * 100.0 / COUNT(*), 2) AS failure_rate_pct FROM transactions WHERE sender_bank IN ('SBI', 'HDFC') GROUP BY sender_bank ORDER BY failed_transactions DESC",
   "query_intent": "Compare SBI and HDFC — failed count AND failure rate percentage in single GROUP BY query",
-  "entities_extracted": {{"transaction_types": [], "states": [], "age_groups": [], "time_filters": {{}}, "metric": "failure_rate"}},
+  "entities_extracted": {"transaction_types": [], "states": [], "age_groups": [], "time_filters": {}, "metric": "failure_rate"},
   "requires_chart": true,
   "suggested_chart_type": "bar"
-}}
-CRITICAL DENOMINATOR RULE: When computing a failure rate or fraud rate for a specific bank, state, or entity — the denominator MUST be COUNT(*) of that entity's own rows only, computed inside a GROUP BY or WHERE clause. NEVER divide by the total table row count. NEVER run separate COUNT queries for numerator and denominator. Always use a single SELECT with GROUP BY and compute both count and rate in the same query.
+}
+CRITICAL DENOMINATOR RULE: When computing a failure rate or fraud rate for a specific bank, state, or entity — the denominator MUST be COUNT(*) of that entity's own rows only, computed inside a GROUP BY or WHERE clause. NEVER divide by the total table row count. NEVER run separate COUNT queries for numerator and denominator. Always use a single SELECT with GROUP BY and compute both count and rate in the same query."""),
+]
 
-RESPONSE FORMAT — Critical:
+SQL_RESPONSE_FORMAT = """RESPONSE FORMAT — Critical:
 Respond with ONLY a valid JSON object. No explanation, no markdown, no code blocks.
 Format:
-{{
+{
   "sql": "SELECT ... FROM transactions ...",
   "query_intent": "one sentence describing what this query computes",
-  "entities_extracted": {{
+  "entities_extracted": {
     "transaction_types": [],
     "states": [],
     "age_groups": [],
-    "time_filters": {{}},
+    "time_filters": {},
     "metric": ""
-  }},
+  },
   "requires_chart": true/false,
   "suggested_chart_type": "bar|line|pie|none"
-}}
+}
 IMPORTANT: In entities_extracted, always populate the relevant lists with the actual values you used in your SQL WHERE clauses. If you filtered by sender_state IN ('Maharashtra'), then states must be ['Maharashtra']. This is mandatory."""
 
-        messages = [{"role": "system", "content": system_content}]
-
-        # DOWNSTREAM HANDLER REQUIRED:
-        # If sql_response["sql"] is None and query_intent == "invalid_combination",
-        # query_pipeline.py must short-circuit and return a user-friendly message
-        # like: "P2P transactions don't have merchant categories in our schema.
-        # Try asking about P2P volume, amounts, or age groups instead."
-        # See query_pipeline.py process() method — add null-SQL check after JSON parse.
-
-        # Inject conversation history
-        # Filter to keep only last 4 turns and ensure format
-        recent_history = conversation_history[-4:] if conversation_history else []
-        messages.extend(recent_history)
-
-        user_content = ""
-        if entity_context:
-            # Format context nicely
-            context_str = json.dumps(entity_context, indent=2)
-            user_content += f"""CONVERSATION CONTEXT (use this to resolve pronouns and references):
-{context_str}
-
-STRICT CONTEXT RULES — follow these without exception:
+CONTEXT_RULES = """STRICT CONTEXT RULES — follow these without exception:
 1. If the question contains ANY of these words: "those", "them", "that", "these", "same", "there", "similar" — you MUST filter using the exact entities from the context above. Do not broaden the scope.
 2. If context has states: ['Maharashtra'] and user says "those states" — generate SQL with WHERE sender_state IN ('Maharashtra'). Not all states.
 3. If context has transaction_types: ['Recharge'] and user says "those transactions" — generate SQL with WHERE transaction_type = 'Recharge'. Not all types.
@@ -278,17 +264,272 @@ STRICT CONTEXT RULES — follow these without exception:
    Do not overwrite the context entity; ADD the new entity to it.
 """
 
-        user_content += "RECENT CONVERSATION:\n"
-        for msg in recent_history:
-            user_content += f"{msg['role'].upper()}: {msg['content']}\n"
-        
-        user_content += f"\nQuestion: {user_query}\n"
-        user_content += "Generate the SQL query to answer this. Apply the STRICT CONTEXT RULES above before writing any SQL."
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_SQL_RE = re.compile(r'"sql": "(.*)",')
+_SCHEMA_COLUMN_RE = re.compile(r"^- (\w+): ")
+# Parts of column names that nearly every question contains
+_GENERIC_COLUMN_WORDS = {"transaction", "sender"}
 
-        messages.append({"role": "user", "content": user_content})
-        
+
+def count_tokens(text: str) -> int:
+    """Approximate token count (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def _terms(text: str) -> set:
+    """Lowercased words of text without stopwords, snake_case split and plurals folded."""
+    terms = set()
+    for word in _WORD_RE.findall(text.lower().replace("_", " ")):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.add(word)
+    return terms
+
+
+def valid_enum_reference(columns: Optional[List[str]] = None) -> str:
+    lines = ["VALID ENUM VALUES (use these EXACTLY — do not paraphrase):"]
+    for column in ENUM_REFERENCE_COLUMNS:
+        if columns is not None and column not in columns:
+            continue
+        values = db.get_column_values(column) if db else None
+        if values:
+            lines.append(f"- {column}: " + ", ".join(f"'{v}'" if isinstance(v, str) else str(v) for v in values))
+    return "\n".join(lines) if len(lines) > 1 else ""
+
+
+def _example_terms() -> List[Tuple[str, str, set]]:
+    return [(label, text, _terms(text)) for label, text in FEW_SHOT_EXAMPLES]
+
+
+_EXAMPLES = _example_terms()
+# Inverse document frequency over the examples: words every example shares carry little
+_EXAMPLE_IDF = {
+    term: math.log(1 + len(_EXAMPLES) / sum(1 for _, _, terms in _EXAMPLES if term in terms))
+    for _, _, example_terms in _EXAMPLES for term in example_terms
+}
+
+
+class PromptBuilder:
+    def __init__(self, token_budget: int = PROMPT_TOKEN_BUDGET, max_examples: int = PROMPT_MAX_EXAMPLES):
+        self.token_budget = token_budget
+        self.max_examples = max_examples
+        self._stats_lock = threading.Lock()
+        self._prompts = 0
+        self._section_tokens: Dict[str, int] = {}
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    @property
+    def schema(self) -> str:
+        # Rebuilt from the in-memory catalog, so it follows appends without querying the table
+        return db.get_schema_description() if db else "Schema not available"
+
+    def build_sql_generation_prompt(self, user_query: str, conversation_history: List[Dict], entity_context: Dict) -> List[Dict]:
+        """
+        Constructs the prompt for GPT-4 to generate DuckDB SQL from natural language.
+        """
+        messages, _ = self.assemble_sql_generation_prompt(user_query, conversation_history, entity_context)
         return messages
 
+    def assemble_sql_generation_prompt(self, user_query: str, conversation_history: List[Dict],
+                                       entity_context: Dict) -> Tuple[List[Dict], Dict[str, Any]]:
+        """
+        SQL-generation messages within the token budget, plus a report of the
+        tokens each section takes. Rules, response format, history and the
+        question always go in; schema columns and few-shot examples are ranked
+        by word overlap with the question (and context) — relevant columns keep
+        their values, the others are listed by name and type — and examples are
+        added best first while they fit.
+        """
+        budget = self.token_budget
+        query_text = " ".join([user_query] + [str(v) for v in (entity_context or {}).values()])
+        query_terms = _terms(query_text)
+        if entity_context:
+            # Follow-up questions are shown how to apply context
+            query_terms |= {"context", "follow"}
+
+        history = self._dedupe_history(conversation_history)
+
+        context_block = ""
+        if entity_context:
+            # Format context nicely
+            context_str = json.dumps(entity_context, indent=2)
+            context_block = f"""CONVERSATION CONTEXT (use this to resolve pronouns and references):
+{context_str}
+
+{CONTEXT_RULES}"""
+        question_block = f"\nQuestion: {user_query}\n"
+        question_block += "Generate the SQL query to answer this. Apply the STRICT CONTEXT RULES above before writing any SQL."
+        user_content = context_block + question_block
+
+        sections = {
+            "instructions": count_tokens(SQL_INSTRUCTIONS) + count_tokens(SQL_RULES) + count_tokens(SQL_RESPONSE_FORMAT),
+            "history": sum(count_tokens(m["content"]) for m in history),
+            "context": count_tokens(context_block),
+            "question": count_tokens(question_block),
+        }
+
+        schema = self.schema
+        examples = self._rank_examples(query_terms) if budget > 0 else list(FEW_SHOT_EXAMPLES)
+        columns = self._relevant_columns(self._schema_columns(schema), query_terms, query_text) if budget > 0 else None
+        schema = self._schema_slice(schema, columns)
+        enum_reference = valid_enum_reference(columns)
+        enum_block = ""
+        if enum_reference and "VALID ENUM VALUES" not in (schema or ""):
+            enum_block = enum_reference
+        sections["schema"] = count_tokens(schema) + count_tokens(enum_block)
+
+        chosen = []
+        remaining = budget - sum(sections.values())
+        for label, text in examples:
+            if budget > 0:
+                if len(chosen) >= self.max_examples:
+                    break
+                # The best example always goes in, even over budget
+                if chosen and count_tokens(text) > remaining:
+                    continue
+                remaining -= count_tokens(text)
+            chosen.append((label, text))
+        sections["examples"] = sum(count_tokens(text) for _, text in chosen)
+
+        system_parts = [SQL_INSTRUCTIONS, schema]
+        if enum_block:
+            system_parts.append(enum_block)
+        system_parts.append(SQL_RULES)
+        system_parts.append("FEW-SHOT EXAMPLES (follow this style exactly):\n" + "\n\n".join(text for _, text in chosen))
+        system_parts.append(SQL_RESPONSE_FORMAT)
+        system_content = "\n\n".join(system_parts)
+
+        messages = [{"role": "system", "content": system_content}]
+
+        # DOWNSTREAM HANDLER REQUIRED:
+        # If sql_response["sql"] is None and query_intent == "invalid_combination",
+        # query_pipeline.py must short-circuit and return a user-friendly message
+        # like: "P2P transactions don't have merchant categories in our schema.
+        # Try asking about P2P volume, amounts, or age groups instead."
+        # See query_pipeline.py process() method — add null-SQL check after JSON parse.
+
+        # History goes in once, as chat messages
+        messages.extend(history)
+        messages.append({"role": "user", "content": user_content})
+
+        report = {
+            "sections": sections,
+            "total": sum(count_tokens(m["content"]) for m in messages),
+            "budget": budget,
+            "examples": [label for label, _ in chosen],
+            "detailed_columns": columns,
+        }
+        self._record(report)
+        return messages, report
+
+    def _dedupe_history(self, conversation_history: List[Dict]) -> List[Dict]:
+        """Last 4 messages; a question asked again (with its answer) appears once, at its
+        latest position, and long messages are cut to PROMPT_HISTORY_MESSAGE_TOKENS."""
+        recent_history = conversation_history[-4:] if conversation_history else []
+        pairs: List[List[Dict]] = []
+        for message in recent_history:
+            if message.get("role") == "user" or not pairs:
+                pairs.append([message])
+            else:
+                pairs[-1].append(message)
+        seen = set()
+        kept: List[List[Dict]] = []
+        for pair in reversed(pairs):
+            key = " ".join(str(pair[0].get("content", "")).lower().split())
+            if key in seen:
+                continue
+            seen.add(key)
+            kept.append(pair)
+        max_chars = PROMPT_HISTORY_MESSAGE_TOKENS * 4
+        history = []
+        for pair in reversed(kept):
+            for message in pair:
+                content = str(message.get("content") or "")
+                if not content:
+                    continue
+                if max_chars > 0 and len(content) > max_chars:
+                    content = content[:max_chars].rstrip() + " …"
+                history.append({"role": message["role"], "content": content})
+        return history
+
+    def _rank_examples(self, query_terms: set) -> List[Tuple[str, str]]:
+        """Few-shot examples by IDF-weighted word overlap with the question, best first;
+        an example with the same SQL as a better one is dropped."""
+        scored = []
+        for position, (label, text, terms) in enumerate(_EXAMPLES):
+            score = sum(_EXAMPLE_IDF[t] for t in query_terms & terms)
+            scored.append((-score, position, label, text))
+        ranked, seen_sql = [], set()
+        for _, _, label, text in sorted(scored):
+            match = _SQL_RE.search(text)
+            sql = match.group(1) if match else label
+            if sql in seen_sql:
+                continue
+            seen_sql.add(sql)
+            ranked.append((label, text))
+        return ranked
+
+    def _schema_columns(self, schema: str) -> List[str]:
+        return [m.group(1) for m in map(_SCHEMA_COLUMN_RE.match, (schema or "").split("\n")) if m]
+
+    def _relevant_columns(self, columns: List[str], query_terms: set, query_text: str) -> List[str]:
+        """Columns the question names — by column name, keyword or one of its values.
+        receiver_* columns only when the question is about receivers."""
+        lowered = f" {' '.join(_WORD_RE.findall(query_text.lower()))} "
+        relevant = []
+        for column in columns:
+            if column.startswith("receiver_") and not query_terms & {"receiver", "recipient"}:
+                continue
+            words = (_terms(column) - _GENERIC_COLUMN_WORDS) | _terms(COLUMN_KEYWORDS.get(column, ""))
+            hit = bool(words & query_terms)
+            if not hit:
+                for value in db.get_column_values(column) or []:
+                    phrase = " ".join(_WORD_RE.findall(str(value).lower()))
+                    if phrase and f" {phrase} " in lowered:
+                        hit = True
+                        break
+            if hit:
+                relevant.append(column)
+        return relevant
+
+    def _schema_slice(self, schema: str, columns: Optional[List[str]]) -> str:
+        """The schema description with value lists and ranges kept only for columns
+        (every column keeps its name, type and NULL note)."""
+        if columns is None:
+            return schema
+        lines = []
+        for line in (schema or "").split("\n"):
+            match = _SCHEMA_COLUMN_RE.match(line)
+            if match and match.group(1) not in columns:
+                line = line.split(" — ")[0]
+            lines.append(line)
+        return "\n".join(lines)
+
+    def _record(self, report: Dict[str, Any]) -> None:
+        logger.info(f"SQL prompt: {report['total']} tokens "
+                    f"({', '.join(f'{k} {v}' for k, v in report['sections'].items())}; "
+                    f"examples {', '.join(report['examples'])})")
+        with self._stats_lock:
+            self._prompts += 1
+            for section, tokens in report["sections"].items():
+                self._section_tokens[section] = self._section_tokens.get(section, 0) + tokens
+            self._section_tokens["total"] = self._section_tokens.get("total", 0) + report["total"]
+            self.last_report = report
+
+    def prompt_stats(self) -> Dict[str, Any]:
+        """Average approximate tokens per SQL-prompt section and the latest prompt's report."""
+        with self._stats_lock:
+            return {
+                "token_budget": self.token_budget,
+                "max_examples": self.max_examples,
+                "prompts": self._prompts,
+                "avg_tokens": {k: round(v / self._prompts, 1) for k, v in self._section_tokens.items()}
+                if self._prompts else {},
+                "last": self.last_report,
+            }
+
     def build_narration_prompt(self, user_query: str, sql_used: str, query_result: Dict, query_intent: str, entity_context: Dict, data_profile: Dict = None, statistical_enrichment: Dict = None) -> List[Dict]:
         """
         Constructs the prompt for GPT-4 to explain the data insights.
@@ -345,8 +586,8 @@ significant outlier, warrants investigation, or concerning in relation to that d
 If the verdict says "VERIFIED STATISTICAL ANOMALY", you must use the z-score value
 provided and label it explicitly as statistically significant."""
 
-        # Format data table for prompt
-        data_rows = query_result.get('data', [])
+        # Format data table for prompt (rows are built here, at the JSON boundary)
+        data_rows = to_records(query_result.get('data', []))
         formatted_data = json.dumps(data_rows, indent=2)
 
         # Assemble user_content in order: question → stats → benchmarks → data
@@ -396,7 +637,27 @@ What was computed: {query_intent}
         user_content += f"""Data returned:
 {formatted_data}
 Total rows: {query_result.get('row_count', 0)}
+"""
+
+        # Sampled estimates — the narrator must not present them as exact figures
+        if query_result.get('approximate'):
+            estimates = query_result.get('estimates', {})
+            user_content += f"""
+--- APPROXIMATE ANSWER ---
+These figures are ESTIMATES from a {estimates.get('method', 'uniform sample')} ({estimates.get('sample_rows', 'N/A')} of {estimates.get('population_rows', 'N/A')} transactions).
+Phrase every number as approximate ("about", "roughly", "an estimated") — never as an exact count.
+State the 95% confidence range for the headline figure using the intervals below (one object per data row).
+Confidence intervals: {json.dumps(estimates.get('intervals', []))}
+"""
+            ranking = estimates.get('ranking')
+            if ranking and ranking.get('uncertain'):
+                user_content += f"""The order of the rows by {ranking['column']} is NOT certain: the intervals of rows {json.dumps(ranking['overlapping_rows'])} (0-based) overlap.
+Do not state which of those rows is highest or lowest as fact — say they are too close to rank from the sample.
+"""
+            user_content += """--- END APPROXIMATE ANSWER ---
+"""
 
+        user_content += """
 Provide a clear business insight answer. Include specific numbers from the data.
 Suggest what this means for business decisions where relevant."""
 
@@ -0,0 +1,80 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, List, Optional
+
+try:
+    from backend.core.process_executor import QueryCancelled
+except ImportError:
+    from core.process_executor import QueryCancelled
+
+
+class QueryContext:
+    """
+    Cancellation handle for one request. Whoever owns the request (the chat
+    router, on client disconnect) calls cancel(); code running a query
+    registers how to stop it with on_cancel() — interrupting a DuckDB cursor,
+    killing a worker process — for as long as the query runs. question labels
+    the request's queries in the slow-query log.
+    """
+
+    def __init__(self, question: Optional[str] = None):
+        self.question = question
+        self._cancelled = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self.reason: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        with self._lock:
+            if self._cancelled.is_set():
+                return
+            self.reason = reason
+            self._cancelled.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            callback()
+
+    def check(self) -> None:
+        """Raise QueryCancelled if the request has been cancelled."""
+        if self._cancelled.is_set():
+            raise QueryCancelled(f"Query cancelled: {self.reason}")
+
+    @contextmanager
+    def on_cancel(self, callback: Callable[[], None]) -> Iterator[None]:
+        """Call callback if the request is cancelled while the block runs
+        (immediately, if it already has been)."""
+        with self._lock:
+            already = self._cancelled.is_set()
+            if not already:
+                self._callbacks.append(callback)
+        if already:
+            callback()
+        try:
+            yield
+        finally:
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+
+
+_current: ContextVar[Optional[QueryContext]] = ContextVar("query_context", default=None)
+
+
+def current_query() -> Optional[QueryContext]:
+    return _current.get()
+
+
+@contextmanager
+def query_scope(context: Optional[QueryContext] = None) -> Iterator[QueryContext]:
+    """Make context (or a new one) the current query context for the block."""
+    context = context or QueryContext()
+    token = _current.set(context)
+    try:
+        yield context
+    finally:
+        _current.reset(token)
@@ -1,37 +1,63 @@
 import os
 import json
+import asyncio
 import logging
 import datetime
 import re
-from dotenv import load_dotenv
-from openai import OpenAI
+import uuid
+import threading
+import time
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 try:
     from backend.core.database import db
     from backend.core.prompt_builder import prompt_builder
     from backend.core.session_manager import session_manager
     from backend.core.sql_validator import validator
     from backend.core.stats_engine import stats_engine
+    from backend.core.result_set import ResultSet, to_records
+    from backend.core.process_executor import QueryTimeout, QueryCancelled
+    from backend.core.query_context import current_query
+    from backend.core.sql_cache import sql_cache
+    from backend.core.narration_cache import narration_cache
+    from backend.core.intent_compiler import intent_compiler
+    from backend.core.shared_scan import ScanBatch, scan_scope, current_scan_member, SHARED_SCAN_ENABLED
+    from backend.core.llm_gateway import llm_gateway
 except ImportError:
     from core.database import db
     from core.prompt_builder import prompt_builder
     from core.session_manager import session_manager
     from core.sql_validator import validator
     from core.stats_engine import stats_engine
+    from core.result_set import ResultSet, to_records
+    from core.process_executor import QueryTimeout, QueryCancelled
+    from core.query_context import current_query
+    from core.sql_cache import sql_cache
+    from core.narration_cache import narration_cache
+    from core.intent_compiler import intent_compiler
+    from core.shared_scan import ScanBatch, scan_scope, current_scan_member, SHARED_SCAN_ENABLED
+    from core.llm_gateway import llm_gateway
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class QueryPipeline:
+    # Words by which a decomposed sub-question refers to an earlier one's answer
+    REFERENCE_WORDS = {"it", "its", "that", "those", "this", "these", "them", "they", "their", "there", "same"}
+
     def __init__(self):
-        load_dotenv()
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         self.primary_model = os.getenv("MODEL_PRIMARY", "gpt-4")
         self.fallback_model = os.getenv("MODEL_FALLBACK", "gpt-3.5-turbo")
         self.max_retries = 1
-        self.openai_timeout_s = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "15"))
-        
-    def process(self, user_question: str, session_id: str) -> dict:
+        # Background exact runs behind approximate answers, oldest evicted first
+        self.refine_approximate = os.getenv("APPROX_BACKGROUND_REFINE", "true").lower() in ("1", "true", "yes")
+        self.max_refinements = int(os.getenv("APPROX_MAX_REFINEMENTS", "256"))
+        self._refinements = OrderedDict()
+        self._refinements_lock = threading.Lock()
+
+    def process(self, user_question: str, session_id: str, approximate: bool = False, bypass_cache: bool = False) -> dict:
         start_time = datetime.datetime.now()
         
         # Step 1 — Ambiguity Check
@@ -40,10 +66,8 @@ class QueryPipeline:
         turn_count = session_ctx.get("turn_count", 0)
 
         # Non-data queries (greetings / definitions / meta) must not enter SQL generation.
-        non_data = self._handle_non_data_query(user_question)
+        non_data = self._non_data_response(user_question, start_time)
         if non_data is not None:
-            execution_time = (datetime.datetime.now() - start_time).total_seconds() * 1000
-            non_data["execution_time_ms"] = execution_time
             return non_data
         
         # Check for compound questions (Multi-Step Decomp)
@@ -62,219 +86,524 @@ class QueryPipeline:
             sub_questions = self._decompose_question(user_question)
             if len(sub_questions) > 1:
                 try:
-                    return self._process_compound(sub_questions, session_id, user_question)
+                    return self._process_compound(sub_questions, session_id, user_question, bypass_cache)
                 except Exception as compound_err:
                     logger.error(f"Compound processing failed, falling through to simple query: {compound_err}", exc_info=True)
 
-        # Just use list [] for ambiguity check history
-        history_for_check = session_ctx.get("recent_turns", [])
-        
-        if prompt_builder.detect_ambiguity(user_question, history_for_check) and turn_count == 0:
-            return {
-                "answer": "Could you clarify your question? For example, are you asking about transaction types, states, or a specific time period?", 
-                "sql_used": None, 
-                "chart": None, 
-                "proactive_insight": None, 
-                "is_clarification": True,
-                "query_intent": "Clarification requested",
-                "execution_time_ms": 0
-            }
+        clarification = self._clarification_response(user_question, session_ctx)
+        if clarification is not None:
+            return clarification
 
         # Step 2 — Get Session Context
         # Already fetched above as session_ctx
         
         try:
-            # Step 3 — GPT-4 Pass 1 (SQL Generation)
-            context_to_inject = session_ctx["entity_tracker"] if self._should_inject_context(
-                user_question, session_ctx["entity_tracker"], session_ctx["turn_count"]
-            ) else {}
-            
-            sql_messages = prompt_builder.build_sql_generation_prompt(
-                user_question, 
-                session_ctx["recent_turns"], 
-                context_to_inject
-            )
-            
-            gpt_response_str = self._call_gpt4(sql_messages, temperature=0, expect_json=True)
-            
-            try:
-                # Clean up potential markdown formatting before parsing
-                clean_json_str = gpt_response_str.replace("```json", "").replace("```", "").strip()
-                # Strip BOM characters and stray leading/trailing whitespace
-                clean_json_str = clean_json_str.strip('\ufeff').strip()
-                try:
-                    sql_response = json.loads(clean_json_str)
-                except json.JSONDecodeError:
-                    # Fallback: skip any leading non-JSON line (e.g. stray explanation text)
-                    sql_response = json.loads(clean_json_str.split('\n', 1)[-1])
-            except (json.JSONDecodeError, Exception):
-                logger.error(f"Failed to parse JSON from GPT: {gpt_response_str}")
-                return {
-                    "answer": "I understood your question, but I encountered an internal error generating the query structure. Please try again.",
-                    "sql_used": None,
-                    "is_clarification": False,
-                    "error": "JSON Parse Error"
-                }
-
-            sql = sql_response.get("sql", "")
-            query_intent = sql_response.get("query_intent", "Analysis")
-            entities_extracted = sql_response.get("entities_extracted", {})
-            requires_chart = sql_response.get("requires_chart", False)
-            suggested_chart_type = sql_response.get("suggested_chart_type", "none")
+            # Step 3 — GPT-4 Pass 1 (SQL Generation), skipped for locally compiled or previously answered questions
+            context_to_inject = self._injected_context(user_question, session_ctx)
+            sql_response, sql_source = self._known_sql(user_question, context_to_inject, bypass_cache)
+            if sql_response is not None:
+                gpt_response_str = json.dumps(sql_response)
+            else:
+                sql_messages = self._sql_messages(user_question, session_ctx, context_to_inject)
+                gpt_response_str = self._call_gpt4(sql_messages, temperature=0, expect_json=True)
+                sql_response = self._parse_sql_response(gpt_response_str)
+                if sql_response is None:
+                    return self._json_error_response()
 
             # Step 4 — SQL Validation
+            sql = sql_response.get("sql", "")
             validation = validator.validate(sql)
             if not validation["valid"]:
-                return {
-                    "answer": f"I cannot execute that query safely. Reason: {validation['reason']}",
-                    "sql_used": sql,
-                    "is_clarification": False
-                }
-            
+                return self._invalid_sql_response(sql, validation)
             cleaned_sql = validation["cleaned_sql"]
 
             # Step 5 — Execute SQL
-            db_result = db.execute_query(cleaned_sql)
+            db_result = self._execute(cleaned_sql, approximate)
+            self._raise_if_interrupted(db_result)
             
             if not db_result["success"]:
                 # Retry logic
-                logger.warning(f"SQL Execution failed: {db_result['error']}. Attempting retry.")
-                retry_message = f"The SQL query failed with error: {db_result['error']}. Please correct the SQL and return the JSON object again."
-                sql_messages.append({"role": "assistant", "content": gpt_response_str})
-                sql_messages.append({"role": "user", "content": retry_message})
-                
+                if sql_source == "cache":
+                    sql_cache.discard(user_question, context_to_inject)
+                sql_source = "model"
+                sql_messages = self._sql_messages(user_question, session_ctx, context_to_inject)
+                sql_messages += self._retry_messages(gpt_response_str, db_result)
                 gpt_retry_str = self._call_gpt4(sql_messages, temperature=0, expect_json=True)
                 try:
-                    clean_retry_json = gpt_retry_str.replace("```json", "").replace("```", "").strip()
-                    sql_response = json.loads(clean_retry_json)
-                    sql = sql_response.get("sql", "")
-                    
-                    # Re-validate
-                    validation = validator.validate(sql)
+                    sql_response, retry_sql, validation = self._parse_retry_response(gpt_retry_str)
                     if not validation["valid"]:
-                         return {
-                            "answer": f"I couldn't generate a valid query even after retrying. Reason: {validation['reason']}",
-                            "sql_used": sql,
-                            "is_clarification": False
-                        }
+                        return self._retry_invalid_response(retry_sql, validation)
                     cleaned_sql = validation["cleaned_sql"]
                     
                     # Re-execute
-                    db_result = db.execute_query(cleaned_sql)
+                    db_result = db.execute_query(cleaned_sql, columnar=True, approximate=approximate)
                     if not db_result["success"]:
-                         return {
-                            "answer": f"I encountered a database error: {db_result['error']}",
-                            "sql_used": cleaned_sql,
-                            "is_clarification": False
-                        }
+                        return self._db_error_response(cleaned_sql, db_result)
                 except Exception as e:
-                     return {
-                        "answer": "I had trouble fixing the query automatically.",
-                        "sql_used": None,
-                        "is_clarification": False
-                    }
+                    return self._retry_failed_response()
+            if sql_source == "model":
+                sql_cache.put(user_question, context_to_inject, {**sql_response, "sql": cleaned_sql})
 
             # Step 5b — Empty result short-circuit (prevents narrator hallucination)
-            if db_result.get("data") == [] and db_result.get("error") is None:
-                execution_time = (datetime.datetime.now() - start_time).total_seconds() * 1000
-                session_manager.add_turn(session_id, {
-                    "turn_number": turn_count + 1,
-                    "user_question": user_question,
-                    "sql_used": cleaned_sql,
-                    "data_result": db_result,
-                    "answer": "No transactions found matching your query. The filters may be too specific — try broadening your search.",
-                    "proactive_insight": None,
-                    "entities": entities_extracted,
-                    "query_intent": query_intent,
-                    "timestamp": datetime.datetime.now().isoformat()
-                })
-                return {
-                    "answer": "No transactions found matching your query. The filters may be too specific — try broadening your search.",
-                    "sql_used": cleaned_sql,
-                    "chart": None,
-                    "proactive_insight": None,
-                    "query_intent": query_intent,
-                    "execution_time_ms": execution_time,
-                    "is_clarification": False
-                }
+            if db_result.get("row_count") == 0 and db_result.get("error") is None:
+                return self._empty_result_response(user_question, session_id, turn_count, cleaned_sql, db_result, sql_response, start_time)
 
             # Statistical enrichment — pure computation, no API calls
-            statistical_enrichment = {}
-            try:
-                if db_result.get('data') and len(db_result['data']) >= 2:
-                    statistical_enrichment = stats_engine.enrich(
-                        data=db_result['data'],
-                        query_intent=query_intent,
-                        sql=cleaned_sql
-                    )
-            except Exception as e:
-                logger.warning(f"Stats enrichment skipped: {e}")
-
-            # Step 6 — GPT-4 Pass 2 (Narration)
-            narration_messages = prompt_builder.build_narration_prompt(
-                user_query=user_question,
-                sql_used=cleaned_sql,
-                query_result=db_result,
-                query_intent=query_intent,
-                entity_context=session_ctx["entity_tracker"],
-                data_profile=db.get_data_profile(),
-                statistical_enrichment=statistical_enrichment
-            )
-            
-            answer_text = self._call_gpt4(narration_messages, temperature=0.3, expect_json=False)
+            statistical_enrichment = self._enrich(db_result, sql_response, cleaned_sql)
 
-            # Step 7 — Proactive Insight
-            proactive_insight = self._generate_proactive_insight(db_result.get("data", []), entities_extracted, user_question)
+            # Step 6 — GPT-4 Pass 2 (Narration), reused when the same question returned the same rows
+            narration_key = self._narration_key(user_question, cleaned_sql, db_result, statistical_enrichment)
+            answer_text = narration_cache.get(narration_key) if narration_key and not bypass_cache else None
+            if answer_text is None:
+                narration_messages = self._narration_messages(user_question, cleaned_sql, db_result, sql_response, session_ctx, statistical_enrichment)
+                answer_text = self._call_gpt4(narration_messages, temperature=0.3, expect_json=False)
+                if narration_key:
+                    narration_cache.put(narration_key, answer_text)
 
-            # Step 8 — Chart Data
-            chart_data = None
-            if requires_chart:
-                chart_data = self._prepare_chart_data(db_result.get("data", []), suggested_chart_type)
+            # Steps 7-8 — Proactive Insight and Chart Data
+            proactive_insight = self._proactive_insight(db_result, sql_response, user_question)
+            chart_data = self._chart(db_result, sql_response)
 
-            # Step 9 — Save Turn
-            execution_time = (datetime.datetime.now() - start_time).total_seconds() * 1000
-            
-            turn_data = {
-                "turn_number": turn_count + 1,
-                "user_question": user_question,
-                "sql_used": cleaned_sql,
-                "data_result": db_result, # Store full result in memory? Prompt says "raw query result"
-                "answer": answer_text,
-                "proactive_insight": proactive_insight,
-                "entities": entities_extracted,
-                "query_intent": query_intent,
-                "timestamp": datetime.datetime.now().isoformat()
-            }
-            session_manager.add_turn(session_id, turn_data)
+            # Steps 8b-10 — Background refinement, save turn, return
+            return self._finish(user_question, session_id, turn_count, cleaned_sql, db_result, sql_response,
+                                answer_text, proactive_insight, chart_data, start_time)
 
-            # Step 10 — Return
-            return {
-                "answer": answer_text,
-                "sql_used": cleaned_sql,
+        except Exception as e:
+            return self._error_response(e)
+
+    async def aprocess(self, user_question: str, session_id: str, approximate: bool = False,
+                       bypass_cache: bool = False) -> dict:
+        """
+        Async twin of process(): same stages and responses, but model calls go
+        through the async OpenAI client, DuckDB work runs on the database's query
+        threads, and the proactive insight is prepared while the narration call
+        is in flight. The event loop is never blocked on I/O.
+        """
+        async for event, data in self.astream(user_question, session_id, approximate, stream_narration=False,
+                                              bypass_cache=bypass_cache):
+            if event == "final":
+                return data
+
+    async def astream(self, user_question: str, session_id: str, approximate: bool = False,
+                      stream_narration: bool = True, bypass_cache: bool = False):
+        """
+        The async pipeline as (event, data) pairs, for progressive display:
+        "sql" once the query is generated and validated (again if a failed query
+        had to be corrected), "result" once it has run
+        (row count, chart), "token" per narration fragment as the model writes it,
+        and always a last "final" carrying the full response. Clarifications,
+        non-data answers, compound questions and errors produce "final" only.
+        A cached narration arrives as a single "token". bypass_cache skips the
+        question→SQL and narration lookups (fresh results are still cached).
+        """
+        start_time = datetime.datetime.now()
+        session_ctx = session_manager.get_context_for_prompt(session_id)
+        turn_count = session_ctx.get("turn_count", 0)
+
+        non_data = self._non_data_response(user_question, start_time)
+        if non_data is not None:
+            yield "final", non_data
+            return
+
+        if self._is_compound_question(user_question) and not turn_count == 0:
+            sub_questions = await self._adecompose_question(user_question)
+            if len(sub_questions) > 1:
+                try:
+                    compound = await self._aprocess_compound(sub_questions, session_id, user_question, bypass_cache)
+                except Exception as compound_err:
+                    logger.error(f"Compound processing failed, falling through to simple query: {compound_err}", exc_info=True)
+                else:
+                    yield "final", compound
+                    return
+
+        clarification = self._clarification_response(user_question, session_ctx)
+        if clarification is not None:
+            yield "final", clarification
+            return
+
+        try:
+            context_to_inject = self._injected_context(user_question, session_ctx)
+            # The compiler may load the data and the SQL cache reads SQLite: both off the event loop
+            sql_response, sql_source = await asyncio.to_thread(self._known_sql, user_question, context_to_inject,
+                                                               bypass_cache)
+            if sql_response is not None:
+                gpt_response_str = json.dumps(sql_response)
+            else:
+                sql_messages = self._sql_messages(user_question, session_ctx, context_to_inject)
+                gpt_response_str = await self._acall_gpt4(sql_messages, temperature=0, expect_json=True)
+                sql_response = self._parse_sql_response(gpt_response_str)
+                if sql_response is None:
+                    yield "final", self._json_error_response()
+                    return
+
+            sql = sql_response.get("sql", "")
+            validation = validator.validate(sql)
+            if not validation["valid"]:
+                yield "final", self._invalid_sql_response(sql, validation)
+                return
+            cleaned_sql = validation["cleaned_sql"]
+            yield "sql", {"sql": cleaned_sql, "query_intent": sql_response.get("query_intent", "Analysis")}
+
+            db_result = await self._aexecute(cleaned_sql, approximate)
+            self._raise_if_interrupted(db_result)
+
+            if not db_result["success"]:
+                if sql_source == "cache":
+                    await asyncio.to_thread(sql_cache.discard, user_question, context_to_inject)
+                sql_source = "model"
+                sql_messages = self._sql_messages(user_question, session_ctx, context_to_inject)
+                sql_messages += self._retry_messages(gpt_response_str, db_result)
+                gpt_retry_str = await self._acall_gpt4(sql_messages, temperature=0, expect_json=True)
+                try:
+                    sql_response, retry_sql, validation = self._parse_retry_response(gpt_retry_str)
+                    if not validation["valid"]:
+                        yield "final", self._retry_invalid_response(retry_sql, validation)
+                        return
+                    cleaned_sql = validation["cleaned_sql"]
+                    db_result = await db.execute_query_async(cleaned_sql, columnar=True, approximate=approximate)
+                    if not db_result["success"]:
+                        yield "final", self._db_error_response(cleaned_sql, db_result)
+                        return
+                except Exception as e:
+                    yield "final", self._retry_failed_response()
+                    return
+                yield "sql", {"sql": cleaned_sql, "query_intent": sql_response.get("query_intent", "Analysis")}
+            if sql_source == "model":
+                await asyncio.to_thread(sql_cache.put, user_question, context_to_inject, {**sql_response, "sql": cleaned_sql})
+
+            if db_result.get("row_count") == 0 and db_result.get("error") is None:
+                yield "final", self._empty_result_response(user_question, session_id, turn_count, cleaned_sql, db_result, sql_response, start_time)
+                return
+
+            loop = asyncio.get_running_loop()
+            chart_data = await loop.run_in_executor(None, self._chart, db_result, sql_response)
+            yield "result", {
+                "sql": cleaned_sql,
+                "row_count": db_result.get("row_count"),
+                "query_time_ms": db_result.get("execution_time_ms"),
                 "chart": chart_data,
-                "proactive_insight": proactive_insight,
-                "query_intent": query_intent,
-                "execution_time_ms": execution_time,
-                "is_clarification": False
+                "is_approximate": db_result.get("approximate", False),
             }
 
+            # The insight only reads the result; it overlaps with enrichment and narration
+            insight_task = loop.run_in_executor(None, self._proactive_insight, db_result, sql_response, user_question)
+            try:
+                statistical_enrichment = await loop.run_in_executor(None, self._enrich, db_result, sql_response, cleaned_sql)
+                narration_key = await loop.run_in_executor(None, self._narration_key, user_question, cleaned_sql,
+                                                           db_result, statistical_enrichment)
+                answer_text = narration_cache.get(narration_key) if narration_key and not bypass_cache else None
+                if answer_text is not None:
+                    yield "token", {"text": answer_text}
+                else:
+                    narration_messages = self._narration_messages(user_question, cleaned_sql, db_result, sql_response, session_ctx, statistical_enrichment)
+                    if stream_narration:
+                        fragments = []
+                        async for fragment in self._astream_gpt4(narration_messages, temperature=0.3):
+                            fragments.append(fragment)
+                            yield "token", {"text": fragment}
+                        answer_text = "".join(fragments)
+                    else:
+                        answer_text = await self._acall_gpt4(narration_messages, temperature=0.3, expect_json=False)
+                    if narration_key:
+                        narration_cache.put(narration_key, answer_text)
+            finally:
+                proactive_insight = await insight_task
+
+            # Turn bookkeeping and the refinement hand-off stay off the event loop too
+            yield "final", await asyncio.to_thread(self._finish, user_question, session_id, turn_count, cleaned_sql,
+                                                   db_result, sql_response, answer_text, proactive_insight, chart_data,
+                                                   start_time)
+
         except Exception as e:
-            logger.error(f"Pipeline Error: {e}", exc_info=True)
-            err_str = str(e).lower()
-            if "json" in err_str:
-                user_msg = "I had trouble parsing the query structure. Could you rephrase your question?"
-            elif "column" in err_str or "binder" in err_str:
-                user_msg = "I couldn't map your question to the data columns. Try being more specific — for example, mention 'sender_bank' or 'transaction_type' explicitly."
-            elif "timeout" in err_str:
-                user_msg = "The query took too long. Try a more specific question with filters."
-            else:
-                user_msg = "An unexpected error occurred while processing your request. If this persists, try rephrasing your question differently."
+            yield "final", self._error_response(e)
+
+    # Pipeline stages shared by process() and astream()
+
+    def _non_data_response(self, user_question: str, start_time: datetime.datetime) -> dict | None:
+        non_data = self._handle_non_data_query(user_question)
+        if non_data is not None:
+            execution_time = (datetime.datetime.now() - start_time).total_seconds() * 1000
+            non_data["execution_time_ms"] = execution_time
+        return non_data
+
+    def _clarification_response(self, user_question: str, session_ctx: dict) -> dict | None:
+        # Just use list [] for ambiguity check history
+        history_for_check = session_ctx.get("recent_turns", [])
+        
+        if prompt_builder.detect_ambiguity(user_question, history_for_check) and session_ctx.get("turn_count", 0) == 0:
             return {
-                "answer": user_msg,
-                "error": str(e),
-                "is_clarification": False,
-                "sql_used": None
+                "answer": "Could you clarify your question? For example, are you asking about transaction types, states, or a specific time period?", 
+                "sql_used": None, 
+                "chart": None, 
+                "proactive_insight": None, 
+                "is_clarification": True,
+                "query_intent": "Clarification requested",
+                "execution_time_ms": 0
             }
+        return None
+
+    def _injected_context(self, user_question: str, session_ctx: dict) -> dict:
+        return session_ctx["entity_tracker"] if self._should_inject_context(
+            user_question, session_ctx["entity_tracker"], session_ctx["turn_count"]
+        ) else {}
+
+    def _known_sql(self, user_question: str, context_to_inject: dict, bypass_cache: bool) -> tuple:
+        """(sql_response, source) without a model call where possible: source is
+        "compiled" (local intent compiler), "cache" (asked before) or "model"
+        (sql_response None — generate it)."""
+        # Both match against dataset values from the catalog
+        db.ensure_initialized()
+        compiled = intent_compiler.compile(user_question, context_to_inject)
+        if compiled is not None:
+            return compiled, "compiled"
+        cached = None if bypass_cache else sql_cache.get(user_question, context_to_inject)
+        return cached, "cache" if cached is not None else "model"
+
+    def _sql_messages(self, user_question: str, session_ctx: dict, context_to_inject: dict) -> list:
+        return prompt_builder.build_sql_generation_prompt(
+            user_question, 
+            session_ctx["recent_turns"], 
+            context_to_inject
+        )
+
+    def _parse_sql_response(self, gpt_response_str: str) -> dict | None:
+        try:
+            # Clean up potential markdown formatting before parsing
+            clean_json_str = gpt_response_str.replace("```json", "").replace("```", "").strip()
+            # Strip BOM characters and stray leading/trailing whitespace
+            clean_json_str = clean_json_str.strip('\ufeff').strip()
+            try:
+                return json.loads(clean_json_str)
+            except json.JSONDecodeError:
+                # Fallback: skip any leading non-JSON line (e.g. stray explanation text)
+                return json.loads(clean_json_str.split('\n', 1)[-1])
+        except (json.JSONDecodeError, Exception):
+            logger.error(f"Failed to parse JSON from GPT: {gpt_response_str}")
+            return None
+
+    def _json_error_response(self) -> dict:
+        return {
+            "answer": "I understood your question, but I encountered an internal error generating the query structure. Please try again.",
+            "sql_used": None,
+            "is_clarification": False,
+            "error": "JSON Parse Error"
+        }
+
+    def _invalid_sql_response(self, sql: str, validation: dict) -> dict:
+        return {
+            "answer": f"I cannot execute that query safely. Reason: {validation['reason']}",
+            "sql_used": sql,
+            "is_clarification": False
+        }
+
+    def _execute(self, cleaned_sql: str, approximate: bool) -> dict:
+        # Compound sibling branches share one scan where their queries can be merged
+        member = current_scan_member()
+        if member is not None and not approximate:
+            return member.execute(cleaned_sql)
+        return db.execute_query(cleaned_sql, columnar=True, approximate=approximate)
+
+    async def _aexecute(self, cleaned_sql: str, approximate: bool) -> dict:
+        member = current_scan_member()
+        if member is not None and not approximate:
+            # Waiting for the sibling branches blocks, so it happens off the event loop
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, contextvars.copy_context().run, member.execute, cleaned_sql)
+        return await db.execute_query_async(cleaned_sql, columnar=True, approximate=approximate)
+
+    def _raise_if_interrupted(self, db_result: dict) -> None:
+        # A slow scan is not a SQL mistake — report it rather than asking for a rewrite
+        if db_result.get("error_type") == "timeout":
+            raise QueryTimeout(db_result["error"])
+        if db_result.get("error_type") == "cancelled":
+            raise QueryCancelled(db_result["error"])
+
+    def _retry_messages(self, gpt_response_str: str, db_result: dict) -> list:
+        logger.warning(f"SQL Execution failed: {db_result['error']}. Attempting retry.")
+        retry_message = f"The SQL query failed with error: {db_result['error']}. Please correct the SQL and return the JSON object again."
+        return [
+            {"role": "assistant", "content": gpt_response_str},
+            {"role": "user", "content": retry_message}
+        ]
+
+    def _parse_retry_response(self, gpt_retry_str: str) -> tuple:
+        """(sql_response, sql, validation) of the corrected query; raises if it is not JSON."""
+        clean_retry_json = gpt_retry_str.replace("```json", "").replace("```", "").strip()
+        sql_response = json.loads(clean_retry_json)
+        sql = sql_response.get("sql", "")
+        
+        # Re-validate
+        return sql_response, sql, validator.validate(sql)
+
+    def _retry_invalid_response(self, sql: str, validation: dict) -> dict:
+        return {
+            "answer": f"I couldn't generate a valid query even after retrying. Reason: {validation['reason']}",
+            "sql_used": sql,
+            "is_clarification": False
+        }
+
+    def _db_error_response(self, cleaned_sql: str, db_result: dict) -> dict:
+        return {
+            "answer": f"I encountered a database error: {db_result['error']}",
+            "sql_used": cleaned_sql,
+            "is_clarification": False
+        }
+
+    def _retry_failed_response(self) -> dict:
+        return {
+            "answer": "I had trouble fixing the query automatically.",
+            "sql_used": None,
+            "is_clarification": False
+        }
+
+    def _empty_result_response(self, user_question: str, session_id: str, turn_count: int, cleaned_sql: str,
+                               db_result: dict, sql_response: dict, start_time: datetime.datetime) -> dict:
+        query_intent = sql_response.get("query_intent", "Analysis")
+        execution_time = (datetime.datetime.now() - start_time).total_seconds() * 1000
+        session_manager.add_turn(session_id, {
+            "turn_number": turn_count + 1,
+            "user_question": user_question,
+            "sql_used": cleaned_sql,
+            "data_result": db_result,
+            "answer": "No transactions found matching your query. The filters may be too specific — try broadening your search.",
+            "proactive_insight": None,
+            "entities": sql_response.get("entities_extracted", {}),
+            "query_intent": query_intent,
+            "timestamp": datetime.datetime.now().isoformat()
+        })
+        return {
+            "answer": "No transactions found matching your query. The filters may be too specific — try broadening your search.",
+            "sql_used": cleaned_sql,
+            "chart": None,
+            "proactive_insight": None,
+            "query_intent": query_intent,
+            "execution_time_ms": execution_time,
+            "is_clarification": False
+        }
+
+    def _enrich(self, db_result: dict, sql_response: dict, cleaned_sql: str) -> dict:
+        statistical_enrichment = {}
+        try:
+            if db_result.get('data') and len(db_result['data']) >= 2:
+                statistical_enrichment = stats_engine.enrich(
+                    data=db_result['data'],
+                    query_intent=sql_response.get("query_intent", "Analysis"),
+                    sql=cleaned_sql
+                )
+        except Exception as e:
+            logger.warning(f"Stats enrichment skipped: {e}")
+        return statistical_enrichment
+
+    def _narration_key(self, user_question: str, cleaned_sql: str, db_result: dict, statistical_enrichment: dict) -> str | None:
+        if not narration_cache.enabled:
+            return None
+        return narration_cache.key_for(sql_cache.normalize(user_question), cleaned_sql, db_result, statistical_enrichment)
+
+    def _narration_messages(self, user_question: str, cleaned_sql: str, db_result: dict, sql_response: dict,
+                            session_ctx: dict, statistical_enrichment: dict) -> list:
+        return prompt_builder.build_narration_prompt(
+            user_query=user_question,
+            sql_used=cleaned_sql,
+            query_result=db_result,
+            query_intent=sql_response.get("query_intent", "Analysis"),
+            entity_context=session_ctx["entity_tracker"],
+            data_profile=db.get_data_profile(),
+            statistical_enrichment=statistical_enrichment
+        )
+
+    def _proactive_insight(self, db_result: dict, sql_response: dict, user_question: str) -> str | None:
+        return self._generate_proactive_insight(db_result.get("data", []), sql_response.get("entities_extracted", {}), user_question)
+
+    def _chart(self, db_result: dict, sql_response: dict) -> dict | None:
+        if not sql_response.get("requires_chart", False):
+            return None
+        return self._prepare_chart_data(db_result.get("data", []), sql_response.get("suggested_chart_type", "none"))
+
+    def _finish(self, user_question: str, session_id: str, turn_count: int, cleaned_sql: str, db_result: dict,
+                sql_response: dict, answer_text: str, proactive_insight, chart_data, start_time: datetime.datetime) -> dict:
+        query_intent = sql_response.get("query_intent", "Analysis")
+
+        # Step 8b — Exact answer in the background for sampled estimates
+        refinement_id = None
+        if db_result.get("approximate") and self.refine_approximate:
+            refinement_id = self._start_refinement(cleaned_sql)
+
+        # Step 9 — Save Turn
+        execution_time = (datetime.datetime.now() - start_time).total_seconds() * 1000
+        
+        turn_data = {
+            "turn_number": turn_count + 1,
+            "user_question": user_question,
+            "sql_used": cleaned_sql,
+            "data_result": db_result, # Store full result in memory? Prompt says "raw query result"
+            "answer": answer_text,
+            "proactive_insight": proactive_insight,
+            "entities": sql_response.get("entities_extracted", {}),
+            "query_intent": query_intent,
+            "timestamp": datetime.datetime.now().isoformat()
+        }
+        session_manager.add_turn(session_id, turn_data)
+
+        # Step 10 — Return
+        return {
+            "answer": answer_text,
+            "sql_used": cleaned_sql,
+            "chart": chart_data,
+            "proactive_insight": proactive_insight,
+            "query_intent": query_intent,
+            "execution_time_ms": execution_time,
+            "is_clarification": False,
+            "is_approximate": db_result.get("approximate", False),
+            "approximation": db_result.get("estimates"),
+            "refinement_id": refinement_id
+        }
+
+    def _error_response(self, e: Exception) -> dict:
+        logger.error(f"Pipeline Error: {e}", exc_info=True)
+        err_str = str(e).lower()
+        if "json" in err_str:
+            user_msg = "I had trouble parsing the query structure. Could you rephrase your question?"
+        elif "column" in err_str or "binder" in err_str:
+            user_msg = "I couldn't map your question to the data columns. Try being more specific — for example, mention 'sender_bank' or 'transaction_type' explicitly."
+        elif "timeout" in err_str:
+            user_msg = "The query took too long. Try a more specific question with filters."
+        elif isinstance(e, QueryCancelled):
+            user_msg = "The request was cancelled before it finished."
+        else:
+            user_msg = "An unexpected error occurred while processing your request. If this persists, try rephrasing your question differently."
+        return {
+            "answer": user_msg,
+            "error": str(e),
+            "is_clarification": False,
+            "sql_used": None
+        }
+
+    def _start_refinement(self, sql: str) -> str:
+        refinement_id = uuid.uuid4().hex
+        future = db.refine_in_background(sql)
+        with self._refinements_lock:
+            self._refinements[refinement_id] = future
+            while len(self._refinements) > self.max_refinements:
+                self._refinements.popitem(last=False)
+        return refinement_id
+
+    def get_refinement(self, refinement_id: str) -> dict | None:
+        """Status of the exact re-run behind an approximate answer (None if unknown)."""
+        with self._refinements_lock:
+            future = self._refinements.get(refinement_id)
+        if future is None:
+            return None
+        if not future.done():
+            return {"status": "pending"}
+        result = future.result()
+        if not result["success"]:
+            return {"status": "failed", "error": result["error"]}
+        return {
+            "status": "done",
+            "data": result["data"],
+            "row_count": result["row_count"],
+            "execution_time_ms": result["execution_time_ms"]
+        }
 
     def _should_inject_context(self, user_question: str, entity_tracker: dict, turn_count: int) -> bool:
         if turn_count == 0:
@@ -442,51 +771,152 @@ class QueryPipeline:
         ]
         return any(patterns)
 
-    def _decompose_question(self, question: str) -> list[str]:
-        prompt = f"""You are decomposing a compound analytics question into sequential sub-questions.
+    def _decompose_question(self, question: str) -> list[dict]:
+        try:
+            # Use temp=0 and primary model as requested
+            response_str = self._call_gpt4(self._decomposition_messages(question), temperature=0, expect_json=True)
+            return self._parse_decomposition(response_str)
+        except Exception as e:
+            logger.error(f"Decomposition failed: {e}")
+            return [{"question": question, "depends_on": []}]
+
+    async def _adecompose_question(self, question: str) -> list[dict]:
+        try:
+            response_str = await self._acall_gpt4(self._decomposition_messages(question), temperature=0, expect_json=True)
+            return self._parse_decomposition(response_str)
+        except Exception as e:
+            logger.error(f"Decomposition failed: {e}")
+            return [{"question": question, "depends_on": []}]
+
+    def _decomposition_messages(self, question: str) -> list:
+        prompt = f"""You are decomposing a compound analytics question into sub-questions.
 Each sub-question must be answerable independently with a single SQL query.
-The answer to an earlier sub-question may be needed as context for a later one.
+The answer to an earlier sub-question may be needed as context for a later one; list those
+earlier sub-questions (by 0-based index) in depends_on. Sub-questions that do not need another
+answer must have an empty depends_on, so they can run in parallel.
 
 Compound question: "{question}"
 
-Respond with ONLY a JSON array of strings. Maximum 3 sub-questions.
-Example: ["Which age group has the highest volume?", "What is the failure rate for that age group?"]
+Respond with ONLY a JSON array of objects. Maximum 3 sub-questions.
+Example: [{{"question": "Which age group has the highest volume?", "depends_on": []}}, {{"question": "What is the failure rate for that age group?", "depends_on": [0]}}, {{"question": "Which bank has the highest fraud flag rate?", "depends_on": []}}]
 Keep each sub-question focused and specific."""
 
-        messages = [{"role": "system", "content": prompt}]
+        return [{"role": "system", "content": prompt}]
+
+    def _parse_decomposition(self, response_str: str) -> list[dict]:
+        """Sub-questions as [{"question", "depends_on"}], dependencies limited to earlier
+        entries (so the graph is acyclic). A plain list of strings is accepted too: a
+        sub-question referring back ("that age group") then depends on the one before."""
+        clean_json = response_str.replace("```json", "").replace("```", "").strip()
+        nodes = []
+        for i, item in enumerate(json.loads(clean_json)):
+            if isinstance(item, str):
+                refers_back = i > 0 and bool(set(re.findall(r"[a-z]+", item.lower())) & self.REFERENCE_WORDS)
+                item = {"question": item, "depends_on": [i - 1] if refers_back else []}
+            depends_on = sorted({d for d in item.get("depends_on") or [] if isinstance(d, int) and 0 <= d < i})
+            nodes.append({"question": item["question"], "depends_on": depends_on})
+        return nodes
+
+    def _branch_session(self, node: dict, branch_sessions: dict) -> str:
+        """Temporary session for one sub-question (prevents context bleeding between
+        branches), holding the turns of the sub-questions it depends on."""
+        branch_session_id = session_manager.create_session()
+        replayed = []
+        for dep in node["depends_on"]:
+            for turn in session_manager.get_session(branch_sessions[dep])["turns"]:
+                if not any(turn is seen for seen in replayed):
+                    replayed.append(turn)
+        for turn in replayed:
+            session_manager.add_turn(branch_session_id, turn)
+        return branch_session_id
+
+    def _scan_batch(self, sub_questions: list) -> ScanBatch | None:
+        """Shared-scan batch for the sub-questions that start together (those without
+        dependencies); a dependent one's query needs an earlier answer, so it runs alone."""
+        roots = sum(1 for node in sub_questions if not node["depends_on"])
+        return ScanBatch(roots) if SHARED_SCAN_ENABLED and roots > 1 else None
+
+    def _branch_timing(self, node: dict, result: dict, started: float, finished: float, compound_start: float) -> dict:
+        return {
+            "question": node["question"],
+            "depends_on": node["depends_on"],
+            "started_at_ms": round((started - compound_start) * 1000, 1),
+            "execution_time_ms": round((finished - started) * 1000, 1),
+            "sql_used": result.get("sql_used"),
+        }
+
+    def _process_compound(self, sub_questions: list, session_id: str, original_question: str,
+                          bypass_cache: bool = False) -> dict:
+        """Sub-questions run as a dependency graph: each starts as soon as the ones it
+        depends on have answered, independent ones side by side on their own threads."""
+        compound_start = time.perf_counter()
+        results, timings, branch_sessions = [None] * len(sub_questions), [None] * len(sub_questions), {}
+        scan_batch = self._scan_batch(sub_questions)
+
+        def run_branch(i: int) -> dict:
+            started = time.perf_counter()
+            with scan_scope(scan_batch if not sub_questions[i]["depends_on"] else None):
+                result = self.process(sub_questions[i]["question"], branch_sessions[i], bypass_cache=bypass_cache)
+            timings[i] = self._branch_timing(sub_questions[i], result, started, time.perf_counter(), compound_start)
+            return result
+
         try:
-            # Use temp=0 and primary model as requested
-            response_str = self._call_gpt4(messages, temperature=0, expect_json=True)
-            clean_json = response_str.replace("```json", "").replace("```", "").strip()
-            return json.loads(clean_json)
-        except Exception as e:
-            logger.error(f"Decomposition failed: {e}")
-            return [question]
+            with ThreadPoolExecutor(max_workers=len(sub_questions), thread_name_prefix="compound") as branches:
+                waiting, running = set(range(len(sub_questions))), {}
+                while waiting or running:
+                    for i in sorted(waiting):
+                        if all(results[d] is not None for d in sub_questions[i]["depends_on"]):
+                            waiting.discard(i)
+                            branch_sessions[i] = self._branch_session(sub_questions[i], branch_sessions)
+                            # Each branch carries the request's query context (cancellation)
+                            running[branches.submit(contextvars.copy_context().run, run_branch, i)] = i
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        results[running.pop(future)] = future.result()
+        finally:
+            # Clean up temp sessions
+            for branch_session_id in branch_sessions.values():
+                session_manager.delete_session(branch_session_id)
+
+        results = [(node["question"], result) for node, result in zip(sub_questions, results)]
+        final_answer = self._call_gpt4(self._synthesis_messages(results, original_question), temperature=0.3, expect_json=False)
+        return self._compound_response(results, original_question, final_answer, timings, compound_start)
+
+    async def _aprocess_compound(self, sub_questions: list, session_id: str, original_question: str,
+                                 bypass_cache: bool = False) -> dict:
+        compound_start = time.perf_counter()
+        timings, branch_sessions, tasks = [None] * len(sub_questions), {}, []
+        scan_batch = self._scan_batch(sub_questions)
+
+        async def run_branch(i: int) -> dict:
+            node = sub_questions[i]
+            if node["depends_on"]:
+                await asyncio.gather(*(tasks[d] for d in node["depends_on"]))
+            branch_sessions[i] = self._branch_session(node, branch_sessions)
+            started = time.perf_counter()
+            with scan_scope(scan_batch if not node["depends_on"] else None):
+                result = await self.aprocess(node["question"], branch_sessions[i], bypass_cache=bypass_cache)
+            timings[i] = self._branch_timing(node, result, started, time.perf_counter(), compound_start)
+            return result
 
-    def _process_compound(self, sub_questions: list, session_id: str, original_question: str) -> dict:
-        results = []
-        accumulated_sql = []
-        last_chart = None
-        
-        # Create a temporary session for isolation (prevent context bleeding)
-        temp_session_id = session_manager.create_session()
-        
         try:
-            for sub_q in sub_questions:
-                # Run process() on each sub-question sequentially using TEMP session
-                res = self.process(sub_q, temp_session_id)
-                results.append(f"Question: {sub_q}\nAnswer: {res['answer']}")
-                
-                if res.get("sql_used"):
-                    accumulated_sql.append(res["sql_used"])
-                if res.get("chart"):
-                    last_chart = res["chart"]
+            # Dependencies always point at earlier entries, so each task's are already scheduled
+            for i in range(len(sub_questions)):
+                tasks.append(asyncio.ensure_future(run_branch(i)))
+            branch_results = await asyncio.gather(*tasks)
         finally:
-            # Clean up temp session
-            session_manager.delete_session(temp_session_id)
-        
+            for task in tasks:
+                task.cancel()
+            for branch_session_id in branch_sessions.values():
+                session_manager.delete_session(branch_session_id)
+
+        results = [(node["question"], result) for node, result in zip(sub_questions, branch_results)]
+        final_answer = await self._acall_gpt4(self._synthesis_messages(results, original_question), temperature=0.3, expect_json=False)
+        return self._compound_response(results, original_question, final_answer, timings, compound_start)
+
+    def _synthesis_messages(self, results: list, original_question: str) -> list:
         # Final Synthesis
-        all_answers = "\n\n".join(results)
+        all_answers = "\n\n".join(f"Question: {sub_q}\nAnswer: {res['answer']}" for sub_q, res in results)
         
         # Get data profile for benchmarks
         data_profile = db.get_data_profile()
@@ -507,58 +937,53 @@ Dataset benchmarks for comparison:
         
         synthesis_prompt = f"Combine these sequential analysis results into one executive summary answering the original question: '{original_question}'.\n\nResults:\n{all_answers}\n\n{bi_requirements}"
         
-        messages = [{"role": "user", "content": synthesis_prompt}]
-        final_answer = self._call_gpt4(messages, temperature=0.3, expect_json=False)
-        
+        return [{"role": "user", "content": synthesis_prompt}]
+
+    def _compound_response(self, results: list, original_question: str, final_answer: str, timings: list,
+                           compound_start: float) -> dict:
+        accumulated_sql = [res["sql_used"] for _, res in results if res.get("sql_used")]
+        charts = [res["chart"] for _, res in results if res.get("chart")]
         return {
             "answer": final_answer,
             "sql_used": " | THEN | ".join(accumulated_sql),
-            "chart": last_chart,
+            "chart": charts[-1] if charts else None,
             "proactive_insight": None,
             "query_intent": "Multi-step analysis: " + original_question,
-            "execution_time_ms": 0, # Placeholder
-            "is_clarification": False
+            "execution_time_ms": (time.perf_counter() - compound_start) * 1000,
+            "is_clarification": False,
+            "sub_queries": timings
         }
 
     def _call_gpt4(self, messages: list, temperature: float, expect_json: bool) -> str:
+        # No model calls on behalf of a request that has been cancelled
+        context = current_query()
+        if context is not None:
+            context.check()
         try:
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.primary_model,
-                    messages=messages,
-                    temperature=temperature,
-                    timeout=self.openai_timeout_s
-                )
-            except TypeError:
-                # Backward-compatible: some SDK versions don't accept per-call timeout.
-                response = self.client.chat.completions.create(
-                    model=self.primary_model,
-                    messages=messages,
-                    temperature=temperature
-                )
-            logger.info(f"Successfully called primary model: {self.primary_model}")
-            return response.choices[0].message.content
+            return llm_gateway.complete(messages, temperature, self.primary_model, self.fallback_model)
         except Exception as e:
-            logger.warning(f"Primary model {self.primary_model} failed: {e}. Trying fallback {self.fallback_model}.")
-            try:
-                try:
-                    response = self.client.chat.completions.create(
-                        model=self.fallback_model,
-                        messages=messages,
-                        temperature=temperature,
-                        timeout=self.openai_timeout_s
-                    )
-                except TypeError:
-                    response = self.client.chat.completions.create(
-                        model=self.fallback_model,
-                        messages=messages,
-                        temperature=temperature
-                    )
-                logger.info(f"Successfully called fallback model: {self.fallback_model}")
-                return response.choices[0].message.content
-            except Exception as e2:
-                logger.error(f"Fallback model failed: {e2}")
-                raise e2
+            logger.error(f"Model call failed: {e}")
+            raise
+
+    async def _acall_gpt4(self, messages: list, temperature: float, expect_json: bool) -> str:
+        """_call_gpt4 on the async client: the request waits without holding a thread."""
+        context = current_query()
+        if context is not None:
+            context.check()
+        try:
+            return await llm_gateway.acomplete(messages, temperature, self.primary_model, self.fallback_model)
+        except Exception as e:
+            logger.error(f"Model call failed: {e}")
+            raise
+
+    async def _astream_gpt4(self, messages: list, temperature: float):
+        """Narration fragments as the model produces them. Falls back to the
+        fallback model only if the primary fails before its first fragment."""
+        context = current_query()
+        if context is not None:
+            context.check()
+        async for fragment in llm_gateway.astream(messages, temperature, self.primary_model, self.fallback_model):
+            yield fragment
 
     def _generate_proactive_insight(self, data: list, entities: dict, question: str) -> str or None:
         if not data:
@@ -631,15 +1056,15 @@ Dataset benchmarks for comparison:
 
         return None
 
-    def _prepare_chart_data(self, data: list, chart_type: str) -> dict or None:
+    def _prepare_chart_data(self, data, chart_type: str) -> dict or None:
         if not data:
             return None
             
-        if not isinstance(data, list) or len(data) == 0:
+        if not isinstance(data, (list, ResultSet)) or len(data) == 0:
             return None
             
-        first_row = data[0]
-        keys = list(first_row.keys())
+        # Chart keys come from the column names; rows are materialized only for the payload
+        keys = data.column_names if isinstance(data, ResultSet) else list(data[0].keys())
         if len(keys) < 2:
             return None
             
@@ -648,7 +1073,7 @@ Dataset benchmarks for comparison:
         
         return {
             "type": chart_type,
-            "data": data,
+            "data": to_records(data),
             "x_key": x_key,
             "y_key": y_key
         }
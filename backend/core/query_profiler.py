@@ -0,0 +1,144 @@
+import os
+import json
+import logging
+import tempfile
+import threading
+import datetime
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: profiling makes DuckDB write a JSON plan after every query
+QUERY_PROFILING = os.getenv("QUERY_PROFILING", "false").lower() in ("1", "true", "yes")
+QUERY_PROFILE_THRESHOLD_MS = float(os.getenv("QUERY_PROFILE_THRESHOLD_MS", "500"))
+QUERY_PROFILE_CAPACITY = int(os.getenv("QUERY_PROFILE_CAPACITY", "100"))
+
+# Operators that read base data; their output cardinality is the rows scanned
+_SCAN_OPERATORS = ("SEQ_SCAN", "TABLE_SCAN", "ARROW_SCAN", "READ_CSV", "READ_PARQUET")
+
+
+def _operators(node: Dict[str, Any], depth: int = 0, out: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """Flatten a DuckDB JSON profile tree into one entry per operator."""
+    out = [] if out is None else out
+    for child in node.get("children", []):
+        out.append({
+            "operator": child.get("name", "").strip(),
+            "depth": depth,
+            "timing_ms": round(float(child.get("timing", 0.0)) * 1000, 3),
+            "cardinality": int(child.get("cardinality", 0)),
+            "extra_info": child.get("extra_info", "").replace("[INFOSEPARATOR]", "|").strip(),
+        })
+        _operators(child, depth + 1, out)
+    return out
+
+
+def summarize_profile(profile_json: str) -> Dict[str, Any]:
+    """Plan tree, per-operator timings (slowest first) and rows scanned of one profile."""
+    plan = json.loads(profile_json)
+    operators = _operators(plan)
+    rows_scanned = sum(op["cardinality"] for op in operators if op["operator"].startswith(_SCAN_OPERATORS))
+    return {
+        "profiled_time_ms": round(float(plan.get("timing", 0.0)) * 1000, 3),
+        "rows_scanned": rows_scanned,
+        "operators": sorted(operators, key=lambda op: op["timing_ms"], reverse=True),
+        "plan": plan,
+    }
+
+
+class QueryProfiler:
+    """
+    Slow-query log. With profiling on, every query's cursor (or worker) writes
+    DuckDB's JSON profile; queries at or over the threshold keep theirs, with
+    the question, SQL, rows scanned and operator timings, in a ring buffer of
+    the most recent captures. Faster queries cost one profile write and are
+    otherwise ignored.
+    """
+
+    def __init__(self, enabled: bool = QUERY_PROFILING, threshold_ms: float = QUERY_PROFILE_THRESHOLD_MS,
+                 capacity: int = QUERY_PROFILE_CAPACITY):
+        self.enabled = enabled
+        self.threshold_ms = threshold_ms
+        self.capacity = max(1, capacity)
+        self._captures: "deque[Dict[str, Any]]" = deque(maxlen=self.capacity)
+        self._lock = threading.Lock()
+        self._profile_dir: Optional[str] = None
+        self.profiled = 0
+        self.captured = 0
+
+    def _output_path(self) -> str:
+        # One profile file per thread: each thread has its own cursor
+        with self._lock:
+            if self._profile_dir is None:
+                self._profile_dir = tempfile.mkdtemp(prefix="insightx_profile_")
+        return os.path.join(self._profile_dir, f"{threading.get_ident()}.json")
+
+    def prepare(self, cursor) -> str:
+        """Turn on JSON profiling for cursor; returns the file its next query's profile lands in."""
+        path = self._output_path()
+        cursor.execute("PRAGMA enable_profiling = 'json'")
+        cursor.execute(f"PRAGMA profiling_output = '{path}'")
+        return path
+
+    def is_slow(self, elapsed_ms: float) -> bool:
+        return elapsed_ms >= self.threshold_ms
+
+    def record(self, sql: str, elapsed_ms: float, row_count: Optional[int], profile_json: Optional[str],
+               question: Optional[str] = None) -> None:
+        """Keep a capture of sql if it was slow; row_count is None for a query that timed out."""
+        with self._lock:
+            self.profiled += 1
+        if not self.is_slow(elapsed_ms):
+            return
+        capture = {
+            "captured_at": datetime.datetime.now().isoformat(),
+            "question": question,
+            "sql": sql,
+            "execution_time_ms": round(elapsed_ms, 3),
+            "row_count": row_count,
+            "timed_out": row_count is None,
+            "rows_scanned": None,
+            "operators": [],
+            "plan": None,
+        }
+        if profile_json:
+            try:
+                capture.update(summarize_profile(profile_json))
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Unreadable query profile: {e}")
+        with self._lock:
+            self._captures.append(capture)
+            self.captured += 1
+        logger.info(f"Slow query captured ({elapsed_ms:.1f}ms): {sql[:200]}")
+
+    def read_profile(self, path: str) -> Optional[str]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError as e:
+            logger.warning(f"Query profile not written: {e}")
+            return None
+
+    def slow_queries(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Captured slow queries, newest first."""
+        with self._lock:
+            captures = list(reversed(self._captures))
+        return captures[:limit] if limit else captures
+
+    def clear(self) -> None:
+        with self._lock:
+            self._captures.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "threshold_ms": self.threshold_ms,
+                "capacity": self.capacity,
+                "profiled": self.profiled,
+                "captured": self.captured,
+                "buffered": len(self._captures),
+            }
+
+
+query_profiler = QueryProfiler()
@@ -0,0 +1,94 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
+
+try:
+    from backend.core.result_set import ResultSet
+    from backend.core.sql_rewrite import canonicalize
+    from backend.core.ingest import COLUMN_NAMES
+except ImportError:
+    from core.result_set import ResultSet
+    from core.sql_rewrite import canonicalize
+    from core.ingest import COLUMN_NAMES
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    LRU cache of query results under a byte budget.
+    Keys are (data_version, canonical SQL), so whitespace, case and alias
+    differences share one entry, and a reload to a new data version can
+    never serve stale rows. Hits re-label aliased columns to the caller's
+    aliases without copying the underlying Arrow buffers.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[ResultSet, List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key_for(self, sql: str, data_version: Optional[str]) -> Tuple[Tuple[str, str], List[str]]:
+        canonical, aliases = canonicalize(sql, protected_names=COLUMN_NAMES + ["transactions"])
+        return (data_version or "", canonical), aliases
+
+    def get(self, key: Tuple[str, str], aliases: List[str]) -> Optional[ResultSet]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        result, cached_aliases = entry
+        if cached_aliases == aliases:
+            return result
+        renames = {old.lower(): new for old, new in zip(cached_aliases, aliases)}
+        names = [renames.get(name.lower(), name) for name in result.column_names]
+        return ResultSet(result.arrow.rename_columns(names))
+
+    def put(self, key: Tuple[str, str], aliases: List[str], result: ResultSet) -> None:
+        size = result.nbytes
+        if not self.enabled or size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[0].nbytes
+            self._entries[key] = (result, aliases)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+result_cache = ResultCache(int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))))
@@ -0,0 +1,112 @@
+import datetime
+from collections.abc import Sequence
+from typing import Any, Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+def _normalize_table(table: pa.Table) -> pa.Table:
+    """Cast DECIMAL (e.g. SUM over INTEGER) to float64, matching what fetchdf() produced,
+    and decode dictionary columns (ENUM-encoded categoricals) to plain strings."""
+    for i, field in enumerate(table.schema):
+        if pa.types.is_decimal(field.type):
+            table = table.set_column(i, field.name, pc.cast(table.column(i), pa.float64()))
+        elif pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, pc.cast(table.column(i), field.type.value_type))
+    return table
+
+
+def _json_safe(value: Any) -> Any:
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime.datetime) else value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    return value
+
+
+class ResultSet(Sequence):
+    """
+    Columnar query result backed by an Arrow table.
+    Consumers that only need columns (stats, chart keys) read them directly;
+    row dicts are built once, lazily, when the result crosses the JSON boundary.
+    Indexing and iteration still yield row dicts for older call sites.
+    """
+
+    def __init__(self, table: pa.Table):
+        self._table = _normalize_table(table)
+        self._columns: Dict[str, List[Any]] = {}
+        self._records: Optional[List[Dict[str, Any]]] = None
+
+    @property
+    def arrow(self) -> pa.Table:
+        return self._table
+
+    @property
+    def column_names(self) -> List[str]:
+        return self._table.column_names
+
+    @property
+    def nbytes(self) -> int:
+        return self._table.nbytes
+
+    def column(self, name: str) -> List[Any]:
+        values = self._columns.get(name)
+        if values is None:
+            values = self._table.column(name).to_pylist()
+            self._columns[name] = values
+        return values
+
+    def numeric_columns(self) -> List[str]:
+        return [
+            f.name for f in self._table.schema
+            if pa.types.is_integer(f.type) or pa.types.is_floating(f.type)
+        ]
+
+    def string_columns(self) -> List[str]:
+        return [
+            f.name for f in self._table.schema
+            if pa.types.is_string(f.type) or pa.types.is_large_string(f.type) or pa.types.is_dictionary(f.type)
+        ]
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """JSON-ready list of row dicts (timestamps as ISO strings, NULL as None)."""
+        if self._records is None:
+            names = self.column_names
+            columns = [[_json_safe(v) for v in self.column(n)] for n in names]
+            self._records = [dict(zip(names, row)) for row in zip(*columns)] if names else []
+        return self._records
+
+    def __len__(self) -> int:
+        return self._table.num_rows
+
+    def __getitem__(self, index):
+        if self._records is not None:
+            return self._records[index]
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("ResultSet index out of range")
+        return {name: _json_safe(self.column(name)[index]) for name in self.column_names}
+
+    def __iter__(self):
+        return iter(self.to_records())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ResultSet):
+            return self._table.equals(other._table)
+        if isinstance(other, list):
+            return len(self) == len(other) and self.to_records() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"ResultSet(rows={len(self)}, columns={self.column_names})"
+
+
+def to_records(data: Any) -> List[Dict[str, Any]]:
+    """Row dicts for either a ResultSet or a plain list of dicts."""
+    if isinstance(data, ResultSet):
+        return data.to_records()
+    return list(data or [])
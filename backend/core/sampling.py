@@ -0,0 +1,458 @@
+import os
+import math
+import logging
+import statistics
+from typing import Any, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+
+try:
+    from backend.core.sql_rewrite import token_spans
+    from backend.core.ingest import ingest_manager, COLUMN_NAMES
+    from backend.core.result_set import ResultSet
+except ImportError:
+    from core.sql_rewrite import token_spans
+    from core.ingest import ingest_manager, COLUMN_NAMES
+    from core.result_set import ResultSet
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_TABLE = "transactions_sample"
+
+# Uniform Bernoulli sample by transaction_id hash — deterministic, and appends
+# only need to insert the sampled rows of the new batch
+SAMPLE_PERCENT = float(os.getenv("APPROX_SAMPLE_PERCENT", "10"))
+# Disjoint sub-samples used for batch-means confidence intervals
+SAMPLE_BATCHES = int(os.getenv("APPROX_BATCHES", "10"))
+CONFIDENCE = 0.95
+
+# Two-sided 95% Student t quantiles by degrees of freedom (normal beyond 30)
+_T_975 = {
+    1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306,
+    9: 2.262, 10: 2.228, 11: 2.201, 12: 2.179, 13: 2.160, 14: 2.145, 15: 2.131,
+    16: 2.120, 17: 2.110, 18: 2.101, 19: 2.093, 20: 2.086, 25: 2.060, 30: 2.042,
+}
+
+# Aggregates whose sample value scales with the population: degree 1 in the row count
+_EXTENSIVE = {"count", "sum"}
+# Aggregates that estimate a population value directly
+_INTENSIVE = {"avg", "mean"}
+# Anything else (MIN/MAX, quantiles, DISTINCT counts...) cannot be estimated from a sample
+_OTHER_AGGREGATES = {
+    "min", "max", "median", "mode", "stddev", "stddev_pop", "stddev_samp", "variance",
+    "var_pop", "var_samp", "quantile", "quantile_cont", "quantile_disc", "approx_count_distinct",
+    "approx_quantile", "first", "last", "list", "string_agg", "group_concat", "arg_min",
+    "arg_max", "bool_and", "bool_or", "product", "any_value", "histogram", "entropy",
+    "kurtosis", "skewness", "corr", "covar_pop", "count_star",
+}
+# Degree-preserving wrappers: f(x, ...) has the degree of x
+_PASS_THROUGH = {"round", "abs", "cast", "try_cast", "coalesce", "floor", "ceil", "trunc"}
+_REJECT_KEYWORDS = {"distinct", "having", "union", "intersect", "except", "with", "join", "qualify", "sample", "tablesample"}
+
+
+def build_sample_sql(source: str) -> str:
+    threshold = int(round(SAMPLE_PERCENT * 100))
+    return f"""
+        SELECT *, CAST(hash(transaction_id || '#batch') % {SAMPLE_BATCHES} AS INTEGER) AS sample_batch
+        FROM {source}
+        WHERE hash(transaction_id) % 10000 < {threshold}
+    """
+
+
+def _t_quantile(df: int) -> float:
+    if df > 30:
+        return 1.96
+    return _T_975[max(k for k in _T_975 if k <= df)]
+
+
+class _Degree:
+    """Degree of a SELECT expression in the sampled row count: a value computed on an
+    f-fraction sample estimates the population value times f**degree. None = not estimable."""
+
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.pos = 0
+        self.has_aggregate = False
+
+    def parse(self) -> Optional[int]:
+        try:
+            degree = self._expr()
+        except _Unsupported:
+            return None
+        return degree if self.pos == len(self.tokens) else None
+
+    def _peek(self) -> str:
+        return self.tokens[self.pos][1].lower() if self.pos < len(self.tokens) else ""
+
+    def _take(self) -> Tuple[str, str]:
+        if self.pos >= len(self.tokens):
+            raise _Unsupported()
+        tok = self.tokens[self.pos]
+        self.pos += 1
+        return tok
+
+    def _expr(self) -> int:
+        degree = self._term()
+        while self._peek() in ("+", "-"):
+            self._take()
+            other = self._term()
+            if other != degree:
+                raise _Unsupported()  # e.g. COUNT(*) + 1 — no single scale factor
+        return degree
+
+    def _term(self) -> int:
+        degree = self._factor()
+        while self._peek() in ("*", "/"):
+            op = self._take()[1]
+            other = self._factor()
+            degree = degree + other if op == "*" else degree - other
+        return degree
+
+    def _factor(self) -> int:
+        if self._peek() in ("-", "+"):
+            self._take()
+            return self._factor()
+        degree = self._primary()
+        while self._peek() == "::":  # postfix cast keeps the degree
+            self._take()
+            self._take()
+            if self._peek() == "(":
+                self._skip_parens()
+        return degree
+
+    def _skip_parens(self) -> List[Tuple[str, str]]:
+        self._take()  # "("
+        start = self.pos
+        depth = 1
+        while depth:
+            depth += {"(": 1, ")": -1}.get(self._take()[1], 0)
+        return self.tokens[start:self.pos - 1]
+
+    def _primary(self) -> int:
+        kind, text = self._take()
+        if text == "(":
+            degree = self._expr()
+            if self._take()[1] != ")":
+                raise _Unsupported()
+            return degree
+        if kind == "id" and self._peek() == "(":
+            return self._call(text.lower())
+        if kind == "id" and text.lower() == "case":
+            return self._case()
+        if kind in ("num", "str", "id", "qid"):
+            return 0
+        raise _Unsupported()
+
+    def _call(self, name: str) -> int:
+        args = self._skip_parens()
+        if self._peek() == "over":
+            self._take()
+            if self._peek() != "(":
+                raise _Unsupported()
+            self._skip_parens()
+
+        if name in _EXTENSIVE or name in _INTENSIVE:
+            self.has_aggregate = True
+            inner = _Degree(args if args != [("op", "*")] else [])
+            inner_degree = inner.parse() if inner.tokens else 0
+            if inner_degree is None:
+                raise _Unsupported()
+            if inner.has_aggregate:
+                # Window over group aggregates, e.g. SUM(COUNT(*)) OVER (): sums or averages
+                # across groups keep the inner degree; counting groups does not scale
+                return 0 if name == "count" else inner_degree
+            return 1 if name in _EXTENSIVE else 0
+        if name in _OTHER_AGGREGATES:
+            raise _Unsupported()
+        if name in _PASS_THROUGH:
+            first = _first_argument(args, stop_at_as=name in ("cast", "try_cast"))
+            inner = _Degree(first)
+            degree = inner.parse()
+            self.has_aggregate = self.has_aggregate or inner.has_aggregate
+            if degree is None:
+                raise _Unsupported()
+            return degree
+        # Any other function: fine on plain columns, not estimable around aggregates
+        if any(t[0] == "id" and t[1].lower() in (_EXTENSIVE | _INTENSIVE | _OTHER_AGGREGATES) for t in args):
+            raise _Unsupported()
+        return 0
+
+    def _case(self) -> int:
+        depth = 0
+        while True:
+            kind, text = self._take()
+            lowered = text.lower()
+            if kind == "id" and lowered in (_EXTENSIVE | _INTENSIVE | _OTHER_AGGREGATES):
+                raise _Unsupported()  # aggregates inside CASE branches
+            if lowered == "case":
+                depth += 1
+            elif lowered == "end":
+                if depth == 0:
+                    return 0
+                depth -= 1
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _first_argument(args: List[Tuple[str, str]], stop_at_as: bool) -> List[Tuple[str, str]]:
+    depth = 0
+    for i, (kind, text) in enumerate(args):
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif depth == 0 and (text == "," or (stop_at_as and kind == "id" and text.lower() == "as")):
+            return args[:i]
+    return args
+
+
+def _strip_alias(item: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    if len(item) >= 3 and item[-2][0] == "id" and item[-2][1].lower() == "as":
+        return item[:-2]
+    if len(item) >= 2 and item[-1][0] in ("id", "qid") and item[-1][1].lower() != "end" \
+            and (item[-2][1] == ")" or item[-2][0] in ("id", "qid", "num", "str")):
+        return item[:-1]
+    return item
+
+
+def _order_column(order_by: List[Tuple[str, str]], select_items: List[List[Tuple[str, str]]],
+                  exprs: List[List[Tuple[str, str]]]) -> Optional[Tuple[int, bool]]:
+    """(output column index, descending) of the first ORDER BY key, when it names an
+    output column by alias, position or the same expression; otherwise None."""
+    first = _first_argument(order_by, stop_at_as=False)
+    descending = False
+    while first and first[-1][0] == "id" and first[-1][1].lower() in ("asc", "desc", "nulls", "first", "last"):
+        descending = descending or first[-1][1].lower() == "desc"
+        first = first[:-1]
+    if not first:
+        return None
+    normalized = [(k, t.lower() if k == "id" else t) for k, t in first]
+    for i, (item, expr) in enumerate(zip(select_items, exprs)):
+        alias = item[len(expr):]
+        if len(normalized) == 1 and alias and (alias[-1][1].lower().strip('"') == normalized[0][1].strip('"')):
+            return i, descending
+        if [(k, t.lower() if k == "id" else t) for k, t in expr] == normalized:
+            return i, descending
+    if len(first) == 1 and first[0][0] == "num" and first[0][1].isdigit() and 0 < int(first[0][1]) <= len(exprs):
+        return int(first[0][1]) - 1, descending
+    return None
+
+
+def _overlaps(a: Optional[List[float]], b: Optional[List[float]]) -> bool:
+    # No interval (too few sub-samples) counts as overlapping everything
+    return a is None or b is None or (a[0] <= b[1] and b[0] <= a[1])
+
+
+class SampleEstimator:
+    """
+    Approximate answers from a uniform sample of transactions.
+    Every SELECT item must be a group column or an expression over COUNT/SUM/AVG
+    with a single scale degree (COUNT(*) -> 1, rates and averages -> 0); the
+    sample value is multiplied by (N/n)**degree. 95% confidence intervals come
+    from batch means over SAMPLE_BATCHES disjoint sub-samples. Queries outside
+    that shape (MIN/MAX, DISTINCT, HAVING, several scans) return None.
+    Rankings by an estimated column are checked against the intervals: a LIMIT
+    whose kept and dropped groups overlap is not estimated (the sample cannot
+    tell which groups are top), and overlapping neighbours among the rows
+    returned are reported in estimates["ranking"].
+    """
+
+    def __init__(self, sample_relation: str = f"store.{SAMPLE_TABLE}"):
+        self.sample_relation = sample_relation
+        self._batch_sizes: Dict[str, Dict[int, int]] = {}
+
+    def plan(self, sql: str) -> Optional[Dict[str, Any]]:
+        """Scale degree per output column (None for group columns), or None if not estimable."""
+        spans = token_spans(sql)
+        lowered = [(k, t.lower() if k == "id" else t) for k, t, _, _ in spans]
+        refs = [i for i, tok in enumerate(lowered) if tok == ("id", "transactions")]
+        if len(refs) != 1 or refs[0] == 0 or lowered[refs[0] - 1] != ("id", "from"):
+            return None
+        if any(k == "id" and t in _REJECT_KEYWORDS for k, t in lowered):
+            return None
+        if not lowered or lowered[0] != ("id", "select"):
+            return None
+
+        items: List[List[Tuple[str, str]]] = [[]]
+        depth = 0
+        limit_at = None
+        order_at = limit_index = None
+        for i, (kind, text) in enumerate(lowered[1:], start=1):
+            if text == "(":
+                depth += 1
+            elif text == ")":
+                depth -= 1
+            if depth == 0 and (kind, text) == ("id", "limit"):
+                limit_at = spans[i][2]
+                limit_index = i
+            if depth == 0 and (kind, text) == ("id", "order") and i + 1 < len(lowered) and lowered[i + 1] == ("id", "by"):
+                order_at = i + 2
+            if items is not None and depth == 0 and (kind, text) == ("id", "from"):
+                select_items, items = items, None
+                continue
+            if items is not None:
+                if depth == 0 and text == ",":
+                    items.append([])
+                else:
+                    items[-1].append(spans[i][:2])
+        if items is not None:
+            return None
+
+        degrees: List[Optional[int]] = []
+        exprs = []
+        for item in select_items:
+            expr = _strip_alias(item)
+            exprs.append(expr)
+            if expr == [("op", "*")]:
+                return None
+            parser = _Degree(expr)
+            degree = parser.parse()
+            if degree is None:
+                return None
+            degrees.append(degree if parser.has_aggregate else None)
+        if all(d is None for d in degrees):
+            return None  # row-level query — a sample cannot stand in for the rows
+        order = None
+        if order_at is not None:
+            order_by = [spans[i][:2] for i in range(order_at, limit_index if limit_index is not None else len(spans))]
+            order = _order_column(order_by, select_items, exprs)
+            if order is None and limit_at is not None and any(
+                    k == "id" and t.lower() in (_EXTENSIVE | _INTENSIVE) for k, t in order_by):
+                return None  # a LIMIT ranked by an estimate the result does not show
+        return {"degrees": degrees, "table_ref": spans[refs[0]][2:], "limit_at": limit_at, "order": order}
+
+    def _over_sample(self, sql: str, plan: Dict[str, Any], batch: Optional[int] = None) -> str:
+        start, end = plan["table_ref"]
+        where = f" WHERE sample_batch = {batch}" if batch is not None else ""
+        relation = f"(SELECT {', '.join(COLUMN_NAMES)} FROM {self.sample_relation}{where}) AS transactions"
+        if batch is not None and plan["limit_at"] is not None:
+            sql = sql[:plan["limit_at"]]  # every group in every batch, so absent groups mean zero rows
+        return sql[:start] + relation + sql[end:]
+
+    def batch_sizes(self, cursor, data_version: Optional[str]) -> Dict[int, int]:
+        sizes = self._batch_sizes.get(data_version or "")
+        if sizes is None:
+            rows = cursor.execute(
+                f"SELECT sample_batch, COUNT(*) FROM {self.sample_relation} GROUP BY sample_batch"
+            ).fetchall()
+            sizes = {int(b): int(n) for b, n in rows}
+            self._batch_sizes = {data_version or "": sizes}
+        return sizes
+
+    def estimate(self, cursor, sql: str, plan: Dict[str, Any], population_rows: int,
+                 data_version: Optional[str]) -> Optional[Tuple[ResultSet, Dict[str, Any]]]:
+        sizes = self.batch_sizes(cursor, data_version)
+        sample_rows = sum(sizes.values())
+        degrees = plan["degrees"]
+
+        full = ResultSet(cursor.execute(self._over_sample(sql, plan)).fetch_arrow_table())
+        batch_sql = " UNION ALL ".join(
+            f"SELECT {b} AS __sample_batch, * FROM ({self._over_sample(sql, plan, b)}) AS __b{b}"
+            for b in sorted(sizes)
+        )
+        batches = ResultSet(cursor.execute(batch_sql).fetch_arrow_table())
+
+        names = full.column_names
+        columns = [full.arrow.column(i).to_pylist() for i in range(len(names))]
+        key_idx = [i for i, d in enumerate(degrees) if d is None]
+        measure_idx = [i for i, d in enumerate(degrees) if d is not None]
+
+        # Per group key: per measure, the scaled estimate of each batch
+        batch_cols = [batches.arrow.column(i).to_pylist() for i in range(batches.arrow.num_columns)]
+        per_key: Dict[tuple, Dict[int, Dict[int, float]]] = {}
+        for r in range(len(batches)):
+            b = batch_cols[0][r]
+            key = tuple(batch_cols[1 + i][r] for i in key_idx)
+            slot = per_key.setdefault(key, {i: {} for i in measure_idx})
+            factor = population_rows / sizes[b]
+            for i in measure_idx:
+                value = batch_cols[1 + i][r]
+                if value is not None:
+                    slot[i][b] = float(value) * factor ** degrees[i]
+
+        factor = population_rows / sample_rows
+
+        def interval(key: tuple, i: int, value) -> Optional[List[float]]:
+            point = float(value) * factor ** degrees[i]
+            estimates = dict(per_key.get(key, {}).get(i, {}))
+            if degrees[i] > 0:
+                # Extensive measures of a group absent from a batch are zero there
+                estimates.update({b: 0.0 for b in sizes if b not in estimates})
+            if len(estimates) < 2:
+                return None
+            half = _t_quantile(len(estimates) - 1) * statistics.stdev(estimates.values()) / math.sqrt(len(estimates))
+            low = point - half
+            if low < 0 <= min(estimates.values()):
+                low = 0.0  # counts and non-negative sums cannot go below zero
+            return [round(low, 4), round(point + half, 4)]
+
+        intervals: List[Dict[str, List[float]]] = []
+        for r in range(len(full)):
+            key = tuple(columns[i][r] for i in key_idx)
+            row_intervals = {}
+            for i in measure_idx:
+                if columns[i][r] is None:
+                    continue
+                bounds = interval(key, i, columns[i][r])
+                if bounds is not None:
+                    row_intervals[names[i]] = bounds
+            intervals.append(row_intervals)
+
+        ranking = None
+        order = plan.get("order")
+        if order is not None and key_idx and degrees[order[0]] is not None:
+            o, descending = order
+            kept = [tuple(columns[i][r] for i in key_idx) for r in range(len(full))]
+            kept_bounds = [None if columns[o][r] is None else interval(kept[r], o, columns[o][r])
+                           for r in range(len(full))]
+            if plan["limit_at"] is not None:
+                # Groups the LIMIT dropped: with overlapping intervals the sample cannot pick the top ones
+                rest = cursor.execute(self._over_sample(sql[:plan["limit_at"]], plan)).fetch_arrow_table()
+                rest_cols = [rest.column(i).to_pylist() for i in range(rest.num_columns)]
+                kept_set = set(kept)
+                for r in range(rest.num_rows):
+                    key = tuple(rest_cols[i][r] for i in key_idx)
+                    if key in kept_set or rest_cols[o][r] is None:
+                        continue
+                    dropped = interval(key, o, rest_cols[o][r])
+                    if any(_overlaps(dropped, bounds) for bounds in kept_bounds):
+                        logger.info(f"Approximate LIMIT cannot separate the top groups by {names[o]}; running exact")
+                        return None
+            overlapping = [[r, r + 1] for r in range(len(full) - 1)
+                           if _overlaps(kept_bounds[r], kept_bounds[r + 1])]
+            ranking = {
+                "column": names[o],
+                "order": "DESC" if descending else "ASC",
+                "uncertain": bool(overlapping),
+                "overlapping_rows": overlapping,
+            }
+
+        table = full.arrow
+        for i in measure_idx:
+            if degrees[i] == 0:
+                continue
+            scale = factor ** degrees[i]
+            field = table.schema.field(i)
+            scaled = [None if v is None else v * scale for v in columns[i]]
+            if pa.types.is_integer(field.type):
+                scaled = [None if v is None else int(round(v)) for v in scaled]
+            table = table.set_column(i, field.name, pa.array(scaled, type=field.type))
+
+        estimates = {
+            "method": f"{SAMPLE_PERCENT:g}% uniform sample, batch means over {len(sizes)} sub-samples",
+            "sample_rows": sample_rows,
+            "population_rows": population_rows,
+            "confidence": CONFIDENCE,
+            "intervals": intervals,
+        }
+        if ranking is not None:
+            estimates["ranking"] = ranking
+        return ResultSet(table), estimates
+
+
+# Appends insert the sampled rows of each batch
+ingest_manager.register_derived_table(SAMPLE_TABLE, build_sample_sql, appendable=True)
+
+sample_estimator = SampleEstimator()
@@ -0,0 +1,414 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import duckdb
+
+try:
+    from backend.core.database import db
+    from backend.core.catalog import catalog
+    from backend.core.cube import cube_router, _AGGREGATES
+    from backend.core.result_set import ResultSet
+    from backend.core.sql_rewrite import token_spans
+except ImportError:
+    from core.database import db
+    from core.catalog import catalog
+    from core.cube import cube_router, _AGGREGATES
+    from core.result_set import ResultSet
+    from core.sql_rewrite import token_spans
+
+logger = logging.getLogger(__name__)
+
+SHARED_SCAN_ENABLED = os.getenv("SHARED_SCAN_ENABLED", "true").lower() in ("1", "true", "yes")
+# How long a submitted query waits for its siblings' SQL before the batch is given up
+# and every member runs its own query
+SHARED_SCAN_WAIT_SECONDS = float(os.getenv("SHARED_SCAN_WAIT_SECONDS", "1.0"))
+
+_CLAUSES = ("from", "where", "group", "having", "order", "limit")
+_REJECT_KEYWORDS = {
+    "join", "distinct", "union", "intersect", "except", "with", "using", "qualify", "sample", "tablesample",
+    "having", "over", "filter", "window", "offset", "grouping", "rollup", "cube",
+}
+
+
+class _Query:
+    """One sub-query in the shape the planner can merge:
+    SELECT <group columns and aliased aggregates> FROM transactions [WHERE ...]
+    [GROUP BY col, ...] [ORDER BY <output name or position> ...] [LIMIT n]."""
+
+    def __init__(self, items: List[Tuple[str, Optional[str], List[Tuple[str, str, int, int]]]],
+                 where: Optional[str], group_by: List[str], order_by: Optional[str], limit: Optional[str]):
+        self.items = items          # (kind "dim" | "agg", alias, expression tokens)
+        self.where = where
+        self.group_by = group_by
+        self.order_by = order_by
+        self.limit = limit
+
+
+def _split_top_level(tokens: list, separator: str = ",") -> List[list]:
+    parts, depth, current = [], 0, []
+    for token in tokens:
+        if token[1] == "(":
+            depth += 1
+        elif token[1] == ")":
+            depth -= 1
+        if depth == 0 and token[1] == separator:
+            parts.append(current)
+            current = []
+        else:
+            current.append(token)
+    parts.append(current)
+    return parts
+
+
+def _text(sql: str, tokens: list) -> str:
+    return sql[tokens[0][2]:tokens[-1][3]] if tokens else ""
+
+
+def parse_query(sql: str) -> Optional[_Query]:
+    """The query's parts, or None when it is not a single-table aggregate the planner can merge."""
+    sql = sql.strip().rstrip(";")
+    tokens = token_spans(sql)
+    lowered = [(kind, text.lower() if kind == "id" else text) for kind, text, _, _ in tokens]
+    if not tokens or lowered[0] != ("id", "select"):
+        return None
+    if sum(1 for tok in lowered if tok == ("id", "select")) != 1 or ("op", ".") in lowered:
+        return None
+    if any(kind == "qid" or (kind == "id" and text in _REJECT_KEYWORDS) for kind, text in lowered):
+        return None
+
+    # Top-level clause boundaries
+    depth, clauses = 0, {}
+    for i, (kind, text) in enumerate(lowered):
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif depth == 0 and kind == "id" and text in _CLAUSES and text not in clauses:
+            if text in ("group", "order") and (i + 1 >= len(lowered) or lowered[i + 1] != ("id", "by")):
+                return None
+            clauses[text] = i
+    if "from" not in clauses or lowered[clauses["from"] + 1:clauses["from"] + 2] != [("id", "transactions")]:
+        return None
+    order = sorted(clauses.items(), key=lambda item: item[1])
+    if [name for name, _ in order] != [name for name in _CLAUSES if name in clauses]:
+        return None
+
+    def body(name: str) -> list:
+        if name not in clauses:
+            return []
+        start = clauses[name] + (2 if name in ("group", "order") else 1)
+        later = [pos for _, pos in order if pos > clauses[name]]
+        return tokens[start:later[0] if later else len(tokens)]
+
+    if len(body("from")) != 1:
+        return None
+    group_by = []
+    for part in _split_top_level(body("group")) if "group" in clauses else []:
+        if len(part) != 1 or part[0][0] != "id":
+            return None
+        group_by.append(part[0][1].lower())
+    # Group columns must be low-cardinality, so the merged row count has a known bound
+    if any(catalog.distinct_values(column) is None for column in group_by):
+        return None
+    limit = body("limit")
+    if limit and (len(limit) != 1 or limit[0][0] != "num"):
+        return None
+
+    items = []
+    for part in _split_top_level(tokens[1:clauses["from"]]):
+        if not part:
+            return None
+        if len(part) == 1 and part[0][0] == "id" and part[0][1].lower() in group_by:
+            items.append(("dim", part[0][1].lower(), part))
+            continue
+        if len(part) < 3 or part[-2][1].lower() != "as" or part[-1][0] != "id":
+            return None  # every aggregate needs an alias to be split back out
+        expression = part[:-2]
+        calls = [j for j, tok in enumerate(expression)
+                 if tok[0] == "id" and tok[1].lower() in _AGGREGATES and j + 1 < len(expression) and expression[j + 1][1] == "("]
+        if not calls:
+            return None
+        items.append(("agg", part[-1][1], expression))
+
+    names = {alias.lower() for _, alias, _ in items}
+    for part in _split_top_level(body("order")) if "order" in clauses else []:
+        if not part or not (part[0][0] == "num" or (part[0][0] == "id" and part[0][1].lower() in names)):
+            return None
+        if any(tok[0] != "id" or tok[1].lower() not in ("asc", "desc", "nulls", "first", "last") for tok in part[1:]):
+            return None
+
+    where = _text(sql, body("where")) or None
+    return _Query(items, where, group_by, _text(sql, body("order")) or None, limit[0][1] if limit else None)
+
+
+def _filtered(sql_expression: List[Tuple[str, str, int, int]], source: str, condition: Optional[str]) -> str:
+    """Expression text with FILTER (WHERE condition) after each aggregate call."""
+    if condition is None:
+        return _text(source, sql_expression)
+    out, depth_of_call, depth = [], [], 0
+    for j, (kind, text, start, end) in enumerate(sql_expression):
+        piece = source[start:end]
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            if depth_of_call and depth_of_call[-1] == depth:
+                depth_of_call.pop()
+                piece += f" FILTER (WHERE {condition})"
+            depth -= 1
+        if kind == "id" and text.lower() in _AGGREGATES and j + 1 < len(sql_expression) and sql_expression[j + 1][1] == "(":
+            depth_of_call.append(depth + 1)
+        out.append(piece)
+    return " ".join(out)
+
+
+class SharedScanPlan:
+    """
+    One scan for several sub-queries: GROUP BY GROUPING SETS over each query's
+    group columns, every aggregate under FILTER (WHERE <its query's condition>),
+    and per query a hidden count of its matching rows, so groups only present
+    for other queries can be dropped. split_sql[i] recovers query i's exact
+    result (columns, order, limit) from the merged rows.
+    """
+
+    def __init__(self, sqls: List[str], queries: List[_Query]):
+        dims: List[str] = []
+        for query in queries:
+            dims.extend(column for column in query.group_by if column not in dims)
+        grouping_sets: List[Tuple[str, ...]] = []
+        for query in queries:
+            key = tuple(column for column in dims if column in query.group_by)
+            if key not in grouping_sets:
+                grouping_sets.append(key)
+
+        select = [f"GROUPING({', '.join(dims)}) AS _grouping"] + dims if dims else []
+        self.split_sql: List[str] = []
+        default_limit = os.getenv('MAX_ROWS_RETURNED', '500')
+        for i, (sql, query) in enumerate(zip(sqls, queries)):
+            source = sql.strip().rstrip(";")
+            select.append(f"COUNT(*) FILTER (WHERE {query.where}) AS _n{i}" if query.where else f"COUNT(*) AS _n{i}")
+            columns = []
+            for k, (kind, alias, expression) in enumerate(query.items):
+                if kind == "dim":
+                    columns.append(alias)
+                else:
+                    select.append(f"{_filtered(expression, source, query.where)} AS _q{i}_{k}")
+                    columns.append(f"_q{i}_{k} AS {alias}")
+            conditions = []
+            if dims:
+                rolled_up = sum(1 << (len(dims) - 1 - d) for d, column in enumerate(dims) if column not in query.group_by)
+                conditions.append(f"_grouping = {rolled_up}")
+            if query.group_by:
+                conditions.append(f"_n{i} > 0")
+            split = f"SELECT {', '.join(columns)} FROM merged"
+            if conditions:
+                split += f" WHERE {' AND '.join(conditions)}"
+            if query.order_by:
+                split += f" ORDER BY {query.order_by}"
+            split += f" LIMIT {query.limit or default_limit}"
+            self.split_sql.append(split)
+
+        where = ""
+        if all(query.where for query in queries):
+            where = " WHERE " + " OR ".join(f"({query.where})" for query in queries)
+        # Upper bound on merged rows: every group of every grouping set (plus NULL groups)
+        bound = 0
+        for key in grouping_sets:
+            groups = 1
+            for column in key:
+                groups *= len(catalog.distinct_values(column)) + 1
+            bound += groups
+        self.sql = f"SELECT {', '.join(select)} FROM transactions{where}"
+        if dims:
+            self.sql += f" GROUP BY GROUPING SETS ({', '.join('(' + ', '.join(key) + ')' for key in grouping_sets)})"
+        self.sql += f" LIMIT {bound}"
+
+    def split(self, merged: ResultSet) -> List[ResultSet]:
+        """Each sub-query's result, computed from the merged rows in memory."""
+        conn = duckdb.connect()
+        try:
+            conn.register("merged", merged.arrow)
+            return [ResultSet(conn.execute(sql).arrow()) for sql in self.split_sql]
+        finally:
+            conn.close()
+
+
+def plan_shared_scan(sqls: List[str]) -> Tuple[Optional[SharedScanPlan], List[int]]:
+    """(plan, indexes of the sqls it covers) — None when fewer than two of them can share a scan.
+    Queries the cube can answer are left out: they read no base rows anyway."""
+    members, queries = [], []
+    for i, sql in enumerate(sqls):
+        query = parse_query(sql)
+        if query is None or cube_router.rewrite(sql) is not None:
+            continue
+        members.append(i)
+        queries.append(query)
+    if len(members) < 2:
+        return None, []
+    return SharedScanPlan([sqls[i] for i in members], queries), members
+
+
+class ScanBatch:
+    """
+    Rendezvous for the first query of sibling branches (independent compound
+    sub-questions). Each member either submits its validated SQL or leaves
+    (answered without a query); once none are outstanding, one submitting
+    thread runs the shared scan and the others receive their slice. Queries that
+    could not be merged, or a merged query that failed, run on their own. So does
+    every member once a submitted query has waited wait_s for slower siblings:
+    one slow branch never holds up the others by more than that.
+    """
+
+    def __init__(self, size: int, wait_s: float = SHARED_SCAN_WAIT_SECONDS):
+        self.wait_s = wait_s
+        self._cond = threading.Condition()
+        self._outstanding = size
+        self._sql: Dict[int, str] = {}
+        self._results: Optional[Dict[int, Optional[Dict[str, Any]]]] = None
+        self._running = False
+        self._next_member = 0
+
+    def join(self) -> "_Member":
+        with self._cond:
+            member = _Member(self, self._next_member)
+            self._next_member += 1
+            return member
+
+    def _leave(self) -> None:
+        with self._cond:
+            self._outstanding -= 1
+            self._cond.notify_all()
+
+    def _submit(self, member_id: int, sql: str) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + self.wait_s
+        with self._cond:
+            self._sql[member_id] = sql
+            self._outstanding -= 1
+            self._cond.notify_all()
+            while self._results is None:
+                if self._outstanding == 0 and not self._running:
+                    self._running = True
+                    break
+                if self._running:
+                    # The shared scan is bounded by the query timeout
+                    self._cond.wait()
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.info(f"Shared scan gave up on {self._outstanding} slow sibling(s) after {self.wait_s:g}s")
+                    shared_scan_stats.record_expired()
+                    self._results = {}
+                    self._cond.notify_all()
+                    return None
+                self._cond.wait(remaining)
+            else:
+                return self._results.get(member_id)
+        results: Dict[int, Optional[Dict[str, Any]]] = {}
+        try:
+            results = self._run()
+        finally:
+            with self._cond:
+                self._results = results
+                self._cond.notify_all()
+        return results.get(member_id)
+
+    def _run(self) -> Dict[int, Optional[Dict[str, Any]]]:
+        member_ids = list(self._sql)
+        plan, covered = plan_shared_scan([self._sql[m] for m in member_ids])
+        if plan is None:
+            return {}
+        start = time.time()
+        merged = db.execute_query(plan.sql, columnar=True)
+        if not merged["success"]:
+            if merged.get("error_type") in ("timeout", "cancelled"):
+                return {member_ids[i]: merged for i in covered}
+            logger.warning(f"Shared scan failed, running queries separately: {merged['error']}")
+            return {}
+        split = plan.split(merged["data"])
+        elapsed = (time.time() - start) * 1000
+        shared_scan_stats.record(len(covered))
+        logger.info(f"Shared scan answered {len(covered)} sub-queries in {elapsed:.1f}ms")
+        return {
+            member_ids[i]: {
+                "success": True,
+                "data": result,
+                "row_count": len(result),
+                "error": None,
+                "execution_time_ms": elapsed,
+                "cache_hit": merged.get("cache_hit", False),
+                "cube_routed": False,
+                "approximate": False,
+                "shared_scan": True,
+            }
+            for i, result in zip(covered, split)
+        }
+
+
+class _Member:
+    def __init__(self, batch: ScanBatch, member_id: int):
+        self.batch = batch
+        self.member_id = member_id
+        self.submitted = False
+
+    def execute(self, sql: str) -> Dict[str, Any]:
+        """Result of the member's query — from the shared scan when it could be merged."""
+        if not self.submitted:
+            self.submitted = True
+            result = self.batch._submit(self.member_id, sql)
+            if result is not None:
+                return result
+        return db.execute_query(sql, columnar=True)
+
+    def leave(self) -> None:
+        if not self.submitted:
+            self.submitted = True
+            self.batch._leave()
+
+
+class _SharedScanStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.scans = 0
+        self.queries = 0
+        self.expired = 0
+
+    def record(self, queries: int) -> None:
+        with self._lock:
+            self.scans += 1
+            self.queries += queries
+
+    def record_expired(self) -> None:
+        with self._lock:
+            self.expired += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"enabled": SHARED_SCAN_ENABLED, "shared_scans": self.scans, "queries_merged": self.queries,
+                    "expired_batches": self.expired}
+
+
+shared_scan_stats = _SharedScanStats()
+
+_current: ContextVar[Optional[_Member]] = ContextVar("scan_batch_member", default=None)
+
+
+def current_scan_member() -> Optional[_Member]:
+    return _current.get()
+
+
+@contextmanager
+def scan_scope(batch: Optional[ScanBatch]) -> Iterator[Optional[_Member]]:
+    """Run the block as a member of batch (None: outside any batch). A member
+    that leaves the block without running a query stops holding the batch up."""
+    member = batch.join() if batch is not None else None
+    token = _current.set(member)
+    try:
+        yield member
+    finally:
+        _current.reset(token)
+        if member is not None:
+            member.leave()
@@ -0,0 +1,720 @@
+import os
+import math
+import time
+import struct
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+try:
+    from backend.core.sql_rewrite import token_spans
+    from backend.core.ingest import ingest_manager, TRANSACTION_COLUMNS
+    from backend.core.cube import CUBE_DIMENSIONS
+    from backend.core.result_set import ResultSet
+    from backend.core.sampling import _first_argument, _strip_alias
+except ImportError:
+    from core.sql_rewrite import token_spans
+    from core.ingest import ingest_manager, TRANSACTION_COLUMNS
+    from core.cube import CUBE_DIMENSIONS
+    from core.result_set import ResultSet
+    from core.sampling import _first_argument, _strip_alias
+
+logger = logging.getLogger(__name__)
+
+SKETCH_TABLE = "transactions_sketches"
+
+# One sketch per value of each of these dimensions, plus one over all rows (ALL_ROWS)
+SKETCH_DIMENSIONS = CUBE_DIMENSIONS + ["transaction_status", "receiver_bank"]
+ALL_ROWS = "*"
+# Columns with a t-digest (quantiles) and with a HyperLogLog (distinct counts)
+QUANTILE_TARGETS = ["amount_inr"]
+DISTINCT_TARGETS = ["transaction_id", "sender_bank", "receiver_bank", "sender_state", "merchant_category"]
+
+# HLL registers = 2**precision (relative standard error 1.04 / sqrt(2**precision)).
+# Kept within 11..16 so the rank bits fit a double exactly when computed in SQL.
+HLL_PRECISION = min(16, max(11, int(os.getenv("SKETCH_HLL_PRECISION", "12"))))
+# t-digest compression: about compression/2 centroids, finest at the tails
+TDIGEST_COMPRESSION = float(os.getenv("SKETCH_TDIGEST_COMPRESSION", "200"))
+
+_COLUMN_TYPES = {alias: col_type for _, alias, col_type in TRANSACTION_COLUMNS}
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter over DuckDB's 64-bit hash; merge = register-wise max."""
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: Optional[np.ndarray] = None):
+        self.precision = precision
+        self.registers = registers if registers is not None else np.zeros(1 << precision, dtype=np.uint8)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        return HyperLogLog(self.precision, np.maximum(self.registers, other.registers))
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int32))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * math.log(m / zeros)))  # linear counting for small cardinalities
+        return int(round(raw))
+
+    def to_bytes(self) -> bytes:
+        return bytes([self.precision]) + self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        return cls(data[0], np.frombuffer(data, dtype=np.uint8, offset=1).copy())
+
+
+class TDigest:
+    """
+    Merging t-digest: weighted centroids sorted by mean, grouped under the k1 scale
+    function so centroids are small near q=0 and q=1 and large around the median.
+    Merging two digests concatenates their centroids and compresses again.
+    """
+
+    _HEADER = struct.Struct("<dddI")
+
+    def __init__(self, means: np.ndarray, weights: np.ndarray, minimum: float, maximum: float,
+                 compression: float = TDIGEST_COMPRESSION):
+        self.means = means
+        self.weights = weights
+        self.minimum = minimum
+        self.maximum = maximum
+        self.compression = compression
+
+    @classmethod
+    def from_sorted(cls, values: np.ndarray, weights: np.ndarray,
+                    compression: float = TDIGEST_COMPRESSION) -> "TDigest":
+        """Digest of (value, weight) points already sorted by value."""
+        values = np.asarray(values, dtype=np.float64)
+        weights = np.asarray(weights, dtype=np.float64)
+        means, merged = cls._compress(values, weights, compression)
+        return cls(means, merged, float(values[0]), float(values[-1]), compression)
+
+    @staticmethod
+    def _compress(means: np.ndarray, weights: np.ndarray, compression: float) -> Tuple[np.ndarray, np.ndarray]:
+        total = weights.sum()
+        q_left = (np.cumsum(weights) - weights) / total
+        k = np.floor(compression / (2 * math.pi) * np.arcsin(2 * q_left - 1))
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+        merged = np.add.reduceat(weights, starts)
+        return np.add.reduceat(means * weights, starts) / merged, merged
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        means = np.concatenate([self.means, other.means])
+        weights = np.concatenate([self.weights, other.weights])
+        order = np.argsort(means, kind="stable")
+        means, weights = self._compress(means[order], weights[order], self.compression)
+        return TDigest(means, weights, min(self.minimum, other.minimum),
+                       max(self.maximum, other.maximum), self.compression)
+
+    @property
+    def count(self) -> int:
+        return int(round(self.weights.sum()))
+
+    def quantile(self, q: float) -> float:
+        q = min(1.0, max(0.0, q))
+        total = self.weights.sum()
+        target = q * total
+        centers = np.cumsum(self.weights) - self.weights / 2
+        if target <= centers[0]:
+            if centers[0] == 0:
+                return self.minimum
+            return self.minimum + (self.means[0] - self.minimum) * target / centers[0]
+        if target >= centers[-1]:
+            tail = total - centers[-1]
+            if tail == 0:
+                return self.maximum
+            return self.means[-1] + (self.maximum - self.means[-1]) * (target - centers[-1]) / tail
+        return float(np.interp(target, centers, self.means))
+
+    def quantile_interval(self, q: float) -> Tuple[float, float]:
+        """Values at q +/- half the rank span of the centroid holding q."""
+        position = np.searchsorted(np.cumsum(self.weights), q * self.weights.sum())
+        half_span = self.weights[min(position, len(self.weights) - 1)] / self.weights.sum() / 2
+        return self.quantile(q - half_span), self.quantile(q + half_span)
+
+    def to_bytes(self) -> bytes:
+        header = self._HEADER.pack(self.compression, self.minimum, self.maximum, len(self.means))
+        return header + self.means.astype("<f8").tobytes() + self.weights.astype("<f8").tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TDigest":
+        compression, minimum, maximum, n = cls._HEADER.unpack_from(data)
+        offset = cls._HEADER.size
+        means = np.frombuffer(data, dtype="<f8", count=n, offset=offset).copy()
+        weights = np.frombuffer(data, dtype="<f8", count=n, offset=offset + 8 * n).copy()
+        return cls(means, weights, minimum, maximum, compression)
+
+
+SketchKey = Tuple[str, Optional[str], str]  # (dimension, value as text, target)
+
+
+def _grouped_sql(relation: str, keys: str, aggregates: str) -> str:
+    """One scan grouping by every sketch dimension separately (and by nothing), with
+    the dimension's value as text; gid tells the dimensions apart."""
+    dims = ", ".join(SKETCH_DIMENSIONS)
+    casts = ", ".join(f"CAST({d} AS VARCHAR)" for d in SKETCH_DIMENSIONS)
+    grouping_sets = ", ".join([f"({keys})"] + [f"({d}, {keys})" for d in SKETCH_DIMENSIONS])
+    return f"""
+        SELECT GROUPING({dims}) AS gid, COALESCE({casts}) AS value, {keys}, {aggregates}
+        FROM {relation}
+        GROUP BY GROUPING SETS ({grouping_sets})
+        ORDER BY gid, value NULLS LAST, {keys}
+    """
+
+
+def _dimension_by_gid() -> Dict[int, str]:
+    n = len(SKETCH_DIMENSIONS)
+    everything = (1 << n) - 1
+    mapping = {everything: ALL_ROWS}
+    for i, d in enumerate(SKETCH_DIMENSIONS):
+        mapping[everything ^ (1 << (n - 1 - i))] = d
+    return mapping
+
+
+def _segments(gid: np.ndarray, value: List[Optional[str]]) -> Iterable[Tuple[int, Optional[str], int, int]]:
+    """(gid, value, start, end) runs of a result ordered by gid, value."""
+    start = 0
+    for i in range(1, len(gid) + 1):
+        if i == len(gid) or gid[i] != gid[start] or value[i] != value[start]:
+            yield int(gid[start]), value[start], start, i
+            start = i
+
+
+def compute_sketches(conn, source: str) -> Dict[SketchKey, Any]:
+    """t-digests and HyperLogLogs of source for every (dimension, value, target)."""
+    dimensions = _dimension_by_gid()
+    dims = ", ".join(SKETCH_DIMENSIONS)
+    sketches: Dict[SketchKey, Any] = {}
+
+    for target in QUANTILE_TARGETS:
+        # Integer amounts repeat a lot — (value, count) pairs are much smaller than rows
+        relation = f"(SELECT {dims}, {target} AS v FROM {source} WHERE {target} IS NOT NULL)"
+        table = conn.execute(_grouped_sql(relation, "v", "COUNT(*) AS w")).fetch_arrow_table()
+        gid = table.column("gid").to_numpy()
+        value = table.column("value").to_pylist()
+        v = table.column("v").to_numpy().astype(np.float64)
+        w = table.column("w").to_numpy().astype(np.float64)
+        for g, val, start, end in _segments(gid, value):
+            key = (dimensions[g], ALL_ROWS if dimensions[g] == ALL_ROWS else val, target)
+            sketches[key] = TDigest.from_sorted(v[start:end], w[start:end])
+
+    # Register index = top `precision` hash bits, rank = leading zeros of the rest + 1
+    rest_bits = 64 - HLL_PRECISION
+    mask = (1 << rest_bits) - 1
+    for target in DISTINCT_TARGETS:
+        hashed = f"(SELECT {dims}, hash(CAST({target} AS VARCHAR)) AS h FROM {source} WHERE {target} IS NOT NULL)"
+        ranked = f"""(SELECT {dims}, CAST(h >> {rest_bits} AS INTEGER) AS idx,
+            CASE WHEN h & {mask} = 0 THEN {rest_bits + 1}
+                 ELSE {rest_bits} - CAST(floor(log2(h & {mask})) AS INTEGER) END AS rho
+            FROM {hashed})"""
+        table = conn.execute(_grouped_sql(ranked, "idx", "MAX(rho) AS rho")).fetch_arrow_table()
+        gid = table.column("gid").to_numpy()
+        value = table.column("value").to_pylist()
+        idx = table.column("idx").to_numpy()
+        rho = table.column("rho").to_numpy().astype(np.uint8)
+        for g, val, start, end in _segments(gid, value):
+            sketch = HyperLogLog()
+            sketch.registers[idx[start:end]] = rho[start:end]
+            sketches[(dimensions[g], ALL_ROWS if dimensions[g] == ALL_ROWS else val, target)] = sketch
+    return sketches
+
+
+def _encode(sketch: Any) -> Tuple[str, bytes]:
+    return ("tdigest", sketch.to_bytes()) if isinstance(sketch, TDigest) else ("hll", sketch.to_bytes())
+
+
+def _decode(kind: str, data: bytes) -> Any:
+    return TDigest.from_bytes(data) if kind == "tdigest" else HyperLogLog.from_bytes(data)
+
+
+def _write_sketches(conn, sketches: Dict[SketchKey, Any]) -> None:
+    rows = {"dimension": [], "value": [], "target": [], "kind": [], "sketch": []}
+    for (dimension, value, target), sketch in sketches.items():
+        kind, data = _encode(sketch)
+        for column, item in zip(rows, (dimension, value, target, kind, data)):
+            rows[column].append(item)
+    conn.register("sketch_rows", pa.table({
+        "dimension": pa.array(rows["dimension"], pa.string()),
+        "value": pa.array(rows["value"], pa.string()),
+        "target": pa.array(rows["target"], pa.string()),
+        "kind": pa.array(rows["kind"], pa.string()),
+        "sketch": pa.array(rows["sketch"], pa.binary()),
+    }))
+    try:
+        conn.execute(f"INSERT INTO {SKETCH_TABLE} SELECT * FROM sketch_rows")
+    finally:
+        conn.unregister("sketch_rows")
+
+
+def build_sketch_table(conn, source: str) -> None:
+    conn.execute(
+        f"CREATE OR REPLACE TABLE {SKETCH_TABLE} "
+        "(dimension VARCHAR, value VARCHAR, target VARCHAR, kind VARCHAR, sketch BLOB)"
+    )
+    _write_sketches(conn, compute_sketches(conn, source))
+
+
+def merge_sketch_table(conn, delta_source: str) -> None:
+    """Fold the sketches of an appended batch into the stored ones. The table is a few
+    MB at most, so it is rewritten whole with the merged sketches."""
+    start = time.time()
+    merged = read_sketches(conn, SKETCH_TABLE)
+    for key, sketch in compute_sketches(conn, delta_source).items():
+        merged[key] = merged[key].merge(sketch) if key in merged else sketch
+    conn.execute(f"DELETE FROM {SKETCH_TABLE}")
+    _write_sketches(conn, merged)
+    logger.info(f"Merged batch sketches into '{SKETCH_TABLE}' in {time.time() - start:.2f}s")
+
+
+def read_sketches(conn, relation: str) -> Dict[SketchKey, Any]:
+    rows = conn.execute(f"SELECT dimension, value, target, kind, sketch FROM {relation}").fetchall()
+    return {(dimension, value, target): _decode(kind, data) for dimension, value, target, kind, data in rows}
+
+
+# SQL aggregate -> (statistic, fixed quantile or None when it is the second argument)
+_QUANTILE_FUNCTIONS = {
+    "median": 0.5, "quantile": None, "quantile_cont": None, "quantile_disc": None, "approx_quantile": None,
+}
+_DISCRETE_QUANTILES = {"quantile_disc", "approx_quantile", "percentile_disc"}
+_REJECT_KEYWORDS = {
+    "join", "having", "union", "intersect", "except", "with", "qualify", "over", "sample",
+    "tablesample", "using", "or", "case", "filter",
+}
+
+
+class SketchIndex:
+    """
+    In-memory view of the ingest-time sketch table: a t-digest of amount_inr and
+    HyperLogLogs of the DISTINCT_TARGETS for every value of each SKETCH_DIMENSIONS
+    column and for all rows. Percentiles and distinct counts for one value, a set of
+    values (sketches merged) or every value of a dimension come back without
+    touching the transaction rows.
+    """
+
+    def __init__(self, sketch_relation: str = f"store.{SKETCH_TABLE}"):
+        self.sketch_relation = sketch_relation
+        self.data_version: Optional[str] = None
+        self._sketches: Dict[SketchKey, Any] = {}
+        self._values: Dict[str, List[Optional[str]]] = {}
+
+    def load(self, connection, data_version: Optional[str]) -> None:
+        start = time.time()
+        try:
+            sketches = read_sketches(connection, self.sketch_relation)
+        except Exception as e:
+            logger.warning(f"Sketch index unavailable: {e}")
+            sketches = {}
+        values: Dict[str, List[Optional[str]]] = {}
+        for dimension, value, _ in sketches:
+            if dimension != ALL_ROWS and value not in values.setdefault(dimension, []):
+                values[dimension].append(value)
+        for dimension in values:
+            numeric = _COLUMN_TYPES.get(dimension) == "INTEGER"
+            values[dimension].sort(key=lambda v: (v is None, int(v) if numeric and v is not None else v))
+        self._sketches, self._values, self.data_version = sketches, values, data_version
+        logger.info(f"Loaded {len(sketches)} sketches in {(time.time() - start) * 1000:.1f}ms")
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._sketches)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "data_version": self.data_version,
+            "sketches": len(self._sketches),
+            "dimensions": {d: len(v) for d, v in self._values.items()},
+            "hll_precision": HLL_PRECISION,
+            "tdigest_compression": TDIGEST_COMPRESSION,
+        }
+
+    def _merged(self, target: str, dimension: str, values: Optional[Iterable[Optional[str]]]) -> Optional[Any]:
+        if dimension == ALL_ROWS:
+            return self._sketches.get((ALL_ROWS, ALL_ROWS, target))
+        merged = None
+        for value in (self._values.get(dimension, []) if values is None else values):
+            sketch = self._sketches.get((dimension, value, target))
+            if sketch is not None:
+                merged = sketch if merged is None else merged.merge(sketch)
+        return merged
+
+    def _groups(self, target: str, by: Optional[str], where: Optional[Dict[str, List[Any]]]) -> List[Tuple[Optional[str], Any]]:
+        """(group value, merged sketch) pairs; without `by` a single (None, sketch) pair.
+        where filters one dimension to a list of values (None = its non-NULL values)."""
+        where = {d: v for d, v in (where or {}).items()}
+        if len(where) > 1 or (by and where and by not in where):
+            raise ValueError("Sketches answer a filter and a grouping on one dimension only")
+        for dimension in [by] + list(where):
+            if dimension and dimension not in SKETCH_DIMENSIONS:
+                raise ValueError(f"No sketches by '{dimension}'")
+        allowed = None
+        if where:
+            dimension, wanted = next(iter(where.items()))
+            known = self._values.get(dimension, [])
+            allowed = [v for v in known if v is not None] if wanted is None \
+                else [v for v in known if v in {None if w is None else str(w) for w in wanted}]
+        if by:
+            values = self._values.get(by, []) if allowed is None else allowed
+            return [(v, self._sketches[(by, v, target)]) for v in values if (by, v, target) in self._sketches]
+        if allowed is None:
+            return [(None, self._merged(target, ALL_ROWS, None))]
+        return [(None, self._merged(target, next(iter(where)), allowed))]
+
+    def quantile(self, q: float, target: str = "amount_inr", by: Optional[str] = None,
+                 where: Optional[Dict[str, List[Any]]] = None):
+        """Estimated q-quantile of target; a {value: estimate} dict when grouped by a dimension."""
+        if target not in QUANTILE_TARGETS:
+            raise ValueError(f"No quantile sketch of '{target}'")
+        groups = {_typed_key(v, by): (None if s is None else s.quantile(q)) for v, s in self._groups(target, by, where)}
+        return groups if by else groups[None]
+
+    def distinct_count(self, target: str, by: Optional[str] = None,
+                       where: Optional[Dict[str, List[Any]]] = None):
+        """Estimated number of distinct non-NULL target values; a {value: estimate} dict when grouped."""
+        if target not in DISTINCT_TARGETS:
+            raise ValueError(f"No distinct-count sketch of '{target}'")
+        groups = {_typed_key(v, by): (0 if s is None else s.estimate()) for v, s in self._groups(target, by, where)}
+        return groups if by else groups[None]
+
+    def answer(self, sql: str, population_rows: int) -> Optional[Tuple[ResultSet, Dict[str, Any]]]:
+        """Answer a percentile / distinct-count query from the sketches, or None when it
+        has another shape. Supported: SELECT [dim,] <aggregates> FROM transactions
+        [WHERE predicates on one dimension] [GROUP BY dim] [ORDER BY ...] [LIMIT n],
+        with MEDIAN, QUANTILE[_CONT|_DISC], APPROX_QUANTILE, PERCENTILE_CONT/DISC ...
+        WITHIN GROUP, COUNT(DISTINCT x), APPROX_COUNT_DISTINCT, optionally in ROUND()."""
+        if not self._sketches:
+            return None
+        try:
+            plan = self._plan(sql)
+        except _NotSketchable:
+            return None
+        if plan is None:
+            return None
+
+        by, where, items, order, limit = plan
+        try:
+            group_sketches = {
+                target: dict(self._groups(target, by, where))
+                for target in {item["target"] for item in items if item["kind"] != "key"}
+            }
+        except ValueError:
+            return None
+        group_values = self._values.get(by, []) if by else [None]
+        if by and where:
+            group_values = [v for v in group_values if all(v in g for g in group_sketches.values())]
+
+        rows, intervals = [], []
+        for value in group_values:
+            row, row_intervals = [], {}
+            for item in items:
+                if item["kind"] == "key":
+                    row.append(value)
+                    continue
+                sketch = group_sketches[item["target"]].get(value)
+                if item["kind"] == "quantile":
+                    estimate = None if sketch is None else sketch.quantile(item["q"])
+                    bounds = None if sketch is None else sketch.quantile_interval(item["q"])
+                else:
+                    estimate = 0 if sketch is None else sketch.estimate()
+                    spread = 1.96 * (sketch.relative_error if sketch is not None else 0) * estimate
+                    bounds = (max(0.0, estimate - spread), estimate + spread)
+                if estimate is not None:
+                    estimate = _finish(estimate, item)
+                    row_intervals[item["name"]] = [round(b, 4) for b in bounds]
+                row.append(estimate)
+            rows.append(row)
+            intervals.append(row_intervals)
+
+        for position, descending in reversed(order):
+            rows_with = sorted(
+                zip(rows, intervals),
+                key=lambda r: (r[0][position] is None, r[0][position] if r[0][position] is not None else 0),
+                reverse=descending,
+            )
+            rows, intervals = [r for r, _ in rows_with], [i for _, i in rows_with]
+        if limit is not None:
+            rows, intervals = rows[:limit], intervals[:limit]
+
+        columns = {}
+        for i, item in enumerate(items):
+            columns[item["name"]] = pa.array(
+                [_typed_key(r[i], by) if item["kind"] == "key" else r[i] for r in rows], type=_arrow_type(item, by)
+            )
+        return ResultSet(pa.table(columns)), {
+            "method": f"sketch index (t-digest, HyperLogLog p={HLL_PRECISION}) built over all",
+            "sample_rows": population_rows,
+            "population_rows": population_rows,
+            "confidence": 0.95,
+            "intervals": intervals,
+        }
+
+    def _plan(self, sql: str):
+        sql = sql.strip().rstrip(";")
+        spans = token_spans(sql)
+        tokens = [(k, t) for k, t, _, _ in spans]
+        lowered = [(k, t.lower() if k == "id" else t) for k, t in tokens]
+        if not lowered or lowered[0] != ("id", "select"):
+            return None
+        if any(k == "id" and t in _REJECT_KEYWORDS for k, t in lowered) or ("op", ".") in lowered:
+            return None
+
+        # Split top-level clauses
+        clauses: Dict[str, List[Tuple[str, str, int, int]]] = {"select": []}
+        current = "select"
+        depth = 0
+        i = 1
+        while i < len(tokens):
+            kind, text = lowered[i]
+            if text == "(":
+                depth += 1
+            elif text == ")":
+                depth -= 1
+            if depth == 0 and kind == "id" and text in ("from", "where", "limit"):
+                current = text
+                if current in clauses:
+                    return None
+                clauses[current] = []
+            elif depth == 0 and kind == "id" and text in ("group", "order") \
+                    and i + 1 < len(tokens) and lowered[i + 1] == ("id", "by"):
+                current = text
+                if current in clauses:
+                    return None
+                clauses[current] = []
+                i += 1
+            else:
+                clauses[current].append(spans[i])
+            i += 1
+        if [t.lower() for _, t, _, _ in clauses.get("from", [])] != ["transactions"]:
+            return None
+
+        by = None
+        if "group" in clauses:
+            group = [(k, t) for k, t, _, _ in clauses["group"]]
+            if len(group) != 1 or group[0][0] != "id" or group[0][1].lower() not in SKETCH_DIMENSIONS:
+                return None
+            by = group[0][1].lower()
+
+        where = self._where([(k, t) for k, t, _, _ in clauses.get("where", [])])
+
+        items = []
+        for item_spans in _split_top_level(clauses["select"]):
+            item_tokens = [(k, t) for k, t, _, _ in item_spans]
+            expr = _strip_alias(item_tokens)
+            # Unaliased items are named by their text, as DuckDB does
+            name = item_tokens[-1][1] if len(expr) < len(item_tokens) else sql[item_spans[0][2]:item_spans[-1][3]]
+            if name.startswith('"'):
+                name = name[1:-1].replace('""', '"')
+            item = _aggregate(expr)
+            if item is None:
+                if len(expr) == 1 and expr[0][0] == "id" and by and expr[0][1].lower() == by:
+                    item = {"kind": "key"}
+                else:
+                    return None
+            item.update(name=name, tokens=[(k, t.lower()) for k, t in expr])
+            items.append(item)
+        if not any(item["kind"] != "key" for item in items):
+            return None
+
+        order = []
+        for part in _split_top_level(clauses.get("order", [])):
+            part = [(k, t) for k, t, _, _ in part]
+            descending = False
+            if part and part[-1][1].lower() in ("asc", "desc"):
+                descending = part[-1][1].lower() == "desc"
+                part = part[:-1]
+            position = None
+            if len(part) == 1 and part[0][0] == "num" and part[0][1].isdigit():
+                position = int(part[0][1]) - 1
+            else:
+                lowered_part = [(k, t.lower()) for k, t in part]
+                for j, item in enumerate(items):
+                    if lowered_part == item["tokens"] or (len(part) == 1 and part[0][1].lower() == item["name"].lower()):
+                        position = j
+                        break
+            if position is None or not 0 <= position < len(items):
+                return None
+            order.append((position, descending))
+
+        limit = None
+        if "limit" in clauses:
+            if len(clauses["limit"]) != 1 or not clauses["limit"][0][1].isdigit():
+                return None
+            limit = int(clauses["limit"][0][1])
+        return by, where, items, order, limit
+
+    def _where(self, tokens: Optional[List[Tuple[str, str]]]) -> Optional[Dict[str, Optional[List[str]]]]:
+        """Predicates on a single dimension joined by AND -> {dimension: values or None}."""
+        if not tokens:
+            return None
+        dimension = None
+        allowed: Optional[set] = None
+        for predicate in _split_on(tokens, "and"):
+            if not predicate or predicate[0][0] != "id" or predicate[0][1].lower() not in SKETCH_DIMENSIONS:
+                raise _NotSketchable()
+            column = predicate[0][1].lower()
+            if dimension not in (None, column):
+                raise _NotSketchable()
+            dimension = column
+            rest = [(k, t.lower() if k == "id" else t) for k, t in predicate[1:]]
+            if rest == [("id", "is"), ("id", "not"), ("id", "null")]:
+                continue
+            if len(rest) == 2 and rest[0][1] == "=":
+                literals = [rest[1]]
+            elif len(rest) >= 3 and rest[0] == ("id", "in") and rest[1][1] == "(" and rest[-1][1] == ")":
+                literals = [t for t in rest[2:-1] if t[1] != ","]
+                if len(literals) * 2 - 1 != len(rest) - 3:
+                    raise _NotSketchable()
+            else:
+                raise _NotSketchable()
+            values = set()
+            for kind, text in literals:
+                if kind == "str":
+                    values.add(text[1:-1].replace("''", "'"))
+                elif kind == "num":
+                    values.add(text)
+                else:
+                    raise _NotSketchable()
+            allowed = values if allowed is None else allowed & values
+        return {dimension: None if allowed is None else sorted(allowed)}
+
+
+class _NotSketchable(Exception):
+    pass
+
+
+def _split_on(tokens: List[tuple], separator: str) -> List[List[tuple]]:
+    """Split (kind, text, ...) tokens on a top-level separator token."""
+    parts: List[List[tuple]] = [[]]
+    depth = 0
+    for token in tokens:
+        kind, text = token[0], token[1]
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        if depth == 0 and text.lower() == separator and (kind == "id" or separator == ","):
+            parts.append([])
+        else:
+            parts[-1].append(token)
+    return parts
+
+
+def _split_top_level(tokens: List[tuple]) -> List[List[tuple]]:
+    return [part for part in _split_on(tokens, ",") if part] if tokens else []
+
+
+def _aggregate(expr: List[Tuple[str, str]]) -> Optional[Dict[str, Any]]:
+    """Recognize a sketchable aggregate (optionally inside ROUND(x[, digits]))."""
+    lowered = [(k, t.lower() if k == "id" else t) for k, t in expr]
+    digits = None
+    if len(lowered) > 3 and lowered[0] == ("id", "round") and lowered[1][1] == "(" and lowered[-1][1] == ")":
+        inner = lowered[2:-1]
+        first = _first_argument(inner, stop_at_as=False)
+        rest = inner[len(first):]
+        if rest:
+            if len(rest) != 2 or rest[1][0] != "num" or not rest[1][1].isdigit():
+                return None
+            digits = int(rest[1][1])
+        else:
+            digits = 0
+        item = _aggregate(first)
+        if item is None:
+            return None
+        item["digits"] = digits
+        return item
+
+    if len(lowered) < 4 or lowered[0][0] != "id" or lowered[1][1] != "(":
+        return None
+    name = lowered[0][1]
+    close = _matching_paren(lowered, 1)
+    args = lowered[2:close]
+    trailing = lowered[close + 1:]
+
+    if name in ("percentile_cont", "percentile_disc"):
+        # PERCENTILE_CONT(q) WITHIN GROUP (ORDER BY target)
+        shape = [t for _, t in trailing]
+        if len(args) != 1 or args[0][0] != "num" or shape[:5] != ["within", "group", "(", "order", "by"] \
+                or len(trailing) != 7 or shape[6] != ")" or trailing[5][0] != "id":
+            return None
+        target, q = trailing[5][1], float(args[0][1])
+        discrete = name == "percentile_disc"
+    elif name in _QUANTILE_FUNCTIONS and not trailing:
+        fixed = _QUANTILE_FUNCTIONS[name]
+        if fixed is not None:
+            if len(args) != 1:
+                return None
+            q = fixed
+        else:
+            if len(args) != 3 or args[1][1] != "," or args[2][0] != "num":
+                return None
+            q = float(args[2][1])
+        if args[0][0] != "id":
+            return None
+        target = args[0][1]
+        discrete = name in _DISCRETE_QUANTILES
+    elif name in ("count", "approx_count_distinct") and not trailing:
+        if name == "count":
+            if len(args) != 2 or args[0] != ("id", "distinct"):
+                return None
+            args = args[1:]
+        if len(args) != 1 or args[0][0] != "id" or args[0][1] not in DISTINCT_TARGETS:
+            return None
+        return {"kind": "distinct", "target": args[0][1], "digits": None}
+    else:
+        return None
+
+    if target not in QUANTILE_TARGETS or not 0 <= q <= 1:
+        return None
+    return {"kind": "quantile", "target": target, "q": q, "discrete": discrete, "digits": None}
+
+
+def _matching_paren(tokens: List[Tuple[str, str]], open_at: int) -> int:
+    depth = 0
+    for i in range(open_at, len(tokens)):
+        if tokens[i][1] == "(":
+            depth += 1
+        elif tokens[i][1] == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    raise _NotSketchable()
+
+
+def _finish(estimate: float, item: Dict[str, Any]):
+    if item["kind"] == "distinct":
+        return int(estimate)
+    if item.get("discrete"):
+        return int(round(estimate))
+    if item["digits"] is not None:
+        return round(estimate, item["digits"])
+    return float(estimate)
+
+
+def _arrow_type(item: Dict[str, Any], by: Optional[str]) -> pa.DataType:
+    if item["kind"] == "key":
+        return pa.int32() if _COLUMN_TYPES.get(by) == "INTEGER" else pa.string()
+    if item["kind"] == "distinct" or item.get("discrete"):
+        return pa.int64()
+    return pa.float64()
+
+
+def _typed_key(value: Optional[str], by: Optional[str]):
+    if value is not None and _COLUMN_TYPES.get(by) == "INTEGER":
+        return int(value)
+    return value
+
+
+# Built at ingest; appends merge each batch's sketches into the stored ones
+ingest_manager.register_derived_builder(SKETCH_TABLE, build_sketch_table, merge_sketch_table)
+
+sketch_index = SketchIndex()
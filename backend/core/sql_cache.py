@@ -0,0 +1,257 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import datetime
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from backend.core.catalog import catalog
+    from backend.core.persistence import DB_PATH
+except ImportError:
+    from core.catalog import catalog
+    from core.persistence import DB_PATH
+
+logger = logging.getLogger(__name__)
+
+SQL_CACHE_ENABLED = os.getenv("SQL_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "1000"))
+
+# Fields of the SQL-generation response that a hit hands back
+CACHED_FIELDS = ["sql", "query_intent", "entities_extracted", "requires_chart", "suggested_chart_type"]
+
+# Words that never change the SQL a question needs. Negations, comparatives,
+# "by"/"per" and pronouns stay: they do.
+STOPWORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "at", "to", "from", "with",
+    "is", "are", "was", "were", "be", "been", "do", "does", "did",
+    "i", "me", "my", "we", "us", "our", "you", "your",
+    "can", "could", "would", "will", "please", "kindly",
+    "what", "whats", "which", "tell", "show", "give", "get", "find", "display", "list",
+}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def normalize_question(question: str, value_phrases: Dict[str, str], max_phrase_words: int = 1) -> str:
+    """Lowercased words without punctuation or stopwords; phrases naming a dataset
+    value (matched spaced or run together, so "wi-fi" finds "WiFi") become that
+    value's recorded spelling."""
+    words = _words(question)
+    out = []
+    i = 0
+    while i < len(words):
+        for n in range(min(max_phrase_words, len(words) - i), 0, -1):
+            span = words[i:i + n]
+            value = value_phrases.get(" ".join(span)) or value_phrases.get("".join(span))
+            if value is not None:
+                out.append(value)
+                i += n
+                break
+        else:
+            if words[i] not in STOPWORDS:
+                out.append(words[i])
+            i += 1
+    return " ".join(out)
+
+
+class QuestionSQLCache:
+    """
+    Generated SQL keyed by normalized question + injected entity context, so a
+    repeated question skips the SQL-generation model call. LRU in memory,
+    persisted to SQLite (sql_cache table next to sessions and turns) and
+    reloaded on first use after a restart. Keys include a fingerprint of the
+    table schema; entries made for another schema are dropped.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, max_entries: int = SQL_CACHE_MAX_ENTRIES,
+                 enabled: bool = SQL_CACHE_ENABLED):
+        self.db_path = db_path
+        self.max_entries = max(1, max_entries)
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprint: Optional[str] = None
+        self._data_version: Optional[str] = None
+        self._value_phrases: Dict[str, str] = {}
+        self._max_phrase_words = 1
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get_conn(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sql_cache (
+                cache_key TEXT PRIMARY KEY,
+                schema_fingerprint TEXT NOT NULL,
+                normalized_question TEXT NOT NULL,
+                context TEXT NOT NULL,
+                response TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                last_used_at TEXT NOT NULL
+            )
+        """)
+        return conn
+
+    def _refresh(self) -> str:
+        """Current schema fingerprint. On a new data version, rebuilds the value
+        phrases and, if the schema changed, reloads the persisted entries."""
+        if catalog.data_version == self._data_version and self._fingerprint is not None:
+            return self._fingerprint
+        columns = [(name, catalog.column(name)["data_type"]) for name in catalog.columns]
+        fingerprint = hashlib.sha256(json.dumps(columns).encode("utf-8")).hexdigest()[:16]
+        phrases = {}
+        for name, data_type in columns:
+            if data_type != "VARCHAR":
+                continue
+            for value in catalog.distinct_values(name) or []:
+                words = _words(value)
+                if words:
+                    phrases.setdefault(" ".join(words), value)
+                    phrases.setdefault("".join(words), value)
+        self._value_phrases = phrases
+        self._max_phrase_words = max((len(p.split()) for p in phrases), default=1)
+        self._data_version = catalog.data_version
+        if fingerprint != self._fingerprint:
+            self._load(fingerprint)
+        return fingerprint
+
+    def _load(self, fingerprint: str) -> None:
+        entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        try:
+            conn = self._get_conn()
+            dropped = conn.execute("DELETE FROM sql_cache WHERE schema_fingerprint != ?", (fingerprint,)).rowcount
+            rows = conn.execute(
+                "SELECT cache_key, response FROM sql_cache ORDER BY last_used_at DESC LIMIT ?",
+                (self.max_entries,)
+            ).fetchall()
+            conn.commit()
+            conn.close()
+            for key, response in reversed(rows):
+                entries[key] = json.loads(response)
+            if dropped:
+                logger.info(f"SQL cache: dropped {dropped} entries made for another schema")
+        except Exception as e:
+            logger.error(f"SQL cache load failed: {e}")
+        self._entries = entries
+        self._fingerprint = fingerprint
+        logger.info(f"SQL cache: {len(entries)} entries loaded")
+
+    def normalize(self, question: str) -> str:
+        with self._lock:
+            self._refresh()
+            return normalize_question(question, self._value_phrases, self._max_phrase_words)
+
+    def _key(self, question: str, context: Dict[str, Any]) -> Tuple[str, str, str]:
+        fingerprint = self._refresh()
+        normalized = normalize_question(question, self._value_phrases, self._max_phrase_words)
+        context_json = json.dumps(context or {}, sort_keys=True, default=str)
+        key = hashlib.sha256(f"{fingerprint}|{normalized}|{context_json}".encode("utf-8")).hexdigest()
+        return key, normalized, context_json
+
+    def get(self, question: str, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The cached SQL-generation response for question, or None."""
+        if not self.enabled or not catalog.loaded:
+            return None
+        with self._lock:
+            key, normalized, _ = self._key(question, context)
+            response = self._entries.get(key)
+            if response is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        try:
+            conn = self._get_conn()
+            conn.execute(
+                "UPDATE sql_cache SET hits = hits + 1, last_used_at = ? WHERE cache_key = ?",
+                (datetime.datetime.now().isoformat(), key)
+            )
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"SQL cache touch failed: {e}")
+        logger.info(f"SQL cache hit: '{normalized}'")
+        return dict(response)
+
+    def put(self, question: str, context: Dict[str, Any], sql_response: Dict[str, Any]) -> None:
+        if not self.enabled or not catalog.loaded:
+            return
+        response = {field: sql_response.get(field) for field in CACHED_FIELDS}
+        with self._lock:
+            key, normalized, context_json = self._key(question, context)
+            fingerprint = self._fingerprint
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+            self.evictions += len(evicted)
+        try:
+            now = datetime.datetime.now().isoformat()
+            conn = self._get_conn()
+            conn.execute(
+                """INSERT OR REPLACE INTO sql_cache
+                   (cache_key, schema_fingerprint, normalized_question, context, response, hits, created_at, last_used_at)
+                   VALUES (?, ?, ?, ?, ?, 0, ?, ?)""",
+                (key, fingerprint, normalized, context_json, json.dumps(response), now, now)
+            )
+            conn.executemany("DELETE FROM sql_cache WHERE cache_key = ?", [(k,) for k in evicted])
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"SQL cache save failed: {e}")
+
+    def discard(self, question: str, context: Dict[str, Any]) -> None:
+        """Forget the entry for question (its SQL no longer runs)."""
+        if not self.enabled or not catalog.loaded:
+            return
+        with self._lock:
+            key, _, _ = self._key(question, context)
+            self._entries.pop(key, None)
+        try:
+            conn = self._get_conn()
+            conn.execute("DELETE FROM sql_cache WHERE cache_key = ?", (key,))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"SQL cache discard failed: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        try:
+            conn = self._get_conn()
+            conn.execute("DELETE FROM sql_cache")
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"SQL cache clear failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+sql_cache = QuestionSQLCache()
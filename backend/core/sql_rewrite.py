@@ -0,0 +1,137 @@
+import re
+from typing import Dict, FrozenSet, Iterator, List, Tuple
+
+# Token kinds: str (string literal), qid (quoted identifier), num, id, op
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+|--[^\n]*)
+  | (?P<str>'(?:[^']|'')*')
+  | (?P<qid>"(?:[^"]|"")*")
+  | (?P<num>\d+(?:\.\d*)?|\.\d+)
+  | (?P<id>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op><>|<=|>=|!=|\|\||::|[(),.*+\-/%=<>;\[\]])
+""", re.VERBOSE)
+
+
+def token_spans(sql: str) -> List[Tuple[str, str, int, int]]:
+    """Split SQL into (kind, text, start, end) tokens, dropping whitespace and line
+    comments. Unrecognized characters become single-character 'op' tokens."""
+    tokens = []
+    pos = 0
+    while pos < len(sql):
+        match = _TOKEN_RE.match(sql, pos)
+        if not match:
+            tokens.append(("op", sql[pos], pos, pos + 1))
+            pos += 1
+            continue
+        kind = match.lastgroup
+        if kind != "ws":
+            tokens.append((kind, match.group(), pos, match.end()))
+        pos = match.end()
+    return tokens
+
+
+def tokenize(sql: str) -> List[Tuple[str, str]]:
+    """Split SQL into (kind, text) tokens, dropping whitespace and line comments."""
+    return [(kind, text) for kind, text, _, _ in token_spans(sql)]
+
+
+def _unquote(literal: str) -> str:
+    return literal[1:-1].replace("''", "'")
+
+
+def literal_comparisons(sql: str) -> Iterator[Tuple[str, str, List[Tuple[str, int, int]]]]:
+    """
+    Yield (column, op, literals) for each unqualified column compared with string
+    literals: `col = 'x'`, `col <> 'x'`, `col != 'x'` and `col [NOT] IN ('x', ...)`.
+    column keeps its spelling in the SQL; op is lower-cased ("in", "not in", ...);
+    literals are (value, start, end) with the unquoted value and the quoted span.
+    IN lists holding anything besides string literals are skipped.
+    """
+    tokens = token_spans(sql)
+    for i, (kind, text, _, _) in enumerate(tokens):
+        if kind != "id" or text.lower() == "not" or (i > 0 and tokens[i - 1][1] == "."):
+            continue
+        j = i + 1
+        if j + 1 < len(tokens) and tokens[j][1] in ("=", "<>", "!=") and tokens[j + 1][0] == "str":
+            _, literal, start, end = tokens[j + 1]
+            yield text, tokens[j][1], [(_unquote(literal), start, end)]
+            continue
+        op = "in"
+        if j < len(tokens) and tokens[j][1].lower() == "not":
+            op = "not in"
+            j += 1
+        if not (j + 1 < len(tokens) and tokens[j][1].lower() == "in" and tokens[j + 1][1] == "("):
+            continue
+        j += 2
+        literals = []
+        while j + 1 < len(tokens) and tokens[j][0] == "str" and tokens[j + 1][1] in (",", ")"):
+            _, literal, start, end = tokens[j]
+            literals.append((_unquote(literal), start, end))
+            if tokens[j + 1][1] == ")":
+                yield text, op, literals
+                break
+            j += 2
+
+
+def type_enum_literals(sql: str, enum_columns: Dict[str, Tuple[str, FrozenSet[str]]]) -> str:
+    """
+    Cast string literals compared with ENUM columns (`col = 'x'`, `col <> 'x'`,
+    `col [NOT] IN ('x', 'y')`) to the column's ENUM type. Against a bare string
+    DuckDB casts the column to VARCHAR row by row, which keeps the predicate out
+    of the scan; an ENUM-typed literal compares codes and is pushed down.
+    enum_columns maps lower-cased column name -> (ENUM type SQL, its values).
+    Literals outside the ENUM are left untouched so they still match nothing.
+    """
+    if not enum_columns:
+        return sql
+    replacements: List[Tuple[int, int, str]] = []
+    for column, _, literals in literal_comparisons(sql):
+        enum = enum_columns.get(column.lower())
+        if enum is None:
+            continue
+        type_sql, values = enum
+        if all(value in values for value, _, _ in literals):
+            replacements.extend((start, end, f"CAST({sql[start:end]} AS {type_sql})") for _, start, end in literals)
+
+    for start, end, text in reversed(replacements):
+        sql = sql[:start] + text + sql[end:]
+    return sql
+
+
+def canonicalize(sql: str, protected_names=()) -> Tuple[str, List[str]]:
+    """
+    Canonical form of a query for cache keys: single-spaced tokens, unquoted
+    identifiers and keywords lower-cased, and every `AS <alias>` renamed to a
+    positional placeholder (consistently, wherever the alias is referenced).
+    String literals keep their exact case. Aliases that shadow a name in
+    protected_names (e.g. real column names) are left alone so that two
+    queries only share a key when they are equal up to alias renaming.
+    Returns (canonical_sql, alias_names_in_order) with aliases in their written case.
+    """
+    tokens = tokenize(sql.strip().rstrip(";"))
+    protected = {n.lower() for n in protected_names}
+
+    aliases: List[str] = []
+    placeholders = {}
+    in_cast: List[bool] = []  # per open paren: does it belong to CAST(... AS type)?
+    for i, (kind, text) in enumerate(tokens[:-1]):
+        if (kind, text) == ("op", "("):
+            in_cast.append(i > 0 and tokens[i - 1][1].lower() in ("cast", "try_cast"))
+        elif (kind, text) == ("op", ")") and in_cast:
+            in_cast.pop()
+        elif kind == "id" and text.lower() == "as" and tokens[i + 1][0] == "id" and not (in_cast and in_cast[-1]):
+            alias = tokens[i + 1][1]
+            if alias.lower() not in protected and alias.lower() not in placeholders:
+                placeholders[alias.lower()] = f"_a{len(aliases)}"
+                aliases.append(alias)
+
+    out = []
+    for i, (kind, text) in enumerate(tokens):
+        if kind == "id":
+            lowered = text.lower()
+            qualified = i > 0 and tokens[i - 1] == ("op", ".")
+            is_call = i + 1 < len(tokens) and tokens[i + 1] == ("op", "(")
+            out.append(lowered if qualified or is_call else placeholders.get(lowered, lowered))
+        else:
+            out.append(text)
+    return " ".join(out), aliases
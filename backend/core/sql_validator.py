@@ -1,10 +1,24 @@
 import re
+import logging
+from typing import List, Tuple
+
+try:
+    from backend.core.catalog import catalog
+    from backend.core.sql_rewrite import literal_comparisons
+except ImportError:
+    from core.catalog import catalog
+    from core.sql_rewrite import literal_comparisons
+
+logger = logging.getLogger(__name__)
+
 
 class SQLValidator:
     def validate(self, sql: str) -> dict:
         """
         Validates the generated SQL to ensure it's safe and read-only.
         Returns {"valid": True/False, "cleaned_sql": str, "reason": str or None}.
+        Valid results also carry "warnings": literals that match no value of the
+        column they are compared with (per the column catalog).
         """
         # 1. Strip whitespace and trailing semicolons
         cleaned_sql = sql.strip().rstrip(';')
@@ -48,8 +62,36 @@ class SQLValidator:
             if pattern.search(normalized_sql):
                 return {"valid": False, "cleaned_sql": None, "reason": f"Forbidden SQL keyword detected: {keyword}"}
 
+        # 7. Category literals against the catalog — fix case slips ('sbi' -> 'SBI'),
+        # flag values the column has never held
+        cleaned_sql, warnings = self._check_literals(cleaned_sql)
+        for warning in warnings:
+            logger.warning(f"SQL validation: {warning}")
+
         # If all checks pass
-        return {"valid": True, "cleaned_sql": cleaned_sql, "reason": None}
+        return {"valid": True, "cleaned_sql": cleaned_sql, "reason": None, "warnings": warnings}
+
+    @staticmethod
+    def _check_literals(sql: str) -> Tuple[str, List[str]]:
+        """Check string literals in `col = 'x'`, `col <> 'x'` and `col [NOT] IN ('x', ...)`
+        against the catalog's values of col. Case-only mismatches are rewritten to
+        the stored spelling; unknown values are reported and left alone."""
+        if not catalog.loaded:
+            return sql, []
+        replacements = []
+        warnings = []
+        for column, _, literals in literal_comparisons(sql):
+            if not catalog.has_values(column):
+                continue
+            for value, start, end in literals:
+                canonical = catalog.canonical_value(column, value)
+                if canonical is None:
+                    warnings.append(f"'{value}' is not a known value of {column.lower()}")
+                elif canonical != value:
+                    replacements.append((start, end, "'" + canonical.replace("'", "''") + "'"))
+        for start, end, literal in reversed(replacements):
+            sql = sql[:start] + literal + sql[end:]
+        return sql, warnings
 
 # Module-level singleton
 validator = SQLValidator()
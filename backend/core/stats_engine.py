@@ -2,9 +2,33 @@ import math
 import logging
 from typing import Any
 
+try:
+    from backend.core.result_set import ResultSet
+except ImportError:
+    from core.result_set import ResultSet
+
 logger = logging.getLogger(__name__)
 
 
+class _RowColumns:
+    """Column view over a plain list of row dicts, mirroring ResultSet's column API."""
+
+    def __init__(self, rows: list[dict]):
+        self._rows = rows
+        self.column_names = list(rows[0].keys()) if rows else []
+
+    def column(self, name: str) -> list:
+        return [row.get(name) for row in self._rows]
+
+    def numeric_columns(self) -> list[str]:
+        first = self._rows[0]
+        return [k for k, v in first.items() if isinstance(v, (int, float)) and not isinstance(v, bool)]
+
+    def string_columns(self) -> list[str]:
+        first = self._rows[0]
+        return [k for k, v in first.items() if isinstance(v, str)]
+
+
 class StatsEngine:
     """
     Computes statistical enrichment on DuckDB query results.
@@ -12,24 +36,25 @@ class StatsEngine:
     Pure computation — never calls external APIs, never modifies data.
     """
 
-    def enrich(self, data: list[dict], query_intent: str, sql: str) -> dict:
+    def enrich(self, data: "ResultSet | list[dict]", query_intent: str, sql: str) -> dict:
         if not data or len(data) < 2:
             return {}
 
         enrichment = {}
         try:
-            numeric_cols = self._get_numeric_cols(data)
-            categorical_cols = self._get_categorical_cols(data)
+            columns = data if isinstance(data, ResultSet) else _RowColumns(data)
+            numeric_cols = self._get_numeric_cols(columns)
+            categorical_cols = self._get_categorical_cols(columns)
 
             if len(data) >= 3 and numeric_cols:
-                zscore_result = self._compute_zscores(data, numeric_cols[0], categorical_cols)
+                zscore_result = self._compute_zscores(columns, numeric_cols[0], categorical_cols)
                 if zscore_result:
                     enrichment['zscore'] = zscore_result
 
             time_indicators = ['hour_of_day', 'day_of_week', 'hour', 'day', 'month']
             is_time_query = any(t in sql.lower() for t in time_indicators)
             if is_time_query and len(data) >= 4 and numeric_cols:
-                trend_result = self._compute_trend(data, numeric_cols[0])
+                trend_result = self._compute_trend(columns, numeric_cols[0])
                 if trend_result:
                     enrichment['trend'] = trend_result
 
@@ -48,17 +73,16 @@ class StatsEngine:
 
         return enrichment
 
-    def _get_numeric_cols(self, data: list[dict]) -> list[str]:
-        first = data[0]
-        return [k for k, v in first.items() if isinstance(v, (int, float)) and not isinstance(v, bool)]
+    def _get_numeric_cols(self, columns) -> list[str]:
+        return columns.numeric_columns()
 
-    def _get_categorical_cols(self, data: list[dict]) -> list[str]:
-        first = data[0]
-        return [k for k, v in first.items() if isinstance(v, str)]
+    def _get_categorical_cols(self, columns) -> list[str]:
+        return columns.string_columns()
 
-    def _compute_zscores(self, data: list[dict], col: str, categorical_cols: list[str]) -> dict | None:
+    def _compute_zscores(self, columns, col: str, categorical_cols: list[str]) -> dict | None:
         try:
-            values = [float(row[col]) for row in data if row.get(col) is not None]
+            raw_values = columns.column(col)
+            values = [float(v) for v in raw_values if v is not None]
             if len(values) < 3:
                 return None
 
@@ -71,16 +95,17 @@ class StatsEngine:
                 return None
 
             label_col = categorical_cols[0] if categorical_cols else None
+            labels = columns.column(label_col) if label_col else [None] * len(raw_values)
             anomalies = []
             highest = None
             lowest = None
             highest_z = float('-inf')
             lowest_z = float('inf')
 
-            for row in data:
-                val = float(row[col])
+            for raw, raw_label in zip(raw_values, labels):
+                val = float(raw)
                 z = (val - mean) / std
-                label = str(row.get(label_col, 'Unknown')) if label_col else 'Unknown'
+                label = str(raw_label) if label_col else 'Unknown'
 
                 if z > highest_z:
                     highest_z = z
@@ -108,9 +133,9 @@ class StatsEngine:
             logger.warning(f"Z-score failed: {e}")
             return None
 
-    def _compute_trend(self, data: list[dict], col: str) -> dict | None:
+    def _compute_trend(self, columns, col: str) -> dict | None:
         try:
-            values = [float(row[col]) for row in data if row.get(col) is not None]
+            values = [float(v) for v in columns.column(col) if v is not None]
             n = len(values)
             if n < 4:
                 return None
@@ -0,0 +1,97 @@
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from backend.core.database import db
+    from backend.core.prompt_builder import prompt_builder
+    from backend.core.llm_gateway import llm_gateway
+except ImportError:
+    from core.database import db
+    from core.prompt_builder import prompt_builder
+    from core.llm_gateway import llm_gateway
+
+logger = logging.getLogger(__name__)
+
+
+def _prepare_prompts() -> None:
+    # Schema description and value lists from the freshly loaded catalog
+    prompt_builder.build_sql_generation_prompt("warm-up", [], {})
+
+
+WARMUP_STEPS: List[Tuple[str, Callable[[], Any]]] = [
+    ("data", db.initialize),
+    ("prompts", _prepare_prompts),
+    ("llm_client", llm_gateway.warm),
+]
+
+
+class Warmup:
+    """
+    Start-up work run on a background thread, so the server accepts
+    connections (and answers /health) immediately. State goes idle →
+    warming → ready, or failed with the step's error. Nothing gates on
+    "idle": without a warm-up (scripts, tests) data loads on first use.
+    """
+
+    def __init__(self, steps: List[Tuple[str, Callable[[], Any]]] = WARMUP_STEPS):
+        self.steps = steps
+        self.state = "idle"
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.step_ms: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.state != "idle":
+                return
+            self.state = "warming"
+            self.started_at = time.time()
+        threading.Thread(target=self._run, name="warmup", daemon=True).start()
+
+    def _run(self) -> None:
+        for name, step in self.steps:
+            step_start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                logger.error(f"Warm-up step '{name}' failed: {e}", exc_info=True)
+                self.error = f"{name}: {e}"
+                self.state = "failed"
+                break
+            self.step_ms[name] = round((time.perf_counter() - step_start) * 1000, 1)
+        else:
+            self.state = "ready"
+        self.finished_at = time.time()
+        if self.state == "ready":
+            logger.info(f"Warm-up complete in {(self.finished_at - self.started_at) * 1000:.0f}ms: {self.step_ms}")
+        self._done.set()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    @property
+    def blocking(self) -> bool:
+        """True while data routes must not run: warm-up in progress or failed."""
+        return self.state in ("warming", "failed")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        self._done.wait(timeout)
+        return self.ready
+
+    def status(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "status": self.state,
+            "error": self.error,
+            "elapsed_ms": round((end - self.started_at) * 1000, 1) if self.started_at else None,
+            "steps": dict(self.step_ms),
+        }
+
+
+warmup = Warmup()
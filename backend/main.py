@@ -1,18 +1,57 @@
 import os
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 try:
-    from backend.routers import chat, sessions, dashboard
+    from backend.routers import chat, sessions, dashboard, admin
+    from backend.core.warmup import warmup
+    from backend.core.llm_gateway import llm_gateway
 except ImportError:
-    from routers import chat, sessions, dashboard
+    from routers import chat, sessions, dashboard, admin
+    from core.warmup import warmup
+    from core.llm_gateway import llm_gateway
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Data load, profiling and prompt preparation run in the background;
+    # the server accepts connections right away
+    warmup.start()
+    # The async model client's connections live on this loop, so they are opened here
+    llm_warmup = asyncio.get_running_loop().create_task(llm_gateway.awarm())
+    yield
+    llm_warmup.cancel()
+    with suppress(asyncio.CancelledError):
+        await llm_warmup
+    await llm_gateway.aclose()
+
 
 app = FastAPI(
     title="InsightX API",
     description="Conversational AI analytics for UPI transaction data",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+
+def require_ready():
+    """Fail data routes fast while the warm-up is running (or has failed)."""
+    if warmup.blocking:
+        status = warmup.status()
+        if status["status"] == "warming":
+            error, message = "warming_up", "InsightX is still loading data. Please retry in a few seconds."
+        else:
+            error, message = "warmup_failed", f"InsightX failed to load its data ({status['error']})."
+        raise HTTPException(
+            status_code=503,
+            detail={"error": error, "message": message, "elapsed_ms": status["elapsed_ms"]},
+            headers={"Retry-After": "5"}
+        )
+
+
 # CORS — production-safe configuration
 allowed_origins = [
     "http://localhost:3000",
@@ -36,9 +75,10 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
-app.include_router(chat.router, prefix="/api", tags=["Chat"])
+app.include_router(chat.router, prefix="/api", tags=["Chat"], dependencies=[Depends(require_ready)])
 app.include_router(sessions.router, prefix="/api", tags=["Sessions"])
-app.include_router(dashboard.router, prefix="/api", tags=["Dashboard"])
+app.include_router(dashboard.router, prefix="/api", tags=["Dashboard"], dependencies=[Depends(require_ready)])
+app.include_router(admin.router, prefix="/api", tags=["Admin"], dependencies=[Depends(require_ready)])
 
 @app.get("/health")
 async def health_check():
@@ -46,3 +86,13 @@ async def health_check():
         "status": "healthy",
         "service": "InsightX API"
     }
+
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once data and prompts are loaded, 503 until then (or on failure).
+    /health only says the process is up."""
+    status = warmup.status()
+    if warmup.blocking:
+        return JSONResponse(status_code=503, content=status)
+    return status
@@ -4,6 +4,8 @@ from typing import Dict, List, Optional, Union
 class ChatRequest(BaseModel):
     question: str           # user's natural language question
     session_id: str         # which session this belongs to
+    approximate: bool = False   # allow a fast answer estimated from a sample
+    bypass_cache: bool = False  # regenerate SQL and narration instead of reusing cached ones
 
 class ChatResponse(BaseModel):
     answer: str
@@ -14,6 +16,18 @@ class ChatResponse(BaseModel):
     execution_time_ms: Optional[float] = None
     is_clarification: bool
     session_id: str
+    is_approximate: bool = False
+    approximation: Optional[Dict] = None    # sample size, method, per-row 95% confidence intervals
+    refinement_id: Optional[str] = None     # poll GET /chat/refinements/{id} for the exact answer
+    sub_queries: Optional[List[Dict]] = None  # compound questions: per sub-question dependencies and timings
+
+class RefinementResponse(BaseModel):
+    refinement_id: str
+    status: str                             # pending | done | failed
+    data: Optional[List[Dict]] = None
+    row_count: Optional[int] = None
+    execution_time_ms: Optional[float] = None
+    error: Optional[str] = None
 
 class SessionCreateResponse(BaseModel):
     session_id: str
@@ -41,3 +55,19 @@ class DashboardResponse(BaseModel):
     network_distribution: Dict[str, int]
     transaction_type_distribution: Dict[str, int]
     date_range: Dict[str, str]
+
+class SketchResponse(BaseModel):
+    statistic: str          # e.g. "p50" or "distinct_count"
+    target: str
+    by: Optional[str] = None
+    values: Dict[str, Optional[float]]   # group value -> estimate ("*" when not grouped)
+    execution_time_ms: float
+
+class AppendRequest(BaseModel):
+    path: str               # CSV or Parquet batch, relative to APPEND_BATCH_DIR on the server
+
+class AppendResponse(BaseModel):
+    appended_rows: int
+    row_count: int
+    data_version: str
+    execution_time_ms: float
@@ -0,0 +1,91 @@
+import os
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+try:
+    from backend.models.schemas import AppendRequest, AppendResponse
+    from backend.core.database import db
+    from backend.core.sql_cache import sql_cache
+    from backend.core.narration_cache import narration_cache
+    from backend.core.intent_compiler import intent_compiler
+    from backend.core.shared_scan import shared_scan_stats
+    from backend.core.llm_gateway import llm_gateway
+    from backend.core.prompt_builder import prompt_builder
+except ImportError:
+    from models.schemas import AppendRequest, AppendResponse
+    from core.database import db
+    from core.sql_cache import sql_cache
+    from core.narration_cache import narration_cache
+    from core.intent_compiler import intent_compiler
+    from core.shared_scan import shared_scan_stats
+    from core.llm_gateway import llm_gateway
+    from core.prompt_builder import prompt_builder
+
+router = APIRouter()
+
+# Directory POST /admin/append may read batches from; unset disables the endpoint
+# (python -m backend.append_data is unaffected)
+APPEND_BATCH_DIR = os.getenv("APPEND_BATCH_DIR", "")
+
+
+def _batch_path(path: str) -> str:
+    """path resolved inside APPEND_BATCH_DIR (relative to it, symlinks followed).
+    Anything outside is refused before its existence is checked."""
+    if not APPEND_BATCH_DIR:
+        raise HTTPException(status_code=403, detail="Append over HTTP is disabled (APPEND_BATCH_DIR is not set)")
+    root = os.path.realpath(APPEND_BATCH_DIR)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise HTTPException(status_code=403, detail="Batch path must be inside APPEND_BATCH_DIR")
+    return resolved
+
+
+@router.get("/admin/db-stats")
+def get_db_stats():
+    """Cursor pool concurrency/wait-time metrics, result, question→SQL and narration cache counters,
+    local intent compiler and compound shared-scan counters and sketch index size."""
+    return {"pool": db.get_pool_stats(), "result_cache": db.get_cache_stats(), "sql_cache": sql_cache.stats(),
+            "narration_cache": narration_cache.stats(), "intent_compiler": intent_compiler.stats(),
+            "shared_scan": shared_scan_stats.stats(), "sketches": db.get_sketch_stats()}
+
+
+@router.get("/admin/llm-stats")
+def get_llm_stats():
+    """Model gateway counters: hedges fired and won, rate-limit waits, and per-model
+    circuit state, failures and p95 latency."""
+    return llm_gateway.stats()
+
+
+@router.get("/admin/prompt-stats")
+def get_prompt_stats():
+    """Approximate tokens per SQL-prompt section (instructions, schema, examples, history,
+    context, question), averaged and for the latest prompt, with the examples it used."""
+    return prompt_builder.prompt_stats()
+
+
+@router.get("/admin/catalog")
+def get_catalog():
+    """Per-column statistics (type, NULL fraction, min/max, low-cardinality values) of the loaded data."""
+    return db.get_catalog()
+
+
+@router.get("/admin/slow-queries")
+def get_slow_queries(limit: Optional[int] = Query(default=None, ge=1)):
+    """Queries over QUERY_PROFILE_THRESHOLD_MS, newest first, with their DuckDB plan,
+    rows scanned and operator timings (empty unless QUERY_PROFILING is on)."""
+    return db.get_slow_queries(limit)
+
+
+@router.post("/admin/append", response_model=AppendResponse)
+def append_batch(request: AppendRequest):
+    """Append a transaction batch (CSV or Parquet under APPEND_BATCH_DIR) to the store."""
+    batch_path = _batch_path(request.path)
+    try:
+        return AppendResponse(**db.append_batch(batch_path))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail={"error": "Append failed", "detail": str(e)})
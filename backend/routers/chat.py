@@ -1,22 +1,38 @@
+import os
 import json
-from fastapi import APIRouter, HTTPException
+import asyncio
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
 try:
-    from backend.models.schemas import ChatRequest, ChatResponse
+    from backend.models.schemas import ChatRequest, ChatResponse, RefinementResponse
     from backend.core.session_manager import session_manager
     from backend.core.query_pipeline import pipeline
     from backend.core.persistence import persistence
+    from backend.core.query_context import QueryContext, query_scope
 except ImportError:
-    from models.schemas import ChatRequest, ChatResponse
+    from models.schemas import ChatRequest, ChatResponse, RefinementResponse
     from core.session_manager import session_manager
     from core.query_pipeline import pipeline
     from core.persistence import persistence
+    from core.query_context import QueryContext, query_scope
 
 router = APIRouter()
 
+# How often a running chat request checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))
 
-@router.post("/chat", response_model=ChatResponse)
-def chat_endpoint(request: ChatRequest):
+
+async def _cancel_on_disconnect(http_request: Request, context: QueryContext) -> None:
+    while not context.cancelled:
+        if await http_request.is_disconnected():
+            context.cancel("client disconnected")
+            return
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+
+def _validate_chat_request(request: ChatRequest) -> None:
     # Validation 1: Empty or too long question
     if not request.question or len(request.question) > 500:
         raise HTTPException(status_code=422, detail="Question must not be empty or longer than 500 characters.")
@@ -48,42 +64,122 @@ def chat_endpoint(request: ChatRequest):
         else:
             raise HTTPException(status_code=404, detail="Session not found. Create a session first via POST /sessions")
 
+
+def _persist_turns(request: ChatRequest, result: dict) -> None:
+    # Persist user turn (fault-tolerant)
     try:
-        # Process via pipeline
-        result = pipeline.process(request.question, request.session_id)
+        persistence.save_turn(
+            session_id=request.session_id,
+            role="user",
+            content=request.question
+        )
+    except Exception:
+        pass
 
-        # Persist user turn (fault-tolerant)
-        try:
-            persistence.save_turn(
-                session_id=request.session_id,
-                role="user",
-                content=request.question
-            )
-        except Exception:
-            pass
-
-        # Persist assistant turn (fault-tolerant)
-        try:
-            persistence.save_turn(
-                session_id=request.session_id,
-                role="assistant",
-                content=result.get("answer", ""),
-                sql_used=result.get("sql_used"),
-                execution_time_ms=result.get("execution_time_ms"),
-                chart=result.get("chart")
-            )
-        except Exception:
-            pass
-
-        return ChatResponse(
-            answer=result["answer"],
+    # Persist assistant turn (fault-tolerant)
+    try:
+        persistence.save_turn(
+            session_id=request.session_id,
+            role="assistant",
+            content=result.get("answer", ""),
             sql_used=result.get("sql_used"),
-            chart=result.get("chart"),
-            proactive_insight=result.get("proactive_insight"),
-            query_intent=result.get("query_intent"),
             execution_time_ms=result.get("execution_time_ms"),
-            is_clarification=result.get("is_clarification", False),
-            session_id=request.session_id
+            chart=result.get("chart")
         )
+    except Exception:
+        pass
+
+
+def _chat_response(request: ChatRequest, result: dict) -> ChatResponse:
+    return ChatResponse(
+        answer=result["answer"],
+        sql_used=result.get("sql_used"),
+        chart=result.get("chart"),
+        proactive_insight=result.get("proactive_insight"),
+        query_intent=result.get("query_intent"),
+        execution_time_ms=result.get("execution_time_ms"),
+        is_clarification=result.get("is_clarification", False),
+        session_id=request.session_id,
+        is_approximate=result.get("is_approximate", False),
+        approximation=result.get("approximation"),
+        refinement_id=result.get("refinement_id"),
+        sub_queries=result.get("sub_queries")
+    )
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat_endpoint(request: ChatRequest, http_request: Request):
+    await run_in_threadpool(_validate_chat_request, request)
+
+    # The pipeline awaits model calls and DuckDB threads without holding a worker;
+    # if the client goes away meanwhile, its running query is interrupted and no
+    # further model calls are made
+    context = QueryContext(question=request.question)
+    watcher = asyncio.create_task(_cancel_on_disconnect(http_request, context))
+    try:
+        with query_scope(context):
+            result = await pipeline.aprocess(request.question, request.session_id, approximate=request.approximate,
+                                          bypass_cache=request.bypass_cache)
+
+        # Nobody is waiting for a cancelled request's answer; keep it out of the saved history
+        if not context.cancelled:
+            await run_in_threadpool(_persist_turns, request, result)
+
+        return _chat_response(request, result)
     except Exception as e:
         raise HTTPException(status_code=500, detail={"error": "Internal processing error", "detail": str(e)})
+    finally:
+        watcher.cancel()
+
+
+def _sse(event: str, data) -> str:
+    payload = data if isinstance(data, str) else json.dumps(data, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    The chat pipeline as Server-Sent Events: "sql" (generated query), "result"
+    (row count, chart), "token" (narration fragments as they arrive) and a final
+    "final" event with the same fields as POST /chat. The turn is persisted
+    once the stream completes; a client that disconnects early cancels it.
+    """
+    await run_in_threadpool(_validate_chat_request, request)
+
+    async def events():
+        context = QueryContext(question=request.question)
+        completed = False
+        try:
+            with query_scope(context):
+                async for event, data in pipeline.astream(request.question, request.session_id, approximate=request.approximate,
+                                                            bypass_cache=request.bypass_cache):
+                    if event == "final":
+                        response = _chat_response(request, data)
+                        await run_in_threadpool(_persist_turns, request, data)
+                        yield _sse("final", response.model_dump_json())
+                    else:
+                        yield _sse(event, data)
+            completed = True
+        except Exception as e:
+            yield _sse("error", {"error": "Internal processing error", "detail": str(e)})
+            completed = True
+        finally:
+            # Closed before the end: the client went away
+            if not completed:
+                context.cancel("client disconnected")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/chat/refinements/{refinement_id}", response_model=RefinementResponse)
+def get_refinement(refinement_id: str):
+    """Exact result behind an approximate answer, once the background run finishes."""
+    refinement = pipeline.get_refinement(refinement_id)
+    if refinement is None:
+        raise HTTPException(status_code=404, detail="Refinement not found or expired")
+    return RefinementResponse(refinement_id=refinement_id, **refinement)
@@ -1,11 +1,16 @@
-from fastapi import APIRouter
+import time
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
 
 try:
-    from backend.models.schemas import DashboardResponse
+    from backend.models.schemas import DashboardResponse, SketchResponse
     from backend.core.database import db
+    from backend.core.sketches import sketch_index
 except ImportError:
-    from models.schemas import DashboardResponse
+    from models.schemas import DashboardResponse, SketchResponse
     from core.database import db
+    from core.sketches import sketch_index
 
 router = APIRouter()
 
@@ -33,3 +38,29 @@ def get_dashboard():
         transaction_type_distribution=type_dist,
         date_range=profile.get("date_range", {})
     )
+
+
+@router.get("/dashboard/percentile", response_model=SketchResponse)
+def get_percentile(q: float = Query(0.5, ge=0.0, le=1.0), target: str = "amount_inr", by: Optional[str] = None):
+    """Estimated percentile of a column per dimension value, from the ingest-time t-digests."""
+    start = time.perf_counter()
+    try:
+        result = sketch_index.quantile(q, target=target, by=by)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    values = {str(k): v for k, v in result.items()} if by else {"*": result}
+    return SketchResponse(statistic=f"p{q * 100:g}", target=target, by=by, values=values,
+                          execution_time_ms=(time.perf_counter() - start) * 1000)
+
+
+@router.get("/dashboard/distinct-count", response_model=SketchResponse)
+def get_distinct_count(target: str, by: Optional[str] = None):
+    """Estimated number of distinct values of a column per dimension value, from the ingest-time HyperLogLogs."""
+    start = time.perf_counter()
+    try:
+        result = sketch_index.distinct_count(target, by=by)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    values = {str(k): v for k, v in result.items()} if by else {"*": result}
+    return SketchResponse(statistic="distinct_count", target=target, by=by, values=values,
+                          execution_time_ms=(time.perf_counter() - start) * 1000)
@@ -0,0 +1,82 @@
+import os
+import csv
+import random
+import datetime
+import tempfile
+
+import pytest
+
+# A small, seeded transactions table. The environment is set before any backend
+# module is imported: the store, persistence and caches read it at import time.
+FIXTURE_DIR = tempfile.mkdtemp(prefix="insightx-tests-")
+FIXTURE_CSV = os.path.join(FIXTURE_DIR, "transactions.csv")
+FIXTURE_ROWS = 4000
+
+CSV_HEADER = [
+    "transaction id", "timestamp", "transaction type", "merchant_category", "amount (INR)", "transaction_status",
+    "sender_age_group", "receiver_age_group", "sender_state", "sender_bank", "receiver_bank", "device_type",
+    "network_type", "fraud_flag", "hour_of_day", "day_of_week", "is_weekend",
+]
+TYPES = ["P2P", "P2M", "Bill Payment", "Recharge"]
+CATEGORIES = ["Food", "Grocery", "Fuel", "Entertainment", "Shopping", "Healthcare", "Education", "Transport",
+              "Utilities", "Other"]
+AGES = ["18-25", "26-35", "36-45", "46-55", "56+"]
+STATES = ["Maharashtra", "Karnataka", "Delhi", "Tamil Nadu", "Uttar Pradesh", "Gujarat", "Rajasthan", "Telangana",
+          "West Bengal", "Andhra Pradesh"]
+BANKS = ["SBI", "HDFC", "ICICI", "Axis", "PNB", "Kotak", "IndusInd", "Yes Bank"]
+DEVICES = ["Android", "iOS", "Web"]
+NETWORKS = ["4G", "5G", "WiFi", "3G"]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def write_transactions(path: str, rows: int, seed: int, first_id: int = 0) -> None:
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 1, 1)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for i in range(first_id, first_id + rows):
+            ts = start + datetime.timedelta(seconds=rng.randint(0, 365 * 86400))
+            kind = rng.choice(TYPES)
+            writer.writerow([
+                f"TXN{i:010d}", ts.strftime("%Y-%m-%d %H:%M:%S"), kind,
+                rng.choice(CATEGORIES) if kind == "P2M" else "", rng.randint(10, 50000),
+                "FAILED" if rng.random() < 0.05 else "SUCCESS", rng.choice(AGES),
+                rng.choice(AGES) if kind == "P2P" else "", rng.choice(STATES), rng.choice(BANKS), rng.choice(BANKS),
+                rng.choice(DEVICES), rng.choice(NETWORKS), 1 if rng.random() < 0.02 else 0, ts.hour,
+                DAYS[ts.weekday()], 1 if ts.weekday() >= 5 else 0,
+            ])
+
+
+write_transactions(FIXTURE_CSV, FIXTURE_ROWS, seed=7)
+os.environ.update({
+    "CSV_PATH": FIXTURE_CSV,
+    "DATA_STORE_DIR": os.path.join(FIXTURE_DIR, "store"),
+    "DB_PATH": os.path.join(FIXTURE_DIR, "insightx.db"),
+    "OPENAI_API_KEY": "sk-test",
+    "QUERY_EXECUTOR": "thread",
+})
+
+
+@pytest.fixture(scope="session")
+def db():
+    from backend.core.database import db as database
+    database.ensure_initialized()
+    return database
+
+
+@pytest.fixture
+def exact(db, monkeypatch):
+    """execute_query with cube routing and the result cache off: the base-table answer."""
+    from backend.core.cube import cube_router
+    from backend.core.result_cache import result_cache
+
+    def run(sql: str) -> dict:
+        monkeypatch.setattr(cube_router, "enabled", False)
+        result_cache.clear()
+        try:
+            return db.execute_query(sql)
+        finally:
+            monkeypatch.setattr(cube_router, "enabled", True)
+            result_cache.clear()
+    return run
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from backend.routers import admin
+
+
+@pytest.fixture
+def client(db, monkeypatch, tmp_path):
+    batches = tmp_path / "batches"
+    batches.mkdir()
+    monkeypatch.setattr(admin, "APPEND_BATCH_DIR", str(batches))
+    appended = []
+
+    def fake_append(path):
+        appended.append(path)
+        return {"appended_rows": 1, "row_count": 1, "data_version": "v", "execution_time_ms": 0.0}
+    monkeypatch.setattr(admin.db, "append_batch", fake_append)
+    client = TestClient(app)
+    client.batches, client.appended = batches, appended
+    return client
+
+
+def test_disabled_without_batch_dir(client, monkeypatch):
+    monkeypatch.setattr(admin, "APPEND_BATCH_DIR", "")
+    response = client.post("/api/admin/append", json={"path": "day.csv"})
+    assert response.status_code == 403
+    assert client.appended == []
+
+
+def test_relative_path_inside_batch_dir_is_appended(client):
+    (client.batches / "day.csv").write_text("x")
+    response = client.post("/api/admin/append", json={"path": "day.csv"})
+    assert response.status_code == 200
+    assert client.appended == [os.path.realpath(client.batches / "day.csv")]
+
+
+@pytest.mark.parametrize("path", ["/etc/passwd", "../outside.csv", "sub/../../outside.csv", "/no/such/file.csv"])
+def test_paths_outside_batch_dir_are_refused(client, path):
+    response = client.post("/api/admin/append", json={"path": path})
+    assert response.status_code == 403
+    assert client.appended == []
+
+
+def test_symlink_out_of_batch_dir_is_refused(client, tmp_path):
+    (tmp_path / "secret.csv").write_text("x")
+    os.symlink(tmp_path / "secret.csv", client.batches / "link.csv")
+    response = client.post("/api/admin/append", json={"path": "link.csv"})
+    assert response.status_code == 403
+    assert client.appended == []
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+import pytest
+
+from backend.core.query_pipeline import pipeline
+from backend.core.session_manager import session_manager
+from backend.core.sql_cache import sql_cache
+
+DEVICE_SQL = "SELECT device_type, COUNT(*) AS n FROM transactions GROUP BY device_type ORDER BY n DESC"
+QUESTION = "Which device type do people trust most?"  # not compiled locally: the model writes the SQL
+
+
+@pytest.fixture
+def session(db):
+    session_id = session_manager.create_session()
+    yield session_id
+    session_manager.delete_session(session_id)
+
+
+@pytest.fixture
+def stub_model(monkeypatch):
+    """The async model calls answer with DEVICE_SQL and a fixed narration."""
+    async def fake_model(messages, temperature, expect_json):
+        if expect_json:
+            return '{"sql": "' + DEVICE_SQL + '", "query_intent": "Comparison"}'
+        return "Android leads."
+    monkeypatch.setattr(pipeline, "_acall_gpt4", fake_model)
+
+
+def test_blocking_stages_run_off_the_event_loop(session, stub_model, monkeypatch):
+    threads = {}
+
+    def recorded(name, fn):
+        def run(*args, **kwargs):
+            threads[name] = threading.get_ident()
+            return fn(*args, **kwargs)
+        return run
+
+    monkeypatch.setattr(pipeline, "_known_sql", recorded("known_sql", pipeline._known_sql))
+    monkeypatch.setattr(pipeline, "_finish", recorded("finish", pipeline._finish))
+    monkeypatch.setattr(sql_cache, "put", recorded("sql_cache.put", sql_cache.put))
+
+    async def run():
+        threads["loop"] = threading.get_ident()
+        return await pipeline.aprocess(QUESTION, session, bypass_cache=True)
+
+    result = asyncio.run(run())
+    assert result["answer"] == "Android leads." and result["sql_used"].startswith(DEVICE_SQL)
+    loop_thread = threads.pop("loop")
+    assert set(threads) == {"known_sql", "finish", "sql_cache.put"}
+    assert loop_thread not in threads.values()
+    sql_cache.discard(QUESTION, {})
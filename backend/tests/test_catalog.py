@@ -0,0 +1,69 @@
+import pytest
+
+from backend.core.catalog import VALUE_COLUMNS, catalog, compute_column_stats, merge_column_stats
+from backend.core.sql_validator import validator
+from backend.tests.conftest import FIXTURE_ROWS
+
+
+def test_catalog_matches_the_table(db):
+    assert catalog.loaded and catalog.row_count == FIXTURE_ROWS
+    for name in catalog.columns:
+        info = catalog.column(name)
+        non_null, minimum, maximum = db.connection.execute(
+            f"SELECT COUNT({name}), MIN({name}), MAX({name}) FROM transactions"
+        ).fetchone()
+        assert info["null_count"] == FIXTURE_ROWS - non_null, name
+        assert info["null_fraction"] == pytest.approx((FIXTURE_ROWS - non_null) / FIXTURE_ROWS), name
+        if info["data_type"] == "INTEGER":
+            assert (info["min_value"], info["max_value"]) == (minimum, maximum), name
+        elif info["data_type"] == "VARCHAR":
+            assert (info["min_value"], info["max_value"]) == (str(minimum), str(maximum)), name
+
+
+def test_distinct_values_match_the_table(db):
+    for name in VALUE_COLUMNS:
+        rows = db.connection.execute(
+            f"SELECT DISTINCT {name} FROM transactions WHERE {name} IS NOT NULL"
+        ).fetchall()
+        expected = sorted(row[0] if isinstance(row[0], int) else str(row[0]) for row in rows)
+        assert catalog.distinct_values(name) == expected, name
+    assert catalog.distinct_values("transaction_id") is None
+    assert catalog.distinct_values("no_such_column") is None
+
+
+def test_merged_stats_equal_stats_of_the_union(db):
+    whole = compute_column_stats(db.connection, "transactions")
+    early = compute_column_stats(db.connection, "(SELECT * FROM transactions WHERE hour_of_day < 12)")
+    late = compute_column_stats(db.connection, "(SELECT * FROM transactions WHERE hour_of_day >= 12)")
+    for name in whole:
+        assert merge_column_stats(early[name], late[name]) == whole[name], name
+
+
+def test_canonical_value_is_case_insensitive(db):
+    assert catalog.canonical_value("sender_bank", "sbi") == "SBI"
+    assert catalog.canonical_value("Device_Type", "ANDROID") == "Android"
+    assert catalog.canonical_value("sender_bank", "Barclays") is None
+
+
+def test_schema_description_comes_from_the_catalog(db):
+    schema = db.get_schema_description()
+    assert f"Total rows: {FIXTURE_ROWS}" in schema
+    device = next(line for line in schema.splitlines() if line.startswith("- device_type:"))
+    assert "values: Android, Web, iOS" in device
+    hour = next(line for line in schema.splitlines() if line.startswith("- hour_of_day:"))
+    hours = catalog.column("hour_of_day")
+    assert f"Range: {hours['min_value']} to {hours['max_value']}" in hour
+    null_percent = catalog.column("merchant_category")["null_fraction"] * 100
+    category = next(line for line in schema.splitlines() if line.startswith("- merchant_category:"))
+    assert f"(NULLABLE, {null_percent:.0f}% NULL)" in category
+    assert "NULLABLE" not in next(line for line in schema.splitlines() if line.startswith("- sender_bank:"))
+
+
+def test_validator_fixes_case_and_flags_unknown_literals(db):
+    result = validator.validate(
+        "SELECT COUNT(*) FROM transactions WHERE sender_bank IN ('sbi', 'hdfc') AND device_type = 'Tablet'"
+    )
+    assert result["valid"]
+    assert "IN ('SBI', 'HDFC')" in result["cleaned_sql"]
+    assert "'Tablet'" in result["cleaned_sql"]
+    assert result["warnings"] == ["'Tablet' is not a known value of device_type"]
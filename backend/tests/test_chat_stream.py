@@ -0,0 +1,87 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.main as main
+from backend.core.persistence import persistence
+from backend.core.query_pipeline import pipeline
+from backend.core.session_manager import session_manager
+from backend.core.sql_cache import sql_cache
+from backend.core.warmup import Warmup
+
+DEVICE_SQL = "SELECT device_type, COUNT(*) AS n FROM transactions GROUP BY device_type ORDER BY n DESC"
+QUESTION = "Which device type do people trust most?"
+
+
+def parse_events(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    monkeypatch.setattr(main, "warmup", Warmup([]))  # not warming: data routes open
+    client = TestClient(main.app)
+    client.session_id = client.post("/api/sessions").json()["session_id"]
+    yield client
+    session_manager.delete_session(client.session_id)
+    persistence.delete_session(client.session_id)
+    sql_cache.discard(QUESTION, {})
+
+
+def stream(client) -> list:
+    response = client.post("/api/chat/stream", json={"question": QUESTION, "session_id": client.session_id,
+                                                     "bypass_cache": True})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    return parse_events(response.text)
+
+
+def test_events_arrive_in_pipeline_order(client, monkeypatch):
+    async def fake_sql(messages, temperature, expect_json):
+        return '{"sql": "' + DEVICE_SQL + '", "query_intent": "Comparison"}'
+
+    async def fake_narration(messages, temperature):
+        for fragment in ("Android ", "leads."):
+            yield fragment
+
+    monkeypatch.setattr(pipeline, "_acall_gpt4", fake_sql)
+    monkeypatch.setattr(pipeline, "_astream_gpt4", fake_narration)
+    events = stream(client)
+
+    assert [name for name, _ in events] == ["sql", "result", "token", "token", "final"]
+    (_, sql), (_, result), *tokens, (_, final) = events
+    assert sql == {"sql": final["sql_used"], "query_intent": "Comparison"}
+    assert sql["sql"].startswith(DEVICE_SQL)
+    assert result["sql"] == sql["sql"] and result["row_count"] == 3 and result["chart"] == final["chart"]
+    assert "".join(data["text"] for _, data in tokens) == final["answer"] == "Android leads."
+    assert final["session_id"] == client.session_id
+
+    # Persisted before the final event goes out
+    saved = persistence.get_turns(client.session_id)
+    assert [(turn["role"], turn["content"]) for turn in saved] == [("user", QUESTION), ("assistant", "Android leads.")]
+
+
+def test_invalid_sql_ends_with_a_final_event_only(client, monkeypatch):
+    async def fake_sql(messages, temperature, expect_json):
+        return '{"sql": "DELETE FROM transactions", "query_intent": "Oops"}'
+
+    monkeypatch.setattr(pipeline, "_acall_gpt4", fake_sql)
+    events = stream(client)
+    assert [name for name, _ in events] == ["final"]
+    assert events[0][1]["sql_used"] == "DELETE FROM transactions"
+    assert "cannot execute that query safely" in events[0][1]["answer"]
+
+
+def test_a_failing_model_ends_with_a_final_error(client, monkeypatch):
+    async def broken(messages, temperature, expect_json):
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(pipeline, "_acall_gpt4", broken)
+    events = stream(client)
+    assert [name for name, _ in events] == ["final"]
+    assert events[0][1]["answer"].startswith("An unexpected error occurred")
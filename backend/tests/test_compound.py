@@ -0,0 +1,130 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from backend.core.query_pipeline import pipeline
+from backend.core.session_manager import session_manager
+
+BRANCH_SECONDS = 0.3
+
+
+@pytest.mark.parametrize("response, expected", [
+    ('[{"question": "A", "depends_on": []}, {"question": "B", "depends_on": [0, 0]}, '
+     '{"question": "C", "depends_on": [1, 0]}]',
+     [[], [0], [0, 1]]),
+    # Forward and self references would close a cycle; unknown ids point nowhere
+    ('```json\n[{"question": "A", "depends_on": [1]}, {"question": "B", "depends_on": [1, 2, -1, "0", 7]}, '
+     '{"question": "C"}]\n```',
+     [[], [], []]),
+    ('["Which age group has the highest volume?", "What is the failure rate for that age group?", '
+     '"Which bank has the highest fraud flag rate?"]',
+     [[], [0], []]),
+])
+def test_dependencies_only_point_at_earlier_sub_questions(response, expected):
+    nodes = pipeline._parse_decomposition(response)
+    assert [node["depends_on"] for node in nodes] == expected
+
+
+class Branches:
+    """Stands in for the per-branch pipeline: sleeps, records when it ran and which
+    earlier answers its branch session was given, and saves its own turn."""
+
+    def __init__(self, failing: str = None):
+        self.failing = failing
+        self.runs = {}
+        self._lock = threading.Lock()
+
+    def _begin(self, question: str, session_id: str) -> None:
+        replayed = [turn["user_question"] for turn in session_manager.get_session(session_id)["turns"]]
+        with self._lock:
+            self.runs[question] = {"start": time.perf_counter(), "replayed": replayed}
+
+    def _end(self, question: str, session_id: str) -> dict:
+        self.runs[question]["end"] = time.perf_counter()
+        if question == self.failing:
+            raise RuntimeError(f"{question} failed")
+        session_manager.add_turn(session_id, {"user_question": question, "answer": f"{question} answered"})
+        return {"answer": f"{question} answered", "sql_used": f"SELECT '{question}'", "chart": None}
+
+    def process(self, question: str, session_id: str, bypass_cache: bool = False) -> dict:
+        self._begin(question, session_id)
+        time.sleep(BRANCH_SECONDS)
+        return self._end(question, session_id)
+
+    async def aprocess(self, question: str, session_id: str, bypass_cache: bool = False) -> dict:
+        self._begin(question, session_id)
+        await asyncio.sleep(BRANCH_SECONDS)
+        return self._end(question, session_id)
+
+
+@pytest.fixture(params=["threads", "asyncio"])
+def run_compound(request, db, monkeypatch):
+    """Run sub-questions through _process_compound or _aprocess_compound with stubbed branches."""
+    monkeypatch.setattr(pipeline, "_call_gpt4", lambda messages, temperature, expect_json: "summary")
+
+    async def synthesis(messages, temperature, expect_json):
+        return "summary"
+    monkeypatch.setattr(pipeline, "_acall_gpt4", synthesis)
+
+    def run(sub_questions, branches):
+        monkeypatch.setattr(pipeline, "process", branches.process)
+        monkeypatch.setattr(pipeline, "aprocess", branches.aprocess)
+        session_id = session_manager.create_session()
+        try:
+            if request.param == "threads":
+                return pipeline._process_compound(sub_questions, session_id, "compound?")
+            return asyncio.run(pipeline._aprocess_compound(sub_questions, session_id, "compound?"))
+        finally:
+            session_manager.delete_session(session_id)
+    return run
+
+
+GRAPH = [
+    {"question": "A", "depends_on": []},
+    {"question": "B", "depends_on": []},
+    {"question": "C", "depends_on": [0]},
+]
+
+
+def test_independent_branches_run_side_by_side(run_compound):
+    branches = Branches()
+    start = time.perf_counter()
+    result = run_compound(GRAPH, branches)
+    elapsed = time.perf_counter() - start
+    a, b, c = (branches.runs[q] for q in "ABC")
+    assert a["start"] < b["end"] and b["start"] < a["end"]  # A and B overlapped
+    assert c["start"] >= a["end"]  # C waited for A only
+    assert elapsed < BRANCH_SECONDS * 2.9  # A∥B then C: two rounds, not three
+    assert result["answer"] == "summary"
+    assert result["sql_used"] == "SELECT 'A' | THEN | SELECT 'B' | THEN | SELECT 'C'"
+
+
+def test_dependent_branches_see_the_answers_they_depend_on(run_compound):
+    branches = Branches()
+    run_compound(GRAPH + [{"question": "D", "depends_on": [1, 2]}], branches)
+    assert branches.runs["A"]["replayed"] == branches.runs["B"]["replayed"] == []
+    assert branches.runs["C"]["replayed"] == ["A"]
+    assert branches.runs["D"]["replayed"] == ["B", "A", "C"]  # each answer once, in dependency order
+
+
+def test_each_branch_reports_its_timing(run_compound):
+    result = run_compound(GRAPH, Branches())
+    timings = {t["question"]: t for t in result["sub_queries"]}
+    assert [t["depends_on"] for t in result["sub_queries"]] == [[], [], [0]]
+    for question, timing in timings.items():
+        assert timing["sql_used"] == f"SELECT '{question}'"
+        assert BRANCH_SECONDS * 1000 * 0.9 <= timing["execution_time_ms"] < BRANCH_SECONDS * 1000 * 2
+    assert timings["A"]["started_at_ms"] < BRANCH_SECONDS * 500
+    assert timings["C"]["started_at_ms"] >= timings["A"]["started_at_ms"] + timings["A"]["execution_time_ms"] - 1
+    assert result["execution_time_ms"] >= timings["C"]["started_at_ms"] + timings["C"]["execution_time_ms"]
+
+
+def test_a_failing_branch_fails_the_compound_and_cleans_up(run_compound):
+    sessions_before = set(session_manager.sessions)
+    branches = Branches(failing="A")
+    with pytest.raises(RuntimeError, match="A failed"):
+        run_compound(GRAPH, branches)
+    assert "C" not in branches.runs  # its dependency never answered
+    assert set(session_manager.sessions) == sessions_before  # branch sessions deleted
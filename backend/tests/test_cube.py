@@ -0,0 +1,62 @@
+import pytest
+
+from backend.core.cube import cube_router
+from backend.core.result_cache import result_cache
+
+ROUTABLE = [
+    "SELECT COUNT(*) FROM transactions WHERE sender_state IN ('Maharashtra')",
+    "SELECT COUNT(*), SUM(fraud_flag) FROM transactions WHERE sender_state = 'Atlantis'",
+    "SELECT sender_bank, AVG(amount_inr), SUM(fraud_flag), SUM(amount_inr) FROM transactions "
+    "GROUP BY sender_bank ORDER BY sender_bank",
+    "SELECT sender_bank, ROUND(SUM(CASE WHEN transaction_status = 'FAILED' THEN 1.0 ELSE 0 END) * 100.0 / COUNT(*), 2) "
+    "AS failure_rate FROM transactions GROUP BY sender_bank ORDER BY failure_rate DESC, sender_bank LIMIT 20",
+    "SELECT device_type, network_type, COUNT(*) AS n FROM transactions WHERE transaction_type = 'P2M' "
+    "GROUP BY device_type, network_type ORDER BY device_type, network_type",
+    "SELECT hour_of_day, COUNT(*) c, SUM(fraud_flag) AS flagged FROM transactions GROUP BY hour_of_day ORDER BY hour_of_day",
+]
+
+
+def _routed(db, sql):
+    result_cache.clear()
+    return db.execute_query(sql)
+
+
+@pytest.mark.parametrize("sql", ROUTABLE)
+def test_routed_answer_matches_base_table(db, exact, sql):
+    routed = _routed(db, sql)
+    base = exact(sql)
+    assert routed["success"] and base["success"]
+    assert routed["cube_routed"] and not base["cube_routed"]
+    assert [list(r) for r in routed["data"]] == [list(r) for r in base["data"]]
+    for routed_row, base_row in zip(routed["data"], base["data"]):
+        for column, value in base_row.items():
+            assert routed_row[column] == pytest.approx(value)
+            assert type(routed_row[column]) is type(value)
+
+
+def test_unaliased_measures_keep_duckdb_column_names(db):
+    routed = _routed(db, "SELECT COUNT(*), AVG(amount_inr) FROM transactions WHERE sender_bank = 'SBI'")
+    assert routed["cube_routed"]
+    assert list(routed["data"][0]) == ["count_star()", "avg(amount_inr)"]
+
+
+@pytest.mark.parametrize("sql", [
+    # Unaliased expressions over measures: the routed column name would differ
+    "SELECT SUM(CASE WHEN transaction_status = 'FAILED' THEN 1 ELSE 0 END) FROM transactions",
+    "SELECT sender_bank, ROUND(COUNT(*) * 100.0 / 4000, 2) FROM transactions GROUP BY sender_bank",
+    # Not additive / not a cube dimension / row level
+    "SELECT sender_bank, MEDIAN(amount_inr) AS m FROM transactions GROUP BY sender_bank",
+    "SELECT receiver_bank, COUNT(*) AS n FROM transactions GROUP BY receiver_bank",
+    "SELECT COUNT(DISTINCT sender_bank) AS n FROM transactions",
+    "SELECT transaction_id FROM transactions WHERE sender_bank = 'SBI'",
+    "SELECT transaction_type, COUNT(*) * 100.0 / SUM(COUNT(*)) OVER() AS pct, COUNT(*) OVER () AS groups "
+    "FROM transactions GROUP BY transaction_type",
+])
+def test_incompatible_queries_are_not_routed(sql):
+    assert cube_router.rewrite(sql) is None
+
+
+def test_too_many_dimensions_are_not_routed():
+    sql = ("SELECT sender_state, sender_bank, device_type, network_type, COUNT(*) AS n FROM transactions "
+           "GROUP BY sender_state, sender_bank, device_type, network_type")
+    assert cube_router.rewrite(sql) is None
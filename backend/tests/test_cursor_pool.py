@@ -0,0 +1,97 @@
+import time
+import threading
+
+import duckdb
+
+from backend.core.database import CursorPool
+
+
+def make_pool(max_concurrency: int) -> CursorPool:
+    connection = duckdb.connect(":memory:")
+    connection.execute("CREATE TABLE numbers AS SELECT range AS n FROM range(100)")
+    return CursorPool(connection, max_concurrency)
+
+
+def run_threads(count: int, target) -> None:
+    errors = []
+
+    def run(i):
+        try:
+            target(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert not errors, errors
+
+
+def test_pool_caps_concurrent_queries():
+    pool = make_pool(2)
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def query(_):
+        with pool.cursor() as cursor:
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            assert cursor.execute("SELECT SUM(n) FROM numbers").fetchone()[0] == 4950
+            time.sleep(0.1)
+            with lock:
+                running[0] -= 1
+
+    run_threads(6, query)
+    stats = pool.stats()
+    assert peak[0] == 2
+    assert stats["acquired"] == 6 and stats["in_flight"] == 0
+    assert stats["waited"] >= 4 and stats["max_wait_ms"] >= 90
+
+
+def test_each_thread_keeps_its_own_cursor():
+    pool = make_pool(4)
+    cursors = {}
+
+    def grab(i):
+        with pool.cursor() as first:
+            pass
+        with pool.cursor() as second:
+            assert second is first  # reused within the thread
+            assert second.execute("SELECT COUNT(*) FROM numbers").fetchone()[0] == 100  # shared catalog
+        cursors[i] = first
+
+    run_threads(3, grab)
+    assert len({id(c) for c in cursors.values()}) == 3
+
+
+def test_exclusive_waits_for_in_flight_queries_and_blocks_new_ones():
+    pool = make_pool(2)
+    events = []
+    holding = threading.Event()
+
+    def long_query(_):
+        with pool.cursor():
+            holding.set()
+            time.sleep(0.2)
+            events.append("query done")
+
+    def late_query():
+        with pool.cursor():
+            events.append("late query")
+
+    worker = threading.Thread(target=long_query, args=(0,))
+    worker.start()
+    holding.wait(5)
+    with pool.exclusive():
+        events.append("exclusive")
+        late = threading.Thread(target=late_query)
+        late.start()
+        late.join(0.1)
+        assert late.is_alive()  # blocked while exclusive
+        events.append("exclusive done")
+    late.join(5)
+    worker.join(5)
+    assert events == ["query done", "exclusive", "exclusive done", "late query"]
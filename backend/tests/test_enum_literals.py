@@ -0,0 +1,81 @@
+import duckdb
+import pytest
+
+from backend.core.ingest import IngestManager, load_enum_columns
+from backend.core.sql_rewrite import literal_comparisons, type_enum_literals
+from backend.tests.conftest import FIXTURE_CSV, FIXTURE_ROWS, write_transactions
+
+DEVICE = "ENUM('Android', 'Web', 'iOS')"
+ENUMS = {"device_type": (DEVICE, frozenset(["Android", "Web", "iOS"]))}
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT COUNT(*) FROM transactions WHERE device_type = 'Web'",
+     f"SELECT COUNT(*) FROM transactions WHERE device_type = CAST('Web' AS {DEVICE})"),
+    ("SELECT COUNT(*) FROM transactions WHERE DEVICE_TYPE <> 'iOS'",
+     f"SELECT COUNT(*) FROM transactions WHERE DEVICE_TYPE <> CAST('iOS' AS {DEVICE})"),
+    ("SELECT COUNT(*) FROM transactions WHERE device_type NOT IN ('Web', 'iOS')",
+     f"SELECT COUNT(*) FROM transactions WHERE device_type NOT IN (CAST('Web' AS {DEVICE}), CAST('iOS' AS {DEVICE}))"),
+])
+def test_literals_compared_with_enum_columns_are_typed(sql, expected):
+    assert type_enum_literals(sql, ENUMS) == expected
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT COUNT(*) FROM transactions WHERE device_type = 'Tablet'",  # not a value: matches nothing as is
+    "SELECT COUNT(*) FROM transactions WHERE device_type IN ('Web', 'Tablet')",
+    "SELECT COUNT(*) FROM transactions WHERE device_type IN ('Web', UPPER('ios'))",
+    "SELECT COUNT(*) FROM transactions t WHERE t.device_type = 'Web'",  # qualified: left alone
+    "SELECT COUNT(*) FROM transactions WHERE network_type = 'Web'",
+    "SELECT COUNT(*) FROM transactions WHERE device_type LIKE 'We%'",
+])
+def test_other_literals_are_left_alone(sql):
+    assert type_enum_literals(sql, ENUMS) == sql
+
+
+def test_literal_comparisons_yield_columns_ops_and_spans():
+    sql = ("SELECT * FROM transactions t WHERE Device_Type != 'Web' AND sender_bank NOT IN ('SBI', 'Yes''s') "
+           "AND t.network_type = '4G' AND receiver_bank IN ('HDFC', LOWER('x')) AND amount_inr = 5")
+    found = list(literal_comparisons(sql))
+    assert [(column, op, [value for value, _, _ in literals]) for column, op, literals in found] == [
+        ("Device_Type", "!=", ["Web"]), ("sender_bank", "not in", ["SBI", "Yes's"]),
+    ]
+    assert [sql[start:end] for _, start, end in found[1][2]] == ["'SBI'", "'Yes''s'"]
+
+
+def test_typed_literals_give_the_varchar_answers(exact, db):
+    assert "device_type" in db.enum_columns and "sender_state" in db.enum_columns
+    sql = ("SELECT sender_state, COUNT(*) FROM transactions WHERE device_type IN ('Web', 'iOS') "
+           "AND transaction_type <> 'P2P' GROUP BY sender_state ORDER BY sender_state")
+    assert "CAST('Web' AS ENUM(" in type_enum_literals(sql, db.enum_columns)
+    varchar = sql.replace("device_type", "CAST(device_type AS VARCHAR)").replace(
+        "transaction_type", "CAST(transaction_type AS VARCHAR)")
+    assert exact(sql)["data"] == exact(varchar)["data"]
+
+
+def test_append_widens_enums_with_new_values(tmp_path):
+    manager = IngestManager(str(tmp_path / "store"), storage_format="duckdb")
+    manager.ensure_store(FIXTURE_CSV)
+    batch = tmp_path / "batch.csv"
+    write_transactions(str(batch), 200, seed=13, first_id=FIXTURE_ROWS)
+    batch.write_text(batch.read_text().replace(",Delhi,", ",Goa,"))
+    manager.append(str(batch))
+
+    conn = duckdb.connect(":memory:")
+    try:
+        conn.execute(f"ATTACH '{manager.store_path}' AS store (READ_ONLY)")
+        conn.execute("CREATE VIEW transactions AS SELECT * FROM store.transactions")
+        enums = load_enum_columns(conn)
+        _, values = enums["sender_state"]
+        assert "Goa" in values and "Delhi" in values
+        states = [s for (s,) in conn.execute(
+            "SELECT DISTINCT sender_state FROM transactions ORDER BY sender_state").fetchall()]
+        assert states == sorted(states)  # the widened ENUM still sorts like the strings
+        sql = "SELECT COUNT(*) FROM transactions WHERE sender_state = 'Goa'"
+        typed = type_enum_literals(sql, enums)
+        assert typed != sql
+        goa = conn.execute(typed).fetchone()[0]
+        assert goa > 0 and goa == conn.execute(
+            "SELECT COUNT(*) FROM transactions WHERE CAST(sender_state AS VARCHAR) = 'Goa'").fetchone()[0]
+    finally:
+        conn.close()
@@ -0,0 +1,56 @@
+import pytest
+
+from backend.core.intent_compiler import intent_compiler
+
+FAILURE_RATE = "ROUND(SUM(CASE WHEN transaction_status = 'FAILED' THEN 1.0 ELSE 0 END) * 100.0 / COUNT(*), 2)"
+
+
+@pytest.fixture
+def compile_question(db):
+    def compile_question(question: str) -> dict:
+        response = intent_compiler.compile(question)
+        assert response is not None, question
+        return response
+    return compile_question
+
+
+def test_ranked_time_question_orders_by_the_metric(compile_question, exact):
+    response = compile_question("Which hour has the highest failure rate?")
+    assert response["sql"].endswith("GROUP BY hour_of_day ORDER BY failure_rate DESC LIMIT 20")
+    assert response["suggested_chart_type"] == "bar"
+    assert response["query_intent"].endswith("rank descending")
+
+    rows = exact(response["sql"])["data"]
+    expected = exact(f"SELECT MAX(rate) AS top FROM (SELECT {FAILURE_RATE} AS rate FROM transactions GROUP BY hour_of_day)")
+    assert rows[0]["failure_rate"] == expected["data"][0]["top"]
+
+
+def test_time_question_honours_ascending_and_explicit_limits(compile_question, exact):
+    response = compile_question("top 3 hours by volume")
+    assert response["sql"].endswith("ORDER BY transaction_count DESC LIMIT 3")
+    assert len(exact(response["sql"])["data"]) == 3
+
+    response = compile_question("Which hour has the lowest fraud rate?")
+    assert response["sql"].endswith("ORDER BY fraud_flag_rate ASC LIMIT 20")
+    assert response["query_intent"].endswith("rank ascending")
+
+
+def test_trend_question_keeps_chronological_order(compile_question, exact):
+    response = compile_question("failure rate by hour")
+    assert response["sql"].endswith("GROUP BY hour_of_day ORDER BY hour_of_day ASC")
+    assert response["suggested_chart_type"] == "line"
+    assert "rank" not in response["query_intent"]
+
+    hours = [row["hour_of_day"] for row in exact(response["sql"])["data"]]
+    assert hours == sorted(hours) and len(hours) == 24
+
+
+def test_other_dimensions_are_ranked(compile_question):
+    response = compile_question("Failure rate by bank")
+    assert response["sql"].endswith("GROUP BY sender_bank ORDER BY failure_rate DESC LIMIT 20")
+    assert response["suggested_chart_type"] == "bar"
+
+
+def test_unrecognised_words_go_to_the_model(db):
+    assert intent_compiler.compile("Why did failure rate by hour spike?") is None
+    assert intent_compiler.compile("failure rate by hour", entity_context={"states": ["Delhi"]}) is None
@@ -0,0 +1,288 @@
+import json
+import time
+import socket
+import asyncio
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from backend.core import llm_gateway as gateway_module
+from backend.core.llm_gateway import LLMError, LLMGateway, TokenBucket
+
+
+class ChatStub(BaseHTTPRequestHandler):
+    """Chat completions endpoint: per-model delay, status and reported token usage."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    delays, statuses, usage = {}, {}, {}
+    arrivals = []  # (model, monotonic time) of every completion request
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._send(200, {"data": []})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        model = request["model"]
+        self.arrivals.append((model, time.monotonic()))
+        time.sleep(self.delays.get(model, 0))
+        status = self.statuses.get(model, 200)
+        if status != 200:
+            return self._send(status, {"error": {"message": "unavailable"}})
+        content = f"answer from {model}"
+        if not request.get("stream"):
+            return self._send(200, {"choices": [{"message": {"role": "assistant", "content": content}}],
+                                    "usage": {"total_tokens": self.usage.get(model, 50)}})
+        events = [{"choices": [{"delta": {"content": word + " "}}]} for word in content.split()]
+        data = "".join(f"data: {json.dumps(e)}\n\n" for e in events) + "data: [DONE]\n\n"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data.encode())
+
+    @classmethod
+    def hits(cls, model: str) -> int:
+        return sum(1 for m, _ in cls.arrivals if m == model)
+
+
+@contextmanager
+def socket_closed_port():
+    """URL of a local port nothing listens on."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    yield f"http://127.0.0.1:{port}"
+
+
+@pytest.fixture(scope="module")
+def stub_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ChatStub)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture
+def gateway(stub_url, monkeypatch):
+    for table in (ChatStub.delays, ChatStub.statuses, ChatStub.usage):
+        table.clear()
+    ChatStub.arrivals.clear()
+    monkeypatch.setattr(gateway_module, "LLM_HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(gateway_module, "LLM_HEDGE_MIN_SECONDS", 0.05)
+    return LLMGateway(base_url=stub_url, api_key="sk-test")
+
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+def test_hedge_fires_after_the_primary_p95(gateway):
+    ChatStub.delays["primary"] = 0.15
+    for _ in range(5):
+        gateway.complete(MESSAGES, 0, "primary", "fallback")
+    assert ChatStub.hits("fallback") == 0 and gateway.hedges == 0
+    p95 = gateway.health("primary").p95()
+    assert 0.15 <= p95 < 0.5
+    assert gateway.hedge_delay("primary") == p95
+
+    ChatStub.delays["primary"] = 3.0
+    start = time.monotonic()
+    answer = gateway.complete(MESSAGES, 0, "primary", "fallback")
+    elapsed = time.monotonic() - start
+    assert answer == "answer from fallback"
+    sent = next(t for m, t in ChatStub.arrivals if m == "fallback")
+    assert sent - start >= p95 * 0.9  # not before the primary's p95
+    assert elapsed < 1.5  # and not after the slow primary answered
+    assert (gateway.hedges, gateway.hedge_wins) == (1, 1)
+
+
+def test_async_hedge_uses_the_default_delay_before_enough_samples(gateway, monkeypatch):
+    monkeypatch.setattr(gateway_module, "LLM_HEDGE_DEFAULT_SECONDS", 0.2)
+    ChatStub.delays["primary"] = 3.0
+
+    async def run():
+        start = time.monotonic()
+        answer = await gateway.acomplete(MESSAGES, 0, "primary", "fallback")
+        return answer, time.monotonic() - start
+
+    answer, elapsed = asyncio.run(run())
+    assert answer == "answer from fallback"
+    assert 0.2 <= elapsed < 1.5
+    assert (gateway.hedges, gateway.hedge_wins) == (1, 1)
+    assert gateway.health("primary").failures == 0  # the losing request was cancelled, not failed
+
+
+def test_breaker_skips_a_degraded_model(gateway, monkeypatch):
+    ChatStub.statuses["primary"] = 500
+    for _ in range(gateway_module.LLM_BREAKER_FAILURES):
+        assert gateway.complete(MESSAGES, 0, "primary", "fallback") == "answer from fallback"
+    assert gateway.health("primary").state == "open"
+    hits = ChatStub.hits("primary")
+
+    assert gateway.complete(MESSAGES, 0, "primary", "fallback") == "answer from fallback"
+    assert ChatStub.hits("primary") == hits  # skipped while open
+
+    # After the cooldown one call is let through; a failure re-opens the circuit
+    monkeypatch.setattr(gateway_module, "LLM_BREAKER_COOLDOWN_SECONDS", 0)
+    assert gateway.health("primary").state == "half_open"
+    gateway.complete(MESSAGES, 0, "primary", "fallback")
+    assert ChatStub.hits("primary") == hits + 1
+    assert gateway.health("primary").circuit_opens == 2
+
+    ChatStub.statuses.clear()
+    assert gateway.complete(MESSAGES, 0, "primary", "fallback") == "answer from primary"
+    assert gateway.health("primary").state == "closed"
+
+
+def test_half_open_circuit_admits_a_single_probe(gateway, monkeypatch):
+    ChatStub.statuses["primary"] = 500
+    for _ in range(gateway_module.LLM_BREAKER_FAILURES):
+        gateway.complete(MESSAGES, 0, "primary", "fallback")
+    ChatStub.statuses.clear()
+    ChatStub.delays["primary"] = 0.5
+    monkeypatch.setattr(gateway_module, "LLM_BREAKER_COOLDOWN_SECONDS", 0)
+    hits = ChatStub.hits("primary")
+
+    answers = []
+    threads = [threading.Thread(target=lambda: answers.append(gateway.complete(MESSAGES, 0, "primary", "fallback")))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)  # the first one takes the probe
+    for thread in threads:
+        thread.join(5)
+    assert ChatStub.hits("primary") == hits + 1
+    assert sorted(answers) == ["answer from fallback"] * 3 + ["answer from primary"]
+    assert gateway.health("primary").state == "closed"
+
+
+@pytest.mark.parametrize("status", [400, 401, 404, 422])
+def test_client_errors_do_not_open_the_circuit(gateway, status):
+    ChatStub.statuses["primary"] = status
+    for _ in range(gateway_module.LLM_BREAKER_FAILURES + 1):
+        assert gateway.complete(MESSAGES, 0, "primary", "fallback") == "answer from fallback"
+    health = gateway.health("primary")
+    assert health.state == "closed" and health.failures == 0
+    assert ChatStub.hits("primary") == gateway_module.LLM_BREAKER_FAILURES + 1
+
+    async def run():
+        return [fragment async for fragment in gateway.astream(MESSAGES, 0, "primary", "fallback")]
+
+    assert "".join(asyncio.run(run())).split() == ["answer", "from", "fallback"]
+    assert health.failures == 0
+
+
+def test_rate_limits_and_unreachable_models_open_the_circuit(gateway):
+    ChatStub.statuses["primary"] = 429
+    for _ in range(gateway_module.LLM_BREAKER_FAILURES):
+        with pytest.raises(LLMError) as error:
+            gateway.complete(MESSAGES, 0, "primary")
+        assert error.value.status == 429
+    assert gateway.health("primary").state == "open"
+
+    with socket_closed_port() as url:
+        unreachable = LLMGateway(base_url=url, api_key="sk-test")
+        for _ in range(gateway_module.LLM_BREAKER_FAILURES):
+            with pytest.raises(httpx.TransportError):
+                unreachable.complete(MESSAGES, 0, "primary")
+    assert unreachable.health("primary").state == "open"
+
+
+def test_every_model_open_is_an_error(gateway):
+    ChatStub.statuses.update({"primary": 500, "fallback": 503})
+    for _ in range(gateway_module.LLM_BREAKER_FAILURES):
+        with pytest.raises(LLMError):
+            gateway.complete(MESSAGES, 0, "primary", "fallback")
+    with pytest.raises(LLMError, match="circuit open"):
+        gateway.complete(MESSAGES, 0, "primary", "fallback")
+
+
+def test_requests_per_minute_are_throttled(gateway):
+    gateway.requests = TokenBucket(60)  # a minute's worth up front, then one a second
+    start = time.monotonic()
+    for _ in range(60):
+        gateway.complete(MESSAGES, 0, "primary")
+    assert time.monotonic() - start < 1.0 and gateway.throttled_ms == 0
+
+    start = time.monotonic()
+    gateway.complete(MESSAGES, 0, "primary")
+    assert time.monotonic() - start >= 0.8
+    assert gateway.throttled_ms >= 800
+
+
+def test_tokens_per_minute_follow_reported_usage(gateway):
+    gateway.tokens = TokenBucket(60000)  # 1000 tokens a second
+    ChatStub.usage["primary"] = 30000
+    messages = [{"role": "user", "content": "x" * 4000}]  # reserved up front: 1000 + 400 tokens
+    start = time.monotonic()
+    gateway.complete(messages, 0, "primary")
+    gateway.complete(messages, 0, "primary")
+    assert time.monotonic() - start < 0.5  # 60000 tokens used, none left
+
+    start = time.monotonic()
+    gateway.complete(messages, 0, "primary")
+    assert time.monotonic() - start >= 1.2  # waits for the 1400 reserved
+    assert gateway.throttled_ms >= 1200
+
+
+def test_stream_falls_back_before_the_first_fragment(gateway):
+    ChatStub.statuses["primary"] = 500
+
+    async def run():
+        return [fragment async for fragment in gateway.astream(MESSAGES, 0, "primary", "fallback")]
+
+    assert "".join(asyncio.run(run())).split() == ["answer", "from", "fallback"]
+    assert gateway.health("primary").failures == 1
+
+
+def test_aclose_closes_both_clients(gateway):
+    async def run():
+        assert await gateway.acomplete(MESSAGES, 0, "primary") == "answer from primary"
+        gateway.complete(MESSAGES, 0, "primary")
+        clients = gateway.client, gateway.async_client
+        await gateway.aclose()
+        return clients
+
+    sync_client, async_client = asyncio.run(run())
+    assert sync_client.is_closed and async_client.is_closed
+    assert gateway.complete(MESSAGES, 0, "primary") == "answer from primary"  # a new pool on next use
+    assert gateway.client is not sync_client
+
+
+def test_shutdown_cancels_the_warmup_and_closes_the_clients(db, monkeypatch):
+    from fastapi.testclient import TestClient
+    from backend.main import app, llm_gateway
+
+    state = {}
+
+    async def slow_warmup():
+        state["started"] = True
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+
+    async def close():
+        state["closed"] = state.get("cancelled", False)  # after the warm-up is gone
+
+    monkeypatch.setattr(llm_gateway, "awarm", slow_warmup)
+    monkeypatch.setattr(llm_gateway, "aclose", close)
+    with TestClient(app):
+        pass
+    assert state == {"started": True, "cancelled": True, "closed": True}
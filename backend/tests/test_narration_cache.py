@@ -0,0 +1,97 @@
+import types
+
+import pytest
+
+from backend.core import narration_cache as narration_module
+from backend.core.narration_cache import NarrationCache, narration_cache
+
+DEVICE_SQL = "SELECT device_type, COUNT(*) AS n FROM transactions GROUP BY device_type ORDER BY n DESC"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A hand-driven monotonic clock for the cache module."""
+    now = [1000.0]
+    monkeypatch.setattr(narration_module, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = NarrationCache(max_entries=10, ttl_seconds=60)
+    cache.put("a", "answer")
+    clock[0] += 59
+    assert cache.get("a") == "answer"
+    clock[0] += 1
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1 and cache.stats()["entries"] == 0
+
+
+def test_a_hit_does_not_extend_the_ttl(clock):
+    cache = NarrationCache(max_entries=10, ttl_seconds=60)
+    cache.put("a", "answer")
+    clock[0] += 50
+    assert cache.get("a") == "answer"
+    clock[0] += 20
+    assert cache.get("a") is None
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = NarrationCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", "first")
+    cache.put("b", "second")
+    assert cache.get("a") == "first"  # b is now the least recently used
+    cache.put("c", "third")
+    assert cache.get("b") is None
+    assert cache.get("a") == "first" and cache.get("c") == "third"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disabled_or_empty_answers_are_not_stored():
+    for cache in (NarrationCache(max_entries=0, ttl_seconds=60), NarrationCache(max_entries=10, ttl_seconds=0)):
+        assert not cache.enabled
+        cache.put("a", "answer")
+        assert cache.get("a") is None
+    cache = NarrationCache(max_entries=10, ttl_seconds=60)
+    cache.put("a", "")
+    assert cache.stats()["entries"] == 0
+
+
+def test_key_follows_the_rows(exact):
+    cache = NarrationCache(max_entries=10, ttl_seconds=60)
+    result = exact(DEVICE_SQL)
+    key = cache.key_for("Transactions per device?", DEVICE_SQL, result, {})
+    assert key == cache.key_for("transactions  per DEVICE?", DEVICE_SQL, exact(DEVICE_SQL), {})
+
+    changed = {**result, "data": [dict(row) for row in result["data"]]}
+    changed["data"][0]["n"] += 1
+    assert key != cache.key_for("Transactions per device?", DEVICE_SQL, changed, {})
+    assert key != cache.key_for("Transactions per device?", DEVICE_SQL, {**result, "estimates": {"method": "sample"}}, {})
+    assert key != cache.key_for("Transactions per device?", DEVICE_SQL, result, {"top_share": 0.4})
+    assert key != cache.key_for("Transactions per device?", DEVICE_SQL + " LIMIT 3", result, {})
+
+
+def test_pipeline_reuses_the_narration(db, monkeypatch):
+    from backend.core.query_pipeline import pipeline
+    from backend.core.session_manager import session_manager
+
+    narrations = []
+
+    def fake_model(messages, temperature, expect_json):
+        if expect_json:
+            return '{"sql": "' + DEVICE_SQL + '", "query_intent": "Comparison"}'
+        narrations.append(messages)
+        return "Android leads."
+
+    monkeypatch.setattr(pipeline, "_call_gpt4", fake_model)
+    narration_cache.clear()
+    session_id = session_manager.create_session()
+    try:
+        first = pipeline.process("How many transactions per device type?", session_id)
+        second = pipeline.process("how many  transactions per DEVICE type?", session_id)
+        assert first["answer"] == second["answer"] == "Android leads."
+        assert len(narrations) == 1
+
+        pipeline.process("How many transactions per device type?", session_id, bypass_cache=True)
+        assert len(narrations) == 2
+    finally:
+        narration_cache.clear()
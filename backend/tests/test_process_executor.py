@@ -0,0 +1,60 @@
+import time
+import threading
+
+import duckdb
+import pytest
+
+from backend.core.process_executor import ProcessQueryExecutor, WorkerCrashed
+
+LONG_QUERY = "SELECT SUM(i) FROM range(100000000000) t(i)"
+
+
+@pytest.fixture
+def executor(tmp_path):
+    store = str(tmp_path / "store.duckdb")
+    conn = duckdb.connect(store)
+    conn.execute("CREATE TABLE numbers AS SELECT range AS n FROM range(10)")
+    conn.close()
+    executor = ProcessQueryExecutor(workers=1, timeout_s=60, threads=1)
+    executor.start(store, ["CREATE VIEW numbers AS SELECT * FROM store.numbers"])
+    yield executor
+    executor.stop()
+
+
+def _in_thread(fn):
+    outcome = {}
+
+    def target():
+        try:
+            outcome["result"] = fn()
+        except Exception as e:
+            outcome["error"] = e
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread, outcome
+
+
+def test_executes_in_a_worker(executor):
+    assert executor.execute("SELECT SUM(n) AS total FROM numbers").to_pylist() == [{"total": 45}]
+    with pytest.raises(RuntimeError):
+        executor.execute("SELECT * FROM missing_table")
+    assert executor.execute("SELECT COUNT(*) AS n FROM numbers").to_pylist() == [{"n": 10}]
+
+
+def test_stop_wakes_callers_waiting_for_a_worker(executor):
+    busy, busy_outcome = _in_thread(lambda: executor.execute(LONG_QUERY))
+    while executor.stats()["idle"]:
+        time.sleep(0.01)  # until the only worker is taken
+    waiters = [_in_thread(lambda: executor.execute("SELECT 1 AS one")) for _ in range(3)]
+    for thread, _ in waiters:
+        thread.join(0.2)
+        assert thread.is_alive()  # blocked: no idle worker
+
+    executor.stop()
+    for thread, outcome in waiters + [(busy, busy_outcome)]:
+        thread.join(10)
+        assert not thread.is_alive()
+    assert isinstance(busy_outcome["error"], WorkerCrashed)
+    for _, outcome in waiters:
+        assert isinstance(outcome["error"], RuntimeError)
+        assert "not running" in str(outcome["error"])
@@ -0,0 +1,58 @@
+import pytest
+
+from backend.core.profiler import ProfileEngine
+
+
+def scalar(db, sql: str):
+    return db.connection.execute(sql).fetchone()[0]
+
+
+def counts(db, column: str) -> dict:
+    return dict(db.connection.execute(f"SELECT {column}, COUNT(*) FROM transactions GROUP BY {column}").fetchall())
+
+
+def test_profile_equals_the_per_column_queries(db):
+    profile = db.get_data_profile()
+    assert profile["total_rows"] == scalar(db, "SELECT COUNT(*) FROM transactions")
+    assert profile["date_range"] == {
+        "min": str(scalar(db, "SELECT MIN(timestamp) FROM transactions")),
+        "max": str(scalar(db, "SELECT MAX(timestamp) FROM transactions")),
+    }
+    assert profile["success_rate"] == pytest.approx(scalar(
+        db, "SELECT SUM(CASE WHEN transaction_status = 'SUCCESS' THEN 1 ELSE 0 END) * 100.0 / COUNT(*) FROM transactions"))
+    assert profile["fraud_flag_rate"] == pytest.approx(scalar(
+        db, "SELECT SUM(CASE WHEN fraud_flag = 1 THEN 1 ELSE 0 END) * 100.0 / COUNT(*) FROM transactions"))
+    assert profile["avg_amount_inr"] == pytest.approx(scalar(db, "SELECT AVG(amount_inr) FROM transactions"))
+    assert profile["max_amount_inr"] == scalar(db, "SELECT MAX(amount_inr) FROM transactions")
+    assert profile["min_amount_inr"] == scalar(db, "SELECT MIN(amount_inr) FROM transactions")
+    assert profile["transaction_type_distribution"] == counts(db, "transaction_type")
+    assert profile["device_distribution"] == counts(db, "device_type")
+    assert profile["network_distribution"] == counts(db, "network_type")
+
+    states = db.connection.execute(
+        "SELECT sender_state, COUNT(*) AS n FROM transactions GROUP BY sender_state ORDER BY n DESC LIMIT 5"
+    ).fetchall()
+    assert [s["count"] for s in profile["top_5_states"]] == [n for _, n in states]
+    hours = counts(db, "hour_of_day")
+    assert hours[profile["peak_hour"]] == max(hours.values())
+
+
+def test_merged_partials_equal_one_scan(db, tmp_path):
+    engine = ProfileEngine(str(tmp_path))
+    whole = engine.compute_partials(db.connection)
+    early = engine.compute_partials(db.connection, "(SELECT * FROM transactions WHERE hour_of_day < 12)")
+    late = engine.compute_partials(db.connection, "(SELECT * FROM transactions WHERE hour_of_day >= 12)")
+    assert engine.finalize(engine.merge(early, late)) == engine.finalize(whole)
+
+
+class _NoScan:
+    def execute(self, sql):
+        raise AssertionError("the cached profile should not scan the table")
+
+
+def test_profile_is_cached_per_data_version(db, tmp_path):
+    engine = ProfileEngine(str(tmp_path))
+    first = engine.load_or_compute(db.connection, "v1")
+    assert engine.load_or_compute(_NoScan(), "v1") == first
+    with pytest.raises(AssertionError):
+        engine.load_or_compute(_NoScan(), "v2")
@@ -0,0 +1,112 @@
+import pytest
+
+from backend.core.prompt_builder import (
+    FEW_SHOT_EXAMPLES, PROMPT_HISTORY_MESSAGE_TOKENS, PromptBuilder, _SCHEMA_COLUMN_RE, _SQL_RE, count_tokens,
+)
+
+QUESTION = "Which bank has the highest failure rate on Android?"
+
+
+def assemble(budget: int, question: str = QUESTION, history=None, context=None, max_examples: int = 4):
+    return PromptBuilder(token_budget=budget, max_examples=max_examples).assemble_sql_generation_prompt(
+        question, history or [], context or {}
+    )
+
+
+def schema_lines(messages) -> dict:
+    """Column lines of the schema block (the first line per column; the value reference repeats some)."""
+    lines = {}
+    for line in messages[0]["content"].split("\n"):
+        match = _SCHEMA_COLUMN_RE.match(line)
+        if match:
+            lines.setdefault(match.group(1), line)
+    return lines
+
+
+def test_sections_add_up_to_the_prompt(db):
+    for budget in (0, 1, 2500):
+        messages, report = assemble(budget, history=[
+            {"role": "user", "content": "Failure rate by state?"}, {"role": "assistant", "content": "Delhi leads."},
+        ], context={"states": ["Delhi"]})
+        assert report["total"] == sum(count_tokens(m["content"]) for m in messages)
+        # Only the separators and the examples header are outside the sections
+        assert 0 <= report["total"] - sum(report["sections"].values()) < 30
+
+
+def test_zero_budget_sends_everything(db):
+    messages, report = assemble(0)
+    assert report["examples"] == [label for label, _ in FEW_SHOT_EXAMPLES]
+    assert report["detailed_columns"] is None
+    assert all(" — " in line for line in schema_lines(messages).values())
+
+
+def test_small_budget_keeps_the_best_example_and_relevant_columns(db):
+    messages, report = assemble(1)
+    assert report["examples"] == ["1"]  # the best example goes in even over budget
+    assert set(report["detailed_columns"]) == {"transaction_status", "sender_bank", "device_type"}
+    lines = schema_lines(messages)
+    for column, line in lines.items():
+        assert (" — " in line) == (column in report["detailed_columns"]), column
+    assert "Android" in lines["device_type"]
+    assert "receiver_bank" in lines  # still listed by name and type
+
+
+def test_examples_stop_at_the_budget(db):
+    _, lean = assemble(1)
+    fixed = sum(lean["sections"].values()) - lean["sections"]["examples"]
+    budget = fixed + lean["sections"]["examples"] + 250
+    _, report = assemble(budget)
+    assert report["examples"][0] == "1"
+    assert sum(report["sections"].values()) <= budget
+    _, roomy = assemble(100000)
+    assert len(report["examples"]) < len(roomy["examples"]) == 4
+
+
+def test_max_examples_caps_the_examples(db):
+    for max_examples in (1, 2, 6):
+        _, report = assemble(100000, max_examples=max_examples)
+        assert len(report["examples"]) == max_examples
+
+
+def test_examples_with_the_same_sql_go_in_once(db):
+    by_sql = {}
+    for label, text in FEW_SHOT_EXAMPLES:
+        by_sql.setdefault(_SQL_RE.search(text).group(1), []).append(label)
+    duplicates = [labels for labels in by_sql.values() if len(labels) > 1]
+    assert duplicates == [["1", "B"]]
+    _, report = assemble(100000, "Which bank has the most transactions and highest failure rate?", max_examples=13)
+    assert "1" in report["examples"] and "B" not in report["examples"]
+
+
+def test_history_is_deduplicated_and_truncated(db):
+    long_answer = "Maharashtra leads. " * 200
+    history = [
+        {"role": "user", "content": "Oldest question"}, {"role": "assistant", "content": "Dropped."},
+        {"role": "user", "content": "Which device fails most?"}, {"role": "assistant", "content": "Web."},
+        {"role": "user", "content": "Failure rate by state?"}, {"role": "assistant", "content": long_answer},
+        {"role": "user", "content": "failure  rate by STATE?"}, {"role": "assistant", "content": "Delhi leads."},
+    ]
+    messages, report = assemble(2500, history=history)
+    sent = messages[1:-1]
+    # Of the last four messages the repeated question (and its answer) goes in once, the latest
+    assert [m["content"] for m in sent] == ["failure  rate by STATE?", "Delhi leads."]
+    assert report["sections"]["history"] == sum(count_tokens(m["content"]) for m in sent)
+
+    messages, _ = assemble(2500, history=history[:6])
+    truncated = messages[-2]["content"]
+    assert truncated.endswith(" …") and len(truncated) <= PROMPT_HISTORY_MESSAGE_TOKENS * 4 + 2
+
+
+def test_context_pulls_in_follow_up_examples(db):
+    _, report = assemble(2500, "What is the fraud flag rate there?", context={"states": ["Maharashtra"]})
+    assert report["examples"][0] == "2"
+    assert report["sections"]["context"] > 0
+    assert "sender_state" in report["detailed_columns"]
+
+
+@pytest.mark.parametrize("budget", [1, 2500])
+def test_budgeted_prompt_is_smaller_than_the_full_prompt(db, budget):
+    _, full = assemble(0)
+    _, report = assemble(budget)
+    assert report["total"] < full["total"]
+    assert report["sections"]["schema"] < full["sections"]["schema"]
@@ -0,0 +1,64 @@
+import time
+import asyncio
+import threading
+
+from backend.core.query_context import QueryContext, query_scope
+from backend.routers import chat
+
+LONG_QUERY = "SELECT SUM(i) AS total FROM range(100000000000) t(i)"
+
+
+def test_timeout_interrupts_the_query(db, monkeypatch):
+    monkeypatch.setattr(db, "query_timeout_s", 0.3)
+    start = time.monotonic()
+    result = db.execute_query(LONG_QUERY)
+    assert not result["success"] and result["error_type"] == "timeout"
+    assert time.monotonic() - start < 5
+    assert db.execute_query("SELECT COUNT(*) AS n FROM transactions")["success"]  # the cursor is usable again
+
+
+def test_cancelling_the_context_interrupts_the_query(db):
+    context = QueryContext(question="how long?")
+    threading.Timer(0.2, context.cancel, args=("client disconnected",)).start()
+    start = time.monotonic()
+    with query_scope(context):
+        result = db.execute_query(LONG_QUERY)
+    assert not result["success"] and result["error_type"] == "cancelled"
+    assert "client disconnected" in result["error"]
+    assert time.monotonic() - start < 5
+
+
+def test_a_cancelled_context_runs_nothing(db):
+    context = QueryContext()
+    context.cancel()
+    with query_scope(context):
+        result = db.execute_query("SELECT COUNT(*) AS n FROM transactions WHERE fraud_flag = 1")
+    assert result["error_type"] == "cancelled"
+
+
+class _Request:
+    """Stands in for the Starlette request: disconnects after `after` seconds."""
+
+    def __init__(self, after: float):
+        self.deadline = time.monotonic() + after
+
+    async def is_disconnected(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+
+def test_client_disconnect_interrupts_the_running_query(db, monkeypatch):
+    monkeypatch.setattr(chat, "DISCONNECT_POLL_SECONDS", 0.05)
+
+    async def run():
+        context = QueryContext()
+        watcher = asyncio.create_task(chat._cancel_on_disconnect(_Request(0.2), context))
+        with query_scope(context):
+            result = await asyncio.to_thread(db.execute_query, LONG_QUERY)
+        await watcher
+        return context, result
+
+    start = time.monotonic()
+    context, result = asyncio.run(run())
+    assert context.reason == "client disconnected"
+    assert result["error_type"] == "cancelled"
+    assert time.monotonic() - start < 5
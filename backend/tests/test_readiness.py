@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.main as main
+from backend.core.warmup import Warmup
+
+
+async def _no_llm_warmup():
+    pass
+
+
+@pytest.fixture
+def start_app(db, monkeypatch):
+    """Run the app's lifespan with the given warm-up steps in place of the real ones."""
+    monkeypatch.setattr(main.llm_gateway, "awarm", _no_llm_warmup)
+
+    def start(steps):
+        warmup = Warmup(steps)
+        monkeypatch.setattr(main, "warmup", warmup)
+        return TestClient(main.app), warmup
+    return start
+
+
+def test_ready_once_the_warmup_finishes(start_app):
+    loading = threading.Event()
+    client, warmup = start_app([("data", loading.wait), ("prompts", lambda: None)])
+    with client:
+        ready = client.get("/ready")
+        assert ready.status_code == 503 and ready.json()["status"] == "warming"
+        assert client.get("/health").status_code == 200
+        dashboard = client.get("/api/dashboard")
+        assert dashboard.status_code == 503 and dashboard.json()["detail"]["error"] == "warming_up"
+
+        loading.set()
+        assert warmup.wait(5)
+        ready = client.get("/ready")
+        assert ready.status_code == 200
+        assert ready.json()["status"] == "ready" and set(ready.json()["steps"]) == {"data", "prompts"}
+        assert client.get("/api/dashboard").status_code == 200
+
+
+def test_a_failed_warmup_is_never_ready(start_app):
+    def broken():
+        raise FileNotFoundError("no CSV")
+
+    client, warmup = start_app([("data", broken), ("prompts", lambda: None)])
+    with client:
+        assert not warmup.wait(5)
+        ready = client.get("/ready")
+        assert ready.status_code == 503
+        assert ready.json()["status"] == "failed" and ready.json()["error"] == "data: no CSV"
+        assert client.get("/api/dashboard").json()["detail"]["error"] == "warmup_failed"
@@ -0,0 +1,63 @@
+import pyarrow as pa
+
+from backend.core.result_cache import ResultCache, result_cache
+from backend.core.result_set import ResultSet
+
+BY_DEVICE = "SELECT device_type, COUNT(*) AS n FROM transactions GROUP BY device_type ORDER BY n"
+BY_DEVICE_RESPELLED = "select device_type,count(*)  as total from transactions\ngroup by device_type order by total"
+
+
+def rows(n: int) -> ResultSet:
+    return ResultSet(pa.table({"value": pa.array(range(n), pa.int64())}))
+
+
+def test_canonically_equal_queries_share_an_entry_under_their_own_aliases():
+    cache = ResultCache(1 << 20)
+    key, aliases = cache.key_for(BY_DEVICE, "v1")
+    cache.put(key, aliases, ResultSet(pa.table({"device_type": ["Web"], "n": [3]})))
+
+    other_key, other_aliases = cache.key_for(BY_DEVICE_RESPELLED, "v1")
+    assert other_key == key
+    hit = cache.get(other_key, other_aliases)
+    assert hit.column_names == ["device_type", "total"]
+    assert hit.to_records() == [{"device_type": "Web", "total": 3}]
+
+
+def test_a_new_data_version_misses():
+    cache = ResultCache(1 << 20)
+    key, aliases = cache.key_for(BY_DEVICE, "v1")
+    cache.put(key, aliases, rows(3))
+    reloaded_key, _ = cache.key_for(BY_DEVICE, "v2")
+    assert reloaded_key != key
+    assert cache.get(reloaded_key, aliases) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_entries_stay_within_the_byte_budget():
+    size = rows(100).nbytes
+    cache = ResultCache(size * 2)
+    keys = [cache.key_for(f"SELECT value FROM t{i}", "v1") for i in range(3)]
+    for key, aliases in keys:
+        cache.put(key, aliases, rows(100))
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+    assert stats["bytes"] <= stats["max_bytes"]
+    assert cache.get(*keys[0]) is None  # least recently used went first
+    assert cache.get(*keys[2]) is not None
+
+    key, aliases = cache.key_for("SELECT value FROM big", "v1")
+    cache.put(key, aliases, rows(1000))  # larger than the whole budget: not cached
+    assert cache.get(key, aliases) is None
+    assert cache.stats()["entries"] == 2
+
+
+def test_repeated_query_is_served_from_the_cache_until_the_data_changes(db, monkeypatch):
+    result_cache.clear()
+    first = db.execute_query(BY_DEVICE)
+    second = db.execute_query(BY_DEVICE_RESPELLED)
+    assert not first["cache_hit"] and second["cache_hit"]
+    assert [list(r.values()) for r in second["data"]] == [list(r.values()) for r in first["data"]]
+
+    monkeypatch.setattr(db, "data_version", f"{db.data_version}-next")
+    assert not db.execute_query(BY_DEVICE)["cache_hit"]
+    result_cache.clear()
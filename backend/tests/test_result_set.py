@@ -0,0 +1,59 @@
+import datetime
+
+import pyarrow as pa
+import pytest
+
+from backend.core.result_set import ResultSet, to_records
+
+
+@pytest.fixture
+def result():
+    return ResultSet(pa.table({
+        "bank": pa.array(["SBI", "HDFC", None]).dictionary_encode(),
+        "total": pa.array([10, 20, 30], pa.decimal128(18, 0)),
+        "rate": pa.array([1.5, None, 2.5]),
+        "first_at": pa.array([datetime.datetime(2024, 1, 1, 9, 30), None, datetime.datetime(2024, 2, 1)]),
+        "n": pa.array([1, 2, 3], pa.int64()),
+    }))
+
+
+def test_columns_are_normalized(result):
+    assert result.column_names == ["bank", "total", "rate", "first_at", "n"]
+    assert result.arrow.schema.field("bank").type == pa.string()  # ENUM dictionary decoded
+    assert result.arrow.schema.field("total").type == pa.float64()  # DECIMAL sums as floats
+    assert result.column("bank") == ["SBI", "HDFC", None]
+    assert result.column("total") == [10.0, 20.0, 30.0]
+    assert result.numeric_columns() == ["total", "rate", "n"]
+    assert result.string_columns() == ["bank"]
+
+
+def test_records_are_json_ready(result):
+    assert result.to_records() == [
+        {"bank": "SBI", "total": 10.0, "rate": 1.5, "first_at": "2024-01-01 09:30:00", "n": 1},
+        {"bank": "HDFC", "total": 20.0, "rate": None, "first_at": None, "n": 2},
+        {"bank": None, "total": 30.0, "rate": 2.5, "first_at": "2024-02-01 00:00:00", "n": 3},
+    ]
+    assert to_records(result) == result.to_records()
+    assert to_records([{"a": 1}]) == [{"a": 1}] and to_records(None) == []
+
+
+def test_sequence_access_matches_records(result):
+    records = result.to_records()
+    fresh = ResultSet(result.arrow)  # indexed before any records are built
+    assert len(fresh) == 3
+    assert fresh[0] == records[0] and fresh[-1] == records[-1]
+    assert fresh[1:] == records[1:]
+    with pytest.raises(IndexError):
+        fresh[3]
+    assert list(fresh) == records
+    assert fresh == records and fresh == result
+
+
+def test_columnar_query_matches_row_query(exact, db):
+    sql = ("SELECT sender_bank, device_type, SUM(amount_inr) AS total, MIN(timestamp) AS first_at "
+           "FROM transactions GROUP BY sender_bank, device_type ORDER BY sender_bank, device_type")
+    rows = exact(sql)["data"]
+    columnar = db.execute_query(sql, columnar=True)["data"]
+    assert isinstance(columnar, ResultSet)
+    assert columnar.to_records() == rows
+    assert columnar.column("total") == [row["total"] for row in rows]
@@ -0,0 +1,109 @@
+import pytest
+
+from backend.core.cube import cube_router
+from backend.core.result_cache import result_cache
+from backend.tests.conftest import FIXTURE_ROWS
+
+COVERAGE_QUERIES = [
+    "SELECT sender_state, COUNT(*) AS n FROM transactions GROUP BY sender_state ORDER BY sender_state",
+    "SELECT sender_bank, ROUND(AVG(amount_inr), 2) AS avg_amount FROM transactions GROUP BY sender_bank ORDER BY sender_bank",
+    "SELECT device_type, ROUND(SUM(CASE WHEN transaction_status = 'FAILED' THEN 1.0 ELSE 0 END) * 100.0 / COUNT(*), 2) "
+    "AS failure_rate, SUM(amount_inr) AS total FROM transactions GROUP BY device_type ORDER BY device_type",
+    "SELECT network_type, COUNT(*) AS n FROM transactions WHERE transaction_type = 'P2P' GROUP BY network_type ORDER BY network_type",
+]
+
+
+@pytest.fixture
+def run(db, monkeypatch):
+    """execute_query without cube routing (cube-routable queries are never sampled) or result cache."""
+    monkeypatch.setattr(cube_router, "enabled", False)
+
+    def run(sql: str, approximate: bool) -> dict:
+        result_cache.clear()
+        return db.execute_query(sql, approximate=approximate)
+    yield run
+    result_cache.clear()
+
+
+def test_total_count_is_scaled_to_the_population(run):
+    result = run("SELECT COUNT(*) AS n FROM transactions", approximate=True)
+    assert result["approximate"]
+    low, high = result["estimates"]["intervals"][0]["n"]
+    assert low <= FIXTURE_ROWS <= high
+    assert result["estimates"]["population_rows"] == FIXTURE_ROWS
+    assert 0 < result["estimates"]["sample_rows"] < FIXTURE_ROWS
+
+
+def test_confidence_intervals_cover_exact_values(run):
+    covered = total = 0
+    for sql in COVERAGE_QUERIES:
+        approx, exact = run(sql, approximate=True), run(sql, approximate=False)
+        assert approx["approximate"] and not exact["approximate"]
+        exact_rows = {tuple(v for v in row.values() if isinstance(v, str)): row for row in exact["data"]}
+        for row, intervals in zip(approx["data"], approx["estimates"]["intervals"]):
+            truth = exact_rows[tuple(v for v in row.values() if isinstance(v, str))]
+            for column, (low, high) in intervals.items():
+                total += 1
+                covered += low <= float(truth[column]) <= high
+    # Nominal 95%; the seeded fixture and hash sample make this deterministic
+    assert total >= 20
+    assert covered / total >= 0.85
+
+
+def test_limit_over_overlapping_groups_runs_exact(run):
+    sql = "SELECT device_type, COUNT(*) AS c FROM transactions GROUP BY device_type ORDER BY c DESC LIMIT 1"
+    approx, exact = run(sql, approximate=True), run(sql, approximate=False)
+    assert not approx["approximate"]
+    assert approx["data"] == exact["data"]
+
+
+def test_limit_ranked_by_hidden_aggregate_runs_exact(run):
+    sql = "SELECT device_type FROM transactions GROUP BY device_type ORDER BY COUNT(*) DESC LIMIT 1"
+    assert not run(sql, approximate=True)["approximate"]
+
+
+def test_overlapping_ranking_is_marked_uncertain(run):
+    sql = "SELECT device_type, COUNT(*) AS c FROM transactions GROUP BY device_type ORDER BY c DESC"
+    result = run(sql, approximate=True)
+    assert result["approximate"]
+    ranking = result["estimates"]["ranking"]
+    assert ranking["column"] == "c" and ranking["order"] == "DESC"
+    assert ranking["uncertain"] and ranking["overlapping_rows"]
+
+
+def test_separable_ranking_is_kept(run):
+    # SUCCESS outnumbers FAILED about 19 to 1: the sample separates them
+    sql = ("SELECT transaction_status, COUNT(*) AS c FROM transactions GROUP BY transaction_status "
+           "ORDER BY c DESC LIMIT 1")
+    result = run(sql, approximate=True)
+    assert result["approximate"]
+    assert result["data"][0]["transaction_status"] == "SUCCESS"
+    assert result["estimates"]["ranking"]["uncertain"] is False
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT sender_bank, COUNT(*) AS n FROM transactions GROUP BY sender_bank HAVING COUNT(*) > 10",
+    "SELECT sender_bank, MAX(amount_inr) AS m FROM transactions GROUP BY sender_bank",
+    "SELECT transaction_id, amount_inr FROM transactions WHERE amount_inr > 49000",
+    "SELECT COUNT(*) + 1 AS n FROM transactions",
+])
+def test_unsupported_shapes_fall_back_to_exact(run, sql):
+    approx, exact = run(sql, approximate=True), run(sql, approximate=False)
+    assert approx["success"] and not approx["approximate"]
+    assert approx["data"] == exact["data"]
+
+
+def test_cube_routable_queries_stay_exact(db, monkeypatch):
+    monkeypatch.setattr(cube_router, "enabled", True)
+    result_cache.clear()
+    result = db.execute_query("SELECT sender_bank, COUNT(*) AS n FROM transactions GROUP BY sender_bank",
+                              approximate=True)
+    assert result["cube_routed"] and not result["approximate"]
+
+
+def test_narration_prompt_warns_about_uncertain_ranking(run):
+    from backend.core.prompt_builder import prompt_builder
+    sql = "SELECT device_type, COUNT(*) AS c FROM transactions GROUP BY device_type ORDER BY c DESC"
+    result = run(sql, approximate=True)
+    messages = prompt_builder.build_narration_prompt("Which device is used most?", sql, result, "volume by device", {})
+    assert "is NOT certain" in messages[-1]["content"]
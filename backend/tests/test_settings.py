@@ -0,0 +1,23 @@
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Stands in for a .env file: load_dotenv sets the values only if it runs before the modules read them
+PROBE = """
+import os, dotenv
+dotenv.load_dotenv = lambda *args, **kwargs: os.environ.update(
+    STORAGE_FORMAT="parquet", QUERY_TIMEOUT_SECONDS="7", CUBE_MAX_DIMS="2", SKETCH_HLL_PRECISION="11")
+from backend.core.database import db
+from backend.core import ingest, process_executor, cube, sketches
+print(ingest.STORAGE_FORMAT, process_executor.QUERY_TIMEOUT_SECONDS, cube.CUBE_MAX_DIMS, sketches.HLL_PRECISION)
+"""
+
+
+def test_dotenv_settings_reach_import_time_constants():
+    env = {k: v for k, v in os.environ.items()
+           if k not in ("STORAGE_FORMAT", "QUERY_TIMEOUT_SECONDS", "CUBE_MAX_DIMS", "SKETCH_HLL_PRECISION")}
+    output = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True,
+                            check=True).stdout
+    assert output.split() == ["parquet", "7.0", "2", "11"]
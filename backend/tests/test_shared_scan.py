@@ -0,0 +1,141 @@
+import time
+import threading
+
+import pytest
+
+from backend.core.result_cache import result_cache
+from backend.core.shared_scan import ScanBatch, parse_query, plan_shared_scan, scan_scope, shared_scan_stats
+
+# Sibling sub-queries the cube cannot answer (filters and aggregates outside it), with
+# different groupings, filters, orders and limits
+BRANCHES = [
+    "SELECT sender_state, COUNT(*) AS failed, ROUND(AVG(amount_inr), 2) AS avg_amount FROM transactions "
+    "WHERE transaction_status = 'FAILED' GROUP BY sender_state ORDER BY failed DESC, sender_state LIMIT 5",
+    "SELECT receiver_bank, MAX(amount_inr) AS largest FROM transactions GROUP BY receiver_bank ORDER BY receiver_bank",
+    "SELECT device_type, network_type, SUM(amount_inr) AS total FROM transactions WHERE amount_inr > 25000 "
+    "GROUP BY device_type, network_type ORDER BY device_type, network_type",
+    "SELECT COUNT(*) AS big, MIN(amount_inr) AS smallest FROM transactions WHERE amount_inr > 45000",
+]
+
+
+@pytest.fixture
+def standalone(db):
+    def run(sql: str):
+        result_cache.clear()
+        return db.execute_query(sql, columnar=True)["data"]
+    yield run
+    result_cache.clear()
+
+
+def assert_same_result(shared, alone):
+    """Same columns, types, row order and values (floats up to summation order)."""
+    assert shared.arrow.schema == alone.arrow.schema
+    shared_rows, alone_rows = shared.to_records(), alone.to_records()
+    assert len(shared_rows) == len(alone_rows)
+    for got, expected in zip(shared_rows, alone_rows):
+        assert got == {k: pytest.approx(v) if isinstance(v, float) else v for k, v in expected.items()}
+
+
+def test_split_results_equal_standalone_results(db, standalone):
+    plan, members = plan_shared_scan(BRANCHES)
+    assert members == [0, 1, 2, 3]
+    assert plan.sql.count("FROM transactions") == 1 and "GROUPING SETS" in plan.sql
+
+    result_cache.clear()
+    merged = db.execute_query(plan.sql, columnar=True)
+    assert merged["success"]
+    for sql, shared in zip(BRANCHES, plan.split(merged["data"])):
+        assert_same_result(shared, standalone(sql))
+
+
+def test_groups_of_other_branches_are_dropped(db, standalone):
+    # Few states have rows for the narrow filter; the other branch sees every state
+    narrow = ("SELECT sender_state, COUNT(*) AS n FROM transactions WHERE amount_inr = 10 "
+              "AND transaction_type = 'P2P' GROUP BY sender_state ORDER BY sender_state")
+    wide = "SELECT sender_state, MAX(amount_inr) AS largest FROM transactions GROUP BY sender_state ORDER BY sender_state"
+    plan, members = plan_shared_scan([narrow, wide])
+    assert members == [0, 1]
+    narrow_result, wide_result = plan.split(db.execute_query(plan.sql, columnar=True)["data"])
+    assert_same_result(narrow_result, standalone(narrow))
+    assert_same_result(wide_result, standalone(wide))
+    assert len(narrow_result) < len(wide_result)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT sender_state, COUNT(*) FROM transactions GROUP BY sender_state",  # unaliased aggregate
+    "SELECT transaction_id, COUNT(*) AS n FROM transactions GROUP BY transaction_id",  # high cardinality
+    "SELECT COUNT(DISTINCT sender_bank) AS banks FROM transactions",
+    "SELECT sender_state, COUNT(*) AS n FROM transactions GROUP BY sender_state HAVING COUNT(*) > 1",
+    "SELECT COUNT(*) AS n FROM transactions t JOIN transactions u ON t.transaction_id = u.transaction_id",
+    "SELECT COUNT(*) AS n FROM (SELECT * FROM transactions)",
+    "SELECT sender_state, COUNT(*) AS n FROM transactions GROUP BY sender_state ORDER BY COUNT(*) DESC",
+])
+def test_unmergeable_queries_are_not_parsed(db, sql):
+    assert parse_query(sql) is None
+
+
+def test_cube_queries_and_lone_queries_run_on_their_own(db):
+    cube_query = "SELECT sender_state, COUNT(*) AS n FROM transactions GROUP BY sender_state"
+    plan, members = plan_shared_scan([cube_query, BRANCHES[1], "SELECT 1 AS one"])
+    assert plan is None and members == []
+    plan, members = plan_shared_scan([cube_query] + BRANCHES[:2])
+    assert members == [1, 2]
+
+
+def test_scan_batch_hands_each_member_its_slice(db, standalone):
+    batch = ScanBatch(len(BRANCHES) + 1)
+    results = {}
+
+    def branch(i):
+        with scan_scope(batch) as member:
+            if i < len(BRANCHES):
+                results[i] = member.execute(BRANCHES[i])
+
+    threads = [threading.Thread(target=branch, args=(i,)) for i in range(len(BRANCHES) + 1)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+        assert not thread.is_alive()
+    for i, sql in enumerate(BRANCHES):
+        assert results[i]["success"] and results[i]["shared_scan"]
+        assert_same_result(results[i]["data"], standalone(sql))
+
+
+def run_branches(batch, delays):
+    """One thread per branch, each submitting BRANCHES[i] after delays[i] seconds;
+    returns ({i: result}, {i: seconds from start until it had its result})."""
+    results, finished = {}, {}
+    start = time.monotonic()
+
+    def branch(i):
+        with scan_scope(batch) as member:
+            time.sleep(delays[i])
+            results[i] = member.execute(BRANCHES[i])
+            finished[i] = time.monotonic() - start
+
+    threads = [threading.Thread(target=branch, args=(i,)) for i in range(len(delays))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+        assert not thread.is_alive()
+    return results, finished
+
+
+def test_a_slow_sibling_does_not_hold_up_the_others(db, standalone):
+    expired = shared_scan_stats.stats()["expired_batches"]
+    results, finished = run_branches(ScanBatch(3, wait_s=0.3), [0, 0, 2.0])
+    assert max(finished[0], finished[1]) < 1.5  # gave up waiting, not blocked on the slow branch
+    assert finished[2] >= 2.0
+    for i in range(3):
+        assert results[i]["success"] and not results[i].get("shared_scan")  # every member ran alone
+        assert_same_result(results[i]["data"], standalone(BRANCHES[i]))
+    assert shared_scan_stats.stats()["expired_batches"] == expired + 1
+
+
+def test_siblings_within_the_wait_still_share_a_scan(db, standalone):
+    results, _ = run_branches(ScanBatch(3, wait_s=5), [0, 0, 0.3])
+    for i in range(3):
+        assert results[i]["shared_scan"]
+        assert_same_result(results[i]["data"], standalone(BRANCHES[i]))
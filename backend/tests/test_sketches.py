@@ -0,0 +1,142 @@
+import numpy as np
+import pytest
+
+from backend.core.sketches import (
+    ALL_ROWS, HyperLogLog, TDigest, compute_sketches, sketch_index,
+)
+from backend.tests.conftest import FIXTURE_ROWS
+
+# Disjoint slices of the fixture table; together they are every row
+PARTS = [
+    "(SELECT * FROM transactions WHERE hour_of_day < 8)",
+    "(SELECT * FROM transactions WHERE hour_of_day BETWEEN 8 AND 15)",
+    "(SELECT * FROM transactions WHERE hour_of_day > 15)",
+]
+
+
+@pytest.fixture(scope="module")
+def sketches(db):
+    whole = compute_sketches(db.connection, "transactions")
+    parts = [compute_sketches(db.connection, source) for source in PARTS]
+    return whole, parts
+
+
+def exact_value(db, sql: str):
+    return db.connection.execute(sql).fetchone()[0]
+
+
+def test_hll_merge_is_associative_and_commutative(sketches):
+    _, (a, b, c) = sketches
+    key = (ALL_ROWS, ALL_ROWS, "transaction_id")
+    left = a[key].merge(b[key]).merge(c[key])
+    right = a[key].merge(b[key].merge(c[key]))
+    swapped = c[key].merge(a[key]).merge(b[key])
+    assert np.array_equal(left.registers, right.registers)
+    assert np.array_equal(left.registers, swapped.registers)
+
+
+def test_merged_hll_equals_the_sketch_of_all_rows(sketches):
+    whole, parts = sketches
+    for key, sketch in whole.items():
+        if not isinstance(sketch, HyperLogLog):
+            continue
+        pieces = [p[key] for p in parts if key in p]
+        merged = pieces[0]
+        for piece in pieces[1:]:
+            merged = merged.merge(piece)
+        assert np.array_equal(merged.registers, sketch.registers), key
+
+
+def test_hll_rejects_mixed_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(11).merge(HyperLogLog(12))
+
+
+def test_tdigest_merge_order_does_not_change_quantiles(sketches, db):
+    whole, (a, b, c) = sketches
+    key = (ALL_ROWS, ALL_ROWS, "amount_inr")
+    left = a[key].merge(b[key]).merge(c[key])
+    right = a[key].merge(b[key].merge(c[key]))
+    assert left.count == right.count == whole[key].count == FIXTURE_ROWS
+    assert (left.minimum, left.maximum) == (right.minimum, right.maximum) == (whole[key].minimum, whole[key].maximum)
+    spread = whole[key].maximum - whole[key].minimum
+    for q in (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99):
+        exact = exact_value(db, f"SELECT quantile_cont(amount_inr, {q}) FROM transactions")
+        for digest in (left, right, whole[key]):
+            assert abs(digest.quantile(q) - exact) <= 0.02 * spread, (q, digest.quantile(q), exact)
+
+
+def test_tdigest_interval_contains_exact_quantile(db):
+    values = np.sort(np.random.default_rng(3).exponential(1000, 20000))
+    digest = TDigest.from_sorted(values, np.ones_like(values))
+    for q in (0.05, 0.5, 0.95):
+        low, high = digest.quantile_interval(q)
+        assert low <= np.quantile(values, q) <= high
+
+
+def test_sketches_survive_a_bytes_round_trip(sketches):
+    whole, _ = sketches
+    hll = whole[(ALL_ROWS, ALL_ROWS, "sender_bank")]
+    copy = HyperLogLog.from_bytes(hll.to_bytes())
+    assert copy.precision == hll.precision and np.array_equal(copy.registers, hll.registers)
+
+    digest = whole[(ALL_ROWS, ALL_ROWS, "amount_inr")]
+    copy = TDigest.from_bytes(digest.to_bytes())
+    assert (copy.compression, copy.minimum, copy.maximum) == (digest.compression, digest.minimum, digest.maximum)
+    assert np.array_equal(copy.means, digest.means) and np.array_equal(copy.weights, digest.weights)
+
+
+def test_distinct_counts_match_exact(db):
+    assert sketch_index.loaded
+    for target in ("transaction_id", "sender_bank", "sender_state", "merchant_category"):
+        exact = exact_value(db, f"SELECT COUNT(DISTINCT {target}) FROM transactions")
+        estimate = sketch_index.distinct_count(target)
+        assert abs(estimate - exact) <= max(1, 3 * HyperLogLog().relative_error * exact), target
+
+    grouped = sketch_index.distinct_count("sender_bank", by="device_type")
+    rows = db.connection.execute(
+        "SELECT device_type, COUNT(DISTINCT sender_bank) FROM transactions GROUP BY device_type"
+    ).fetchall()
+    assert grouped == dict(rows)
+
+
+def test_quantiles_match_exact(db):
+    spread = exact_value(db, "SELECT MAX(amount_inr) - MIN(amount_inr) FROM transactions")
+    median = exact_value(db, "SELECT median(amount_inr) FROM transactions")
+    assert abs(sketch_index.quantile(0.5) - median) <= 0.02 * spread
+
+    filtered = sketch_index.quantile(0.9, where={"device_type": ["iOS", "Web"]})
+    exact = exact_value(db, "SELECT quantile_cont(amount_inr, 0.9) FROM transactions WHERE device_type IN ('iOS', 'Web')")
+    assert abs(filtered - exact) <= 0.02 * spread
+
+
+def test_sketches_refuse_unsketched_groupings():
+    with pytest.raises(ValueError):
+        sketch_index.quantile(0.5, by="receiver_age_group")
+    with pytest.raises(ValueError):
+        sketch_index.distinct_count("device_type")
+
+
+def test_approximate_query_is_answered_by_the_sketch_index(db, monkeypatch):
+    from backend.core.cube import cube_router
+    from backend.core.result_cache import result_cache
+
+    monkeypatch.setattr(cube_router, "enabled", False)
+    result_cache.clear()
+    try:
+        result = db.execute_query(
+            "SELECT sender_state, COUNT(DISTINCT sender_bank) AS banks, MEDIAN(amount_inr) AS median_amount "
+            "FROM transactions GROUP BY sender_state ORDER BY sender_state", approximate=True,
+        )
+    finally:
+        result_cache.clear()
+    assert result["success"] and result["approximate"]
+    assert "sketch index" in result["estimates"]["method"]
+    exact = dict(db.connection.execute(
+        "SELECT sender_state, median(amount_inr) FROM transactions GROUP BY sender_state"
+    ).fetchall())
+    assert [row["sender_state"] for row in result["data"]] == sorted(exact)
+    for row, interval in zip(result["data"], result["estimates"]["intervals"]):
+        assert row["banks"] == 8
+        low, high = interval["median_amount"]
+        assert low <= exact[row["sender_state"]] <= high
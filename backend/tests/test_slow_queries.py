@@ -0,0 +1,58 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.core.cube import cube_router
+from backend.core.query_context import QueryContext, query_scope
+from backend.core.query_profiler import query_profiler
+from backend.core.result_cache import result_cache
+from backend.main import app
+from backend.tests.conftest import FIXTURE_ROWS
+
+SCAN = "SELECT device_type, SUM(amount_inr) AS total FROM transactions GROUP BY device_type ORDER BY device_type"
+FILTERED = "SELECT COUNT(*) AS n FROM transactions WHERE fraud_flag = 1"
+
+
+@pytest.fixture
+def profiling(db, monkeypatch):
+    """Every query profiled and captured, answered from the base table."""
+    monkeypatch.setattr(query_profiler, "enabled", True)
+    monkeypatch.setattr(query_profiler, "threshold_ms", 0)
+    monkeypatch.setattr(cube_router, "enabled", False)
+    query_profiler.clear()
+    result_cache.clear()
+    yield
+    query_profiler.clear()
+    result_cache.clear()
+    with db.pool.cursor() as cursor:
+        cursor.execute("PRAGMA disable_profiling")
+
+
+def test_slow_queries_list_plans_newest_first(db, profiling):
+    with query_scope(QueryContext(question="Total by device?")):
+        assert db.execute_query(SCAN)["success"]
+    assert db.execute_query(FILTERED)["success"]
+
+    body = TestClient(app).get("/api/admin/slow-queries").json()
+    assert body["enabled"] and body["threshold_ms"] == 0 and body["buffered"] == 2
+    newest, oldest = body["queries"]
+    assert newest["sql"].startswith(FILTERED) and newest["question"] is None
+    assert oldest["sql"].startswith(SCAN) and oldest["question"] == "Total by device?"
+    assert oldest["row_count"] == 3 and not oldest["timed_out"]
+    assert oldest["rows_scanned"] == FIXTURE_ROWS
+    timings = [op["timing_ms"] for op in oldest["operators"]]
+    assert timings and timings == sorted(timings, reverse=True)
+    assert any(op["operator"].startswith(("SEQ_SCAN", "TABLE_SCAN")) for op in oldest["operators"])
+    assert isinstance(oldest["plan"], dict)
+
+    limited = TestClient(app).get("/api/admin/slow-queries", params={"limit": 1}).json()
+    assert [q["sql"] for q in limited["queries"]] == [newest["sql"]]
+    assert TestClient(app).get("/api/admin/slow-queries", params={"limit": 0}).status_code == 422
+
+
+def test_timed_out_queries_are_logged_without_a_plan(db, profiling, monkeypatch):
+    monkeypatch.setattr(db, "query_timeout_s", 0.2)
+    assert db.execute_query("SELECT SUM(i) FROM range(100000000000) t(i)")["error_type"] == "timeout"
+    [capture] = TestClient(app).get("/api/admin/slow-queries").json()["queries"]
+    assert capture["timed_out"] and capture["row_count"] is None
+    assert capture["plan"] is None and capture["operators"] == []
+    assert capture["execution_time_ms"] >= 150
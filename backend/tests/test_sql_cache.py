@@ -0,0 +1,95 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from backend.core.query_pipeline import pipeline
+from backend.core.session_manager import session_manager
+from backend.core.sql_cache import QuestionSQLCache, sql_cache
+
+RESPONSE = {"sql": "SELECT COUNT(*) FROM transactions WHERE network_type = 'WiFi'", "query_intent": "Count",
+            "entities_extracted": {}, "requires_chart": False, "suggested_chart_type": None, "reasoning": "dropped"}
+
+
+@pytest.fixture
+def cache(db, tmp_path):
+    return QuestionSQLCache(db_path=str(tmp_path / "cache.db"), max_entries=2)
+
+
+def rows(cache: QuestionSQLCache) -> list:
+    conn = sqlite3.connect(cache.db_path)
+    try:
+        return conn.execute("SELECT normalized_question, schema_fingerprint FROM sql_cache").fetchall()
+    finally:
+        conn.close()
+
+
+def test_questions_are_normalized(cache):
+    assert cache.normalize("What is the failure rate on wi-fi?") == "failure rate WiFi"
+    assert cache.normalize("Show me the FAILURE rate for Wifi") == "failure rate WiFi"
+    assert cache.normalize("Which banks are NOT in tamil nadu?") == "banks not Tamil Nadu"
+    assert cache.normalize("failure rate by state") != cache.normalize("failure rate per state")
+
+
+def test_reworded_questions_hit_within_the_same_context(cache):
+    cache.put("What is the failure rate on wi-fi?", {}, RESPONSE)
+    hit = cache.get("failure rate on WIFI", {})
+    assert hit == {k: v for k, v in RESPONSE.items() if k != "reasoning"}
+    assert cache.get("failure rate on WIFI", {"states": ["Delhi"]}) is None
+    assert cache.get("success rate on WIFI", {}) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_entries_survive_a_restart_until_discarded(cache):
+    cache.put("failure rate on wifi", {"states": ["Delhi"]}, RESPONSE)
+    restarted = QuestionSQLCache(db_path=cache.db_path)
+    assert restarted.get("Failure rate on Wi-Fi?", {"states": ["Delhi"]})["sql"] == RESPONSE["sql"]
+
+    restarted.discard("failure rate on wifi", {"states": ["Delhi"]})
+    assert restarted.get("failure rate on wifi", {"states": ["Delhi"]}) is None
+    assert rows(cache) == []
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    for question in ("failure rate on wifi", "failure rate on 4G", "failure rate on 5G"):
+        cache.put(question, {}, RESPONSE)
+    assert cache.get("failure rate on wifi", {}) is None
+    assert cache.stats()["entries"] == 2 and cache.evictions == 1
+    assert sorted(q for q, _ in rows(cache)) == ["failure rate 4G", "failure rate 5G"]
+
+
+def test_entries_for_another_schema_are_dropped(cache):
+    cache.put("failure rate on wifi", {}, RESPONSE)
+    [(_, fingerprint)] = rows(cache)
+    conn = sqlite3.connect(cache.db_path)
+    conn.execute("UPDATE sql_cache SET schema_fingerprint = 'older-schema'")
+    conn.commit()
+    conn.close()
+
+    assert QuestionSQLCache(db_path=cache.db_path).get("failure rate on wifi", {}) is None
+    assert rows(cache) == []
+    assert fingerprint != "older-schema"
+
+
+def test_a_cached_query_that_fails_is_replaced(db, monkeypatch):
+    question = "Which device type do people trust most?"
+    good_sql = "SELECT device_type, COUNT(*) AS n FROM transactions GROUP BY device_type ORDER BY n DESC"
+    sql_cache.put(question, {}, {"sql": "SELECT no_such_column FROM transactions", "query_intent": "Broken"})
+    prompts = []
+
+    async def fake_model(messages, temperature, expect_json):
+        prompts.append(messages)
+        if expect_json:
+            return '{"sql": "' + good_sql + '", "query_intent": "Comparison"}'
+        return "Android leads."
+
+    monkeypatch.setattr(pipeline, "_acall_gpt4", fake_model)
+    session_id = session_manager.create_session()
+    try:
+        result = asyncio.run(pipeline.aprocess(question, session_id))
+        assert result["sql_used"].startswith(good_sql)
+        assert "no_such_column" in prompts[0][-1]["content"]  # the retry saw the cached query's error
+        assert sql_cache.get(question, {})["sql"] == result["sql_used"]
+    finally:
+        session_manager.delete_session(session_id)
+        sql_cache.discard(question, {})
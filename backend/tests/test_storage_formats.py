@@ -0,0 +1,51 @@
+import duckdb
+import pytest
+
+from backend.core.ingest import COLUMN_NAMES, IngestManager
+from backend.tests.conftest import FIXTURE_CSV, FIXTURE_ROWS, write_transactions
+
+QUERIES = [
+    "SELECT COUNT(*), SUM(amount_inr), MIN(timestamp), MAX(timestamp) FROM transactions",
+    "SELECT sender_state, COUNT(*), SUM(fraud_flag) FROM transactions GROUP BY sender_state ORDER BY sender_state",
+    "SELECT strftime(timestamp, '%Y-%m') AS month, AVG(amount_inr) FROM transactions GROUP BY month ORDER BY month",
+    "SELECT sender_bank, ROUND(SUM(CASE WHEN transaction_status = 'FAILED' THEN 1.0 ELSE 0 END) * 100.0 / COUNT(*), 2) "
+    "FROM transactions WHERE device_type = 'Android' GROUP BY sender_bank ORDER BY sender_bank",
+    "SELECT * FROM transactions WHERE timestamp BETWEEN '2024-03-01' AND '2024-03-15' "
+    "AND sender_state = 'Delhi' ORDER BY transaction_id",
+    "SELECT COUNT(*) FROM transactions WHERE merchant_category IS NULL AND receiver_age_group IS NULL",
+]
+
+
+def open_store(manager: IngestManager) -> duckdb.DuckDBPyConnection:
+    """A connection that sees the store the way DatabaseManager does: through the transactions view."""
+    conn = duckdb.connect(":memory:")
+    conn.execute(f"ATTACH '{manager.store_path}' AS store (READ_ONLY)")
+    conn.execute(f"CREATE VIEW transactions AS SELECT {', '.join(COLUMN_NAMES)} "
+                 f"FROM {manager.transactions_relation()}")
+    return conn
+
+
+def answers(manager: IngestManager) -> list:
+    conn = open_store(manager)
+    try:
+        return [conn.execute(sql).fetchall() for sql in QUERIES]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("partition_by", [["month"], ["month", "sender_state"]])
+def test_parquet_mode_answers_like_duckdb_mode(tmp_path, partition_by):
+    native = IngestManager(str(tmp_path / "duckdb"), storage_format="duckdb")
+    parquet = IngestManager(str(tmp_path / "parquet"), storage_format="parquet", partition_by=partition_by)
+    for manager in (native, parquet):
+        meta = manager.ensure_store(FIXTURE_CSV)
+        assert meta["row_count"] == str(FIXTURE_ROWS)
+    assert native.storage_layout == "duckdb+enum"
+    assert parquet.storage_layout == "parquet:" + ",".join(partition_by)
+    assert answers(parquet) == answers(native)
+
+    batch = tmp_path / "batch.csv"
+    write_transactions(str(batch), 500, seed=11, first_id=FIXTURE_ROWS)
+    for manager in (native, parquet):
+        assert manager.append(str(batch))["row_count"] == str(FIXTURE_ROWS + 500)
+    assert answers(parquet) == answers(native)